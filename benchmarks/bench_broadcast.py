@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк рассылки: 100k получателей через RateLimitedSender
+
+Проверяет, что очередь получателей вычерпывается не быстрее глобального
+лимита, ответы 429 обрабатываются с паузой сервера, а потребление памяти
+не растет с числом получателей. Чтобы прогон занимал секунды, лимит можно
+масштабировать флагом --rate (в боте используется 30 сообщений в секунду).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from bot.broadcast import RateLimitedSender
+
+
+class FakeBot:
+    """Замена aiogram.Bot: задержка запроса и случайные ответы 429"""
+
+    def __init__(self, latency: float, retry_ratio: float):
+        self.latency = latency
+        self.retry_ratio = retry_ratio
+        self.per_second = {}
+        self.started = time.monotonic()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        if random.random() < self.retry_ratio:
+            raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Too Many Requests", 1)
+        second = int(time.monotonic() - self.started)
+        self.per_second[second] = self.per_second.get(second, 0) + 1
+
+
+async def recipients(total: int, page_size: int, checkpoints: list):
+    """Получатели постранично, как при чтении из базы данных"""
+    for start in range(0, total, page_size):
+        # Имитация запроса страницы
+        await asyncio.sleep(0)
+        for user_id in range(start + 1, min(start + page_size, total) + 1):
+            yield user_id, f"📊 Ежедневный отчет о дипворке для {user_id}"
+        checkpoints.append(tracemalloc.get_traced_memory()[0])
+
+
+async def run(args):
+    bot = FakeBot(args.latency, args.retry_ratio)
+    sender = RateLimitedSender(bot, rate=args.rate, max_in_flight=args.concurrency)
+    checkpoints = []
+
+    tracemalloc.start()
+    started = time.monotonic()
+    sent, failed = await sender.broadcast(recipients(args.recipients, 1000, checkpoints))
+    elapsed = time.monotonic() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    ceiling = args.recipients / args.rate
+    # Первая и последняя секунды неполные
+    full_seconds = sorted(bot.per_second.items())[1:-1]
+    max_per_second = max((count for _, count in full_seconds), default=0)
+    quarter = max(1, len(checkpoints) // 4)
+    print(f"Получателей: {args.recipients}, лимит: {args.rate:.0f}/с, параллельно: {args.concurrency}")
+    print(f"Отправлено: {sent}, не доставлено: {failed}, повторов после 429: {sender.retried}")
+    print(f"Время: {elapsed:.2f}с (минимум по лимиту {ceiling:.2f}с)")
+    print(f"Максимум за секунду: {max_per_second} (лимит {args.rate:.0f})")
+    print("Память по ходу рассылки, КБ: " + ", ".join(
+        f"{value / 1024:.0f}" for value in checkpoints[quarter - 1::quarter]
+    ))
+    print(f"Пик памяти: {peak / 1024:.0f} КБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipients', type=int, default=100_000, help='число получателей')
+    parser.add_argument('--rate', type=float, default=5_000, help='глобальный лимит сообщений в секунду')
+    parser.add_argument('--concurrency', type=int, default=200, help='одновременных запросов')
+    parser.add_argument('--latency', type=float, default=0.005, help='задержка запроса к API, секунды')
+    parser.add_argument('--retry-ratio', type=float, default=0.00005, help='доля ответов 429')
+    args = parser.parse_args()
+    # Паузы после 429 считаются в итогах, в логе они не нужны
+    logging.getLogger('bot.broadcast').setLevel(logging.ERROR)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк остановки сессии: прежняя схема против close_session()
+
+Прежняя схема выполняет ту же работу, что и close_session() (закрытие сессии,
+снятие сроков, привычки по часам, статистика за дни, недели и месяцы, серии),
+но каждым шагом - отдельным запросом из приложения, и затем отдельно
+запрашивает статистику за сегодня из обработчика. Новая - один вызов
+хранимой функции; обе проходят через одни и те же триггеры сессий.
+Требуется PostgreSQL (переменные окружения как у бота).
+Флаг --rtt-ms добавляет задержку к каждому запросу, имитируя удаленную базу.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.database import Database
+
+# Синтетические пользователи, которых точно нет среди настоящих
+USER_BASE = 9_000_000_000
+
+
+# Запросов к базе в последнем прогоне
+roundtrips = 0
+
+
+def execute(cursor, rtt: float, query: str, params=()):
+    """Запрос к базе с имитацией сетевой задержки"""
+    global roundtrips
+    roundtrips += 1
+    if rtt:
+        time.sleep(rtt)
+    cursor.execute(query, params)
+
+
+def seed_sessions(db: Database, count: int) -> list:
+    """Открытые сессии синтетических пользователей, по одной на пользователя"""
+    with db.connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO deepwork_sessions (user_id, start_time)
+            SELECT %s + n, now() - INTERVAL '30 minutes'
+            FROM generate_series(1, %s) AS n
+            RETURNING id
+        """, (USER_BASE, count))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def cleanup(db: Database):
+    with db.connection() as conn, conn.cursor() as cursor:
+        for table in ('deepwork_sessions', 'daily_stats', 'weekly_stats', 'monthly_stats', 'user_streaks',
+                      'user_insights', 'session_deadlines'):
+            cursor.execute(f"DELETE FROM {table} WHERE user_id >= %s", (USER_BASE,))
+
+
+def stop_legacy(db: Database, session_id: int, rtt: float):
+    """Остановка сессии так, как это делалось раньше: каждый шаг - отдельный
+    запрос из приложения. Работа та же, что у close_session(): сроки,
+    привычки по часам, статистика по дням, неделям и месяцам, серии."""
+    with db.connection() as conn, conn.cursor() as cursor:
+        execute(cursor, rtt, """
+            UPDATE deepwork_sessions
+            SET end_time = GREATEST(now(), start_time),
+                duration_minutes = FLOOR(EXTRACT(EPOCH FROM (GREATEST(now(), start_time) - start_time)) / 60)
+            WHERE id = %s AND end_time IS NULL
+            RETURNING user_id, start_time, end_time
+        """, (session_id,))
+        user_id, start, end = cursor.fetchone()
+        execute(cursor, rtt, "DELETE FROM session_deadlines WHERE user_id = %s", (user_id,))
+        execute(cursor, rtt, "SELECT pg_advisory_xact_lock_shared(hashtext('daily_stats'))")
+        execute(cursor, rtt, "SELECT daily_goal(%s), user_timezone(%s)", (user_id, user_id))
+        goal, timezone = cursor.fetchone()
+        execute(cursor, rtt, """
+            INSERT INTO user_insights AS i (user_id, hour_minutes, length_counts)
+            VALUES (%s, session_hour_minutes(%s, %s, %s), session_length_counts(%s, %s))
+            ON CONFLICT (user_id)
+            DO UPDATE SET
+                hour_minutes = array_add(i.hour_minutes, EXCLUDED.hour_minutes),
+                length_counts = array_add(i.length_counts, EXCLUDED.length_counts)
+        """, (user_id, start, end, timezone, start, end))
+        execute(cursor, rtt, "SELECT day, minutes, started FROM session_day_split(%s, %s, %s)", (start, end, timezone))
+        for day, minutes, started in cursor.fetchall():
+            execute(cursor, rtt, """
+                INSERT INTO daily_stats AS d (user_id, date, total_minutes, session_count)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id, date)
+                DO UPDATE SET
+                    total_minutes = d.total_minutes + EXCLUDED.total_minutes,
+                    session_count = d.session_count + EXCLUDED.session_count
+                RETURNING d.total_minutes
+            """, (user_id, day, minutes, started))
+            total = cursor.fetchone()[0]
+            new_day = int(total > 0 and total == minutes)
+            for table, column in (('weekly_stats', 'week_start'), ('monthly_stats', 'month_start')):
+                execute(cursor, rtt, f"""
+                    INSERT INTO {table} AS w (user_id, {column}, total_minutes, total_sessions, days_with_work)
+                    VALUES (%s, DATE_TRUNC('{column[:-6]}', %s::date)::date, %s, %s, %s)
+                    ON CONFLICT (user_id, {column})
+                    DO UPDATE SET
+                        total_minutes = w.total_minutes + EXCLUDED.total_minutes,
+                        total_sessions = w.total_sessions + EXCLUDED.total_sessions,
+                        days_with_work = w.days_with_work + EXCLUDED.days_with_work
+                """, (user_id, day, minutes, started, new_day))
+            goal_hit = total >= goal and total - minutes < goal
+            if goal_hit or new_day:
+                execute(cursor, rtt, """
+                    INSERT INTO user_streaks AS s
+                        (user_id, current_streak, longest_streak, last_goal_day, goal_days, active_days)
+                    VALUES (%(user)s, %(hit)s, %(hit)s, CASE WHEN %(hit)s = 1 THEN %(day)s::date END, %(hit)s, %(new)s)
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET
+                        current_streak = CASE
+                            WHEN %(hit)s = 0 THEN s.current_streak
+                            WHEN s.last_goal_day = %(day)s::date - 1 THEN s.current_streak + 1
+                            ELSE 1
+                        END,
+                        longest_streak = GREATEST(s.longest_streak, CASE
+                            WHEN %(hit)s = 0 THEN s.current_streak
+                            WHEN s.last_goal_day = %(day)s::date - 1 THEN s.current_streak + 1
+                            ELSE 1
+                        END),
+                        last_goal_day = CASE WHEN %(hit)s = 1 THEN %(day)s::date ELSE s.last_goal_day END,
+                        goal_days = s.goal_days + %(hit)s,
+                        active_days = s.active_days + %(new)s
+                """, {'user': user_id, 'hit': int(goal_hit), 'day': day, 'new': new_day})
+    # Обработчик затем отдельно запрашивал статистику за сегодня
+    with db.connection() as conn, conn.cursor() as cursor:
+        execute(cursor, rtt, """
+            SELECT total_minutes, session_count FROM daily_stats
+            WHERE user_id = %s AND date = (now() AT TIME ZONE user_timezone(%s))::date
+        """, (user_id, user_id))
+        cursor.fetchone()
+
+
+def stop_single(db: Database, session_id: int, rtt: float):
+    """Остановка сессии одним вызовом close_session()"""
+    with db.connection() as conn, conn.cursor() as cursor:
+        execute(cursor, rtt, "SELECT total_minutes, session_count FROM close_session(%s)", (session_id,))
+        cursor.fetchone()
+
+
+def measure(name: str, db: Database, stop, count: int, rtt: float):
+    global roundtrips
+    session_ids = seed_sessions(db, count)
+    roundtrips = 0
+    started = time.perf_counter()
+    for session_id in session_ids:
+        stop(db, session_id, rtt)
+    elapsed = time.perf_counter() - started
+    print(f"{name:>8}: {count / elapsed:8.0f} остановок/с, "
+          f"{elapsed / count * 1000:.2f} мс на остановку, запросов на остановку: {roundtrips / count:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=2000, help='число остановок')
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='имитируемая задержка сети на запрос')
+    args = parser.parse_args()
+
+    db = Database(maxconn=2)
+    rtt = args.rtt_ms / 1000
+    try:
+        cleanup(db)
+        measure('прежняя', db, stop_legacy, args.count, rtt)
+        cleanup(db)
+        measure('новая', db, stop_single, args.count, rtt)
+    finally:
+        cleanup(db)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
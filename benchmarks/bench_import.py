@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк импорта истории сессий
+
+Генерирует CSV с многолетней историей синтетических пользователей (с
+дубликатами и пересекающимися интервалами), импортирует его через
+bot.importer и печатает время. Затем статистика импортированных
+пользователей сверяется с полным пересчетом из сессий, а повторный импорт
+того же файла должен ничего не записать. Синтетические данные удаляются.
+Требуется PostgreSQL (переменные окружения как у бота).
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.database import (
+    Database, REBUILD_DAILY_STATS_SQL, REBUILD_ROLLUPS_SQL, REBUILD_STREAKS_SQL, REBUILD_INSIGHTS_SQL
+)
+from bot.importer import import_history
+
+# Синтетические пользователи, которых точно нет среди настоящих
+USER_BASE = 9_200_000_000
+
+STATS_TABLES = (
+    ('daily_stats', 'user_id, date, total_minutes, session_count'),
+    ('weekly_stats', 'user_id, week_start, total_minutes, total_sessions, days_with_work'),
+    ('monthly_stats', 'user_id, month_start, total_minutes, total_sessions, days_with_work'),
+    ('user_streaks', '*'),
+    ('user_insights', '*'),
+)
+
+
+def write_history(path: str, rng: random.Random, users: int, rows: int):
+    """CSV: у каждого пользователя подряд идущие дни, примерно 1% повторов"""
+    per_user = rows // users
+    # Промежуток между сессиями меньше суток, поэтому вся история в прошлом
+    first_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=per_user)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['user_id', 'start_time', 'end_time'])
+        for user in range(users):
+            user_id = USER_BASE + user
+            start = first_day + timedelta(hours=rng.randint(6, 10))
+            for _ in range(per_user):
+                end = start + timedelta(minutes=rng.randint(10, 150))
+                writer.writerow([user_id, start.isoformat(' '), end.isoformat(' ')])
+                if rng.random() < 0.01:
+                    # Повтор из другого трекера, частично пересекающийся
+                    writer.writerow([user_id, (start + timedelta(minutes=5)).isoformat(' '), end.isoformat(' ')])
+                start = end + timedelta(minutes=rng.randint(10, 900))
+
+
+def snapshot(db: Database) -> dict:
+    result = {}
+    with db.connection() as conn, conn.cursor() as cursor:
+        for table, columns in STATS_TABLES:
+            cursor.execute(f"SELECT {columns} FROM {table} WHERE user_id >= %s ORDER BY 1, 2", (USER_BASE,))
+            result[table] = cursor.fetchall()
+    return result
+
+
+def cleanup(db: Database):
+    with db.connection() as conn, conn.cursor() as cursor:
+        for table in ('deepwork_sessions', 'daily_stats', 'weekly_stats', 'monthly_stats', 'user_streaks', 'user_insights'):
+            cursor.execute(f"DELETE FROM {table} WHERE user_id >= %s", (USER_BASE,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='строк в файле')
+    parser.add_argument('--users', type=int, default=500, help='число синтетических пользователей')
+    parser.add_argument('--seed', type=int, default=1, help='начальное значение генератора')
+    args = parser.parse_args()
+
+    db = Database(maxconn=1)
+    cleanup(db)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.csv')
+            write_history(path, random.Random(args.seed), args.users, args.rows)
+
+            started = time.perf_counter()
+            result = import_history(db, path)
+            elapsed = time.perf_counter() - started
+            print(
+                f"Импорт: {result['rows']} строк, записано {result['imported']} сессий "
+                f"{result['users']} пользователей за {elapsed:.2f}с "
+                f"({result['rows'] / elapsed:,.0f} строк/с)"
+            )
+
+            incremental = snapshot(db)
+            with db.connection() as conn, conn.cursor() as cursor:
+                cursor.execute(
+                    REBUILD_DAILY_STATS_SQL + REBUILD_ROLLUPS_SQL + REBUILD_STREAKS_SQL + REBUILD_INSIGHTS_SQL,
+                    {'first': USER_BASE, 'last': USER_BASE + args.users}
+                )
+            rebuilt = snapshot(db)
+            for table, _ in STATS_TABLES:
+                if incremental[table] == rebuilt[table]:
+                    print(f"✅ {table}: {len(rebuilt[table])} строк совпадают с полным пересчетом")
+                else:
+                    print(f"❌ {table}: расходится с полным пересчетом")
+
+            started = time.perf_counter()
+            repeat = import_history(db, path)
+            print(
+                f"{'✅' if repeat['imported'] == 0 else '❌'} Повторный импорт записал "
+                f"{repeat['imported']} сессий за {time.perf_counter() - started:.2f}с"
+            )
+    finally:
+        cleanup(db)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
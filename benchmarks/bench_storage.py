@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки обработчиков: блокирующий Database против AsyncDatabase
+
+Моделирует N одновременных пользователей, каждый из которых нажимает кнопки
+(начало сессии, остановка, статистика), и печатает p50/p99 задержки одного
+нажатия. По умолчанию используется встроенная замена базы данных с
+искусственной задержкой запросов, с флагом --postgres - настоящий PostgreSQL
+из переменных окружения.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.storage import AsyncDatabase
+
+
+class LatencyDatabase:
+    """Замена Database: блокирующие запросы с заданной задержкой и ограниченным пулом"""
+
+    def __init__(self, latency: float, slow_ratio: float, maxconn: int):
+        self.latency = latency
+        self.slow_ratio = slow_ratio
+        self.maxconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _query(self):
+        delay = self.latency * (20 if random.random() < self.slow_ratio else 1)
+        with self._slots:
+            time.sleep(delay)
+
+    def start_session(self, user_id, deadlines=(), tag=None):
+        self._query()
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def end_session(self, session_id, end_time=None):
+        self._query()
+        return True
+
+    def get_today_stats(self, user_id, day=None):
+        self._query()
+        return {'total_minutes': 0, 'hours': 0, 'minutes': 0, 'session_count': 0}
+
+    def close(self):
+        pass
+
+
+def percentile(values, p):
+    """Перцентиль по отсортированному списку"""
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def handle_callback(db, blocking, user_id, action, arrival, latencies):
+    """Один callback: задержка считается от момента поступления обновления"""
+    if blocking:
+        # Так работали обработчики раньше: синхронный вызов внутри корутины
+        if action == 'start':
+            db.start_session(user_id)
+        elif action == 'stats':
+            db.get_today_stats(user_id)
+        else:
+            db.end_session(user_id)
+            db.get_today_stats(user_id)
+    else:
+        if action == 'start':
+            await db.start_session(user_id)
+        elif action == 'stats':
+            await db.get_today_stats(user_id)
+        else:
+            await db.end_session(user_id)
+            await db.get_today_stats(user_id)
+    latencies.append(time.perf_counter() - arrival)
+
+
+def generate_events(users, taps, rate):
+    """Моменты поступления нажатий всех пользователей при заданной средней частоте"""
+    total = users * taps * 3
+    duration = total / rate
+    events = []
+    for user_id in range(1, users + 1):
+        offsets = sorted(random.uniform(0, duration) for _ in range(taps * 3))
+        for offset, action in zip(offsets, ('start', 'stats', 'stop') * taps):
+            events.append((offset, user_id, action))
+    events.sort()
+    return events
+
+
+async def run(mode, sync_db, events):
+    latencies = []
+    blocking = mode == 'blocking'
+    db = sync_db if blocking else AsyncDatabase(sync_db)
+    tasks = []
+    started = time.perf_counter()
+    # Как и диспетчер aiogram, создаем задачу на каждое поступившее обновление
+    for offset, user_id, action in events:
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(
+            handle_callback(db, blocking, user_id, action, started + offset, latencies)
+        ))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    if not blocking:
+        db.executor.shutdown(wait=True)
+    print(f"{mode:>9}: callbacks={len(latencies)} total={elapsed:.2f}s "
+          f"p50={percentile(latencies, 50) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50, help='число одновременных пользователей')
+    parser.add_argument('--taps', type=int, default=5, help='циклов нажатий на пользователя')
+    parser.add_argument('--rate', type=float, default=500, help='средняя частота нажатий в секунду')
+    parser.add_argument('--latency', type=float, default=0.002, help='задержка запроса, секунды')
+    parser.add_argument('--slow-ratio', type=float, default=0.01, help='доля медленных запросов (x20)')
+    parser.add_argument('--pool', type=int, default=10, help='размер пула подключений')
+    parser.add_argument('--postgres', action='store_true', help='использовать настоящий PostgreSQL')
+    args = parser.parse_args()
+
+    if args.postgres:
+        from bot.database import Database
+        sync_db = Database(maxconn=args.pool)
+    else:
+        sync_db = LatencyDatabase(args.latency, args.slow_ratio, args.pool)
+
+    events = generate_events(args.users, args.taps, args.rate)
+    print(f"Пользователей: {args.users}, нажатий: {len(events)}, "
+          f"частота: {args.rate:.0f}/с, пул: {args.pool}")
+    for mode in ('blocking', 'async'):
+        asyncio.run(run(mode, sync_db, events))
+    sync_db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк кнопок и текстов ответов на нажатия
+
+Для каждого экрана (главное меню, начало и остановка сессии, статистика за
+сегодня, возврат назад) сравнивается сборка ответа, как ее делали
+обработчики до bot/templates.py - InlineKeyboardBuilder и f-строки при
+каждом нажатии, - с готовыми клавиатурами и шаблонами Templates: число
+созданных моделей aiogram, пик выделенной памяти (tracemalloc) и время на
+один ответ. Флаг --updates дополнительно прогоняет нажатия через
+обработчики бота (MemoryDatabase, Bot API без сети) и показывает те же
+величины на одно обновление; с --iterations 0 запускается только этот
+прогон, и его можно сравнить со старыми версиями бота.
+
+Запуск: python benchmarks/bench_templates.py [--iterations 20000] [--updates 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+# Добавляем корневую директорию и бенчмарки в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram.types import InlineKeyboardButton
+from aiogram.types.base import TelegramObject
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+STATS = {
+    'total_minutes': 135, 'session_count': 3, 'hours': 2, 'minutes': 15,
+    'goal_minutes': 240, 'day': date(2026, 10, 18),
+}
+TAGS = ('thesis',)
+
+# Нажатия одного пользователя при прогоне через обработчики
+CALLBACKS = ('start_deepwork', 'today_stats', 'stop_deepwork', 'back_to_main')
+
+
+class ModelCounter:
+    """Счетчик моделей aiogram (кнопки, клавиатуры, сообщения), созданных конструктором"""
+
+    def __init__(self):
+        self.created = 0
+
+    def __enter__(self):
+        counter = self
+
+        def counting_init(model, *args, **kwargs):
+            counter.created += 1
+            super(TelegramObject, model).__init__(*args, **kwargs)
+
+        TelegramObject.__init__ = counting_init
+        return self
+
+    def __exit__(self, *exc):
+        del TelegramObject.__init__
+
+
+def builder_screens() -> dict:
+    """Ответы, собранные заново при каждом нажатии (как раньше в bot/bot.py)"""
+
+    def main_menu():
+        keyboard = InlineKeyboardBuilder()
+        keyboard.add(InlineKeyboardButton(text="🎯 Начать дипворк", callback_data="start_deepwork"))
+        for tag in TAGS:
+            keyboard.add(InlineKeyboardButton(text=f"🎯 #{tag}", callback_data="start_deepwork:" + tag))
+        keyboard.add(InlineKeyboardButton(text="🍅 Помидор", callback_data="start_pomodoro"))
+        keyboard.add(InlineKeyboardButton(text="⏹ Остановить дипворк", callback_data="stop_deepwork"))
+        keyboard.add(InlineKeyboardButton(text="📊 Статистика за сегодня", callback_data="today_stats"))
+        keyboard.adjust(1)
+        return "🚀 Главное меню Time Tracker Bot\n\nВыберите действие:", keyboard.as_markup()
+
+    def session_started():
+        keyboard = InlineKeyboardBuilder()
+        keyboard.add(InlineKeyboardButton(text="⏹ Остановить дипворк", callback_data="stop_deepwork"))
+        keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
+        text = (
+            f"🎯 Сессия дипворка началась в {'09:30'}\n\n"
+            f"{'Время идет... ⏰'}\n"
+            "Нажмите 'Остановить дипворк' когда закончите."
+        )
+        return text, keyboard.as_markup()
+
+    def session_stopped():
+        keyboard = InlineKeyboardBuilder()
+        keyboard.add(InlineKeyboardButton(text="🎯 Начать дипворк", callback_data="start_deepwork"))
+        keyboard.add(InlineKeyboardButton(text="📊 Статистика за сегодня", callback_data="today_stats"))
+        keyboard.row()
+        keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
+        text = (
+            f"✅ Сессия дипворка завершена!\n\n"
+            f"📊 Статистика за сегодня:\n"
+            f"⏱ Общее время: {STATS['hours']}ч {STATS['minutes']}м\n"
+            f"🔄 Количество сессий: {STATS['session_count']}\n\n"
+            "Отличная работа! 🎉"
+        )
+        return text, keyboard.as_markup()
+
+    def today_stats():
+        goal = STATS['goal_minutes']
+        keyboard = InlineKeyboardBuilder()
+        keyboard.add(InlineKeyboardButton(text="🎯 Начать дипворк", callback_data="start_deepwork"))
+        keyboard.add(InlineKeyboardButton(text="⏹ Остановить дипворк", callback_data="stop_deepwork"))
+        keyboard.row()
+        keyboard.add(InlineKeyboardButton(text="📈 График за неделю", callback_data="chart_week"))
+        keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
+        text = (
+            f"📊 Статистика за сегодня ({STATS['day'].strftime('%d.%m.%Y')}):\n\n"
+            f"⏱ Общее время дипворка: {STATS['hours']}ч {STATS['minutes']}м\n"
+            f"🔄 Количество сессий: {STATS['session_count']}\n\n"
+            f"Цель: {goal // 60}ч {goal % 60}м дипворка в день 🎯"
+        )
+        return text, keyboard.as_markup()
+
+    def no_session():
+        keyboard = InlineKeyboardBuilder()
+        keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
+        return "⚠️ У вас нет активной сессии дипворка.\nСначала начните новую сессию.", keyboard.as_markup()
+
+    return {
+        'main_menu': main_menu, 'session_started': session_started, 'session_stopped': session_stopped,
+        'today_stats': today_stats, 'no_session': no_session,
+    }
+
+
+def template_screens() -> dict:
+    """Те же ответы из готовых клавиатур и шаблонов"""
+    from bot.templates import Templates
+    ui = Templates()
+    goal = STATS['goal_minutes']
+    return {
+        'main_menu': lambda: (ui.text.main_menu, ui.main_menu(TAGS, False)),
+        'session_started': lambda: (ui.session_text('09:30'), ui.keyboard.session),
+        'session_stopped': lambda: (ui.text.session_stopped(**STATS), ui.keyboard.session_stopped),
+        'today_stats': lambda: (
+            ui.text.today_stats(**STATS, goal_hours=goal // 60, goal_rest=goal % 60), ui.keyboard.today_stats
+        ),
+        'no_session': lambda: (ui.text.no_session_stop, ui.keyboard.back),
+    }
+
+
+def measure(render, iterations: int) -> tuple:
+    """(моделей на вызов, пик памяти на вызов в байтах, микросекунд на вызов)"""
+    render()
+    with ModelCounter() as counter:
+        render()
+    tracemalloc.start()
+    peak = 0
+    for _ in range(min(iterations, 1000)):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = render()
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        del result
+    tracemalloc.stop()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    return counter.created, peak, (time.perf_counter() - started) / iterations * 1e6
+
+
+async def measure_updates(users: int) -> tuple:
+    """Нажатия CALLBACKS через обработчики бота: (моделей, пик памяти, мкс) на обновление"""
+    from bot.bot import TimeTrackerBot
+    from bot.memory_database import MemoryDatabase
+    from bot.storage import AsyncDatabase
+    from replay import FakeTelegramSession, make_update
+
+    db = AsyncDatabase(MemoryDatabase())
+    tracker = TimeTrackerBot(db)
+    tracker.setup('1:BENCH')
+    tracker.bot.session = FakeTelegramSession()
+    updates = [
+        make_update(user_id * 10 + index, user_id, 'callback', data)
+        for user_id in range(1, users + 1) for index, data in enumerate(CALLBACKS)
+    ]
+    # Прогрев: кеши пользователей и первые вызовы
+    for update in updates[:len(CALLBACKS)]:
+        await tracker.dp.feed_raw_update(tracker.bot, update)
+    updates = updates[len(CALLBACKS):]
+
+    tracemalloc.start()
+    peak = 0
+    with ModelCounter() as counter:
+        for update in updates[:len(updates) // 4]:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await tracker.dp.feed_raw_update(tracker.bot, update)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    measured = len(updates) // 4
+    started = time.perf_counter()
+    for update in updates[measured:]:
+        await tracker.dp.feed_raw_update(tracker.bot, update)
+    elapsed = time.perf_counter() - started
+    await db.close()
+    return counter.created / measured, peak, elapsed / (len(updates) - measured) * 1e6
+
+
+def compare_screens(iterations: int):
+    """Таблица "до -> после" по каждому экрану"""
+    print(f"{'экран':<16} {'моделей':>16} {'пик памяти, Б':>20} {'мкс на ответ':>20}")
+    builders, templates = builder_screens(), template_screens()
+    for name in builders:
+        before = measure(builders[name], iterations)
+        after = measure(templates[name], iterations)
+        print(
+            f"{name:<16} {before[0]:>7} -> {after[0]:<6} {before[1]:>9} -> {after[1]:<8} "
+            f"{before[2]:>8.1f} -> {after[2]:<8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20_000, help='вызовов на экран (0 - не сравнивать экраны)')
+    parser.add_argument('--updates', type=int, default=0,
+                        help='пользователей для прогона нажатий через обработчики (0 - не прогонять)')
+    args = parser.parse_args()
+
+    if args.iterations:
+        compare_screens(args.iterations)
+    if args.updates:
+        models, peak, micros = asyncio.run(measure_updates(args.updates))
+        print(f"\nНажатия через обработчики ({', '.join(CALLBACKS)}), на обновление:")
+        print(f"моделей: {models:.1f}, пик памяти: {peak} Б, время: {micros:.0f} мкс")
+
+
+if __name__ == "__main__":
+    main()
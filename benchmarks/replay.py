@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение синтетических обновлений через обработчики бота
+
+Генерирует поток обновлений Telegram от многих пользователей: начало и
+остановка сессий, просмотр статистики, команды, ввод даты рождения. Каждое
+обновление проходит через настоящий Dispatcher и обработчики TimeTrackerBot;
+вызовы Bot API отвечает заглушка без сети, данные хранятся в MemoryDatabase
+(по умолчанию) или в PostgreSQL (--postgres, переменные окружения как у
+бота). Обновления одного пользователя обрабатываются по очереди, разные
+пользователи - параллельно.
+
+Печатает пропускную способность, перцентили задержки (всего и по типам
+обновлений), обращения к базе и SQL-запросы на обновление, вызовы Bot API
+и память, выделяемую на обновление (отдельный последовательный проход с
+tracemalloc). --save сохраняет результат как базовый, --compare сравнивает
+с сохраненным и завершается с кодом 1 при ухудшении больше --tolerance.
+
+Запуск: python benchmarks/replay.py [--updates 20000] [--users 500] [--postgres] [--save FILE] [--compare FILE]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+import psycopg2.extensions
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import types
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery
+from bot.bot import TimeTrackerBot
+from bot.database import Database
+from bot.memory_database import MemoryDatabase
+from bot.storage import AsyncDatabase
+
+# Синтетические пользователи, которых точно нет среди настоящих
+USER_BASE = 9_400_000_000
+
+TOKEN = '123456:replay'
+
+COMMANDS = ('/start', '/week', '/month', '/streak', '/insights', '/goal')
+
+# Обновление, которое сейчас обрабатывается: сюда считаются обращения к базе
+CURRENT = contextvars.ContextVar('replay_update', default=None)
+
+
+class FakeTelegramSession(BaseSession):
+    """Bot API без сети: каждый вызов считается и получает ответ-заглушку"""
+
+    def __init__(self, latency: float = 0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        record = CURRENT.get()
+        if record is not None:
+            record['api_calls'] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, AnswerCallbackQuery):
+            return True
+        self._message_id += 1
+        chat_id = getattr(method, 'chat_id', None) or 0
+        return types.Message(
+            message_id=self._message_id,
+            date=datetime.now(),
+            chat=types.Chat(id=chat_id, type='private'),
+            text=getattr(method, 'text', None)
+        )
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        raise NotImplementedError("Загрузка файлов при воспроизведении не используется")
+        yield b''
+
+    async def close(self):
+        pass
+
+
+class CountingDatabase(AsyncDatabase):
+    """AsyncDatabase, относящий обращения к базе к текущему обновлению,
+    с необязательной задержкой каждого обращения"""
+
+    def __init__(self, db, latency: float = 0):
+        super().__init__(db)
+        self.latency = latency
+
+    async def _run(self, func, *args):
+        record = CURRENT.get()
+        if record is None and not self.latency:
+            return await super()._run(func, *args)
+        if record is not None:
+            record['db_calls'] += 1
+
+        def call(*call_args):
+            # У потока пула свой контекст: переносим в него текущее обновление
+            token = CURRENT.set(record)
+            try:
+                if self.latency:
+                    time.sleep(self.latency)
+                return func(*call_args)
+            finally:
+                CURRENT.reset(token)
+
+        call.__name__ = func.__name__
+        return await super()._run(call, *args)
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """Курсор, считающий SQL-запросы текущего обновления"""
+
+    def execute(self, query, vars=None):
+        record = CURRENT.get()
+        if record is not None:
+            record['queries'] += 1
+        return super().execute(query, vars)
+
+
+def count_queries(db: Database):
+    """Подключения пула выдаются с курсором CountingCursor"""
+    getconn = db.pool.getconn
+
+    def counting_getconn(*args, **kwargs):
+        conn = getconn(*args, **kwargs)
+        conn.cursor_factory = CountingCursor
+        return conn
+
+    db.pool.getconn = counting_getconn
+
+
+def cleanup(db: Database):
+    with db.connection() as conn, conn.cursor() as cursor:
+        for table in ('deepwork_sessions', 'daily_stats', 'daily_tag_stats', 'weekly_stats', 'monthly_stats',
+                      'user_streaks', 'user_insights', 'user_settings', 'user_birthday'):
+            cursor.execute(f"DELETE FROM {table} WHERE user_id >= %s", (USER_BASE,))
+
+
+def user_script(rng: random.Random, length: int) -> list:
+    """Действия одного пользователя: (вид обновления, данные)"""
+    actions = [('command', '/start')]
+    while len(actions) < length:
+        actions.append(('callback', 'start_deepwork'))
+        if rng.random() < 0.3:
+            actions.append(('callback', 'today_stats'))
+        actions.append(('callback', 'stop_deepwork'))
+        roll = rng.random()
+        if roll < 0.4:
+            actions.append(('callback', 'today_stats'))
+        elif roll < 0.6:
+            actions.append(('command', rng.choice(COMMANDS)))
+        elif roll < 0.65:
+            actions += [('callback', 'set_birthday'), ('text', '15.03.1990')]
+        actions.append(('callback', 'back_to_main'))
+    return actions[:length]
+
+
+def make_update(update_id: int, user_id: int, kind: str, data: str) -> dict:
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Replay'}
+    chat = {'id': user_id, 'type': 'private'}
+    now = int(time.time())
+    if kind == 'callback':
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': user,
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': {'message_id': 1, 'date': now, 'chat': chat, 'text': 'menu'},
+            },
+        }
+    message = {'message_id': update_id, 'date': now, 'chat': chat, 'from': user, 'text': data}
+    if kind == 'command':
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(data)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def generate_scripts(rng: random.Random, updates: int, users: int, first_user: int) -> list:
+    """Обновления по пользователям: [(user_id, [(тип, обновление), ...]), ...]"""
+    update_id = 0
+    scripts = []
+    for index in range(users):
+        user_id = first_user + index
+        length = updates // users + (1 if index < updates % users else 0)
+        script = []
+        for kind, data in user_script(rng, length):
+            update_id += 1
+            label = kind if kind == 'text' else f"{kind}:{data}"
+            script.append((label, make_update(first_user * 10 + update_id, user_id, kind, data)))
+        scripts.append((user_id, script))
+    return scripts
+
+
+async def feed(tracker: TimeTrackerBot, label: str, update: dict) -> dict:
+    record = {'type': label, 'db_calls': 0, 'queries': 0, 'api_calls': 0, 'error': False}
+    token = CURRENT.set(record)
+    started = time.perf_counter()
+    try:
+        await tracker.dp.feed_raw_update(tracker.bot, update)
+    except Exception:
+        record['error'] = True
+    finally:
+        record['latency'] = time.perf_counter() - started
+        CURRENT.reset(token)
+    return record
+
+
+async def replay(tracker: TimeTrackerBot, scripts: list, concurrency: int) -> list:
+    """Пользователи обрабатываются concurrency обработчиками одновременно"""
+    pending = iter(scripts)
+    records = []
+
+    async def worker():
+        for _, script in pending:
+            for label, update in script:
+                records.append(await feed(tracker, label, update))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return records
+
+
+async def measure_memory(tracker: TimeTrackerBot, scripts: list) -> tuple:
+    """Пик и остаток памяти на обновление, байты: последовательно, с tracemalloc"""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for _, script in scripts:
+            for label, update in script:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                await feed(tracker, label, update)
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return statistics.median(peaks), statistics.mean(retained)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summarize(records: list, elapsed: float, postgres: bool) -> dict:
+    latencies = [record['latency'] for record in records]
+    by_type = {}
+    for record in records:
+        by_type.setdefault(record['type'], []).append(record)
+    return {
+        'updates': len(records),
+        'errors': sum(record['error'] for record in records),
+        'throughput': len(records) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'db_calls_per_update': sum(record['db_calls'] for record in records) / len(records),
+        'queries_per_update': sum(record['queries'] for record in records) / len(records) if postgres else None,
+        'api_calls_per_update': sum(record['api_calls'] for record in records) / len(records),
+        'types': {
+            label: {
+                'count': len(group),
+                'p50_ms': percentile([record['latency'] for record in group], 50) * 1000,
+                'p99_ms': percentile([record['latency'] for record in group], 99) * 1000,
+                'db_calls': sum(record['db_calls'] for record in group) / len(group),
+                'queries': sum(record['queries'] for record in group) / len(group) if postgres else None,
+            }
+            for label, group in sorted(by_type.items())
+        },
+    }
+
+
+def report(result: dict):
+    print(
+        f"Обновлений: {result['updates']} ({result['users']} пользователей, параллельно "
+        f"{result['concurrency']}, хранилище {result['storage']}), ошибок: {result['errors']}"
+    )
+    print(f"Пропускная способность: {result['throughput']:,.0f} обновлений/с")
+    print(f"Задержка: p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms p99={result['p99_ms']:.2f}ms")
+    queries = result['queries_per_update']
+    print(
+        f"На обновление: обращений к базе {result['db_calls_per_update']:.2f}"
+        + (f", SQL-запросов {queries:.2f}" if queries is not None else "")
+        + f", вызовов Bot API {result['api_calls_per_update']:.2f}"
+    )
+    if result.get('alloc_peak_bytes') is not None:
+        print(
+            f"Память на обновление: пик {result['alloc_peak_bytes'] / 1024:.1f} КБ (медиана), "
+            f"остается {result['alloc_retained_bytes']:.0f} Б (среднее)"
+        )
+    print("\nПо типам обновлений:")
+    for label, stats in result['types'].items():
+        line = (
+            f"  {label:<24} {stats['count']:>7}  p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms"
+            f"  база={stats['db_calls']:.2f}"
+        )
+        if stats['queries'] is not None:
+            line += f" sql={stats['queries']:.2f}"
+        print(line)
+
+
+# Показатель -> True, если рост означает ухудшение
+COMPARED = {
+    'throughput': False,
+    'p50_ms': True,
+    'p95_ms': True,
+    'p99_ms': True,
+    'db_calls_per_update': True,
+    'queries_per_update': True,
+    'api_calls_per_update': True,
+    'alloc_peak_bytes': True,
+}
+
+
+def compare(baseline: dict, result: dict, tolerance: float) -> int:
+    """Печать изменений относительно базового результата; число ухудшений"""
+    print(f"\nСравнение с базовым результатом (допуск {tolerance:.0%}):")
+    regressions = 0
+    for name, higher_is_worse in COMPARED.items():
+        old, new = baseline.get(name), result.get(name)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = change > tolerance if higher_is_worse else change < -tolerance
+        regressions += worse
+        print(f"  {'❌' if worse else '✅'} {name}: {old:.2f} → {new:.2f} ({change:+.1%})")
+    # Число обращений к базе по типам не зависит от машины: любое увеличение - ухудшение
+    for label, stats in result['types'].items():
+        old = baseline.get('types', {}).get(label)
+        if old and stats['db_calls'] > old['db_calls'] + 0.01:
+            regressions += 1
+            print(f"  ❌ {label}: обращений к базе {old['db_calls']:.2f} → {stats['db_calls']:.2f}")
+    return regressions
+
+
+async def run(args) -> dict:
+    if args.postgres:
+        database = Database(maxconn=args.pool)
+        cleanup(database)
+        count_queries(database)
+    else:
+        database = MemoryDatabase(maxconn=args.pool)
+    tracker = TimeTrackerBot(db=CountingDatabase(database, latency=args.db_latency / 1000))
+    tracker.setup(TOKEN)
+    api = FakeTelegramSession(latency=args.api_latency / 1000)
+    tracker.bot.session = api
+
+    rng = random.Random(args.seed)
+    try:
+        scripts = generate_scripts(rng, args.updates, args.users, USER_BASE)
+        started = time.perf_counter()
+        records = await replay(tracker, scripts, args.concurrency)
+        result = summarize(records, time.perf_counter() - started, args.postgres)
+        result.update(storage='postgres' if args.postgres else 'memory', users=args.users,
+                      concurrency=args.concurrency, api_methods=dict(api.calls))
+        result['alloc_peak_bytes'] = result['alloc_retained_bytes'] = None
+        if args.memory_sample:
+            sample = generate_scripts(rng, args.memory_sample, max(1, args.memory_sample // 40),
+                                      USER_BASE + args.users)
+            result['alloc_peak_bytes'], result['alloc_retained_bytes'] = await measure_memory(tracker, sample)
+        return result
+    finally:
+        if args.postgres:
+            cleanup(database)
+        await tracker.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=20_000, help='число обновлений')
+    parser.add_argument('--users', type=int, default=500, help='число синтетических пользователей')
+    parser.add_argument('--concurrency', type=int, default=50, help='пользователей одновременно')
+    parser.add_argument('--postgres', action='store_true', help='хранить данные в PostgreSQL')
+    parser.add_argument('--pool', type=int, default=10, help='размер пула подключений')
+    parser.add_argument('--db-latency', type=float, default=0, help='дополнительная задержка обращения к базе, мс')
+    parser.add_argument('--api-latency', type=float, default=0, help='задержка ответа Bot API, мс')
+    parser.add_argument('--memory-sample', type=int, default=2000,
+                        help='обновлений в проходе с tracemalloc (0 - не измерять)')
+    parser.add_argument('--seed', type=int, default=1, help='начальное значение генератора')
+    parser.add_argument('--save', help='сохранить результат как базовый (JSON)')
+    parser.add_argument('--compare', help='сравнить с базовым результатом (JSON)')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='допустимое ухудшение, доля')
+    args = parser.parse_args()
+
+    # Обработчики пишут в лог каждое действие
+    logging.getLogger().setLevel(logging.WARNING)
+    result = asyncio.run(run(args))
+    report(result)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультат сохранен в {args.save}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(baseline, result, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Сверка серий дней с целью с полным пересчетом
+
+Для синтетических пользователей генерируется многолетняя история сессий
+(пропуски, сессии через полночь, поздно закрытые сессии и смена цели), и
+каждая сессия зачисляется через credit_session(), как при закрытии в боте.
+Затем состояние user_streaks сравнивается с полным просмотром daily_stats
+(streak_scan) и печатается время обоих способов. Требуется PostgreSQL
+(переменные окружения как у бота).
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2.extras
+from bot.database import Database
+
+# Синтетические пользователи, которых точно нет среди настоящих
+USER_BASE = 9_100_000_000
+
+
+def generate_history(rng: random.Random, user_id: int, days: int, first_day: date):
+    """Сессии пользователя (user_id, start, end) в порядке закрытия"""
+    sessions = []
+    late = []
+    for offset in range(days):
+        day = datetime.combine(first_day + timedelta(days=offset), datetime.min.time())
+        # Отпуска и пропуски
+        if rng.random() < 0.15:
+            continue
+        cursor = day + timedelta(hours=rng.randint(6, 12))
+        for _ in range(rng.randint(1, 4)):
+            start = cursor + timedelta(minutes=rng.randint(0, 120))
+            end = start + timedelta(minutes=rng.randint(5, 180))
+            # Иногда сессия закрывается с опозданием, после более поздних
+            if rng.random() < 0.01:
+                late.append((user_id, start, end))
+            else:
+                sessions.append((user_id, start, end))
+            cursor = end
+        # Поздняя работа через полночь
+        if rng.random() < 0.05:
+            start = day + timedelta(hours=23, minutes=rng.randint(0, 50))
+            sessions.append((user_id, start, start + timedelta(minutes=rng.randint(20, 150))))
+        while late and rng.random() < 0.3:
+            sessions.append(late.pop(0))
+    return sessions + late
+
+
+def cleanup(db: Database):
+    with db.connection() as conn, conn.cursor() as cursor:
+        for table in ('daily_stats', 'weekly_stats', 'monthly_stats', 'user_streaks', 'user_insights', 'user_settings'):
+            cursor.execute(f"DELETE FROM {table} WHERE user_id >= %s", (USER_BASE,))
+
+
+def credit(db: Database, sessions: list):
+    with db.connection() as conn, conn.cursor() as cursor:
+        psycopg2.extras.execute_batch(
+            cursor, "SELECT 1 FROM credit_session(%s, %s, %s)", sessions, page_size=500
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='число синтетических пользователей')
+    parser.add_argument('--years', type=int, default=3, help='длина истории в годах')
+    parser.add_argument('--seed', type=int, default=1, help='начальное значение генератора')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = Database(maxconn=2)
+    days = args.years * 365
+    first_day = date.today() - timedelta(days=days)
+    last_user = USER_BASE + args.users - 1
+    try:
+        cleanup(db)
+        histories = [
+            generate_history(rng, USER_BASE + n, days, first_day) for n in range(args.users)
+        ]
+        # Разные цели, у части пользователей - по умолчанию
+        for n in range(0, args.users, 2):
+            db.set_daily_goal(USER_BASE + n, rng.choice([60, 120, 180, 300]))
+
+        total = sum(len(history) for history in histories)
+        started = time.perf_counter()
+        for n, history in enumerate(histories):
+            middle = len(history) // 2
+            credit(db, history[:middle])
+            # Смена цели посреди истории
+            if n % 3 == 0:
+                db.set_daily_goal(USER_BASE + n, rng.choice([90, 150, 240]))
+            credit(db, history[middle:])
+        incremental = time.perf_counter() - started
+
+        with db.connection() as conn, conn.cursor() as cursor:
+            started = time.perf_counter()
+            cursor.execute("SELECT * FROM streak_scan(%s, %s) ORDER BY user_id", (USER_BASE, last_user))
+            expected = cursor.fetchall()
+            full_scan = time.perf_counter() - started
+            cursor.execute("""
+                SELECT user_id, current_streak, longest_streak, last_goal_day, goal_days, active_days
+                FROM user_streaks
+                WHERE user_id BETWEEN %s AND %s
+                ORDER BY user_id
+            """, (USER_BASE, last_user))
+            actual = cursor.fetchall()
+
+        mismatches = [(e, a) for e, a in zip(expected, actual) if e != a]
+        print(f"Пользователей: {args.users}, дней истории: {days}, сессий: {total}")
+        print(f"Зачисление: {incremental / total * 1000:.3f} мс на сессию, "
+              f"полный просмотр: {full_scan * 1000:.1f} мс на {args.users} пользователей")
+        if len(expected) != len(actual) or mismatches:
+            print(f"❌ Расхождений: {len(mismatches)}, строк {len(actual)} из {len(expected)}")
+            for e, a in mismatches[:10]:
+                print(f"  ожидалось {e}\n  получено  {a}")
+            sys.exit(1)
+        print("✅ Серии совпадают с полным пересчетом")
+    finally:
+        cleanup(db)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
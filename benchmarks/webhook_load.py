@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест режима webhook
+
+Воспроизводит записанные обновления Telegram (JSON Lines, одно обновление
+на строку) на локальный endpoint и печатает число обновлений в секунду и
+задержку ответа. Без --file обновления генерируются. С флагом --serve
+поднимается локальный прием обновлений с подсчетом вместо обработчиков,
+чтобы измерить пропускную способность самого приема.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import ClientSession, web
+from bot.webhook import SECRET_HEADER, create_webhook_app
+
+
+def generate_updates(count: int, users: int):
+    """Синтетические нажатия кнопок и ввод дат рождения"""
+    actions = ['start_deepwork', 'today_stats', 'stop_deepwork', 'back_to_main']
+    for update_id in range(1, count + 1):
+        user = {'id': random.randint(1, users), 'is_bot': False, 'first_name': 'Load'}
+        chat = {'id': user['id'], 'type': 'private'}
+        if random.random() < 0.9:
+            yield {
+                'update_id': update_id,
+                'callback_query': {
+                    'id': str(update_id),
+                    'from': user,
+                    'chat_instance': str(user['id']),
+                    'data': random.choice(actions),
+                    'message': {'message_id': 1, 'date': int(time.time()), 'chat': chat, 'text': 'menu'},
+                },
+            }
+        else:
+            yield {
+                'update_id': update_id,
+                'message': {
+                    'message_id': update_id,
+                    'date': int(time.time()),
+                    'chat': chat,
+                    'from': user,
+                    'text': '15.03.1990',
+                },
+            }
+
+
+def load_updates(args) -> list:
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            return [line.strip().encode() for line in f if line.strip()]
+    return [json.dumps(update).encode() for update in generate_updates(args.count, args.users)]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def replay(args, bodies: list):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+    headers = {SECRET_HEADER: args.secret, 'Content-Type': 'application/json'}
+
+    async with ClientSession() as session:
+        async def client():
+            nonlocal errors
+            while not queue.empty():
+                body = queue.get_nowait()
+                started = time.perf_counter()
+                async with session.post(args.url, data=body, headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"Обновлений: {len(bodies)}, ошибок: {errors}, параллельно: {args.concurrency}")
+    print(f"Время: {elapsed:.2f}с, {len(bodies) / elapsed:.0f} обновлений/с")
+    print(f"Задержка ответа: p50={percentile(latencies, 50) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms")
+
+
+async def run(args):
+    bodies = load_updates(args)
+    runner = None
+    if args.serve:
+        routed = [0] * args.workers
+
+        def route(user_id, body):
+            routed[user_id % args.workers] += 1
+
+        runner = web.AppRunner(create_webhook_app(route, args.secret, '/webhook'), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', args.port).start()
+        args.url = f'http://127.0.0.1:{args.port}/webhook'
+    try:
+        await replay(args, bodies)
+    finally:
+        if runner:
+            print(f"Распределение по процессам: {routed}")
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook', help='адрес webhook')
+    parser.add_argument('--secret', default=os.getenv('WEBHOOK_SECRET', 'load-test'), help='секретный токен')
+    parser.add_argument('--file', help='файл с записанными обновлениями (JSON Lines)')
+    parser.add_argument('--count', type=int, default=20_000, help='число генерируемых обновлений')
+    parser.add_argument('--users', type=int, default=1_000, help='число генерируемых пользователей')
+    parser.add_argument('--concurrency', type=int, default=50, help='одновременных запросов')
+    parser.add_argument('--serve', action='store_true', help='поднять локальный прием обновлений')
+    parser.add_argument('--port', type=int, default=18080, help='порт для --serve')
+    parser.add_argument('--workers', type=int, default=4, help='число процессов для --serve')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
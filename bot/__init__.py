@@ -4,9 +4,11 @@ Time Tracker Bot - Telegram bot for tracking deep work sessions
 
 from bot.bot import TimeTrackerBot
 from bot.database import Database
+from bot.engines import create_database
+from bot.storage import AsyncDatabase
 
 __version__ = "0.1.0"
 __author__ = "Tarasov Artem"
 __email__ = "almtara550@gmail.com"
 
-__all__ = ["TimeTrackerBot", "Database"]
+__all__ = ["TimeTrackerBot", "Database", "AsyncDatabase", "create_database"]
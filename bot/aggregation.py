@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Пересчет статистики из сессий дипворка
+
+Таблицы daily_stats, weekly_stats и monthly_stats заново строятся из
+deepwork_sessions порциями пользователей: каждая порция пересчитывается
+одним запросом в своей транзакции, поэтому история любого размера не
+загружается в память, а прерванный пересчет можно продолжить флагом
+--after. С флагом --rollups из daily_stats восстанавливаются только
+недельная и месячная статистика. Пересчет можно запускать при работающем
+боте: закрытие сессий ждет окончания пересчета текущей порции.
+
+Запуск: python -m bot.aggregation [--rollups] [--chunk 500] [--after USER_ID]
+"""
+
+import argparse
+import time
+from .engines import Storage, create_database
+
+
+def rebuild(db: Storage, chunk: int, after_user_id: int = 0, rollups_only: bool = False) -> int:
+    """Пересчет всех пользователей после after_user_id, возвращает число порций"""
+    rebuild_chunk = db.refresh_rollups if rollups_only else db.rebuild_daily_stats
+    chunks = 0
+    started = time.monotonic()
+    while True:
+        last_user_id = rebuild_chunk(after_user_id, chunk)
+        if last_user_id is None:
+            break
+        chunks += 1
+        after_user_id = last_user_id
+        print(f"Порция {chunks}: пользователи до {last_user_id}, "
+              f"{time.monotonic() - started:.1f}с")
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunk', type=int, default=500, help='пользователей в одной транзакции')
+    parser.add_argument('--after', type=int, default=0, help='продолжить после этого user_id')
+    parser.add_argument('--rollups', action='store_true', help='только недельная и месячная статистика')
+    args = parser.parse_args()
+
+    db = create_database(maxconn=1)
+    try:
+        chunks = rebuild(db, args.chunk, args.after, args.rollups)
+        print(f"✅ Статистика пересчитана, порций: {chunks}")
+    except Exception as e:
+        print(f"❌ Ошибка при пересчете статистики: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
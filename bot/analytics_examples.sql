@@ -157,55 +157,40 @@ ORDER BY avg_minutes DESC;
 -- 🎯 ЦЕЛИ И ДОСТИЖЕНИЯ
 -- =====================================================
 
--- Дни, когда достигнута цель (4+ часов дипворка)
+-- Дни, когда достигнута цель пользователя (по умолчанию 4 часа)
 SELECT 
     date,
     total_minutes,
     ROUND(total_minutes / 60.0, 2) as hours,
     session_count,
     CASE 
-        WHEN total_minutes >= 240 THEN '🎉 Отлично!'
-        WHEN total_minutes >= 180 THEN '👍 Хорошо'
-        WHEN total_minutes >= 120 THEN '👌 Неплохо'
+        WHEN total_minutes >= daily_goal(user_id) THEN '🎉 Отлично!'
+        WHEN total_minutes >= daily_goal(user_id) * 3 / 4 THEN '👍 Хорошо'
+        WHEN total_minutes >= daily_goal(user_id) / 2 THEN '👌 Неплохо'
         ELSE '💪 Можно лучше'
     END as achievement
 FROM daily_stats 
 WHERE total_minutes > 0
 ORDER BY date DESC;
 
--- Процент дней, когда достигнута цель
+-- Процент дней, когда достигнута цель (хранится в user_streaks)
 SELECT 
-    COUNT(CASE WHEN total_minutes >= 240 THEN 1 END) as days_with_goal,
-    COUNT(*) as total_days,
-    ROUND(
-        (COUNT(CASE WHEN total_minutes >= 240 THEN 1 END)::float / COUNT(*)) * 100, 
-        2
-    ) as goal_percentage
-FROM daily_stats 
-WHERE total_minutes > 0;
+    user_id,
+    goal_days as days_with_goal,
+    active_days as total_days,
+    ROUND((goal_days::float / NULLIF(active_days, 0) * 100)::numeric, 2) as goal_percentage
+FROM user_streaks;
 
--- Текущая серия дней с достижением цели
-WITH goal_days AS (
-    SELECT 
-        date,
-        total_minutes,
-        CASE WHEN total_minutes >= 240 THEN 1 ELSE 0 END as goal_achieved
-    FROM daily_stats 
-    WHERE total_minutes > 0
-    ORDER BY date DESC
-),
-streak AS (
-    SELECT 
-        date,
-        goal_achieved,
-        SUM(CASE WHEN goal_achieved = 0 THEN 1 ELSE 0 END) 
-            OVER (ORDER BY date DESC) as streak_group
-    FROM goal_days
-)
+-- Текущая и лучшая серии дней с достижением цели (обновляются при закрытии сессии)
 SELECT 
-    COUNT(*) as current_streak_days
-FROM streak 
-WHERE streak_group = 0;
+    user_id,
+    CASE WHEN last_goal_day >= CURRENT_DATE - 1 THEN current_streak ELSE 0 END as current_streak_days,
+    longest_streak as longest_streak_days,
+    last_goal_day
+FROM user_streaks;
+
+-- Те же серии полным просмотром daily_stats (для сверки)
+SELECT * FROM streak_scan(0, 9223372036854775807);
 
 -- =====================================================
 -- 📊 ДЕТАЛЬНАЯ АНАЛИТИКА СЕССИЙ
@@ -1,16 +1,32 @@
 import os
 import logging
 import asyncio
-import schedule
 import time
-import threading
-from datetime import datetime, date
+import tempfile
+from datetime import datetime, date, timedelta
+from functools import partial
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
-from aiogram.types import InlineKeyboardButton
-from aiogram.utils.keyboard import InlineKeyboardBuilder
-from .database import Database
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, BufferedInputFile
+from .database import make_stats, SESSION_LENGTH_BUCKETS, LEADERBOARD_PERIODS, MIN_CHAT_ID
+from .storage import AsyncDatabase
+from .sessions import SessionRegistry
+from .cache import TodayStatsCache, ChartCache, RecentKeys, RecentTags
+from .locks import UserLocks
+from .timezones import UserClock, parse_timezone
+from .charts import ChartRenderer, CHART_RANGES, chart_period
+from .scheduler import Scheduler
+from .broadcast import RateLimitedSender
+from .ticker import SessionTicker
+from .deadlines import DeadlineQueue, Deadline
+from .tags import normalize_tag, stats_period, MAX_TAG_LENGTH, TAG_CALLBACK_PREFIX
+from .templates import TemplateRegistry
+from .stats import utc_now, week_start
+from .webhook import run_webhook, webhook_workers
+from .health import HealthServer
+from .metrics import UPDATES, UPDATE_ERRORS, UPDATE_LATENCY, CALLBACK_LATENCY, SKIPPED_UPDATES
 from zoneinfo import ZoneInfo
 
 # Загружаем переменные окружения
@@ -23,186 +39,770 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Размер страницы получателей при рассылке
+BROADCAST_PAGE_SIZE = 1000
+
+# Максимальный размер документа, который бот может отправить в Telegram
+TELEGRAM_DOCUMENT_LIMIT = 50 * 1024 * 1024
+
+# Максимальный размер файла, который бот может скачать из Telegram
+TELEGRAM_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+
+# Кнопки, для которых ведется гистограмма времени обработки
+CALLBACK_ACTIONS = frozenset({
+    "start_deepwork", "stop_deepwork", "today_stats", "chart_week", "set_birthday", "back_to_main",
+    "start_pomodoro", "continue_deepwork"
+})
+
+# Недавних тегов на кнопках главного меню
+RECENT_TAGS_LIMIT = 3
+
+# Групповых чатов в одной транзакции пересчета таблиц лидеров
+LEADERBOARD_CHUNK_SIZE = 500
+
+# Типы групповых чатов Telegram
+GROUP_CHAT_TYPES = frozenset({"group", "supergroup"})
+
 class TimeTrackerBot:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: AsyncDatabase = None):
+        self.db = db if db is not None else AsyncDatabase()
         self.timezone = ZoneInfo(os.getenv('TIMEZONE', 'Europe/Moscow'))
+        admin_user_id = os.getenv('ADMIN_USER_ID', '')
+        self.admin_user_id = int(admin_user_id) if admin_user_id.isdigit() else None
         self.bot = None
         self.dp = None
+        self.sender = None
+        self.ticker = None
+        # Одновременно выполняется одна выгрузка и один импорт: они надолго занимают подключение
+        self._export_lock = asyncio.Lock()
+        self._import_lock = asyncio.Lock()
         
-        # Словарь для хранения активных сессий пользователей
-        self.active_sessions = {}
+        # Часовые пояса и границы текущего дня пользователей
+        self.clock = UserClock(
+            self.db, self.timezone, maxsize=int(os.getenv('TIMEZONE_CACHE_SIZE', '10000'))
+        )
         
-        # Запускаем планировщик задач в отдельном потоке
-        self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
-        self.scheduler_thread.start()
-    
-    def _run_scheduler(self):
-        """Запуск планировщика задач"""
+        # Статистика за сегодня в памяти: обновляется при закрытии сессий
+        self.today_stats = TodayStatsCache(
+            maxsize=int(os.getenv('TODAY_STATS_CACHE_SIZE', '10000')),
+            ttl=float(os.getenv('TODAY_STATS_CACHE_TTL', '600'))
+        )
+        
+        # Графики рисуются в отдельных процессах, отправленные - переиспользуются по file_id
+        self.charts = ChartRenderer(max_workers=int(os.getenv('CHART_WORKERS', '1')))
+        self.chart_cache = ChartCache(maxsize=int(os.getenv('CHART_CACHE_SIZE', '10000')))
+        
+        # Недавние теги для кнопок главного меню
+        self.recent_tags = RecentTags(RECENT_TAGS_LIMIT, maxsize=int(os.getenv('TAG_CACHE_SIZE', '10000')))
+        # Кнопки и тексты меню, собранные при запуске; первый язык - по умолчанию
+        self.ui = TemplateRegistry(tuple(
+            language.strip() for language in os.getenv('BOT_LANGUAGES', 'ru').split(',') if language.strip()
+        ))
+        
+        # Повторные доставки обновлений отбрасываются по update_id
+        self.seen_updates = RecentKeys(
+            maxsize=int(os.getenv('SEEN_UPDATES_SIZE', '10000')),
+            ttl=float(os.getenv('SEEN_UPDATES_TTL', '3600'))
+        )
+        # Нажатия пользователя выполняются по очереди, повторное нажатие во время обработки - отбрасывается
+        self.user_locks = UserLocks()
+        # Прошедшее время в сообщении идущей сессии (включается SESSION_TICKER=1)
+        self.ticker_enabled = os.getenv('SESSION_TICKER', '0') == '1'
+        
+        # Помидоры, напоминания и остановка забытых сессий: сроки в базе, один цикл обработки
+        self.pomodoro_minutes = int(os.getenv('POMODORO_MINUTES', '25'))
+        self.pomodoro_break_minutes = int(os.getenv('POMODORO_BREAK_MINUTES', '5'))
+        self.remind_minutes = int(os.getenv('SESSION_REMIND_MINUTES', '120'))
+        self.idle_minutes = int(os.getenv('SESSION_IDLE_MINUTES', '30'))
+        self.deadlines = DeadlineQueue(
+            self.db, self._handle_deadline, batch_size=int(os.getenv('DEADLINE_BATCH_SIZE', '500'))
+        )
+        
+        # Реестр активных сессий пользователей (кеш в памяти + запись в базу)
+        self.sessions = SessionRegistry(
+            self.db,
+            max_age_minutes=int(os.getenv('SESSION_MAX_HOURS', '12')) * 60,
+            today_stats=self.today_stats
+        )
+        
+        # Планировщик задач работает в цикле событий бота
+        self.scheduler = Scheduler(self.db)
         # Отправка отчета о дипворке в 23:59
-        schedule.every().day.at("23:59").do(self._send_daily_report_sync)
+        self.scheduler.add_job("daily_report", "59 23 * * *", self.send_daily_report, self.timezone)
         # Отправка сообщения о днях жизни в 6:00
-        schedule.every().day.at("06:00").do(self._send_birthday_message_sync)
-        
+        self.scheduler.add_job("birthday_message", "0 6 * * *", self.send_birthday_message, self.timezone)
+        # Сверка зависших сессий раз в час, пропущенные запуски не нужны
+        self.scheduler.add_job(
+            "reconcile_sessions", "0 * * * *", self._reconcile_sessions, self.timezone, catch_up=False
+        )
+        # Секции таблицы сессий на несколько месяцев вперед
+        self.scheduler.add_job("session_partitions", "15 3 * * *", self._ensure_session_partitions, self.timezone)
+        # Отчеты для часовых поясов, выбранных в других процессах (режим webhook)
+        self.scheduler.add_job(
+            "timezone_jobs", "*/10 * * * *", self._schedule_timezones, self.timezone, catch_up=False
+        )
+        # Снимки таблиц лидеров групп: /leaderboard только читает их
+        self.leaderboard_size = int(os.getenv('LEADERBOARD_SIZE', '10'))
+        self.leaderboard_refresh_minutes = int(os.getenv('LEADERBOARD_REFRESH_MINUTES', '5'))
+        # Шаг cron начинается заново каждый час: равные интервалы только у делителей 60
+        if not 1 <= self.leaderboard_refresh_minutes <= 59 or 60 % self.leaderboard_refresh_minutes:
+            raise ValueError(
+                f"LEADERBOARD_REFRESH_MINUTES должен делить 60 (1-30): {self.leaderboard_refresh_minutes}"
+            )
+        self.scheduler.add_job(
+            "leaderboards", f"*/{self.leaderboard_refresh_minutes} * * * *", self._refresh_leaderboards,
+            self.timezone, catch_up=False
+        )
+    
+    def _schedule_timezone(self, name: str):
+        """Ежедневный отчет и сообщение о днях жизни по местному времени пояса name"""
+        if name == self.timezone.key or f"daily_report:{name}" in self.scheduler:
+            return
+        tz = ZoneInfo(name)
+        self.scheduler.add_job(
+            f"daily_report:{name}", "59 23 * * *", partial(self.send_daily_report, timezone=name), tz
+        )
+        self.scheduler.add_job(
+            f"birthday_message:{name}", "0 6 * * *", partial(self.send_birthday_message, timezone=name), tz
+        )
+    
+    async def _schedule_timezones(self, run_at: datetime = None):
+        """Задачи рассылок для всех часовых поясов пользователей"""
+        for name in await self.db.get_timezones():
+            self._schedule_timezone(name)
+    
+    async def _reconcile_sessions(self, run_at: datetime):
+        """Закрытие сессий, открытых дольше SESSION_MAX_HOURS"""
+        await self.sessions.reconcile()
+        counters = self.today_stats.counters()
+        logger.info(
+            f"Кеш статистики за сегодня: попаданий {counters['hits']}, "
+            f"промахов {counters['misses']}, записей {counters['size']}"
+        )
+    
+    async def _ensure_session_partitions(self, run_at: datetime):
+        """Создание секций deepwork_sessions на SESSION_PARTITIONS_AHEAD месяцев вперед"""
+        created = await self.db.ensure_session_partitions(int(os.getenv('SESSION_PARTITIONS_AHEAD', '3')))
+        if created:
+            logger.info(f"Создано секций сессий: {created}")
+    
+    async def _refresh_leaderboards(self, run_at: datetime):
+        """Пересчет снимков таблиц лидеров всех групп за день и неделю по часовому поясу бота"""
+        day = run_at.astimezone(self.timezone).date()
+        after_chat_id = MIN_CHAT_ID
         while True:
-            schedule.run_pending()
-            time.sleep(60)
-    
-    def _send_daily_report_sync(self):
-        """Синхронная отправка ежедневного отчета (для планировщика)"""
-        if self.bot:
-            asyncio.create_task(self.send_daily_report())
-    
-    def _send_birthday_message_sync(self):
-        """Синхронная отправка сообщения о днях жизни (для планировщика)"""
-        if self.bot:
-            asyncio.create_task(self.send_birthday_message())
+            last_chat_id = await self.db.refresh_leaderboards(
+                day, after_chat_id, LEADERBOARD_CHUNK_SIZE, self.leaderboard_size
+            )
+            if last_chat_id is None:
+                break
+            after_chat_id = last_chat_id
+    
+    async def _get_today_stats(self, user_id: int) -> dict:
+        """Статистика за сегодня из кеша, при промахе - из базы данных"""
+        today = await self.clock.today(user_id)
+        stats = self.today_stats.get(user_id, today)
+        if stats is None:
+            stats = await self.db.get_today_stats(user_id, today)
+            if stats is not None:
+                self.today_stats.put(user_id, today, stats)
+        return stats
 
-    async def start_command(self, message: types.Message):
-        """Обработчик команды /start"""
-        keyboard = InlineKeyboardBuilder()
+    async def _get_recent_tags(self, user_id: int) -> list:
+        """Недавние теги из кеша, при промахе - из базы данных"""
+        tags = self.recent_tags.get(user_id)
+        if tags is None:
+            tags = await self.db.get_recent_tags(user_id, RECENT_TAGS_LIMIT)
+            self.recent_tags.put(user_id, tags)
+        return tags
 
-        keyboard.add(InlineKeyboardButton(text="🎯 Начать дипворк", callback_data="start_deepwork"))
-        keyboard.add(InlineKeyboardButton(text="⏹ Остановить дипворк", callback_data="stop_deepwork"))
-        keyboard.add(InlineKeyboardButton(text="📊 Статистика за сегодня", callback_data="today_stats"))
-        keyboard.add(InlineKeyboardButton(text="🎂 Установить дату рождения", callback_data="set_birthday"))
+    async def _user_ui(self, user_id: int):
+        """Templates языка пользователя для сообщений без его обновления (сроки сессий)"""
+        if not self.ui.multilingual or user_id in self.ui:
+            return self.ui.for_user_id(user_id)
+        language = await self.db.get_user_language(user_id)
+        self.ui.remember(user_id, language)
+        return self.ui.get(language)
 
-        # Настройка: 1 кнопка в каждой строке
-        keyboard.adjust(1)
+    async def _main_menu(self, ui, user_id: int, birthday: bool = False):
+        """Кнопки главного меню с недавними тегами пользователя (готовые для одинаковых тегов)"""
+        return ui.main_menu(tuple(await self._get_recent_tags(user_id)), birthday)
 
+    async def start_command(self, message: types.Message):
+        """Обработчик команды /start"""
+        ui = self.ui.for_user(message.from_user)
+        tz = await self.clock.timezone(message.from_user.id)
         await message.answer(
-            "🚀 Добро пожаловать в Time Tracker Bot!\n\n"
-            "Этот бот поможет вам отслеживать время, проведенное в дипворке.\n\n"
-            "Выберите действие:",
-            reply_markup=keyboard.as_markup()
+            ui.text.welcome(timezone=tz.key),
+            reply_markup=await self._main_menu(ui, message.from_user.id, birthday=True)
         )
 
     async def button_callback(self, callback: types.CallbackQuery):
         """Обработчик нажатий на кнопки"""
-        await callback.answer()
-        
+        # Кнопки с тегом учитываются вместе с обычным началом сессии
+        action = callback.data.split(':', 1)[0]
+        action = action if action in CALLBACK_ACTIONS else "other"
+        with CALLBACK_LATENCY.time(action):
+            await callback.answer()
+            
+            # Двойное нажатие: то же действие пользователя еще выполняется
+            if self.user_locks.pending(callback.from_user.id, callback.data):
+                SKIPPED_UPDATES.inc("debounced")
+                return
+            async with self.user_locks.hold(callback.from_user.id, callback.data):
+                # Сообщение сессии сейчас будет заменено: таймер его больше не правит
+                if self.ticker is not None:
+                    self.ticker.untrack(callback.from_user.id)
+                await self._dispatch_callback(callback)
+    
+    async def _dispatch_callback(self, callback: types.CallbackQuery):
+        """Выполнение действия кнопки под блокировкой пользователя"""
         if callback.data == "start_deepwork":
             await self.start_deepwork(callback)
         elif callback.data == "stop_deepwork":
             await self.stop_deepwork(callback)
         elif callback.data == "today_stats":
             await self.show_today_stats(callback)
+        elif callback.data == "chart_week":
+            await self.send_chart(callback.message, callback.from_user.id, "week")
         elif callback.data == "set_birthday":
             await self.ask_birthday(callback)
         elif callback.data == "back_to_main":
             await self.back_to_main(callback)
+        elif callback.data == "start_pomodoro":
+            await self.start_deepwork(callback, self.pomodoro_minutes, self.pomodoro_break_minutes)
+        elif callback.data == "continue_deepwork":
+            await self.continue_deepwork(callback)
+        elif callback.data.startswith(TAG_CALLBACK_PREFIX):
+            await self.start_deepwork(callback, tag=callback.data[len(TAG_CALLBACK_PREFIX):])
     
-    async def start_deepwork(self, callback: types.CallbackQuery):
-        """Начало сессии дипворка"""
+    async def _observe_update(self, handler, update: types.Update, data: dict):
+        """Внешний middleware: повторные доставки, число обновлений, ошибки и время обработки по типам"""
+        update_type = update.event_type
+        if self.seen_updates.seen(update.update_id):
+            SKIPPED_UPDATES.inc("duplicate")
+            return None
+        user = data.get('event_from_user')
+        if self.ui.multilingual and user is not None:
+            language = self.ui.language_of(user)
+            # Язык сохраняется для рассылок и сообщений после перезапуска
+            if self.ui.remember(user.id, language):
+                await self.db.set_user_language(user.id, language)
+        started = time.perf_counter()
+        try:
+            return await handler(update, data)
+        except Exception:
+            UPDATE_ERRORS.inc(update_type)
+            # Повторная доставка после ошибки обрабатывается заново
+            self.seen_updates.forget(update.update_id)
+            raise
+        finally:
+            UPDATES.inc(update_type)
+            UPDATE_LATENCY.observe(time.perf_counter() - started, update_type)
+    
+    @staticmethod
+    async def _edit(callback: types.CallbackQuery, text: str, reply_markup=None):
+        """Правка сообщения с кнопками; без запроса, если текст и кнопки не изменились"""
+        message = callback.message
+        if message.text == text and message.reply_markup == reply_markup:
+            SKIPPED_UPDATES.inc("not_modified")
+            return
+        try:
+            await message.edit_text(text, reply_markup=reply_markup)
+        except TelegramBadRequest as e:
+            # Сообщение успело измениться на тот же текст (повторное нажатие из другого клиента)
+            if "message is not modified" not in str(e):
+                raise
+            SKIPPED_UPDATES.inc("not_modified")
+    
+    async def start_deepwork(self, callback: types.CallbackQuery, planned_minutes: int = None,
+                             break_minutes: int = None, tag: str = None):
+        """Начало сессии дипворка с тегом tag; с planned_minutes - помидор, который закончится сам"""
         user_id = callback.from_user.id
+        ui = self.ui.for_user(callback.from_user)
         
         # Проверяем, есть ли уже активная сессия
-        if user_id in self.active_sessions:
-            keyboard = InlineKeyboardBuilder()
-            keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
-            
-            await callback.message.edit_text(
-                "⚠️ У вас уже есть активная сессия дипворка!\n"
-                "Сначала остановите текущую сессию.",
-                reply_markup=keyboard.as_markup()
-            )
+        if user_id in self.sessions:
+            await self._edit(callback, ui.text.session_exists, reply_markup=ui.keyboard.back)
             return
         
-        # Создаем новую сессию в базе данных
-        session_id = self.db.start_session(user_id)
-        if session_id:
-            self.active_sessions[user_id] = session_id
-            start_time = datetime.now(tz=self.timezone).strftime("%H:%M")
-            
-            keyboard = InlineKeyboardBuilder()
-            keyboard.add(InlineKeyboardButton(text="⏹ Остановить дипворк", callback_data="stop_deepwork"))
-            keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
+        # Создаем новую сессию в базе данных вместе с ее сроками
+        session = await self._begin_session(user_id, planned_minutes, break_minutes, tag)
+        if session:
+            text, markup, render = session
+            await self._edit(callback, text, reply_markup=markup)
+            if self.ticker is not None:
+                self.ticker.track(
+                    user_id, callback.message.chat.id, callback.message.message_id, text, render,
+                    reply_markup=markup
+                )
+        else:
+            await self._edit(callback, ui.text.session_start_failed)
+    
+    async def focus_command(self, message: types.Message, command: CommandObject):
+        """Помидор: /focus [минуты работы] [минуты перерыва]"""
+        ui = self.ui.for_user(message.from_user)
+        try:
+            values = [int(arg) for arg in (command.args or '').split()]
+        except ValueError:
+            values = None
+        if values is None or len(values) > 2:
+            await message.answer(ui.text.focus_usage)
+            return
+        planned_minutes, break_minutes = values + [self.pomodoro_minutes, self.pomodoro_break_minutes][len(values):]
+        if not 1 <= planned_minutes <= 240 or not 0 <= break_minutes <= 60:
+            await message.answer(ui.text.focus_limits)
+            return
+        await self._answer_session(message, planned_minutes, break_minutes)
+    
+    async def start_deepwork_command(self, message: types.Message, command: CommandObject):
+        """Начало сессии дипворка с тегом: /start_deepwork [тег]"""
+        try:
+            tag = normalize_tag(command.args or '')
+        except ValueError:
+            await message.answer(self.ui.for_user(message.from_user).text.tag_too_long(max_length=MAX_TAG_LENGTH))
+            return
+        await self._answer_session(message, tag=tag)
+    
+    async def _answer_session(self, message: types.Message, planned_minutes: int = None, break_minutes: int = None,
+                              tag: str = None):
+        """Начало сессии по команде: сообщение сессии отправляется ответом"""
+        user_id = message.from_user.id
+        ui = self.ui.for_user(message.from_user)
+        async with self.user_locks.hold(user_id, "start_deepwork"):
+            if user_id in self.sessions:
+                await message.answer(ui.text.session_exists)
+                return
             
-            await callback.message.edit_text(
-                f"🎯 Сессия дипворка началась в {start_time}\n\n"
-                "Время идет... ⏰\n"
-                "Нажмите 'Остановить дипворк' когда закончите.",
-                reply_markup=keyboard.as_markup()
-            )
+            session = await self._begin_session(user_id, planned_minutes, break_minutes, tag)
+            if not session:
+                await message.answer(ui.text.session_start_failed)
+                return
+            text, markup, render = session
+            sent = await message.answer(text, reply_markup=markup)
+            if self.ticker is not None:
+                self.ticker.track(user_id, sent.chat.id, sent.message_id, text, render, reply_markup=markup)
+    
+    async def _begin_session(self, user_id: int, planned_minutes: int = None, break_minutes: int = None,
+                             tag: str = None) -> tuple:
+        """Начало сессии со сроками: (текст, кнопки, текст по таймеру) или None при ошибке
+
+        Сессия с planned_minutes заканчивается сама, после нее начинается
+        перерыв break_minutes. Открытой сессии ставятся напоминание через
+        SESSION_REMIND_MINUTES и остановка, если на него не ответили.
+        """
+        # Сроки отсчитываются от времени начала, записанного базой данных
+        if planned_minutes:
+            deadlines = [('finish', timedelta(minutes=planned_minutes), break_minutes)]
         else:
-            await callback.message.edit_text("❌ Ошибка при создании сессии. Попробуйте еще раз.")
+            deadlines = self._open_session_deadlines()
+        if not await self.sessions.start(user_id, deadlines, tag):
+            return None
+        if tag is not None:
+            self.recent_tags.add(user_id, tag)
+        now = utc_now()
+        if deadlines:
+            self.deadlines.notify(now + min(delay for _, delay, _ in deadlines))
+        
+        tz = await self.clock.timezone(user_id)
+        start_time = now.astimezone(tz).strftime("%H:%M")
+        finish_time = (now + deadlines[0][1]).astimezone(tz).strftime("%H:%M") if planned_minutes else None
+        
+        ui = await self._user_ui(user_id)
+        return (
+            ui.session_text(start_time, finish_time=finish_time, tag=tag),
+            ui.keyboard.session,
+            partial(self._live_session_text, ui, user_id, start_time, finish_time, tag)
+        )
+    
+    def _open_session_deadlines(self) -> list:
+        """Напоминание и остановка открытой сессии без ответа на него (SESSION_REMIND_MINUTES=0 - без них):
+        [(kind, через сколько, minutes), ...]"""
+        if not self.remind_minutes:
+            return []
+        remind = timedelta(minutes=self.remind_minutes)
+        return [
+            ('remind', remind, None),
+            ('autostop', remind + timedelta(minutes=self.idle_minutes), self.idle_minutes),
+        ]
+    
+    def _live_session_text(self, ui, user_id: int, start_time: str, finish_time: str, tag: str,
+                           elapsed: float) -> str:
+        """Текст для обновления по таймеру: None, если сессия закончилась или будет закрыта сверкой"""
+        if user_id not in self.sessions or elapsed >= self.sessions.max_age_minutes * 60:
+            return None
+        return ui.session_text(start_time, int(elapsed // 60), finish_time, tag)
+    
+    async def continue_deepwork(self, callback: types.CallbackQuery):
+        """Ответ на напоминание: сессия продолжается, следующее напоминание - через SESSION_REMIND_MINUTES"""
+        user_id = callback.from_user.id
+        ui = self.ui.for_user(callback.from_user)
+        if user_id not in self.sessions:
+            await self._edit(callback, ui.text.no_session, reply_markup=ui.keyboard.back)
+            return
+        
+        now = utc_now()
+        deadlines = [(kind, now + delay, minutes) for kind, delay, minutes in self._open_session_deadlines()]
+        if not await self.db.set_deadlines(user_id, deadlines):
+            await self._edit(callback, ui.text.continue_failed)
+            return
+        if deadlines:
+            self.deadlines.notify(deadlines[0][1])
+        await self._edit(
+            callback, ui.text.session_continued(minutes=self.remind_minutes), reply_markup=ui.keyboard.session
+        )
+    
+    async def _handle_deadline(self, deadline: Deadline):
+        """Наступивший срок сессии; нажатия пользователя в это время ждут"""
+        async with self.user_locks.hold(deadline.user_id):
+            if deadline.kind == 'break':
+                await self._send_break_over(deadline.user_id)
+            elif self.sessions.get(deadline.user_id) != deadline.session_id:
+                # Сессия уже закончилась или началась новая
+                return
+            elif deadline.kind == 'remind':
+                await self._send_session_reminder(deadline.user_id)
+            elif deadline.kind == 'finish':
+                await self._finish_session(deadline, deadline.due_at)
+            elif deadline.kind == 'autostop':
+                await self._finish_session(deadline, deadline.due_at - timedelta(minutes=deadline.minutes))
+    
+    async def _finish_session(self, deadline: Deadline, end_time: datetime):
+        """Окончание помидора или остановка забытой сессии с зачислением времени до end_time"""
+        user_id = deadline.user_id
+        if self.ticker is not None:
+            self.ticker.untrack(user_id)
+        stats = await self.sessions.end(user_id, end_time)
+        if stats is None:
+            logger.error(f"Не удалось завершить сессию {deadline.session_id} по сроку {deadline.kind}")
+            return
+        
+        ui = await self._user_ui(user_id)
+        summary = ui.text.today_summary(**stats)
+        if deadline.kind == 'finish':
+            text = ui.text.pomodoro_finished(summary=summary)
+            if deadline.minutes:
+                break_over = deadline.due_at + timedelta(minutes=deadline.minutes)
+                if await self.db.set_deadlines(user_id, [('break', break_over, None)]):
+                    self.deadlines.notify(break_over)
+                    text += ui.text.pomodoro_break(minutes=deadline.minutes)
+            keyboard = ui.keyboard.pomodoro_finished
+        else:
+            text = ui.text.session_autostopped(summary=summary)
+            keyboard = ui.keyboard.session_autostopped
+        await self.sender.send_message(user_id, text, reply_markup=keyboard)
+    
+    async def _send_session_reminder(self, user_id: int):
+        ui = await self._user_ui(user_id)
+        await self.sender.send_message(
+            user_id, ui.text.session_reminder(minutes=self.idle_minutes), reply_markup=ui.keyboard.reminder
+        )
+    
+    async def _send_break_over(self, user_id: int):
+        ui = await self._user_ui(user_id)
+        await self.sender.send_message(user_id, ui.text.break_over, reply_markup=ui.keyboard.break_over)
+    
+    async def _edit_session_message(self, chat_id: int, message_id: int, text: str, reply_markup):
+        """Правка сообщения сессии по таймеру с учетом лимитов Telegram"""
+        return await self.sender.call(
+            self.bot.edit_message_text, chat_id, message_id=message_id, text=text, reply_markup=reply_markup
+        )
     
     async def stop_deepwork(self, callback: types.CallbackQuery):
         """Остановка сессии дипворка"""
         user_id = callback.from_user.id
+        ui = self.ui.for_user(callback.from_user)
         
-        if user_id not in self.active_sessions:
-            keyboard = InlineKeyboardBuilder()
-            keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
-            
-            await callback.message.edit_text(
-                "⚠️ У вас нет активной сессии дипворка.\n"
-                "Сначала начните новую сессию.",
-                reply_markup=keyboard.as_markup()
-            )
+        if user_id not in self.sessions:
+            await self._edit(callback, ui.text.no_session_stop, reply_markup=ui.keyboard.back)
             return
         
-        session_id = self.active_sessions[user_id]
-        
-        # Завершаем сессию в базе данных
-        if self.db.end_session(session_id):
-            # Получаем статистику за сегодня
-            stats = self.db.get_today_stats(user_id)
-            
-            # Удаляем сессию из активных
-            del self.active_sessions[user_id]
-            
-            keyboard = InlineKeyboardBuilder()
-            keyboard.add(InlineKeyboardButton(text="🎯 Начать дипворк", callback_data="start_deepwork"))
-            keyboard.add(InlineKeyboardButton(text="📊 Статистика за сегодня", callback_data="today_stats"))
-            keyboard.row()
-            keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
-            
-            await callback.message.edit_text(
-                f"✅ Сессия дипворка завершена!\n\n"
-                f"📊 Статистика за сегодня:\n"
-                f"⏱ Общее время: {stats['hours']}ч {stats['minutes']}м\n"
-                f"🔄 Количество сессий: {stats['session_count']}\n\n"
-                "Отличная работа! 🎉",
-                reply_markup=keyboard.as_markup()
-            )
+        # Завершаем сессию в базе данных и сразу получаем статистику за сегодня
+        stats = await self.sessions.end(user_id)
+        if stats is not None:
+            await self._edit(callback, ui.text.session_stopped(**stats), reply_markup=ui.keyboard.session_stopped)
         else:
-            await callback.message.edit_text("❌ Ошибка при завершении сессии. Попробуйте еще раз.")
+            await self._edit(callback, ui.text.stop_failed)
     
     async def show_today_stats(self, callback: types.CallbackQuery):
         """Показать статистику за сегодня"""
         user_id = callback.from_user.id
-        stats = self.db.get_today_stats(user_id)
-        
-        keyboard = InlineKeyboardBuilder()
-        keyboard.add(InlineKeyboardButton(text="🎯 Начать дипворк", callback_data="start_deepwork"))
-        keyboard.add(InlineKeyboardButton(text="⏹ Остановить дипворк", callback_data="stop_deepwork"))
-        keyboard.row()
-        keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
-        
-        await callback.message.edit_text(
-            f"📊 Статистика за сегодня ({date.today().strftime('%d.%m.%Y')}):\n\n"
-            f"⏱ Общее время дипворка: {stats['hours']}ч {stats['minutes']}м\n"
-            f"🔄 Количество сессий: {stats['session_count']}\n\n"
-            f"Цель: 4-6 часов дипворка в день 🎯",
-            reply_markup=keyboard.as_markup()
+        ui = self.ui.for_user(callback.from_user)
+        stats = await self._get_today_stats(user_id)
+        if stats is None:
+            await self._edit(callback, ui.text.stats_failed)
+            return
+        goal = stats['goal_minutes']
+        await self._edit(
+            callback,
+            ui.text.today_stats(**stats, goal_hours=goal // 60, goal_rest=goal % 60),
+            reply_markup=ui.keyboard.today_stats
+        )
+    
+    async def week_command(self, message: types.Message):
+        """Статистика за текущую неделю"""
+        user_id = message.from_user.id
+        ui = self.ui.for_user(message.from_user)
+        stats = await self.db.get_week_stats(user_id, await self.clock.today(user_id))
+        if stats is None:
+            await message.answer(ui.text.stats_failed)
+            return
+        end = stats['start'] + timedelta(days=6)
+        await message.answer(ui.period_stats('week', stats['start'], end, stats))
+    
+    async def month_command(self, message: types.Message):
+        """Статистика за текущий месяц"""
+        user_id = message.from_user.id
+        ui = self.ui.for_user(message.from_user)
+        stats = await self.db.get_month_stats(user_id, await self.clock.today(user_id))
+        if stats is None:
+            await message.answer(ui.text.stats_failed)
+            return
+        end = (stats['start'] + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        await message.answer(ui.period_stats('month', stats['start'], end, stats))
+    
+    async def streak_command(self, message: types.Message):
+        """Серия дней с достигнутой целью"""
+        user_id = message.from_user.id
+        ui = self.ui.for_user(message.from_user)
+        streak = await self.db.get_streak(user_id, await self.clock.today(user_id))
+        if streak is None:
+            await message.answer(ui.text.streak_failed)
+            return
+        await message.answer(ui.streak(streak))
+    
+    async def chart_command(self, message: types.Message, command: CommandObject):
+        """График дипворка: /chart [week|month|year]"""
+        kind = (command.args or "week").strip().lower()
+        if kind not in CHART_RANGES:
+            await message.answer(self.ui.for_user(message.from_user).text.chart_usage)
+            return
+        await self.send_chart(message, message.from_user.id, kind)
+    
+    async def send_chart(self, message: types.Message, user_id: int, kind: str):
+        """Отправка графика; если данные не менялись, повторно по file_id без отрисовки"""
+        ui = await self._user_ui(user_id)
+        start, end = chart_period(kind, await self.clock.today(user_id))
+        data = await self.db.get_chart_data(user_id, start, end)
+        if data is None:
+            await message.answer(ui.text.stats_failed)
+            return
+        total = sum(data['days'].values())
+        caption = ui.text.chart_caption(period=ui.names.periods[kind], hours=total // 60, minutes=total % 60)
+        # Подписи графика на языке пользователя: другой язык - другая картинка
+        version = (data['version'], ui.language)
+        
+        file_id = self.chart_cache.get(user_id, kind, version)
+        if file_id is not None:
+            await message.answer_photo(file_id, caption=caption)
+            return
+        try:
+            image = await self.charts.render(kind, start, end, data['days'], data['goal'], ui.language)
+        except ImportError:
+            await message.answer(ui.text.charts_unavailable)
+            return
+        except Exception as e:
+            logger.error(f"Ошибка отрисовки графика {kind} пользователя {user_id}: {e}")
+            await message.answer(ui.text.chart_failed)
+            return
+        sent = await message.answer_photo(BufferedInputFile(image, filename=f"{kind}.png"), caption=caption)
+        self.chart_cache.put(user_id, kind, version, sent.photo[-1].file_id)
+    
+    async def insights_command(self, message: types.Message):
+        """Закономерности дипворка за всю историю: часы, дни недели, длительность сессий"""
+        ui = self.ui.for_user(message.from_user)
+        insights = await self.db.get_insights(message.from_user.id)
+        if insights is None:
+            await message.answer(ui.text.insights_failed)
+            return
+        await message.answer(
+            ui.insights(insights['hour_minutes'], insights['length_counts'], SESSION_LENGTH_BUCKETS)
         )
     
+    async def stats_command(self, message: types.Message, command: CommandObject):
+        """Время по тегам за период: /stats [week|month|year|all|ДД.ММ.ГГГГ-ДД.ММ.ГГГГ]"""
+        user_id = message.from_user.id
+        ui = self.ui.for_user(message.from_user)
+        period = (command.args or 'month').strip().lower()
+        try:
+            start, end = stats_period(period, await self.clock.today(user_id))
+        except ValueError:
+            await message.answer(ui.text.stats_usage)
+            return
+        stats = await self.db.get_tag_stats(user_id, start, end)
+        if stats is None:
+            await message.answer(ui.text.stats_failed)
+            return
+        await message.answer(ui.tag_stats(ui.period_title(period, start, end), stats))
+    
+    async def join_command(self, message: types.Message):
+        """Участие в таблице лидеров группы: /join в групповом чате"""
+        ui = self.ui.for_user(message.from_user)
+        if message.chat.type not in GROUP_CHAT_TYPES:
+            await message.answer(ui.text.group_only)
+            return
+        name = message.from_user.full_name
+        if not await self.db.add_group_member(message.chat.id, message.from_user.id, name):
+            await message.answer(ui.text.join_failed)
+            return
+        await message.answer(ui.text.joined(name=name, minutes=self.leaderboard_refresh_minutes))
+    
+    async def leave_command(self, message: types.Message):
+        """Выход из таблицы лидеров группы: /leave в групповом чате"""
+        ui = self.ui.for_user(message.from_user)
+        if message.chat.type not in GROUP_CHAT_TYPES:
+            await message.answer(ui.text.leave_group_only)
+            return
+        if await self.db.remove_group_member(message.chat.id, message.from_user.id):
+            await message.answer(ui.text.left(name=message.from_user.full_name))
+        else:
+            await message.answer(ui.text.leave_failed)
+    
+    async def member_left(self, message: types.Message):
+        """Участник покинул группу: убираем его из таблицы лидеров"""
+        await self.db.remove_group_member(message.chat.id, message.left_chat_member.id)
+    
+    async def leaderboard_command(self, message: types.Message, command: CommandObject):
+        """Таблица лидеров группы: /leaderboard [day|week]"""
+        ui = self.ui.for_user(message.from_user)
+        if message.chat.type not in GROUP_CHAT_TYPES:
+            await message.answer(ui.text.group_only)
+            return
+        period = (command.args or 'day').strip().lower()
+        if period not in LEADERBOARD_PERIODS:
+            await message.answer(ui.text.leaderboard_usage)
+            return
+        # Дни таблиц лидеров - по часовому поясу бота, как в задаче пересчета
+        today = utc_now().astimezone(self.timezone).date()
+        start = today if period == 'day' else week_start(today)
+        rows = await self.db.get_leaderboard(message.chat.id, period, start)
+        await message.answer(ui.leaderboard(ui.names.periods[period], rows, self.leaderboard_refresh_minutes))
+    
+    async def goal_command(self, message: types.Message, command: CommandObject):
+        """Просмотр и установка цели дипворка в день: /goal <минуты>"""
+        user_id = message.from_user.id
+        ui = self.ui.for_user(message.from_user)
+        if not command.args:
+            goal = await self.db.get_daily_goal(user_id)
+            await message.answer(ui.text.goal(hours=goal // 60, minutes=goal % 60))
+            return
+        
+        arg = command.args.strip()
+        if not arg.isdigit() or not 1 <= int(arg) <= 1440:
+            await message.answer(ui.text.goal_invalid)
+            return
+        
+        goal = int(arg)
+        if await self.db.set_daily_goal(user_id, goal):
+            # Цель хранится вместе со статистикой за сегодня
+            self.today_stats.invalidate(user_id)
+            await message.answer(ui.text.goal_saved(hours=goal // 60, minutes=goal % 60))
+        else:
+            await message.answer(ui.text.goal_failed)
+    
+    async def timezone_command(self, message: types.Message, command: CommandObject):
+        """Просмотр и установка часового пояса: /timezone <пояс>"""
+        user_id = message.from_user.id
+        ui = self.ui.for_user(message.from_user)
+        if not command.args:
+            tz = await self.clock.timezone(user_id)
+            await message.answer(ui.text.timezone(timezone=tz.key, now=datetime.now(tz).strftime('%H:%M')))
+            return
+        
+        try:
+            name = parse_timezone(command.args)
+        except ValueError:
+            await message.answer(ui.text.timezone_invalid)
+            return
+        
+        if await self.clock.set(user_id, name):
+            # Статистика за дни пересчитана в новом поясе
+            self.today_stats.invalidate(user_id)
+            self._schedule_timezone(name)
+            now = datetime.now(ZoneInfo(name)).strftime('%H:%M')
+            await message.answer(ui.text.timezone_saved(timezone=name, now=now))
+        else:
+            await message.answer(ui.text.timezone_failed)
+    
+    async def export_command(self, message: types.Message, command: CommandObject):
+        """Выгрузка истории: /export [csv|jsonl|parquet] [all]"""
+        ui = self.ui.for_user(message.from_user)
+        args = (command.args or '').lower().split()
+        everyone = 'all' in args
+        fmt = next((arg for arg in args if arg != 'all'), 'csv')
+        if everyone and message.from_user.id != self.admin_user_id:
+            await message.answer(ui.text.export_admin_only)
+            return
+        if self._export_lock.locked():
+            await message.answer(ui.text.export_busy)
+            return
+        
+        async with self._export_lock:
+            with tempfile.TemporaryDirectory(prefix='export_') as directory:
+                try:
+                    files = await self.db.export_history(
+                        directory, fmt, None if everyone else message.from_user.id
+                    )
+                except ValueError:
+                    await message.answer(ui.text.export_usage)
+                    return
+                except ImportError:
+                    await message.answer(ui.text.parquet_unavailable)
+                    return
+                except Exception as e:
+                    logger.error(f"Ошибка выгрузки истории: {e}")
+                    await message.answer(ui.text.export_failed)
+                    return
+                
+                for path, count in files:
+                    name = os.path.basename(path)
+                    if os.path.getsize(path) > TELEGRAM_DOCUMENT_LIMIT:
+                        await message.answer(ui.text.export_too_large(name=name))
+                        continue
+                    await message.answer_document(FSInputFile(path), caption=ui.text.export_caption(name=name, count=count))
+    
+    async def import_command(self, message: types.Message):
+        """Импорт истории из файла CSV или JSON, отправленного с подписью /import"""
+        ui = self.ui.for_user(message.from_user)
+        document = message.document
+        if document is None:
+            await message.answer(ui.text.import_help)
+            return
+        if document.file_size and document.file_size > TELEGRAM_DOWNLOAD_LIMIT:
+            await message.answer(ui.text.import_too_large)
+            return
+        if self._import_lock.locked():
+            await message.answer(ui.text.import_busy)
+            return
+        
+        user_id = message.from_user.id
+        async with self._import_lock:
+            with tempfile.TemporaryDirectory(prefix='import_') as directory:
+                path = os.path.join(directory, os.path.basename(document.file_name or 'history.csv'))
+                try:
+                    await self.bot.download(document, destination=path)
+                    result = await self.db.import_history(path, None, user_id)
+                except ValueError:
+                    await message.answer(ui.text.import_unsupported)
+                    return
+                except Exception as e:
+                    logger.error(f"Ошибка импорта истории пользователя {user_id}: {e}")
+                    await message.answer(ui.text.import_failed)
+                    return
+        
+        # Импорт мог добавить минуты и в сегодняшний день
+        self.today_stats.invalidate(user_id)
+        await message.answer(ui.import_result(result))
+    
     async def ask_birthday(self, callback: types.CallbackQuery):
         """Запрос даты рождения"""
-        keyboard = InlineKeyboardBuilder()
-        keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
-        
-        await callback.message.edit_text(
-            "🎂 Пожалуйста, отправьте вашу дату рождения в формате ДД.ММ.ГГГГ\n\n"
-            "Например: 15.03.1990\n\n"
-            "Это нужно для подсчета количества прожитых дней.",
-            reply_markup=keyboard.as_markup()
-        )
+        ui = self.ui.for_user(callback.from_user)
+        await self._edit(callback, ui.text.ask_birthday, reply_markup=ui.keyboard.back)
     
     async def handle_birthday_input(self, message: types.Message):
         """Обработка введенной даты рождения"""
         user_id = message.from_user.id
+        ui = self.ui.for_user(message.from_user)
 
         try:
             # Парсим дату рождения
@@ -210,100 +810,117 @@ class TimeTrackerBot:
             birthday = datetime.strptime(birthday_str, "%d.%m.%Y").date()
             
             # Сохраняем в базу данных
-            if self.db.set_user_birthday(user_id, birthday):
+            if await self.db.set_user_birthday(user_id, birthday):
                 # Вычисляем количество прожитых дней
-                days_lived = (date.today() - birthday).days
-                
-                keyboard = InlineKeyboardBuilder()
-                keyboard.add(InlineKeyboardButton(text="🎯 Начать дипворк", callback_data="start_deepwork"))
-                keyboard.add(InlineKeyboardButton(text="📊 Статистика за сегодня", callback_data="today_stats"))
-                keyboard.row()
-                keyboard.add(InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_main"))
-                
+                days_lived = (await self.clock.today(user_id) - birthday).days
                 await message.answer(
-                    f"✅ Дата рождения успешно установлена!\n\n"
-                    f"🎂 Ваш день рождения: {birthday.strftime('%d.%m.%Y')}\n"
-                    f"🌍 Вы прожили на этой планете: {days_lived} дней\n\n"
-                    "Теперь каждое утро в 6:00 вы будете получать обновление о количестве прожитых дней!",
-                    reply_markup=keyboard.as_markup()
+                    ui.text.birthday_saved(birthday=birthday, days=days_lived),
+                    reply_markup=ui.keyboard.birthday_saved
                 )
             else:
-                await message.answer("❌ Ошибка при сохранении даты рождения. Попробуйте еще раз.")
+                await message.answer(ui.text.birthday_failed)
                 
         except ValueError:
-            await message.answer(
-                "❌ Неверный формат даты. Используйте формат ДД.ММ.ГГГГ\n"
-                "Например: 15.03.1990"
-            )
+            await message.answer(ui.text.birthday_invalid)
     
     async def back_to_main(self, callback: types.CallbackQuery):
         """Возврат к главному меню"""
-        keyboard = InlineKeyboardBuilder()
-
-        keyboard.add(InlineKeyboardButton(text="🎯 Начать дипворк", callback_data="start_deepwork"))
-        keyboard.add(InlineKeyboardButton(text="⏹ Остановить дипворк", callback_data="stop_deepwork"))
-        keyboard.add(InlineKeyboardButton(text="📊 Статистика за сегодня", callback_data="today_stats"))
-
-        # Настройка: 1 кнопка в каждой строке
-        keyboard.adjust(1)
-
-        await callback.message.edit_text(
-            "🚀 Главное меню Time Tracker Bot\n\n"
-            "Выберите действие:",
-            reply_markup=keyboard.as_markup()
-        )
+        ui = self.ui.for_user(callback.from_user)
+        await self._edit(callback, ui.text.main_menu, reply_markup=await self._main_menu(ui, callback.from_user.id))
+    
+    async def _daily_report_messages(self, report_day: date, timezone: str = None):
+        """Отчеты пользователей часового пояса с дипворком за день на их языке, постранично из базы"""
+        after_user_id = 0
+        while True:
+            rows = await self.db.get_daily_report_page(report_day, after_user_id, BROADCAST_PAGE_SIZE, timezone)
+            if not rows:
+                return
+            for user_id, total_minutes, session_count, goal, language in rows:
+                ui = self.ui.get(language)
+                yield user_id, ui.daily_report(report_day, make_stats(total_minutes, session_count), goal)
+            after_user_id = rows[-1][0]
     
-    async def send_daily_report(self):
-        """Отправка ежедневного отчета о дипворке"""
-        if not self.admin_user_id or not self.bot:
+    async def _birthday_messages(self, today: date, timezone: str = None):
+        """Утренние сообщения пользователям часового пояса с датой рождения на их языке"""
+        after_user_id = 0
+        while True:
+            rows = await self.db.get_birthday_page(after_user_id, BROADCAST_PAGE_SIZE, timezone)
+            if not rows:
+                return
+            for user_id, birthday, language in rows:
+                yield user_id, self.ui.get(language).text.birthday_morning(days=(today - birthday).days)
+            after_user_id = rows[-1][0]
+    
+    async def send_daily_report(self, run_at: datetime, timezone: str = None):
+        """Отправка ежедневного отчета о дипворке пользователям часового пояса
+        (по умолчанию пояса бота)"""
+        if not self.sender:
             return
         
-        try:
-            stats = self.db.get_today_stats(self.admin_user_id)
-            
-            if stats['total_minutes'] > 0:
-                message = (
-                    f"📊 Ежедневный отчет о дипворке\n"
-                    f"📅 {date.today().strftime('%d.%m.%Y')}\n\n"
-                    f"⏱ Общее время: {stats['hours']}ч {stats['minutes']}м\n"
-                    f"🔄 Количество сессий: {stats['session_count']}\n\n"
-                )
-                
-                # Оценка продуктивности
-                if stats['total_minutes'] >= 240:  # 4+ часов
-                    message += "🎉 Отличный день! Вы достигли цели!"
-                elif stats['total_minutes'] >= 180:  # 3+ часов
-                    message += "👍 Хороший результат! Продолжайте в том же духе!"
-                elif stats['total_minutes'] >= 120:  # 2+ часов
-                    message += "👌 Неплохо! Завтра постарайтесь больше."
-                else:
-                    message += "💪 Завтра новый день! Поставьте цель и достигните её!"
-                
-                await self.bot.send_message(chat_id=self.admin_user_id, text=message)
-                logger.info("Ежедневный отчет отправлен")
-        except Exception as e:
-            logger.error(f"Ошибка отправки ежедневного отчета: {e}")
+        timezone = timezone or self.timezone.key
+        # День отчета берем из планового времени запуска: при догоняющем запуске это вчера
+        # (ошибки записывает планировщик и не сохраняет неудачный запуск)
+        report_day = run_at.astimezone(ZoneInfo(timezone)).date()
+        sent, failed = await self.sender.broadcast(self._daily_report_messages(report_day, timezone))
+        logger.info(f"Ежедневный отчет отправлен: {sent}, не доставлено: {failed}")
     
-    async def send_birthday_message(self):
-        """Отправка сообщения о количестве прожитых дней"""
-        if not self.admin_user_id or not self.bot:
+    async def send_birthday_message(self, run_at: datetime, timezone: str = None):
+        """Отправка сообщения о количестве прожитых дней пользователям часового
+        пояса (по умолчанию пояса бота)"""
+        if not self.sender:
             return
         
-        try:
-            birthday = self.db.get_user_birthday(self.admin_user_id)
-            if birthday:
-                days_lived = (date.today() - birthday).days
-                message = (
-                    f"🌅 Доброе утро!\n\n"
-                    f"🎂 Сегодня вы прожили на этой планете: {days_lived} дней\n\n"
-                    f"💫 Каждый новый день - это возможность стать лучше!\n"
-                    f"🎯 Начните день с дипворка и достигните своих целей!"
-                )
-                
-                await self.bot.send_message(chat_id=self.admin_user_id, text=message)
-                logger.info("Сообщение о днях жизни отправлено")
-        except Exception as e:
-            logger.error(f"Ошибка отправки сообщения о днях жизни: {e}")
+        timezone = timezone or self.timezone.key
+        today = run_at.astimezone(ZoneInfo(timezone)).date()
+        sent, failed = await self.sender.broadcast(self._birthday_messages(today, timezone))
+        logger.info(f"Сообщение о днях жизни отправлено: {sent}, не доставлено: {failed}")
+    
+    def setup(self, token: str, workers: int = 0):
+        """Создание бота, диспетчера и регистрация обработчиков
+
+        workers - число процессов-обработчиков webhook: лимиты BROADCAST_RATE и
+        SESSION_TICKER_RATE общие для бота, поэтому делятся между основным
+        процессом и обработчиками (правки сессий - только между обработчиками).
+        """
+        self.bot = Bot(token=token)
+        self.dp = Dispatcher()
+        self.sender = RateLimitedSender(
+            self.bot,
+            rate=float(os.getenv('BROADCAST_RATE', '30')) / (workers + 1),
+            max_in_flight=int(os.getenv('BROADCAST_CONCURRENCY', '20'))
+        )
+        if self.ticker_enabled:
+            # Доля общего лимита отправки: остальное - ответам и рассылкам
+            self.ticker = SessionTicker(
+                self._edit_session_message,
+                rate=float(os.getenv('SESSION_TICKER_RATE', '10')) / max(workers, 1),
+                locks=self.user_locks
+            )
+        
+        # Метрики обработки обновлений
+        self.dp.update.outer_middleware(self._observe_update)
+        
+        # Регистрируем обработчики
+        self.dp.message.register(self.start_command, Command("start"))
+        self.dp.message.register(self.week_command, Command("week"))
+        self.dp.message.register(self.month_command, Command("month"))
+        self.dp.message.register(self.streak_command, Command("streak"))
+        self.dp.message.register(self.chart_command, Command("chart"))
+        self.dp.message.register(self.insights_command, Command("insights"))
+        self.dp.message.register(self.goal_command, Command("goal"))
+        self.dp.message.register(self.timezone_command, Command("timezone"))
+        self.dp.message.register(self.focus_command, Command("focus"))
+        self.dp.message.register(self.start_deepwork_command, Command("start_deepwork"))
+        self.dp.message.register(self.stats_command, Command("stats"))
+        self.dp.message.register(self.export_command, Command("export"))
+        self.dp.message.register(self.import_command, Command("import"))
+        self.dp.message.register(self.join_command, Command("join"))
+        self.dp.message.register(self.leave_command, Command("leave"))
+        self.dp.message.register(self.leaderboard_command, Command("leaderboard"))
+        self.dp.message.register(self.member_left, F.left_chat_member)
+        self.dp.callback_query.register(self.button_callback)
+        # В группах бот отвечает только на команды
+        self.dp.message.register(self.handle_birthday_input, F.text, F.chat.type == "private")
     
     async def start(self):
         """Запуск бота"""
@@ -314,17 +931,57 @@ class TimeTrackerBot:
             return
         
         # Создаем бота и диспетчер
-        self.bot = Bot(token=token)
-        self.dp = Dispatcher()
+        webhook_mode = os.getenv('BOT_MODE', 'polling') == 'webhook'
+        self.setup(token, workers=webhook_workers() if webhook_mode else 0)
         
-        # Регистрируем обработчики
-        self.dp.message.register(self.start_command, Command("start"))
-        self.dp.callback_query.register(self.button_callback)
-        self.dp.message.register(self.handle_birthday_input, F.text)
+        # Восстанавливаем открытые сессии после перезапуска
+        # (в режиме webhook это делает каждый процесс-обработчик)
+        if webhook_mode:
+            # Реестр основного процесса пуст: сессии сверяют процессы-обработчики
+            self.scheduler.remove_job("reconcile_sessions")
+        else:
+            await self.sessions.load()
+            self.deadlines.start()
+            if self.ticker is not None:
+                self.ticker.start()
+        
+        # Проверки живости и готовности и метрики
+        health = create_health_server(self)
+        if health:
+            await health.start()
+        
+        # Запускаем планировщик в цикле событий бота с рассылками по часовым поясам пользователей
+        await self._schedule_timezones()
+        await self.scheduler.start()
         
         # Запускаем бота
         logger.info("Бот запущен...")
-        await self.dp.start_polling(self.bot)
+        try:
+            if webhook_mode:
+                await run_webhook(self)
+            else:
+                await self.dp.start_polling(self.bot)
+        finally:
+            await self.scheduler.stop()
+            await self.deadlines.stop()
+            if self.ticker is not None:
+                await self.ticker.stop()
+            self.charts.close()
+            if health:
+                await health.stop()
+            await self.db.close()
+
+def create_health_server(tracker, offset: int = 0) -> HealthServer:
+    """HTTP-сервер проверок и метрик на METRICS_PORT + offset (None, если порт 0)"""
+    port = int(os.getenv('METRICS_PORT', '8000'))
+    if not port:
+        return None
+    return HealthServer(
+        tracker,
+        host=os.getenv('METRICS_HOST', '0.0.0.0'),
+        port=port + offset,
+        max_loop_lag=float(os.getenv('READY_MAX_LOOP_LAG', '1.0'))
+    )
 
 async def main():
     """Основная функция"""
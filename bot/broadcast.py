@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Токен-бакет в форме GCRA: rate событий в секунду, всплеск до burst
+
+    reserve() сразу резервирует слот и возвращает время ожидания, поэтому
+    конкурирующие отправители выстраиваются в очередь без активного опроса.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic):
+        self.interval = 1.0 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self.clock = clock
+        # Theoretical arrival time - момент, к которому "израсходован" бакет
+        self._tat = 0.0
+
+    def reserve(self) -> float:
+        """Резервирование слота: сколько секунд нужно подождать"""
+        now = self.clock()
+        tat = max(self._tat, now)
+        self._tat = tat + self.interval
+        return max(0.0, tat - self.tolerance - now)
+
+    def pause(self, seconds: float):
+        """Запрет отправки на seconds секунд (ответ 429 от Telegram)"""
+        self._tat = max(self._tat, self.clock() + seconds + self.tolerance)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class RateLimitedSender:
+    """Отправка сообщений с учетом лимитов Telegram
+
+    Глобальный лимит и лимит на один чат соблюдаются токен-бакетами, число
+    одновременных запросов ограничено, а при ответе 429 запрос повторяется
+    после паузы, указанной сервером.
+    """
+
+    def __init__(self, bot, rate: float = 30, per_chat_rate: float = 1, max_in_flight: int = 20,
+                 max_retries: int = 3, clock=time.monotonic):
+        self.bot = bot
+        self.clock = clock
+        self.global_bucket = TokenBucket(rate, burst=1, clock=clock)
+        self.per_chat_interval = 1.0 / per_chat_rate
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        # chat_id -> момент, когда в чат можно отправлять следующее сообщение
+        self._chat_ready = {}
+        self._prune_at = 1024
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def _reserve_chat(self, chat_id: int) -> float:
+        """Резервирование слота в чате, устаревшие записи периодически удаляются"""
+        now = self.clock()
+        ready = max(self._chat_ready.get(chat_id, 0.0), now)
+        self._chat_ready[chat_id] = ready + self.per_chat_interval
+        if len(self._chat_ready) > self._prune_at:
+            self._chat_ready = {chat: at for chat, at in self._chat_ready.items() if at > now}
+            self._prune_at = max(1024, 2 * len(self._chat_ready))
+        return ready - now
+
+    async def call(self, method, chat_id: int, **kwargs):
+        """Вызов метода Bot API для чата с соблюдением лимитов и повторами при 429"""
+        async with self._in_flight:
+            for attempt in range(self.max_retries + 1):
+                delay = self._reserve_chat(chat_id)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self.global_bucket.acquire()
+                try:
+                    result = await method(chat_id=chat_id, **kwargs)
+                    self.sent += 1
+                    return result
+                except TelegramRetryAfter as e:
+                    # Сервер просит паузу: останавливаем все отправки, а не только этот чат
+                    self.retried += 1
+                    self.global_bucket.pause(e.retry_after)
+                    logger.warning(f"Лимит Telegram, пауза {e.retry_after} с (попытка {attempt + 1})")
+                except (TelegramForbiddenError, TelegramBadRequest) as e:
+                    # Пользователь заблокировал бота или чат недоступен - повторять бессмысленно
+                    logger.info(f"Сообщение в чат {chat_id} не доставлено: {e}")
+                    break
+                except Exception as e:
+                    logger.error(f"Ошибка отправки в чат {chat_id}: {e}")
+                    break
+            self.failed += 1
+            return None
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        return await self.call(self.bot.send_message, chat_id, text=text, **kwargs)
+
+    async def broadcast(self, messages) -> tuple:
+        """Рассылка из асинхронного итератора пар (chat_id, text)
+
+        Итератор читается по мере отправки через очередь ограниченного размера,
+        поэтому память не зависит от числа получателей. Возвращает (sent, failed).
+        """
+        queue = asyncio.Queue(maxsize=self.max_in_flight * 2)
+        sent_before, failed_before = self.sent, self.failed
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                chat_id, text = item
+                try:
+                    await self.send_message(chat_id, text)
+                except Exception as e:
+                    # Ошибка одного получателя не должна останавливать рассылку
+                    self.failed += 1
+                    logger.error(f"Ошибка рассылки в чат {chat_id}: {e}")
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.max_in_flight)]
+        try:
+            async for item in messages:
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        return self.sent - sent_before, self.failed - failed_before
@@ -0,0 +1,169 @@
+import time
+from collections import OrderedDict
+from datetime import date
+
+
+class TodayStatsCache:
+    """Кеш статистики за сегодня в памяти процесса
+
+    Ключ - (user_id, локальная дата пользователя). Статистика за день
+    меняется только при закрытии сессий, поэтому значения записываются сразу
+    после закрытия и сбрасываются при сверке устаревших сессий. Размер
+    ограничен (LRU), а TTL защищает от изменений в базе в обход бота. У
+    пользователей разные часовые пояса, поэтому день хранится в каждой
+    записи: запись за прошлый день пользователя - промах и удаляется.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        # user_id -> (expires_at, day, stats)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int, day: date) -> dict:
+        """Статистика пользователя за day или None, если ее нужно прочитать из базы"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] != day or entry[0] <= self.clock():
+            # Запись за более поздний день остается: day уже прошел
+            if entry is not None and entry[1] <= day:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, user_id: int, day: date, stats: dict):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > day:
+            return
+        self._entries[user_id] = (self.clock() + self.ttl, day, stats)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def counters(self) -> dict:
+        """Счетчики для экспорта: попадания, промахи, число записей"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class ChartCache:
+    """file_id отправленных графиков
+
+    Ключ - (user_id, вид графика), значение - версия данных и file_id
+    картинки в Telegram. Пока версия не изменилась, график отправляется
+    повторно по file_id: без отрисовки и без загрузки в Telegram. Новая
+    версия заменяет старую запись. Размер ограничен (LRU).
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        # (user_id, kind) -> (version, file_id)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int, kind: str, version) -> str:
+        """file_id графика этой версии данных или None, если его нужно нарисовать"""
+        entry = self._entries.get((user_id, kind))
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end((user_id, kind))
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id: int, kind: str, version, file_id: str):
+        self._entries[(user_id, kind)] = (version, file_id)
+        self._entries.move_to_end((user_id, kind))
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def counters(self) -> dict:
+        """Счетчики для экспорта: попадания, промахи, число записей"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class RecentKeys:
+    """Недавно обработанные ключи: идентификаторы обновлений Telegram
+
+    Telegram доставляет обновление повторно, если ответ на webhook задержался
+    или не дошел; у повтора тот же update_id. Ключ помнится ttl секунд,
+    размер ограничен (LRU).
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        # key -> expires_at
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def seen(self, key) -> bool:
+        """Запоминает key; True, если он уже встречался за последние ttl секунд"""
+        now = self.clock()
+        expires_at = self._entries.get(key)
+        if expires_at is not None and expires_at > now:
+            return True
+        self._entries[key] = now + self.ttl
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return False
+
+    def forget(self, key):
+        """Удаление key: следующая доставка с ним обрабатывается как новая"""
+        self._entries.pop(key, None)
+
+
+class RecentTags:
+    """Недавние теги пользователей для кнопок главного меню
+
+    Значение - список тегов, последний использованный первым. При промахе
+    список читается из базы данных (get_recent_tags), а начало сессии с
+    тегом обновляет запись без запроса. Размер ограничен (LRU).
+    """
+
+    def __init__(self, limit: int = 3, maxsize: int = 10_000):
+        self.limit = limit
+        self.maxsize = maxsize
+        # user_id -> [tag, ...]
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> list:
+        """Теги пользователя или None, если их нужно прочитать из базы"""
+        tags = self._entries.get(user_id)
+        if tags is not None:
+            self._entries.move_to_end(user_id)
+        return tags
+
+    def put(self, user_id: int, tags: list):
+        self._entries[user_id] = list(tags)[:self.limit]
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def add(self, user_id: int, tag: str):
+        """Тег начатой сессии становится первым; без записи пользователя
+        список прочитается из базы при следующем показе меню"""
+        tags = self._entries.get(user_id)
+        if tags is not None:
+            self.put(user_id, [tag] + [other for other in tags if other != tag])
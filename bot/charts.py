@@ -0,0 +1,141 @@
+"""
+Графики дипворка по ежедневной статистике
+
+/chart week и /chart month рисуют столбцы по дням периода с линией цели,
+/chart year - тепловую карту последних YEAR_WEEKS недель. Картинки PNG
+строит matplotlib (poetry install -E charts) в отдельных процессах
+ChartRenderer, поэтому отрисовка не блокирует цикл событий.
+"""
+
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+from .templates import TEXTS, NAMES, DEFAULT_LANGUAGE
+
+CHART_RANGES = ('week', 'month', 'year')
+
+# Недель в тепловой карте за год
+YEAR_WEEKS = 53
+
+GOAL_COLOR = '#2e7d32'
+BELOW_GOAL_COLOR = '#90a4ae'
+
+
+def chart_period(kind: str, today: date) -> tuple:
+    """Первый и последний день графика: неделя и месяц целиком, год - до сегодня"""
+    if kind == 'week':
+        start = today - timedelta(days=today.weekday())
+        return start, start + timedelta(days=6)
+    if kind == 'month':
+        start = today.replace(day=1)
+        return start, (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    if kind == 'year':
+        return today - timedelta(days=today.weekday() + 7 * (YEAR_WEEKS - 1)), today
+    raise ValueError(f"Неизвестный график {kind}, доступны: {', '.join(CHART_RANGES)}")
+
+
+def _draw_bars(figure, start: date, end: date, days: dict, goal: int, text: dict, names: dict):
+    dates = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    minutes = [days.get(day, 0) for day in dates]
+    axes = figure.add_subplot()
+    axes.bar(
+        range(len(dates)), [value / 60 for value in minutes],
+        color=[GOAL_COLOR if value >= goal else BELOW_GOAL_COLOR for value in minutes]
+    )
+    axes.axhline(goal / 60, color='#e53935', linestyle='--', linewidth=1, label=text['chart_goal'])
+    if len(dates) <= 7:
+        labels = [f"{names['weekdays'][day.weekday()]}\n{day.day}" for day in dates]
+    else:
+        labels = [str(day.day) for day in dates]
+    axes.set_xticks(range(len(dates)), labels, fontsize=8)
+    axes.set_ylabel(text['chart_hours'])
+    axes.set_title(text['chart_title'].format(start=start, end=end))
+    axes.legend(loc='upper right', fontsize=8)
+    axes.spines[['top', 'right']].set_visible(False)
+
+
+def _draw_heatmap(figure, start: date, end: date, days: dict, goal: int, text: dict, names: dict):
+    import numpy as np
+
+    weeks = (end - start).days // 7 + 1
+    # Строка - день недели, столбец - неделя; дни после end остаются пустыми
+    grid = np.full((7, weeks), np.nan)
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        grid[day.weekday(), offset // 7] = days.get(day, 0) / 60
+
+    axes = figure.add_subplot()
+    # Насыщенный цвет - цель достигнута
+    image = axes.imshow(grid, cmap='Greens', vmin=0, vmax=goal / 60, aspect='equal')
+    image.cmap.set_bad('white')
+    axes.set_yticks(range(0, 7, 2), names['weekdays'][::2], fontsize=8)
+    # Подпись месяца над неделей, в которой он начинается
+    ticks = [
+        (week, (start + timedelta(weeks=week, days=6)).month) for week in range(weeks)
+        if week == 0 or (start + timedelta(weeks=week, days=6)).day <= 7
+    ]
+    axes.set_xticks([week for week, _ in ticks], [names['months'][month - 1] for _, month in ticks], fontsize=8)
+    axes.tick_params(length=0)
+    for spine in axes.spines.values():
+        spine.set_visible(False)
+    axes.set_title(text['chart_title_year'].format(start=start, end=end))
+    figure.colorbar(image, ax=axes, orientation='horizontal', fraction=0.05, pad=0.12, label=text['chart_hours'])
+
+
+def render_chart(kind: str, start: date, end: date, days: dict, goal: int,
+                 language: str = DEFAULT_LANGUAGE) -> bytes:
+    """PNG графика: days - минуты дипворка по датам, goal - цель в минутах,
+    подписи - на языке language
+
+    Используется Figure без pyplot: нет глобального состояния и выбора
+    интерактивного бэкенда.
+    """
+    from matplotlib.figure import Figure
+
+    text = {**TEXTS[DEFAULT_LANGUAGE], **TEXTS.get(language, {})}
+    names = {**NAMES[DEFAULT_LANGUAGE], **NAMES.get(language, {})}
+    figure = Figure(figsize=(10, 3) if kind == 'year' else (8, 4))
+    if kind == 'year':
+        _draw_heatmap(figure, start, end, days, goal, text, names)
+    else:
+        _draw_bars(figure, start, end, days, goal, text, names)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', dpi=110, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class ChartRenderer:
+    """Отрисовка графиков в пуле процессов
+
+    Пул запускается при первом графике. Процессы создаются через spawn: они
+    не наследуют потоки и подключения бота, а matplotlib импортируется в
+    каждом процессе один раз.
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self.max_workers = max_workers
+        self._executor = None
+
+    async def render(self, kind: str, start: date, end: date, days: dict, goal: int,
+                     language: str = DEFAULT_LANGUAGE) -> bytes:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, render_chart, kind, start, end, days, goal, language
+            )
+        except BrokenProcessPool:
+            # Процесс завершился аварийно: следующий график запустит новый пул
+            self._executor = None
+            raise
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,97 +1,418 @@
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
+import psycopg2.pool
+import threading
+import io
+from itertools import islice
+from contextlib import contextmanager
 from datetime import datetime, date
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Цель дипворка в день по умолчанию, минуты (та же, что в функции daily_goal)
+DEFAULT_DAILY_GOAL_MINUTES = 240
+
+# Границы корзин длительности сессий в user_insights, минуты (те же, что в
+# функции session_length_bucket)
+SESSION_LENGTH_BUCKETS = (30, 60, 120, 240)
+
+# За сколько дней ищутся недавние теги пользователя
+RECENT_TAGS_DAYS = 90
+
+# Периоды таблиц лидеров групповых чатов
+LEADERBOARD_PERIODS = ('day', 'week')
+
+# Меньше любого chat_id (у групп они отрицательные): начало пересчета таблиц лидеров
+MIN_CHAT_ID = -2 ** 63
+
+# Пересчет недельной и месячной статистики диапазона пользователей
+REBUILD_ROLLUPS_SQL = """
+    DELETE FROM weekly_stats WHERE user_id BETWEEN %(first)s AND %(last)s;
+    INSERT INTO weekly_stats (user_id, week_start, total_minutes, total_sessions, days_with_work)
+    SELECT user_id, DATE_TRUNC('week', date)::date, SUM(total_minutes), SUM(session_count),
+           COUNT(*) FILTER (WHERE total_minutes > 0)
+    FROM daily_stats
+    WHERE user_id BETWEEN %(first)s AND %(last)s
+    GROUP BY user_id, DATE_TRUNC('week', date);
+    DELETE FROM monthly_stats WHERE user_id BETWEEN %(first)s AND %(last)s;
+    INSERT INTO monthly_stats (user_id, month_start, total_minutes, total_sessions, days_with_work)
+    SELECT user_id, DATE_TRUNC('month', date)::date, SUM(total_minutes), SUM(session_count),
+           COUNT(*) FILTER (WHERE total_minutes > 0)
+    FROM daily_stats
+    WHERE user_id BETWEEN %(first)s AND %(last)s
+    GROUP BY user_id, DATE_TRUNC('month', date);
+"""
+
+# Пересчет серий дней с целью диапазона пользователей
+REBUILD_STREAKS_SQL = """
+    DELETE FROM user_streaks WHERE user_id BETWEEN %(first)s AND %(last)s;
+    INSERT INTO user_streaks SELECT * FROM streak_scan(%(first)s, %(last)s);
+"""
+
+# Пересчет гистограмм /insights диапазона пользователей из сессий
+REBUILD_INSIGHTS_SQL = """
+    DELETE FROM user_insights WHERE user_id BETWEEN %(first)s AND %(last)s;
+    INSERT INTO user_insights (user_id, hour_minutes, length_counts)
+    SELECT * FROM session_insights(%(first)s, %(last)s);
+"""
+
+# Пересчет ежедневной статистики диапазона пользователей из сессий, дни - в
+# часовом поясе пользователя
+REBUILD_DAILY_STATS_SQL = """
+    DELETE FROM daily_stats WHERE user_id BETWEEN %(first)s AND %(last)s;
+    INSERT INTO daily_stats (user_id, date, total_minutes, session_count)
+    SELECT s.user_id, sp.day, SUM(sp.minutes), SUM(sp.started)
+    FROM deepwork_sessions s
+    LEFT JOIN user_settings u ON u.user_id = s.user_id
+    CROSS JOIN LATERAL session_day_split(
+        s.start_time, s.end_time, COALESCE(u.timezone, current_setting('TimeZone'))
+    ) sp
+    WHERE s.user_id BETWEEN %(first)s AND %(last)s AND s.end_time IS NOT NULL
+    GROUP BY s.user_id, sp.day;
+"""
+
+# Пересчет статистики по тегам диапазона пользователей из сессий с тегом
+REBUILD_TAG_STATS_SQL = """
+    DELETE FROM daily_tag_stats WHERE user_id BETWEEN %(first)s AND %(last)s;
+    INSERT INTO daily_tag_stats (user_id, date, tag, total_minutes, session_count)
+    SELECT s.user_id, sp.day, s.tag, SUM(sp.minutes), SUM(sp.started)
+    FROM deepwork_sessions s
+    LEFT JOIN user_settings u ON u.user_id = s.user_id
+    CROSS JOIN LATERAL session_day_split(
+        s.start_time, s.end_time, COALESCE(u.timezone, current_setting('TimeZone'))
+    ) sp
+    WHERE s.user_id BETWEEN %(first)s AND %(last)s AND s.end_time IS NOT NULL AND s.tag IS NOT NULL
+    GROUP BY s.user_id, sp.day, s.tag;
+"""
+
+# Снимок таблиц лидеров диапазона чатов: первые %(size)s участников с
+# дипворком за день %(day)s и его неделю (с понедельника). Минуты участника - диапазон
+# первичного ключа daily_stats (дни - местные дни участника).
+REFRESH_LEADERBOARDS_SQL = """
+    DELETE FROM group_leaderboards WHERE chat_id BETWEEN %(first)s AND %(last)s;
+    INSERT INTO group_leaderboards (chat_id, period, position, period_start, user_id, name, total_minutes)
+    SELECT chat_id, period, position, period_start, user_id, name, total_minutes
+    FROM (
+        SELECT m.chat_id, p.period, p.period_start, m.user_id, m.name, t.total_minutes,
+               ROW_NUMBER() OVER (
+                   PARTITION BY m.chat_id, p.period ORDER BY t.total_minutes DESC, m.user_id
+               ) AS position
+        FROM group_members m
+        CROSS JOIN (
+            VALUES ('day', %(day)s::date), ('week', DATE_TRUNC('week', %(day)s::date)::date)
+        ) p (period, period_start)
+        CROSS JOIN LATERAL (
+            SELECT SUM(d.total_minutes)::integer AS total_minutes
+            FROM daily_stats d
+            WHERE d.user_id = m.user_id AND d.date BETWEEN p.period_start AND %(day)s
+        ) t
+        WHERE m.chat_id BETWEEN %(first)s AND %(last)s AND t.total_minutes > 0
+    ) ranked
+    WHERE position <= %(size)s;
+"""
+
+# Загрузка истории из import_staging: пересекающиеся интервалы пользователя
+# объединяются, интервалы, пересекающиеся с уже записанными сессиями,
+# отбрасываются (повторный импорт того же файла ничего не меняет). Затронутые
+# дни, недели и месяцы статистики, статистика по тегам, серии и гистограммы
+# /insights пересчитываются одним проходом.
+IMPORT_SESSIONS_SQL = """
+    CREATE TEMP TABLE import_merged ON COMMIT DROP AS
+    WITH ordered AS (
+        SELECT user_id, start_time, end_time, tag,
+               MAX(end_time) OVER (
+                   PARTITION BY user_id ORDER BY start_time, end_time
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ) AS prev_end
+        FROM import_staging
+    ), islands AS (
+        SELECT user_id, start_time, end_time, tag,
+               COUNT(*) FILTER (WHERE prev_end IS NULL OR start_time >= prev_end) OVER (
+                   PARTITION BY user_id ORDER BY start_time, end_time
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+               ) AS grp
+        FROM ordered
+    )
+    -- Объединенный интервал получает тег первого из объединенных
+    SELECT user_id, MIN(start_time) AS start_time, MAX(end_time) AS end_time,
+           (ARRAY_AGG(tag ORDER BY start_time, end_time))[1] AS tag
+    FROM islands
+    GROUP BY user_id, grp;
+
+    -- У временных таблиц нет автоматической статистики для планировщика
+    ANALYZE import_merged;
+
+    -- Зачисление сессий ждет окончания загрузки
+    SELECT pg_advisory_xact_lock(hashtext('daily_stats'));
+
+    -- Уже записанные сессии затронутых пользователей в диапазоне импорта
+    -- сортируются вместе с интервалами: интервал пересекается с записанной
+    -- сессией, если одна из начатых не позже него заканчивается после его
+    -- начала или следующая начинается до его конца. Две сортировки вместо
+    -- поиска по индексу для каждого интервала.
+    DELETE FROM import_merged m
+    USING (
+        SELECT user_id, start_time, imported,
+               MAX(end_time) FILTER (WHERE NOT imported) OVER (
+                   PARTITION BY user_id ORDER BY start_time, imported
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ) AS existing_end,
+               -- Рамка от начала раздела: агрегат считается нарастающим итогом
+               MIN(start_time) FILTER (WHERE NOT imported) OVER (
+                   PARTITION BY user_id ORDER BY start_time DESC, imported DESC
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ) AS existing_start
+        FROM (
+            SELECT user_id, start_time, end_time, TRUE AS imported FROM import_merged
+            UNION ALL
+            SELECT s.user_id, s.start_time, COALESCE(s.end_time, now()), FALSE
+            FROM (
+                SELECT user_id, MIN(start_time) AS first_start, MAX(end_time) AS last_end
+                FROM import_merged
+                GROUP BY user_id
+            ) r
+            JOIN deepwork_sessions s ON s.user_id = r.user_id AND s.start_time < r.last_end
+            WHERE s.end_time IS NULL OR s.end_time > r.first_start
+        ) intervals
+    ) c
+    WHERE c.imported AND c.user_id = m.user_id AND c.start_time = m.start_time
+      AND (c.existing_end > m.start_time OR c.existing_start < m.end_time);
+
+    SELECT ensure_session_partitions(
+        (MIN(start_time) AT TIME ZONE 'UTC')::date, (MAX(start_time) AT TIME ZONE 'UTC')::date
+    )
+    FROM import_merged;
+
+    INSERT INTO deepwork_sessions (user_id, start_time, end_time, duration_minutes, tag)
+    SELECT user_id, start_time, end_time, FLOOR(EXTRACT(EPOCH FROM (end_time - start_time)) / 60), tag
+    FROM import_merged
+    ORDER BY user_id, start_time;
+
+    INSERT INTO daily_tag_stats AS t (user_id, date, tag, total_minutes, session_count)
+    SELECT m.user_id, sp.day, m.tag, SUM(sp.minutes), SUM(sp.started)
+    FROM import_merged m
+    LEFT JOIN user_settings u ON u.user_id = m.user_id
+    CROSS JOIN LATERAL session_day_split(
+        m.start_time, m.end_time, COALESCE(u.timezone, current_setting('TimeZone'))
+    ) sp
+    WHERE m.tag IS NOT NULL
+    GROUP BY m.user_id, sp.day, m.tag
+    ORDER BY m.user_id, sp.day, m.tag
+    ON CONFLICT (user_id, date, tag)
+    DO UPDATE SET
+        total_minutes = t.total_minutes + EXCLUDED.total_minutes,
+        session_count = t.session_count + EXCLUDED.session_count;
+
+    CREATE TEMP TABLE import_days ON COMMIT DROP AS
+    SELECT m.user_id, sp.day, SUM(sp.minutes)::integer AS minutes, SUM(sp.started)::integer AS started
+    FROM import_merged m
+    LEFT JOIN user_settings u ON u.user_id = m.user_id
+    CROSS JOIN LATERAL session_day_split(
+        m.start_time, m.end_time, COALESCE(u.timezone, current_setting('TimeZone'))
+    ) sp
+    GROUP BY m.user_id, sp.day;
+    ANALYZE import_days;
+
+    INSERT INTO daily_stats AS d (user_id, date, total_minutes, session_count)
+    SELECT user_id, day, minutes, started FROM import_days
+    ORDER BY user_id, day
+    ON CONFLICT (user_id, date)
+    DO UPDATE SET
+        total_minutes = d.total_minutes + EXCLUDED.total_minutes,
+        session_count = d.session_count + EXCLUDED.session_count;
+
+    INSERT INTO weekly_stats AS w (user_id, week_start, total_minutes, total_sessions, days_with_work)
+    SELECT d.user_id, a.week_start, SUM(d.total_minutes), SUM(d.session_count),
+           COUNT(*) FILTER (WHERE d.total_minutes > 0)
+    FROM (SELECT DISTINCT user_id, DATE_TRUNC('week', day)::date AS week_start FROM import_days) a
+    JOIN daily_stats d
+      ON d.user_id = a.user_id AND d.date >= a.week_start AND d.date < a.week_start + 7
+    GROUP BY d.user_id, a.week_start
+    ON CONFLICT (user_id, week_start)
+    DO UPDATE SET
+        total_minutes = EXCLUDED.total_minutes,
+        total_sessions = EXCLUDED.total_sessions,
+        days_with_work = EXCLUDED.days_with_work;
+
+    INSERT INTO monthly_stats AS m (user_id, month_start, total_minutes, total_sessions, days_with_work)
+    SELECT d.user_id, a.month_start, SUM(d.total_minutes), SUM(d.session_count),
+           COUNT(*) FILTER (WHERE d.total_minutes > 0)
+    FROM (SELECT DISTINCT user_id, DATE_TRUNC('month', day)::date AS month_start FROM import_days) a
+    JOIN daily_stats d
+      ON d.user_id = a.user_id AND d.date >= a.month_start
+     AND d.date < (a.month_start + INTERVAL '1 month')::date
+    GROUP BY d.user_id, a.month_start
+    ON CONFLICT (user_id, month_start)
+    DO UPDATE SET
+        total_minutes = EXCLUDED.total_minutes,
+        total_sessions = EXCLUDED.total_sessions,
+        days_with_work = EXCLUDED.days_with_work;
+
+    DELETE FROM user_streaks WHERE user_id IN (SELECT user_id FROM import_days);
+    INSERT INTO user_streaks
+    SELECT s.* FROM (SELECT DISTINCT user_id FROM import_days) u
+    CROSS JOIN LATERAL streak_scan(u.user_id, u.user_id) s;
+
+    DELETE FROM user_insights WHERE user_id IN (SELECT user_id FROM import_days);
+    INSERT INTO user_insights (user_id, hour_minutes, length_counts)
+    SELECT i.* FROM (SELECT DISTINCT user_id FROM import_days) u
+    CROSS JOIN LATERAL session_insights(u.user_id, u.user_id) i;
+
+    SELECT (SELECT COUNT(*) FROM import_merged), (SELECT COUNT(DISTINCT user_id) FROM import_days);
+"""
+
+# Выгружаемые данные: имя -> (колонки с типами, запрос). Условие по
+# пользователю подставляется в {where}, порядок совпадает с индексами.
+EXPORT_DATASETS = {
+    'sessions': (
+        (('id', 'int'), ('user_id', 'int'), ('start_time', 'timestamptz'), ('end_time', 'timestamptz'),
+         ('duration_minutes', 'int'), ('tag', 'text')),
+        """
+            SELECT id, user_id, start_time, end_time, duration_minutes, tag
+            FROM deepwork_sessions {where}
+            ORDER BY user_id, start_time
+        """
+    ),
+    'daily_stats': (
+        (('user_id', 'int'), ('date', 'date'), ('total_minutes', 'int'), ('session_count', 'int')),
+        """
+            SELECT user_id, date, total_minutes, session_count
+            FROM daily_stats {where}
+            ORDER BY user_id, date
+        """
+    ),
+}
+
+
+def make_stats(total_minutes: int = 0, session_count: int = 0) -> dict:
+    """Словарь статистики за день в формате, который используют обработчики"""
+    return {
+        'total_minutes': total_minutes,
+        'hours': total_minutes // 60,
+        'minutes': total_minutes % 60,
+        'session_count': session_count
+    }
+
+
+def import_row(row) -> tuple:
+    """Строка импорта (user_id, start_time, end_time[, tag]) с тегом None, если его нет"""
+    user_id, start, end, *tag = row
+    return user_id, start, end, tag[0] if tag else None
+
+
+def _copy_text(value: str) -> str:
+    """Значение текстовой колонки в формате COPY: NULL - \\N"""
+    if value is None:
+        return '\\N'
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def make_day_stats(day: date, goal_minutes: int, total_minutes: int = None, session_count: int = None) -> dict:
+    """Статистика за день вместе с датой и целью пользователя"""
+    stats = make_stats(total_minutes or 0, session_count or 0)
+    stats['day'] = day
+    stats['goal_minutes'] = goal_minutes
+    return stats
+
+
 class Database:
-    def __init__(self):
-        self.conn = None
+    def __init__(self, minconn: int = None, maxconn: int = None, migrate: bool = True):
+        self.minconn = minconn or int(os.getenv('DB_POOL_MIN', '1'))
+        self.maxconn = maxconn or int(os.getenv('DB_POOL_MAX', '10'))
+        self.pool = None
+        # Ограничиваем число одновременно выданных подключений размером пула:
+        # ThreadedConnectionPool не ждет свободное подключение, а бросает PoolError
+        self._slots = threading.BoundedSemaphore(self.maxconn)
         self.connect()
-        self.create_tables()
+        if migrate:
+            self.migrate()
     
     def connect(self):
-        """Подключение к базе данных PostgreSQL"""
+        """Создание пула подключений к базе данных PostgreSQL"""
         try:
-            self.conn = psycopg2.connect(
+            self.pool = psycopg2.pool.ThreadedConnectionPool(
+                self.minconn,
+                self.maxconn,
                 host=os.getenv('DB_HOST', 'localhost'),
                 port=os.getenv('DB_PORT', '5432'),
                 database=os.getenv('DB_NAME', 'time_tracker'),
                 user=os.getenv('DB_USER'),
-                password=os.getenv('DB_PASSWORD')
+                password=os.getenv('DB_PASSWORD'),
+                # Часовой пояс бота - пояс пользователей, не выбравших свой
+                options=self._connection_options()
             )
             print("Успешно подключились к базе данных")
         except Exception as e:
             print(f"Ошибка подключения к базе данных: {e}")
             raise
     
-    def create_tables(self):
-        """Создание необходимых таблиц"""
+    @staticmethod
+    def _connection_options() -> str:
+        options = f"-c timezone={os.getenv('TIMEZONE', 'Europe/Moscow')}"
+        # Отдельная схема (например, для тестов)
+        if os.getenv('DB_SCHEMA'):
+            options += f" -c search_path={os.getenv('DB_SCHEMA')}"
+        return options
+    
+    def migrate(self):
+        """Применение миграций схемы из bot/migrations"""
+        # Импорт здесь: bot.migrate запускается как модуль (python -m bot.migrate)
+        from .migrate import migrate as apply_migrations
         try:
-            with self.conn.cursor() as cursor:
-                # Таблица для хранения даты рождения пользователя
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS user_birthday (
-                        user_id BIGINT PRIMARY KEY,
-                        birthday DATE NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Таблица для хранения сессий дипворка
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS deepwork_sessions (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        start_time TIMESTAMP NOT NULL,
-                        end_time TIMESTAMP,
-                        duration_minutes INTEGER,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                
-                # Таблица для ежедневной статистики
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS daily_stats (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        date DATE NOT NULL,
-                        total_minutes INTEGER DEFAULT 0,
-                        session_count INTEGER DEFAULT 0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        UNIQUE(user_id, date)
-                    )
-                """)
-                
-                self.conn.commit()
-                print("Таблицы успешно созданы")
+            with self.connection() as conn:
+                applied = apply_migrations(conn)
+            if applied:
+                print(f"Применены миграции: {', '.join(applied)}")
         except Exception as e:
-            print(f"Ошибка создания таблиц: {e}")
-            self.conn.rollback()
+            print(f"Ошибка применения миграций: {e}")
+            raise
+    
+    @contextmanager
+    def connection(self):
+        """Подключение из пула: commit при успехе, rollback при ошибке"""
+        with self._slots:
+            conn = self.pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self.pool.putconn(conn)
+    
+    def ping(self) -> bool:
+        """Проверка доступности базы данных через пул подключений"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                return True
+        except Exception as e:
+            print(f"База данных недоступна: {e}")
+            return False
     
     def set_user_birthday(self, user_id: int, birthday: date):
         """Установка даты рождения пользователя"""
         try:
-            with self.conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 cursor.execute("""
                     INSERT INTO user_birthday (user_id, birthday) 
                     VALUES (%s, %s) 
                     ON CONFLICT (user_id) 
                     DO UPDATE SET birthday = EXCLUDED.birthday
                 """, (user_id, birthday))
-                self.conn.commit()
                 return True
         except Exception as e:
             print(f"Ошибка установки даты рождения: {e}")
-            self.conn.rollback()
             return False
     
     def get_user_birthday(self, user_id: int) -> date:
         """Получение даты рождения пользователя"""
         try:
-            with self.conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 cursor.execute("SELECT birthday FROM user_birthday WHERE user_id = %s", (user_id,))
                 result = cursor.fetchone()
                 return result[0] if result else None
@@ -99,107 +420,724 @@ class Database:
             print(f"Ошибка получения даты рождения: {e}")
             return None
     
-    def start_session(self, user_id: int) -> int:
-        """Начало новой сессии дипворка"""
+    def start_session(self, user_id: int, deadlines: list = (), tag: str = None) -> int:
+        """Начало новой сессии дипворка с тегом tag (проект) или без него
+
+        Открытая сессия у пользователя может быть только одна (open_sessions):
+        если она уже есть, новая не создается и возвращается ее id. Сроки
+        новой сессии deadlines - [(kind, timedelta от начала, minutes), ...] -
+        заменяют прежние сроки пользователя в той же транзакции.
+        """
         try:
-            with self.conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 cursor.execute("""
-                    INSERT INTO deepwork_sessions (user_id, start_time) 
-                    VALUES (%s, %s) RETURNING id
-                """, (user_id, datetime.now()))
-                session_id = cursor.fetchone()[0]
-                self.conn.commit()
+                    WITH open AS (
+                        SELECT session_id FROM open_sessions WHERE user_id = %s
+                    ), created AS (
+                        INSERT INTO deepwork_sessions (user_id, start_time, tag)
+                        SELECT %s, now(), %s WHERE NOT EXISTS (SELECT 1 FROM open)
+                        RETURNING id, start_time
+                    )
+                    SELECT id, start_time FROM created
+                    UNION ALL
+                    SELECT session_id, NULL FROM open
+                """, (user_id, user_id, tag))
+                session_id, start = cursor.fetchone()
+                if start is not None:
+                    self._replace_deadlines(cursor, user_id, session_id, [
+                        (kind, start + delay, minutes) for kind, delay, minutes in deadlines
+                    ])
                 return session_id
+        except psycopg2.errors.UniqueViolation:
+            # Одновременный вызов успел открыть сессию первым
+            return self.get_active_session(user_id)
         except Exception as e:
             print(f"Ошибка начала сессии: {e}")
-            self.conn.rollback()
             return None
     
-    def end_session(self, session_id: int) -> bool:
-        """Завершение сессии дипворка"""
+    def end_session(self, session_id: int, end_time: datetime = None) -> dict:
+        """Завершение сессии дипворка одним запросом к базе данных
+
+        Сессия закрывается в момент end_time (по умолчанию сейчас), ее сроки
+        снимаются. Возвращает обновленную статистику за местный день
+        окончания (с датой day и целью goal_minutes) или None при ошибке.
+        Уже закрытая сессия (например, при сверке устаревших) повторно не
+        учитывается.
+        """
         try:
-            with self.conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 cursor.execute("""
-                    UPDATE deepwork_sessions 
-                    SET end_time = %s, duration_minutes = EXTRACT(EPOCH FROM (%s - start_time)) / 60
-                    WHERE id = %s
-                """, (datetime.now(), datetime.now(), session_id))
-                
-                # Обновляем ежедневную статистику
+                    SELECT (COALESCE(%s, now()) AT TIME ZONE user_timezone(s.user_id))::date, daily_goal(s.user_id),
+                           c.total_minutes, c.session_count
+                    FROM (SELECT 1) one
+                    LEFT JOIN deepwork_sessions s ON s.id = %s
+                    LEFT JOIN LATERAL close_session(s.id, %s) c ON TRUE
+                """, (end_time, session_id, end_time))
+                return make_day_stats(*cursor.fetchone())
+        except Exception as e:
+            print(f"Ошибка завершения сессии: {e}")
+            return None
+    
+    def get_today_stats(self, user_id: int, day: date = None) -> dict:
+        """Получение статистики за сегодня (или за указанный день) с целью
+        пользователя, None при ошибке
+
+        Бот передает местный день пользователя, и строка ищется по индексу
+        (user_id, date); без day сегодняшний день считается в базе данных.
+        """
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
                 cursor.execute("""
-                    SELECT user_id, duration_minutes FROM deepwork_sessions WHERE id = %s
-                """, (session_id,))
-                result = cursor.fetchone()
-                if result:
-                    user_id, duration = result[0], result[1]
-                    self._update_daily_stats(user_id, duration)
-                
-                self.conn.commit()
+                    SELECT p.day, daily_goal(%s), d.total_minutes, d.session_count
+                    FROM (SELECT COALESCE(%s, (now() AT TIME ZONE user_timezone(%s))::date) AS day) p
+                    LEFT JOIN daily_stats d ON d.user_id = %s AND d.date = p.day
+                """, (user_id, day, user_id, user_id))
+                return make_day_stats(*cursor.fetchone())
+        except Exception as e:
+            print(f"Ошибка получения статистики: {e}")
+            return None
+    
+    def get_week_stats(self, user_id: int, day: date = None) -> dict:
+        """Статистика за неделю, содержащую day (по умолчанию текущую)"""
+        return self._get_period_stats('weekly_stats', 'week_start', 'week', user_id, day)
+    
+    def get_month_stats(self, user_id: int, day: date = None) -> dict:
+        """Статистика за месяц, содержащий day (по умолчанию текущий)"""
+        return self._get_period_stats('monthly_stats', 'month_start', 'month', user_id, day)
+    
+    def _get_period_stats(self, table: str, column: str, unit: str, user_id: int, day: date) -> dict:
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT p.start, r.total_minutes, r.total_sessions, r.days_with_work
+                    FROM (
+                        SELECT DATE_TRUNC(
+                            '{unit}', COALESCE(%s, (now() AT TIME ZONE user_timezone(%s))::date)
+                        )::date AS start
+                    ) p
+                    LEFT JOIN {table} r ON r.user_id = %s AND r.{column} = p.start
+                """, (day, user_id, user_id))
+                start, total_minutes, total_sessions, days_with_work = cursor.fetchone()
+                stats = make_stats(total_minutes or 0, total_sessions or 0)
+                stats['start'] = start
+                stats['days_with_work'] = days_with_work or 0
+                return stats
+        except Exception as e:
+            print(f"Ошибка получения статистики за период: {e}")
+            return None
+    
+    def get_daily_goal(self, user_id: int) -> int:
+        """Цель дипворка пользователя в минутах"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT daily_goal(%s)", (user_id,))
+                return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Ошибка получения цели: {e}")
+            return DEFAULT_DAILY_GOAL_MINUTES
+    
+    def set_daily_goal(self, user_id: int, minutes: int) -> bool:
+        """Установка цели дипворка и пересчет серии дней с целью под новую цель"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                # Зачисление сессий пользователя ждет смены цели, остальных - нет
+                # (блокировки в том же порядке, что и в credit_session)
+                cursor.execute("SELECT pg_advisory_xact_lock_shared(hashtext('daily_stats'))")
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('daily_stats'), hashtext(%s::text))", (user_id,))
+                cursor.execute("""
+                    INSERT INTO user_settings (user_id, daily_goal_minutes)
+                    VALUES (%s, %s)
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET daily_goal_minutes = EXCLUDED.daily_goal_minutes,
+                                  updated_at = CURRENT_TIMESTAMP
+                """, (user_id, minutes))
+                cursor.execute(REBUILD_STREAKS_SQL, {'first': user_id, 'last': user_id})
                 return True
         except Exception as e:
-            print(f"Ошибка завершения сессии: {e}")
-            self.conn.rollback()
+            print(f"Ошибка установки цели: {e}")
             return False
     
-    def _update_daily_stats(self, user_id: int, duration_minutes: int):
-        """Обновление ежедневной статистики"""
+    def get_user_timezone(self, user_id: int) -> str:
+        """Часовой пояс пользователя (IANA), без своего - пояс бота; None при ошибке"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT user_timezone(%s)", (user_id,))
+                return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Ошибка получения часового пояса: {e}")
+            return None
+    
+    def set_user_timezone(self, user_id: int, timezone: str) -> bool:
+        """Установка часового пояса пользователя
+
+        Дни и часы недели уже записанных сессий пересчитываются в новом поясе:
+        вся статистика пользователя строится заново, как при
+        rebuild_daily_stats. Неизвестный базе данных пояс не сохраняется.
+        """
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                # Ошибка для пояса, которого нет в базе часовых поясов PostgreSQL
+                cursor.execute("SELECT now() AT TIME ZONE %s", (timezone,))
+                # Пересчет ждет только зачислений сессий этого пользователя, как и смена цели
+                cursor.execute("SELECT pg_advisory_xact_lock_shared(hashtext('daily_stats'))")
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('daily_stats'), hashtext(%s::text))", (user_id,))
+                cursor.execute("""
+                    INSERT INTO user_settings (user_id, timezone)
+                    VALUES (%s, %s)
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET timezone = EXCLUDED.timezone,
+                                  updated_at = CURRENT_TIMESTAMP
+                """, (user_id, timezone))
+                cursor.execute(
+                    REBUILD_DAILY_STATS_SQL + REBUILD_TAG_STATS_SQL + REBUILD_ROLLUPS_SQL + REBUILD_STREAKS_SQL
+                    + REBUILD_INSIGHTS_SQL,
+                    {'first': user_id, 'last': user_id}
+                )
+                return True
+        except Exception as e:
+            print(f"Ошибка установки часового пояса: {e}")
+            return False
+    
+    def get_user_language(self, user_id: int) -> str:
+        """Запомненный язык пользователя, None - не запомнен или ошибка"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT language FROM user_settings WHERE user_id = %s", (user_id,))
+                row = cursor.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            print(f"Ошибка получения языка: {e}")
+            return None
+    
+    def set_user_language(self, user_id: int, language: str) -> bool:
+        """Запоминание языка пользователя"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO user_settings (user_id, language)
+                    VALUES (%s, %s)
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET language = EXCLUDED.language,
+                                  updated_at = CURRENT_TIMESTAMP
+                """, (user_id, language))
+                return True
+        except Exception as e:
+            print(f"Ошибка сохранения языка: {e}")
+            return False
+    
+    def get_timezones(self) -> list:
+        """Часовые пояса, выбранные пользователями"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT DISTINCT timezone FROM user_settings WHERE timezone IS NOT NULL ORDER BY 1
+                """)
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Ошибка получения часовых поясов: {e}")
+            return []
+    
+    def get_streak(self, user_id: int, today: date = None) -> dict:
+        """Серия дней с целью: текущая (прерывается, если вчера цель не достигнута),
+        лучшая, число дней с целью и с дипворком, цель в минутах. today -
+        местный день пользователя (по умолчанию считается в базе данных)."""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT
+                        CASE WHEN s.last_goal_day >= COALESCE(%s, (now() AT TIME ZONE user_timezone(%s))::date) - 1
+                             THEN s.current_streak ELSE 0 END,
+                        COALESCE(s.longest_streak, 0),
+                        COALESCE(s.goal_days, 0),
+                        COALESCE(s.active_days, 0),
+                        daily_goal(%s)
+                    FROM (SELECT 1) one
+                    LEFT JOIN user_streaks s ON s.user_id = %s
+                """, (today, user_id, user_id, user_id))
+                current, longest, goal_days, active_days, goal = cursor.fetchone()
+                return {
+                    'current_streak': current or 0,
+                    'longest_streak': longest,
+                    'goal_days': goal_days,
+                    'active_days': active_days,
+                    'goal_minutes': goal,
+                }
+        except Exception as e:
+            print(f"Ошибка получения серии: {e}")
+            return None
+    
+    def get_chart_data(self, user_id: int, start: date, end: date) -> dict:
+        """Данные графика: минуты дипворка по датам периода, цель и версия
+
+        Версия меняется при любом изменении daily_stats периода (updated_at
+        обновляет триггер, удаленные строки меняют их число) и при смене цели.
+        """
         try:
-            today = date.today()
-            with self.conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 cursor.execute("""
-                    INSERT INTO daily_stats (user_id, date, total_minutes, session_count) 
-                    VALUES (%s, %s, %s, 1)
-                    ON CONFLICT (user_id, date) 
-                    DO UPDATE SET 
-                        total_minutes = daily_stats.total_minutes + EXCLUDED.total_minutes,
-                        session_count = daily_stats.session_count + 1
-                """, (user_id, today, duration_minutes))
+                    SELECT date, total_minutes, updated_at FROM daily_stats
+                    WHERE user_id = %s AND date BETWEEN %s AND %s
+                """, (user_id, start, end))
+                rows = cursor.fetchall()
+                cursor.execute("SELECT daily_goal(%s)", (user_id,))
+                goal = cursor.fetchone()[0]
+                return {
+                    'days': {day: minutes for day, minutes, _ in rows},
+                    'goal': goal,
+                    'version': (start, end, goal, len(rows), max((row[2] for row in rows), default=None)),
+                }
         except Exception as e:
-            print(f"Ошибка обновления статистики: {e}")
+            print(f"Ошибка получения данных графика: {e}")
+            return None
     
-    def get_today_stats(self, user_id: int) -> dict:
-        """Получение статистики за сегодня"""
+    def get_insights(self, user_id: int) -> dict:
+        """Гистограммы закрытых сессий: hour_minutes - 168 значений минут по
+        часам недели (с понедельника 00:00), length_counts - число сессий по
+        корзинам SESSION_LENGTH_BUCKETS"""
         try:
-            today = date.today()
-            with self.conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor() as cursor:
                 cursor.execute("""
-                    SELECT total_minutes, session_count 
-                    FROM daily_stats 
-                    WHERE user_id = %s AND date = %s
-                """, (user_id, today))
+                    SELECT hour_minutes, length_counts FROM user_insights WHERE user_id = %s
+                """, (user_id,))
                 result = cursor.fetchone()
-                
-                if result:
-                    total_minutes, session_count = result
-                    hours = total_minutes // 60
-                    minutes = total_minutes % 60
-                    return {
-                        'total_minutes': total_minutes,
-                        'hours': hours,
-                        'minutes': minutes,
-                        'session_count': session_count
-                    }
-                return {'total_minutes': 0, 'hours': 0, 'minutes': 0, 'session_count': 0}
+                if result is None:
+                    return {'hour_minutes': [0] * 168, 'length_counts': [0] * (len(SESSION_LENGTH_BUCKETS) + 1)}
+                return {'hour_minutes': result[0], 'length_counts': result[1]}
         except Exception as e:
-            print(f"Ошибка получения статистики: {e}")
-            return {'total_minutes': 0, 'hours': 0, 'minutes': 0, 'session_count': 0}
+            print(f"Ошибка получения закономерностей: {e}")
+            return None
+    
+    def get_tag_stats(self, user_id: int, start: date, end: date) -> dict:
+        """Статистика по тегам за дни start..end включительно
+
+        Итоги периода (total_minutes, session_count) - из daily_stats, теги -
+        из daily_tag_stats: tags - [(tag, минуты, сессии), ...] по убыванию
+        минут. Время без тега - разность итога и суммы по тегам. Оба запроса
+        читают диапазон первичного ключа (user_id, date), сессии не читаются.
+        """
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COALESCE(SUM(total_minutes), 0), COALESCE(SUM(session_count), 0)
+                    FROM daily_stats
+                    WHERE user_id = %s AND date BETWEEN %s AND %s
+                """, (user_id, start, end))
+                stats = make_stats(*cursor.fetchone())
+                cursor.execute("""
+                    SELECT tag, SUM(total_minutes), SUM(session_count)
+                    FROM daily_tag_stats
+                    WHERE user_id = %s AND date BETWEEN %s AND %s
+                    GROUP BY tag
+                    ORDER BY 2 DESC, 1
+                """, (user_id, start, end))
+                stats['tags'] = [(tag, int(minutes), int(count)) for tag, minutes, count in cursor.fetchall()]
+                return stats
+        except Exception as e:
+            print(f"Ошибка получения статистики по тегам: {e}")
+            return None
+    
+    def get_recent_tags(self, user_id: int, limit: int) -> list:
+        """Теги закрытых сессий пользователя за RECENT_TAGS_DAYS дней: последние
+        использованные первыми, не больше limit"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT tag FROM daily_tag_stats
+                    WHERE user_id = %s
+                      AND date >= (now() AT TIME ZONE user_timezone(%s))::date - %s
+                    GROUP BY tag
+                    ORDER BY MAX(date) DESC, SUM(total_minutes) DESC, tag
+                    LIMIT %s
+                """, (user_id, user_id, RECENT_TAGS_DAYS, limit))
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Ошибка получения недавних тегов: {e}")
+            return []
+    
+    def add_group_member(self, chat_id: int, user_id: int, name: str) -> bool:
+        """Участник таблицы лидеров группового чата; для участника - обновление имени"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO group_members (chat_id, user_id, name)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (chat_id, user_id)
+                    DO UPDATE SET name = EXCLUDED.name
+                """, (chat_id, user_id, name))
+                return True
+        except Exception as e:
+            print(f"Ошибка добавления участника группы: {e}")
+            return False
+    
+    def remove_group_member(self, chat_id: int, user_id: int) -> bool:
+        """Выход из таблицы лидеров чата: участник сразу пропадает и из снимка"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("DELETE FROM group_members WHERE chat_id = %s AND user_id = %s", (chat_id, user_id))
+                cursor.execute(
+                    "DELETE FROM group_leaderboards WHERE chat_id = %s AND user_id = %s", (chat_id, user_id)
+                )
+                return True
+        except Exception as e:
+            print(f"Ошибка удаления участника группы: {e}")
+            return False
+    
+    def get_leaderboard(self, chat_id: int, period: str, period_start: date) -> list:
+        """Таблица лидеров чата из последнего снимка: [(user_id, name, минуты), ...]
+        по местам. Снимок прошлого дня или недели не возвращается."""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT user_id, name, total_minutes FROM group_leaderboards
+                    WHERE chat_id = %s AND period = %s AND period_start = %s
+                    ORDER BY position
+                """, (chat_id, period, period_start))
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка получения таблицы лидеров: {e}")
+            return []
+    
+    def refresh_leaderboards(self, day: date, after_chat_id: int, limit: int, size: int) -> int:
+        """Снимок таблиц лидеров за день day и его неделю для следующих limit чатов
+
+        Чаты обрабатываются по возрастанию chat_id после after_chat_id (для
+        первой порции - MIN_CHAT_ID), каждая порция - в своей транзакции.
+        Возвращает последний обработанный chat_id или None, если чатов больше нет.
+        """
+        with self.connection() as conn, conn.cursor() as cursor:
+            # Пересчеты из нескольких процессов не сталкиваются на первичном ключе
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('group_leaderboards'))")
+            cursor.execute("""
+                SELECT MAX(chat_id) FROM (
+                    SELECT DISTINCT chat_id FROM group_members
+                    WHERE chat_id > %s
+                    ORDER BY chat_id
+                    LIMIT %s
+                ) chunk
+            """, (after_chat_id, limit))
+            last_chat_id = cursor.fetchone()[0]
+            if last_chat_id is None:
+                return None
+            cursor.execute(REFRESH_LEADERBOARDS_SQL, {
+                'first': after_chat_id + 1, 'last': last_chat_id,
+                'day': day, 'size': size,
+            })
+            return last_chat_id
+    
+    def get_daily_report_page(self, day: date, after_user_id: int, limit: int, timezone: str = None) -> list:
+        """Страница статистики всех пользователей за день:
+        (user_id, total_minutes, session_count, daily_goal_minutes, language)
+
+        Пагинация по ключу user_id: каждый вызов - один короткий индексный запрос.
+        timezone - только пользователи этого часового пояса (без своего пояса -
+        пояса бота).
+        """
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT d.user_id, d.total_minutes, d.session_count,
+                           COALESCE(s.daily_goal_minutes, %s), s.language
+                    FROM daily_stats d
+                    LEFT JOIN user_settings s ON s.user_id = d.user_id
+                    WHERE d.date = %s AND d.user_id > %s AND d.total_minutes > 0
+                      AND (%s::text IS NULL OR COALESCE(s.timezone, current_setting('TimeZone')) = %s)
+                    ORDER BY d.user_id
+                    LIMIT %s
+                """, (DEFAULT_DAILY_GOAL_MINUTES, day, after_user_id, timezone, timezone, limit))
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка получения статистики для рассылки: {e}")
+            # Пустая страница означала бы конец рассылки: неудачный запуск не должен считаться выполненным
+            raise
+    
+    def get_birthday_page(self, after_user_id: int, limit: int, timezone: str = None) -> list:
+        """Страница дат рождения пользователей: (user_id, birthday, language);
+        timezone - как в get_daily_report_page"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT b.user_id, b.birthday, s.language
+                    FROM user_birthday b
+                    LEFT JOIN user_settings s ON s.user_id = b.user_id
+                    WHERE b.user_id > %s
+                      AND (%s::text IS NULL OR COALESCE(s.timezone, current_setting('TimeZone')) = %s)
+                    ORDER BY b.user_id
+                    LIMIT %s
+                """, (after_user_id, timezone, timezone, limit))
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка получения дат рождения для рассылки: {e}")
+            # Пустая страница означала бы конец рассылки: неудачный запуск не должен считаться выполненным
+            raise
     
     def get_active_session(self, user_id: int) -> int:
         """Получение активной сессии пользователя"""
         try:
-            with self.conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT id FROM deepwork_sessions 
-                    WHERE user_id = %s AND end_time IS NULL
-                    ORDER BY start_time DESC LIMIT 1
-                """, (user_id,))
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT session_id FROM open_sessions WHERE user_id = %s", (user_id,))
                 result = cursor.fetchone()
                 return result[0] if result else None
         except Exception as e:
             print(f"Ошибка получения активной сессии: {e}")
             return None
     
+    def get_open_sessions(self, shard: tuple = None) -> list:
+        """Все открытые сессии одним запросом: список пар (user_id, session_id);
+        shard - только пользователи процесса-обработчика, как в claim_deadlines"""
+        index, count = shard or (None, None)
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT user_id, session_id FROM open_sessions
+                    WHERE %(count)s::integer IS NULL OR user_id %% %(count)s = %(index)s
+                    ORDER BY user_id
+                """, {'index': index, 'count': count})
+                return cursor.fetchall()
+        except Exception as e:
+            print(f"Ошибка получения открытых сессий: {e}")
+            # Без них реестр был бы пуст, а новые сессии упирались бы в уже открытые
+            raise
+    
+    def close_stale_sessions(self, max_age_minutes: int, shard: tuple = None) -> list:
+        """Массовое закрытие сессий старше max_age_minutes
+
+        Длительность таких сессий ограничивается max_age_minutes, и одним
+        запросом они зачисляются в статистику. shard - только пользователи
+        процесса-обработчика. Возвращает список user_id, чьи сессии были
+        закрыты.
+        """
+        index, count = shard or (None, None)
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    WITH closed AS (
+                        UPDATE deepwork_sessions
+                        SET end_time = start_time + make_interval(mins => %(max_age)s),
+                            duration_minutes = %(max_age)s
+                        WHERE end_time IS NULL
+                          AND start_time < now() - make_interval(mins => %(max_age)s)
+                          AND (%(count)s::integer IS NULL OR user_id %% %(count)s = %(index)s)
+                        RETURNING user_id, start_time, end_time
+                    ), dropped AS (
+                        DELETE FROM session_deadlines
+                        WHERE user_id = ANY(ARRAY(SELECT user_id FROM closed))
+                    )
+                    SELECT DISTINCT c.user_id
+                    FROM closed c
+                    CROSS JOIN LATERAL credit_session(c.user_id, c.start_time, c.end_time)
+                """, {'max_age': max_age_minutes, 'index': index, 'count': count})
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Ошибка закрытия устаревших сессий: {e}")
+            return []
+    
+    @staticmethod
+    def _replace_deadlines(cursor, user_id: int, session_id: int, deadlines):
+        cursor.execute("DELETE FROM session_deadlines WHERE user_id = %s", (user_id,))
+        if deadlines:
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO session_deadlines (user_id, session_id, kind, due_at, minutes) VALUES %s
+            """, [(user_id, session_id, kind, due_at, minutes) for kind, due_at, minutes in deadlines])
+    
+    def set_deadlines(self, user_id: int, deadlines: list) -> bool:
+        """Замена сроков пользователя на deadlines - [(kind, due_at, minutes), ...]
+
+        Сроки привязываются к открытой сессии пользователя, если она есть.
+        """
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT session_id FROM open_sessions WHERE user_id = %s", (user_id,))
+                row = cursor.fetchone()
+                self._replace_deadlines(cursor, user_id, row[0] if row else None, deadlines)
+                return True
+        except Exception as e:
+            print(f"Ошибка сохранения сроков сессии: {e}")
+            return False
+    
+    def claim_deadlines(self, now: datetime, limit: int, shard: tuple = None) -> list:
+        """Наступившие к now сроки, не больше limit, по возрастанию времени
+
+        Сроки удаляются из таблицы в той же транзакции, поэтому каждый
+        обрабатывается один раз; строки, уже забранные другим процессом,
+        пропускаются (SKIP LOCKED). shard=(index, count) ограничивает выборку
+        пользователями процесса-обработчика: user_id % count = index.
+        Возвращает [(user_id, session_id, kind, due_at, minutes), ...].
+        """
+        index, count = shard or (None, None)
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    DELETE FROM session_deadlines
+                    WHERE id IN (
+                        SELECT id FROM session_deadlines
+                        WHERE due_at <= %(now)s
+                          AND (%(count)s::integer IS NULL OR user_id %% %(count)s = %(index)s)
+                        ORDER BY due_at
+                        LIMIT %(limit)s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING user_id, session_id, kind, due_at, minutes
+                """, {'now': now, 'limit': limit, 'index': index, 'count': count})
+                return sorted(cursor.fetchall(), key=lambda row: row[3])
+        except Exception as e:
+            print(f"Ошибка получения наступивших сроков: {e}")
+            return []
+    
+    def next_deadline(self, shard: tuple = None) -> datetime:
+        """Время ближайшего срока (None, если сроков нет)"""
+        index, count = shard or (None, None)
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT due_at FROM session_deadlines
+                    WHERE %(count)s::integer IS NULL OR user_id %% %(count)s = %(index)s
+                    ORDER BY due_at
+                    LIMIT 1
+                """, {'index': index, 'count': count})
+                row = cursor.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            print(f"Ошибка получения ближайшего срока: {e}")
+            return None
+    
+    def rebuild_daily_stats(self, after_user_id: int, limit: int) -> int:
+        """Пересчет всей статистики следующих limit пользователей из сессий
+
+        Пользователи обрабатываются по возрастанию user_id после after_user_id,
+        каждая порция - в своей транзакции. Возвращает последний обработанный
+        user_id или None, если пользователей больше нет.
+        """
+        return self._rebuild_chunk(
+            'deepwork_sessions',
+            REBUILD_DAILY_STATS_SQL + REBUILD_TAG_STATS_SQL + REBUILD_ROLLUPS_SQL + REBUILD_STREAKS_SQL
+            + REBUILD_INSIGHTS_SQL,
+            after_user_id, limit
+        )
+    
+    def refresh_rollups(self, after_user_id: int, limit: int) -> int:
+        """Пересчет недельной и месячной статистики и серий следующих limit пользователей
+
+        Источник - ежедневная статистика; порядок и результат как у
+        rebuild_daily_stats.
+        """
+        return self._rebuild_chunk(
+            'daily_stats', REBUILD_ROLLUPS_SQL + REBUILD_STREAKS_SQL, after_user_id, limit
+        )
+    
+    def _rebuild_chunk(self, source: str, query: str, after_user_id: int, limit: int) -> int:
+        with self.connection() as conn, conn.cursor() as cursor:
+            # Зачисление сессий ждет окончания пересчета порции
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('daily_stats'))")
+            cursor.execute(f"""
+                SELECT MAX(user_id) FROM (
+                    SELECT DISTINCT user_id FROM {source}
+                    WHERE user_id > %s
+                    ORDER BY user_id
+                    LIMIT %s
+                ) chunk
+            """, (after_user_id, limit))
+            last_user_id = cursor.fetchone()[0]
+            if last_user_id is None:
+                return None
+            cursor.execute(query, {'first': after_user_id + 1, 'last': last_user_id})
+            return last_user_id
+    
+    def ensure_session_partitions(self, months_ahead: int) -> int:
+        """Создание секций deepwork_sessions на months_ahead месяцев вперед (UTC)"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT ensure_session_partitions(
+                        (now() AT TIME ZONE 'UTC')::date,
+                        ((now() AT TIME ZONE 'UTC') + make_interval(months => %s))::date
+                    )
+                """, (months_ahead,))
+                return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"Ошибка создания секций сессий: {e}")
+            return None
+    
+    def iter_export_rows(self, dataset: str, user_id: int = None, chunk_size: int = 5000):
+        """Строки набора EXPORT_DATASETS порциями по chunk_size
+
+        Данные читаются именованным (серверным) курсором: в памяти процесса
+        одновременно не больше одной порции, сколько бы истории ни было.
+        user_id=None - все пользователи. Ошибки не перехватываются, чтобы
+        не получить молча обрезанную выгрузку.
+        """
+        _, query = EXPORT_DATASETS[dataset]
+        where = "WHERE user_id = %s" if user_id is not None else ""
+        params = (user_id,) if user_id is not None else None
+        with self.connection() as conn, conn.cursor(name=f'export_{dataset}') as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(query.format(where=where), params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+    
+    def import_sessions(self, rows, batch_size: int = 50000) -> dict:
+        """Загрузка закрытых сессий: rows - итератор (user_id, start_time, end_time[, tag]),
+        время без часового пояса считается временем бота
+
+        Строки порциями по batch_size загружаются COPY во временную таблицу,
+        затем одной транзакцией записываются сессии и пересчитывается
+        статистика (IMPORT_SESSIONS_SQL). Возвращает словарь: loaded -
+        загружено строк, imported - записано сессий, users - пользователей.
+        Ошибки не перехватываются: загрузка либо проходит целиком, либо нет.
+        """
+        rows = iter(rows)
+        loaded = 0
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE import_staging (
+                    user_id BIGINT NOT NULL,
+                    start_time TIMESTAMPTZ NOT NULL,
+                    end_time TIMESTAMPTZ NOT NULL,
+                    tag TEXT
+                ) ON COMMIT DROP
+            """)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                buffer = io.StringIO(''.join(
+                    f"{user_id}\t{start.isoformat(' ')}\t{end.isoformat(' ')}\t{_copy_text(tag)}\n"
+                    for user_id, start, end, tag in map(import_row, batch)
+                ))
+                cursor.copy_expert("COPY import_staging (user_id, start_time, end_time, tag) FROM STDIN", buffer)
+                loaded += len(batch)
+            cursor.execute(IMPORT_SESSIONS_SQL)
+            imported, users = cursor.fetchone()
+            return {'loaded': loaded, 'imported': imported, 'users': users}
+    
+    def get_job_runs(self) -> dict:
+        """Время последнего запуска задач планировщика: name -> datetime"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("SELECT name, last_run_at FROM scheduler_jobs")
+                return dict(cursor.fetchall())
+        except Exception as e:
+            print(f"Ошибка получения запусков задач: {e}")
+            return {}
+    
+    def set_job_run(self, name: str, run_at: datetime) -> bool:
+        """Сохранение времени последнего запуска задачи"""
+        try:
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO scheduler_jobs (name, last_run_at)
+                    VALUES (%s, %s)
+                    ON CONFLICT (name)
+                    DO UPDATE SET last_run_at = GREATEST(scheduler_jobs.last_run_at, EXCLUDED.last_run_at)
+                """, (name, run_at))
+                return True
+        except Exception as e:
+            print(f"Ошибка сохранения запуска задачи: {e}")
+            return False
+    
     def close(self):
-        """Закрытие соединения с базой данных"""
-        if self.conn:
-            self.conn.close()
+        """Закрытие всех подключений пула"""
+        if self.pool:
+            self.pool.closeall()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import NamedTuple
+from .storage import AsyncDatabase
+from .stats import utc_now
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline(NamedTuple):
+    """Срок сессии из таблицы session_deadlines
+
+    kind: finish - окончание сессии по плану (minutes - перерыв после нее),
+    break - конец перерыва, remind - напоминание об идущей сессии,
+    autostop - остановка сессии без ответа на напоминание (minutes -
+    сколько последних минут не засчитывать).
+    """
+    user_id: int
+    session_id: int
+    kind: str
+    due_at: datetime
+    minutes: int
+
+
+class DeadlineQueue:
+    """Цикл обработки сроков сессий из базы данных
+
+    Все сроки хранятся в одной таблице с индексом по времени: цикл забирает
+    наступившие порциями по batch_size и спит до ближайшего следующего (не
+    дольше max_sleep, чтобы заметить сроки, добавленные другими процессами).
+    Миллион ожидающих сроков - это строки индекса и одна задача, а не
+    миллион спящих задач. Срок забирается из таблицы до обработки, поэтому
+    выполняется не больше одного раза. shard=(index, count) ограничивает
+    цикл пользователями процесса-обработчика в режиме webhook.
+    """
+
+    def __init__(self, db: AsyncDatabase, handler, batch_size: int = 500, max_sleep: float = 60,
+                 shard: tuple = None, clock=utc_now):
+        self.db = db
+        self.handler = handler
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.shard = shard
+        self.clock = clock
+        self._next = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.handled = 0
+        self.failed = 0
+
+    def notify(self, due_at: datetime):
+        """Новый срок этого процесса: разбудить цикл, если он наступит раньше ожидаемого"""
+        if self._next is None or due_at < self._next:
+            self._next = due_at
+            self._wakeup.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            # Сброс до чтения ближайшего срока: notify() во время запроса не теряется
+            self._wakeup.clear()
+            if await self.run_once() == self.batch_size:
+                continue
+            self._next = await self.db.next_deadline(self.shard)
+            delay = self.max_sleep
+            if self._next is not None:
+                delay = min(max(0.0, (self._next - self.clock()).total_seconds()), self.max_sleep)
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> int:
+        """Обработка одной порции наступивших сроков: их число"""
+        batch = [Deadline(*row) for row in await self.db.claim_deadlines(self.clock(), self.batch_size, self.shard)]
+        results = await asyncio.gather(*(self.handler(deadline) for deadline in batch), return_exceptions=True)
+        for deadline, result in zip(batch, results):
+            if isinstance(result, Exception):
+                self.failed += 1
+                logger.error(f"Ошибка обработки срока {deadline.kind} пользователя {deadline.user_id}: {result}")
+            else:
+                self.handled += 1
+        return len(batch)
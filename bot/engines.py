@@ -0,0 +1,87 @@
+"""
+Выбор хранилища данных бота
+
+DB_ENGINE задает движок:
+- postgres (по умолчанию) - Database поверх PostgreSQL;
+- sqlite - SQLiteDatabase в одном файле SQLITE_PATH (журнал WAL), для
+  развертывания на одной машине без контейнера базы данных;
+- memory - MemoryDatabase в памяти процесса: данные теряются при остановке,
+  для тестов и пробного запуска.
+
+Все движки реализуют интерфейс Storage и проходят общий набор тестов
+test_storage_conformance.py.
+"""
+
+import os
+from datetime import date, datetime
+from typing import Iterator, Protocol
+from .database import Database
+from .memory_database import MemoryDatabase
+from .sqlite_database import SQLiteDatabase
+
+ENGINES = {
+    'postgres': Database,
+    'sqlite': SQLiteDatabase,
+    'memory': MemoryDatabase,
+}
+
+
+class Storage(Protocol):
+    """Синхронные методы хранилища, которые вызывает AsyncDatabase
+
+    Ошибки методов бота перехватываются и превращаются в None, False или
+    пустой результат; import_sessions, iter_export_rows и пересчеты
+    статистики ошибки не перехватывают.
+    """
+
+    # Размер пула подключений: столько потоков AsyncDatabase использует
+    maxconn: int
+
+    def ping(self) -> bool: ...
+    def set_user_birthday(self, user_id: int, birthday: date) -> bool: ...
+    def get_user_birthday(self, user_id: int) -> date: ...
+    def start_session(self, user_id: int, deadlines: list = (), tag: str = None) -> int: ...
+    def end_session(self, session_id: int, end_time: datetime = None) -> dict: ...
+    def get_today_stats(self, user_id: int, day: date = None) -> dict: ...
+    def get_week_stats(self, user_id: int, day: date = None) -> dict: ...
+    def get_month_stats(self, user_id: int, day: date = None) -> dict: ...
+    def get_daily_goal(self, user_id: int) -> int: ...
+    def set_daily_goal(self, user_id: int, minutes: int) -> bool: ...
+    def get_user_timezone(self, user_id: int) -> str: ...
+    def set_user_timezone(self, user_id: int, timezone: str) -> bool: ...
+    def get_user_language(self, user_id: int) -> str: ...
+    def set_user_language(self, user_id: int, language: str) -> bool: ...
+    def get_timezones(self) -> list: ...
+    def get_streak(self, user_id: int, today: date = None) -> dict: ...
+    def get_chart_data(self, user_id: int, start: date, end: date) -> dict: ...
+    def get_insights(self, user_id: int) -> dict: ...
+    def get_tag_stats(self, user_id: int, start: date, end: date) -> dict: ...
+    def get_recent_tags(self, user_id: int, limit: int) -> list: ...
+    def add_group_member(self, chat_id: int, user_id: int, name: str) -> bool: ...
+    def remove_group_member(self, chat_id: int, user_id: int) -> bool: ...
+    def get_leaderboard(self, chat_id: int, period: str, period_start: date) -> list: ...
+    def refresh_leaderboards(self, day: date, after_chat_id: int, limit: int, size: int) -> int: ...
+    def get_daily_report_page(self, day: date, after_user_id: int, limit: int, timezone: str = None) -> list: ...
+    def get_birthday_page(self, after_user_id: int, limit: int, timezone: str = None) -> list: ...
+    def get_active_session(self, user_id: int) -> int: ...
+    def get_open_sessions(self, shard: tuple = None) -> list: ...
+    def close_stale_sessions(self, max_age_minutes: int, shard: tuple = None) -> list: ...
+    def set_deadlines(self, user_id: int, deadlines: list) -> bool: ...
+    def claim_deadlines(self, now: datetime, limit: int, shard: tuple = None) -> list: ...
+    def next_deadline(self, shard: tuple = None) -> datetime: ...
+    def rebuild_daily_stats(self, after_user_id: int, limit: int) -> int: ...
+    def refresh_rollups(self, after_user_id: int, limit: int) -> int: ...
+    def ensure_session_partitions(self, months_ahead: int) -> int: ...
+    def iter_export_rows(self, dataset: str, user_id: int = None, chunk_size: int = 5000) -> Iterator[list]: ...
+    def import_sessions(self, rows, batch_size: int = 50000) -> dict: ...
+    def get_job_runs(self) -> dict: ...
+    def set_job_run(self, name: str, run_at: datetime) -> bool: ...
+    def close(self): ...
+
+
+def create_database(engine: str = None, maxconn: int = None) -> Storage:
+    """Хранилище движка engine (по умолчанию DB_ENGINE)"""
+    engine = engine or os.getenv('DB_ENGINE', 'postgres')
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок базы данных {engine}, доступны: {', '.join(ENGINES)}")
+    return ENGINES[engine](maxconn=maxconn)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Выгрузка истории дипворка
+
+Сессии (deepwork_sessions) и ежедневная статистика (daily_stats) одного
+пользователя или всех пользователей записываются в файлы CSV, JSON Lines
+или Parquet. Строки читаются серверным курсором и записываются порциями,
+поэтому расход памяти не зависит от длины истории. Для Parquet нужен
+pyarrow (poetry install -E export).
+
+Запуск: python -m bot.export [--format csv|jsonl|parquet] [--user USER_ID] [--out DIR] [--chunk 5000]
+"""
+
+import argparse
+import csv
+import json
+import os
+from datetime import date, datetime
+from .database import EXPORT_DATASETS
+from .engines import Storage, create_database
+
+# Строк в одной порции чтения и записи
+DEFAULT_CHUNK_SIZE = 5000
+
+# Типы колонок EXPORT_DATASETS в Parquet
+PARQUET_TYPES = {'int': 'int64', 'date': 'date32', 'text': 'string'}
+
+
+def _write_csv(path: str, columns: tuple, chunks) -> int:
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in columns])
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def _write_jsonl(path: str, columns: tuple, chunks) -> int:
+    names = [name for name, _ in columns]
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for rows in chunks:
+            f.writelines(
+                json.dumps(dict(zip(names, row)), default=_json_default, ensure_ascii=False) + '\n'
+                for row in rows
+            )
+            count += len(rows)
+    return count
+
+
+def _parquet_type(pa, kind: str):
+    """Тип колонки в Parquet; время сессий - в UTC с часовым поясом"""
+    if kind == 'timestamptz':
+        return pa.timestamp('us', tz='UTC')
+    return pa.type_for_alias(PARQUET_TYPES[kind])
+
+
+def _write_parquet(path: str, columns: tuple, chunks) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, _parquet_type(pa, kind)) for name, kind in columns])
+    count = 0
+    # Каждая порция - отдельная группа строк файла
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+        if not count:
+            writer.write_table(schema.empty_table())
+    return count
+
+
+# Формат -> (расширение файла, функция записи)
+EXPORT_FORMATS = {
+    'csv': ('csv', _write_csv),
+    'jsonl': ('jsonl', _write_jsonl),
+    'parquet': ('parquet', _write_parquet),
+}
+
+
+def check_format(fmt: str):
+    """Проверка формата до чтения данных: ValueError или ImportError"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат {fmt}, доступны: {', '.join(EXPORT_FORMATS)}")
+    if fmt == 'parquet':
+        import pyarrow  # noqa: F401
+
+
+def export_history(db: Storage, directory: str, fmt: str = 'csv', user_id: int = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> list:
+    """Выгрузка всех наборов EXPORT_DATASETS в directory
+
+    user_id=None - все пользователи. Возвращает список (путь, число строк).
+    """
+    check_format(fmt)
+    extension, write = EXPORT_FORMATS[fmt]
+    scope = f"user_{user_id}" if user_id is not None else "all"
+    files = []
+    for dataset, (columns, _) in EXPORT_DATASETS.items():
+        path = os.path.join(directory, f"{dataset}_{scope}.{extension}")
+        count = write(path, columns, db.iter_export_rows(dataset, user_id, chunk_size))
+        files.append((path, count))
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--format', default='csv', choices=list(EXPORT_FORMATS), help='формат файлов')
+    parser.add_argument('--user', type=int, default=None, help='только этот пользователь')
+    parser.add_argument('--out', default='.', help='каталог для файлов')
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK_SIZE, help='строк в одной порции')
+    args = parser.parse_args()
+
+    db = create_database(maxconn=1)
+    try:
+        os.makedirs(args.out, exist_ok=True)
+        for path, count in export_history(db, args.out, args.format, args.user, args.chunk):
+            print(f"✅ {path}: {count} строк")
+    except Exception as e:
+        print(f"❌ Ошибка выгрузки: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
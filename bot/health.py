@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from aiohttp import web
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать ответа базы данных при проверке готовности, секунды
+READY_DB_TIMEOUT = 2.0
+
+
+class LoopLagMonitor:
+    """Задержка цикла событий: насколько позже запланированного просыпается задача"""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.lag = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - started - self.interval)
+
+
+def register_bot_metrics(tracker, monitor: LoopLagMonitor):
+    """Метрики, которые читаются из объектов бота при выдаче /metrics"""
+    REGISTRY.callback(
+        'bot_loop_lag_seconds', 'Задержка цикла событий', 'gauge',
+        lambda: {(): monitor.lag}
+    )
+    REGISTRY.callback(
+        'bot_active_sessions', 'Открытые сессии дипворка в памяти процесса', 'gauge',
+        lambda: {(): len(tracker.sessions)}
+    )
+    REGISTRY.callback(
+        'bot_today_stats_cache', 'Обращения к кешу статистики за сегодня', 'counter',
+        lambda: {
+            ('hit',): tracker.today_stats.hits,
+            ('miss',): tracker.today_stats.misses,
+        },
+        ('result',)
+    )
+    REGISTRY.callback(
+        'bot_chart_cache', 'Обращения к кешу отправленных графиков', 'counter',
+        lambda: {
+            ('hit',): tracker.chart_cache.hits,
+            ('miss',): tracker.chart_cache.misses,
+        },
+        ('result',)
+    )
+    REGISTRY.callback(
+        'bot_session_deadlines', 'Обработанные сроки сессий: помидоры, перерывы, напоминания', 'counter',
+        lambda: {
+            ('handled',): tracker.deadlines.handled,
+            ('failed',): tracker.deadlines.failed,
+        },
+        ('result',)
+    )
+    if tracker.ticker is not None:
+        REGISTRY.callback(
+            'bot_session_ticker', 'Обновления сообщений идущих сессий по таймеру', 'counter',
+            lambda: {
+                ('edited',): tracker.ticker.edited,
+                ('unchanged',): tracker.ticker.unchanged,
+                ('failed',): tracker.ticker.failed,
+            },
+            ('result',)
+        )
+    if tracker.sender is not None:
+        REGISTRY.callback(
+            'bot_messages', 'Сообщения рассылки по результату отправки', 'counter',
+            lambda: {
+                ('sent',): tracker.sender.sent,
+                ('failed',): tracker.sender.failed,
+                ('retried',): tracker.sender.retried,
+            },
+            ('result',)
+        )
+
+
+def create_health_app(db, monitor: LoopLagMonitor, max_loop_lag: float) -> web.Application:
+    """HTTP-приложение с проверками живости и готовности и метриками
+
+    /health - процесс жив и цикл событий отвечает; /ready - база данных
+    доступна и задержка цикла событий не больше max_loop_lag; /metrics -
+    метрики в формате Prometheus.
+    """
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok'})
+
+    async def ready(request: web.Request) -> web.Response:
+        try:
+            db_ok = await asyncio.wait_for(db.ping(), READY_DB_TIMEOUT)
+        except asyncio.TimeoutError:
+            db_ok = False
+        loop_ok = monitor.lag <= max_loop_lag
+        return web.json_response(
+            {'db': db_ok, 'loop_lag': round(monitor.lag, 4)},
+            status=200 if db_ok and loop_ok else 503
+        )
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=REGISTRY.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/health', health)
+    app.router.add_get('/ready', ready)
+    app.router.add_get('/metrics', metrics)
+    return app
+
+
+class HealthServer:
+    """Встроенный HTTP-сервер проверок и метрик процесса бота"""
+
+    def __init__(self, tracker, host: str, port: int, max_loop_lag: float = 1.0):
+        self.tracker = tracker
+        self.host = host
+        self.port = port
+        self.max_loop_lag = max_loop_lag
+        self.monitor = LoopLagMonitor()
+        self._runner = None
+
+    async def start(self):
+        self.monitor.start()
+        register_bot_metrics(self.tracker, self.monitor)
+        app = create_health_app(self.tracker.db, self.monitor, self.max_loop_lag)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Проверки и метрики доступны на {self.host}:{self.port}")
+
+    async def stop(self):
+        await self.monitor.stop()
+        if self._runner:
+            await self._runner.cleanup()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Импорт истории сессий из других трекеров
+
+Файл CSV (с заголовком) или JSON (массив объектов или JSON Lines) с полями
+start_time и end_time в формате ISO 8601, необязательным tag, при импорте
+нескольких пользователей - еще user_id. Файлы выгрузки sessions из /export
+подходят без изменений, теги сессий сохраняются. Время без часового пояса считается временем пользователя
+(--user, поясом из /timezone) или TIMEZONE.
+
+Строки проверяются по одной и порциями загружаются в базу через COPY,
+поэтому файл не читается в память целиком. Пересекающиеся интервалы
+объединяются, уже записанные сессии не дублируются, после загрузки
+статистика затронутых дней пересчитывается одним запросом.
+
+Запуск: python -m bot.importer FILE [--format csv|json] [--user USER_ID] [--batch 50000]
+"""
+
+import argparse
+import csv
+import json
+import os
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from .engines import Storage, create_database
+from .stats import utc_now, as_utc
+from .tags import normalize_tag
+
+# Строк в одной порции COPY
+DEFAULT_BATCH_SIZE = 50000
+
+# Самая длинная сессия, которую принимает импорт
+MAX_SESSION_DURATION = timedelta(hours=24)
+
+# Сколько ошибок в строках показывать пользователю
+MAX_REPORTED_ERRORS = 10
+
+IMPORT_FORMATS = ('csv', 'json')
+
+
+def detect_format(path: str) -> str:
+    """Формат по расширению файла: .csv - csv, .json и .jsonl - json"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.json', '.jsonl'):
+        return 'json'
+    raise ValueError(f"Не удалось определить формат файла {os.path.basename(path)}")
+
+
+class SessionReader:
+    """Проверенные сессии из файла: итератор (user_id, start_time, end_time, tag),
+    время - в UTC, tag - None, если тега нет
+
+    Некорректные строки пропускаются и считаются в invalid, первые
+    MAX_REPORTED_ERRORS описаний ошибок сохраняются в errors. user_id
+    задает пользователя для всех строк, иначе он читается из файла.
+    """
+
+    def __init__(self, path: str, fmt: str = None, user_id: int = None, timezone: ZoneInfo = None,
+                 now: datetime = None):
+        self.path = path
+        self.fmt = fmt or detect_format(path)
+        if self.fmt not in IMPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат {self.fmt}, доступны: {', '.join(IMPORT_FORMATS)}")
+        self.user_id = user_id
+        self.timezone = timezone or ZoneInfo(os.getenv('TIMEZONE', 'Europe/Moscow'))
+        self.now = now or utc_now()
+        self.rows = 0
+        self.invalid = 0
+        self.errors = []
+
+    def __iter__(self):
+        for line, record in self._records():
+            self.rows += 1
+            try:
+                yield self._parse(record)
+            except (ValueError, TypeError, KeyError) as e:
+                self.invalid += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append(f"строка {line}: {e}")
+
+    def _records(self):
+        with open(self.path, newline='', encoding='utf-8-sig') as f:
+            if self.fmt == 'csv':
+                reader = csv.DictReader(f)
+                for record in reader:
+                    yield reader.line_num, record
+                return
+
+            first = f.read(1)
+            while first.isspace():
+                first = f.read(1)
+            f.seek(0)
+            if first == '[':
+                # Массив JSON читается целиком - для больших файлов JSON Lines
+                for index, record in enumerate(json.load(f), 1):
+                    yield index, record
+                return
+            for line, text in enumerate(f, 1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except ValueError as e:
+                        yield line, e
+
+    def _parse(self, record) -> tuple:
+        if isinstance(record, Exception):
+            raise ValueError(f"некорректный JSON ({record})")
+        if not isinstance(record, dict):
+            raise ValueError("ожидается объект с полями start_time и end_time")
+        if self.user_id is not None:
+            user_id = self.user_id
+        elif record.get('user_id') in (None, ''):
+            raise ValueError("не указан user_id")
+        else:
+            user_id = int(record['user_id'])
+        start = self._parse_time(record.get('start_time'), 'start_time')
+        end = self._parse_time(record.get('end_time'), 'end_time')
+        if end <= start:
+            raise ValueError("end_time не позже start_time")
+        if end - start > MAX_SESSION_DURATION:
+            raise ValueError("сессия длиннее 24 часов")
+        if end > self.now:
+            raise ValueError("сессия заканчивается в будущем")
+        tag = record.get('tag')
+        return user_id, start, end, normalize_tag(str(tag)) if tag not in (None, '') else None
+
+    def _parse_time(self, value, field: str) -> datetime:
+        if not value:
+            raise ValueError(f"не указано {field}")
+        return as_utc(datetime.fromisoformat(str(value).strip().replace('Z', '+00:00')), self.timezone)
+
+
+def import_history(db: Storage, path: str, fmt: str = None, user_id: int = None,
+                   batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """Импорт файла: итог import_sessions плюс rows, invalid и errors
+
+    При импорте для одного пользователя время без часового пояса считается
+    временем его часового пояса.
+    """
+    timezone = None
+    if user_id is not None:
+        name = db.get_user_timezone(user_id)
+        timezone = ZoneInfo(name) if name else None
+    reader = SessionReader(path, fmt, user_id, timezone)
+    result = db.import_sessions(reader, batch_size)
+    result.update(rows=reader.rows, invalid=reader.invalid, errors=reader.errors)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file', help='файл CSV или JSON')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='формат файла (по умолчанию по расширению)')
+    parser.add_argument('--user', type=int, default=None, help='записать все сессии этому пользователю')
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH_SIZE, help='строк в одной порции COPY')
+    args = parser.parse_args()
+
+    db = create_database(maxconn=1)
+    try:
+        result = import_history(db, args.file, args.format, args.user, args.batch)
+        for error in result['errors']:
+            print(f"⚠️ {error}")
+        print(
+            f"✅ Строк в файле: {result['rows']}, с ошибками: {result['invalid']}, "
+            f"записано сессий: {result['imported']}, пользователей: {result['users']}"
+        )
+    except Exception as e:
+        print(f"❌ Ошибка импорта: {e}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
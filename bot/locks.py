@@ -0,0 +1,53 @@
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+
+
+class _UserLock:
+    __slots__ = ('lock', 'holders', 'actions')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Владелец и ожидающие: запись удаляется, когда их не осталось
+        self.holders = 0
+        # Действия владельца и ожидающих
+        self.actions = Counter()
+
+
+class UserLocks:
+    """Блокировки пользователей для действий, меняющих состояние
+
+    Нажатия одного пользователя выполняются по очереди, разных - параллельно.
+    Запись пользователя живет, пока блокировку держат или ждут, поэтому
+    словарь не растет с числом пользователей. pending() сообщает, что такое
+    же действие уже выполняется или ждет очереди: повторное нажатие можно
+    отбросить. Блокировки действуют в одном процессе; в режиме webhook все
+    обновления пользователя обрабатывает один процесс.
+    """
+
+    def __init__(self):
+        # user_id -> _UserLock
+        self._locks = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def pending(self, user_id: int, action: str) -> bool:
+        entry = self._locks.get(user_id)
+        return entry is not None and entry.actions[action] > 0
+
+    @asynccontextmanager
+    async def hold(self, user_id: int, action: str = None):
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = _UserLock()
+        entry.holders += 1
+        entry.actions[action] += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.holders -= 1
+            entry.actions[action] -= 1
+            if not entry.holders:
+                del self._locks[user_id]
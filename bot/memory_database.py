@@ -0,0 +1,472 @@
+"""
+Хранилище в памяти процесса (DB_ENGINE=memory)
+
+Те же методы и результаты, что у Database, без внешних сервисов: для
+тестов, бенчмарков и пробного запуска. Данные теряются при остановке
+бота. Все операции выполняются под одной блокировкой; недельная и месячная
+статистика и серии считаются при чтении из ежедневной. Время сессий
+хранится в UTC.
+"""
+
+import heapq
+import threading
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from itertools import groupby
+from zoneinfo import ZoneInfo
+from .database import (
+    EXPORT_DATASETS, DEFAULT_DAILY_GOAL_MINUTES, RECENT_TAGS_DAYS, LEADERBOARD_PERIODS, make_stats, make_day_stats,
+    import_row
+)
+from .stats import (
+    local_timezone, utc_now, as_utc, session_minutes, session_day_split, empty_insights, add_session_insights,
+    merge_intervals, streak_scan, current_streak, week_start, month_start, next_month
+)
+
+
+class MemoryDatabase:
+    def __init__(self, maxconn: int = None):
+        # Операции выполняются под одной блокировкой: больше потоков не нужно
+        self.maxconn = maxconn or 1
+        self.timezone = local_timezone()
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # session_id -> [user_id, start_time, end_time, duration_minutes, tag]
+        self._sessions = {}
+        # user_id -> session_id сессий пользователя
+        self._user_sessions = defaultdict(list)
+        # user_id -> session_id открытой сессии: у пользователя она одна
+        self._open = {}
+        # user_id -> {date: [total_minutes, session_count, версия изменения]}
+        self._daily = defaultdict(dict)
+        self._version = 0
+        # user_id -> {(date, tag): [total_minutes, session_count]}
+        self._tag_daily = defaultdict(dict)
+        # user_id -> (hour_minutes, length_counts)
+        self._insights = {}
+        self._goals = {}
+        # user_id -> часовой пояс, выбранный пользователем
+        self._timezones = {}
+        # user_id -> запомненный язык пользователя
+        self._languages = {}
+        self._birthdays = {}
+        self._job_runs = {}
+        # id -> (user_id, session_id, kind, due_at, minutes); куча (due_at, id) с ленивым удалением
+        self._deadlines = {}
+        self._deadline_heap = []
+        self._user_deadlines = defaultdict(set)
+        self._next_deadline_id = 0
+        # chat_id -> {user_id: имя} участников таблицы лидеров
+        self._members = defaultdict(dict)
+        # (chat_id, period) -> (period_start, [(user_id, name, total_minutes), ...]) - снимок
+        self._leaderboards = {}
+
+    def _goal(self, user_id: int) -> int:
+        return self._goals.get(user_id, DEFAULT_DAILY_GOAL_MINUTES)
+
+    def _zone(self, user_id: int) -> ZoneInfo:
+        name = self._timezones.get(user_id)
+        return ZoneInfo(name) if name else self.timezone
+
+    def _today(self, user_id: int) -> date:
+        return utc_now().astimezone(self._zone(user_id)).date()
+
+    def _day_stats(self, user_id: int, day: date) -> dict:
+        row = self._daily[user_id].get(day) if user_id in self._daily else None
+        return make_day_stats(day, self._goal(user_id), *(row[:2] if row else ()))
+
+    def _credit(self, user_id: int, start: datetime, end: datetime, tag: str = None):
+        """Зачисление закрытой сессии в ежедневную статистику, статистику по тегам и /insights"""
+        tz = self._zone(user_id)
+        days = self._daily[user_id]
+        for day, minutes, started in session_day_split(start, end, tz):
+            self._version += 1
+            row = days.setdefault(day, [0, 0, 0])
+            row[0] += minutes
+            row[1] += started
+            row[2] = self._version
+            if tag is not None:
+                tag_row = self._tag_daily[user_id].setdefault((day, tag), [0, 0])
+                tag_row[0] += minutes
+                tag_row[1] += started
+        if user_id not in self._insights:
+            self._insights[user_id] = empty_insights()
+        add_session_insights(*self._insights[user_id], start, end, tz)
+
+    def _close(self, session_id: int, end: datetime):
+        session = self._sessions[session_id]
+        session[2] = end
+        session[3] = session_minutes(session[1], end)
+        self._open.pop(session[0], None)
+        self._credit(session[0], session[1], end, session[4])
+        self._replace_deadlines(session[0], None, ())
+
+    def _replace_deadlines(self, user_id: int, session_id: int, deadlines):
+        for deadline_id in self._user_deadlines.pop(user_id, ()):
+            del self._deadlines[deadline_id]
+        for kind, due_at, minutes in deadlines:
+            self._next_deadline_id += 1
+            self._deadlines[self._next_deadline_id] = (user_id, session_id, kind, due_at, minutes)
+            self._user_deadlines[user_id].add(self._next_deadline_id)
+            heapq.heappush(self._deadline_heap, (due_at, self._next_deadline_id))
+
+    def ping(self) -> bool:
+        return True
+
+    def set_user_birthday(self, user_id: int, birthday: date) -> bool:
+        with self._lock:
+            self._birthdays[user_id] = birthday
+            return True
+
+    def get_user_birthday(self, user_id: int) -> date:
+        return self._birthdays.get(user_id)
+
+    def start_session(self, user_id: int, deadlines: list = (), tag: str = None) -> int:
+        with self._lock:
+            if user_id in self._open:
+                return self._open[user_id]
+            self._next_id += 1
+            start = utc_now()
+            self._sessions[self._next_id] = [user_id, start, None, None, tag]
+            self._user_sessions[user_id].append(self._next_id)
+            self._open[user_id] = self._next_id
+            self._replace_deadlines(user_id, self._next_id, [
+                (kind, start + delay, minutes) for kind, delay, minutes in deadlines
+            ])
+            return self._next_id
+
+    def end_session(self, session_id: int, end_time: datetime = None) -> dict:
+        with self._lock:
+            end = end_time or utc_now()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return make_day_stats(end.astimezone(self.timezone).date(), DEFAULT_DAILY_GOAL_MINUTES)
+            if session[2] is None:
+                end = max(end, session[1])
+                self._close(session_id, end)
+            return self._day_stats(session[0], end.astimezone(self._zone(session[0])).date())
+
+    def get_today_stats(self, user_id: int, day: date = None) -> dict:
+        with self._lock:
+            return self._day_stats(user_id, day or self._today(user_id))
+
+    def get_week_stats(self, user_id: int, day: date = None) -> dict:
+        start = week_start(day or self._today(user_id))
+        return self._period_stats(user_id, start, start + timedelta(days=7))
+
+    def get_month_stats(self, user_id: int, day: date = None) -> dict:
+        start = month_start(day or self._today(user_id))
+        return self._period_stats(user_id, start, next_month(start))
+
+    def _period_stats(self, user_id: int, start: date, end: date) -> dict:
+        with self._lock:
+            days = self._daily.get(user_id, {})
+            rows = [days[day] for day in (start + timedelta(days=offset) for offset in range((end - start).days))
+                    if day in days]
+            stats = make_stats(sum(row[0] for row in rows), sum(row[1] for row in rows))
+            stats['start'] = start
+            stats['days_with_work'] = sum(1 for row in rows if row[0] > 0)
+            return stats
+
+    def get_daily_goal(self, user_id: int) -> int:
+        return self._goal(user_id)
+
+    def set_daily_goal(self, user_id: int, minutes: int) -> bool:
+        with self._lock:
+            self._goals[user_id] = minutes
+            return True
+
+    def get_user_timezone(self, user_id: int) -> str:
+        return self._timezones.get(user_id, self.timezone.key)
+
+    def set_user_timezone(self, user_id: int, timezone: str) -> bool:
+        """Установка часового пояса и пересчет статистики пользователя в нем"""
+        try:
+            ZoneInfo(timezone)
+        except (ValueError, KeyError) as e:
+            print(f"Ошибка установки часового пояса: {e}")
+            return False
+        with self._lock:
+            self._timezones[user_id] = timezone
+            self._rebuild(user_id)
+            return True
+
+    def get_user_language(self, user_id: int) -> str:
+        return self._languages.get(user_id)
+
+    def set_user_language(self, user_id: int, language: str) -> bool:
+        with self._lock:
+            self._languages[user_id] = language
+            return True
+
+    def get_timezones(self) -> list:
+        with self._lock:
+            return sorted(set(self._timezones.values()))
+
+    def get_streak(self, user_id: int, today: date = None) -> dict:
+        with self._lock:
+            goal = self._goal(user_id)
+            days = self._daily.get(user_id, {})
+            streak = streak_scan(((day, days[day][0]) for day in sorted(days)), goal)
+            return {
+                'current_streak': current_streak(streak, today or self._today(user_id)),
+                'longest_streak': streak['longest_streak'],
+                'goal_days': streak['goal_days'],
+                'active_days': streak['active_days'],
+                'goal_minutes': goal,
+            }
+
+    def get_chart_data(self, user_id: int, start: date, end: date) -> dict:
+        with self._lock:
+            rows = [(day, row[0], row[2]) for day, row in self._daily.get(user_id, {}).items()
+                    if start <= day <= end]
+            goal = self._goal(user_id)
+            return {
+                'days': {day: minutes for day, minutes, _ in rows},
+                'goal': goal,
+                'version': (start, end, goal, len(rows), max((row[2] for row in rows), default=None)),
+            }
+
+    def get_insights(self, user_id: int) -> dict:
+        with self._lock:
+            hour_minutes, length_counts = self._insights.get(user_id) or empty_insights()
+            return {'hour_minutes': list(hour_minutes), 'length_counts': list(length_counts)}
+
+    def get_tag_stats(self, user_id: int, start: date, end: date) -> dict:
+        with self._lock:
+            rows = [row for day, row in self._daily.get(user_id, {}).items() if start <= day <= end]
+            stats = make_stats(sum(row[0] for row in rows), sum(row[1] for row in rows))
+            tags = defaultdict(lambda: [0, 0])
+            for (day, tag), row in self._tag_daily.get(user_id, {}).items():
+                if start <= day <= end:
+                    tags[tag][0] += row[0]
+                    tags[tag][1] += row[1]
+            stats['tags'] = sorted(((tag, *row) for tag, row in tags.items()), key=lambda item: (-item[1], item[0]))
+            return stats
+
+    def get_recent_tags(self, user_id: int, limit: int) -> list:
+        with self._lock:
+            since = self._today(user_id) - timedelta(days=RECENT_TAGS_DAYS)
+            tags = {}
+            for (day, tag), row in self._tag_daily.get(user_id, {}).items():
+                if day >= since:
+                    last, minutes = tags.get(tag, (day, 0))
+                    tags[tag] = (max(last, day), minutes + row[0])
+            return sorted(tags, key=lambda tag: (-tags[tag][0].toordinal(), -tags[tag][1], tag))[:limit]
+
+    def add_group_member(self, chat_id: int, user_id: int, name: str) -> bool:
+        with self._lock:
+            self._members[chat_id][user_id] = name
+            return True
+
+    def remove_group_member(self, chat_id: int, user_id: int) -> bool:
+        with self._lock:
+            self._members.get(chat_id, {}).pop(user_id, None)
+            for period in LEADERBOARD_PERIODS:
+                if (chat_id, period) in self._leaderboards:
+                    period_start, rows = self._leaderboards[chat_id, period]
+                    self._leaderboards[chat_id, period] = (period_start, [row for row in rows if row[0] != user_id])
+            return True
+
+    def get_leaderboard(self, chat_id: int, period: str, period_start: date) -> list:
+        with self._lock:
+            snapshot_start, rows = self._leaderboards.get((chat_id, period), (None, []))
+            return list(rows) if snapshot_start == period_start else []
+
+    def refresh_leaderboards(self, day: date, after_chat_id: int, limit: int, size: int) -> int:
+        """Снимок таблиц лидеров следующих limit чатов, как у Database.refresh_leaderboards"""
+        with self._lock:
+            chunk = sorted(chat_id for chat_id, members in self._members.items()
+                           if chat_id > after_chat_id and members)[:limit]
+            if not chunk:
+                return None
+            for key in [key for key in self._leaderboards if after_chat_id < key[0] <= chunk[-1]]:
+                del self._leaderboards[key]
+            for chat_id in chunk:
+                for period, start in zip(LEADERBOARD_PERIODS, (day, week_start(day))):
+                    rows = []
+                    for user_id, name in self._members[chat_id].items():
+                        days = self._daily.get(user_id, {})
+                        minutes = sum(row[0] for stats_day, row in days.items() if start <= stats_day <= day)
+                        if minutes > 0:
+                            rows.append((user_id, name, minutes))
+                    rows.sort(key=lambda row: (-row[2], row[0]))
+                    self._leaderboards[chat_id, period] = (start, rows[:size])
+            return chunk[-1]
+
+    def _in_timezone(self, user_id: int, timezone: str) -> bool:
+        return timezone is None or self._timezones.get(user_id, self.timezone.key) == timezone
+
+    def get_daily_report_page(self, day: date, after_user_id: int, limit: int, timezone: str = None) -> list:
+        with self._lock:
+            rows = [
+                (user_id, days[day][0], days[day][1], self._goal(user_id), self._languages.get(user_id))
+                for user_id, days in self._daily.items()
+                if user_id > after_user_id and day in days and days[day][0] > 0
+                and self._in_timezone(user_id, timezone)
+            ]
+            return sorted(rows)[:limit]
+
+    def get_birthday_page(self, after_user_id: int, limit: int, timezone: str = None) -> list:
+        with self._lock:
+            return sorted(
+                (user_id, birthday, self._languages.get(user_id)) for user_id, birthday in self._birthdays.items()
+                if user_id > after_user_id and self._in_timezone(user_id, timezone)
+            )[:limit]
+
+    def get_active_session(self, user_id: int) -> int:
+        with self._lock:
+            return self._open.get(user_id)
+
+    def get_open_sessions(self, shard: tuple = None) -> list:
+        with self._lock:
+            return sorted(item for item in self._open.items() if shard is None or item[0] % shard[1] == shard[0])
+
+    def close_stale_sessions(self, max_age_minutes: int, shard: tuple = None) -> list:
+        with self._lock:
+            max_age = timedelta(minutes=max_age_minutes)
+            cutoff = utc_now() - max_age
+            users = set()
+            for session_id in [session_id for user_id, session_id in self._open.items()
+                               if self._sessions[session_id][1] < cutoff
+                               and (shard is None or user_id % shard[1] == shard[0])]:
+                start = self._sessions[session_id][1]
+                self._close(session_id, start + max_age)
+                users.add(self._sessions[session_id][0])
+            return sorted(users)
+
+    def set_deadlines(self, user_id: int, deadlines: list) -> bool:
+        with self._lock:
+            self._replace_deadlines(user_id, self._open.get(user_id), deadlines)
+            return True
+
+    def claim_deadlines(self, now: datetime, limit: int, shard: tuple = None) -> list:
+        with self._lock:
+            claimed, skipped = [], []
+            while self._deadline_heap and self._deadline_heap[0][0] <= now and len(claimed) < limit:
+                item = heapq.heappop(self._deadline_heap)
+                deadline = self._deadlines.get(item[1])
+                if deadline is None:
+                    continue
+                if shard is not None and deadline[0] % shard[1] != shard[0]:
+                    skipped.append(item)
+                    continue
+                del self._deadlines[item[1]]
+                user_deadlines = self._user_deadlines[deadline[0]]
+                user_deadlines.discard(item[1])
+                if not user_deadlines:
+                    del self._user_deadlines[deadline[0]]
+                claimed.append(deadline)
+            for item in skipped:
+                heapq.heappush(self._deadline_heap, item)
+            return claimed
+
+    def next_deadline(self, shard: tuple = None) -> datetime:
+        with self._lock:
+            if shard is not None:
+                return min((deadline[3] for deadline in self._deadlines.values()
+                            if deadline[0] % shard[1] == shard[0]), default=None)
+            while self._deadline_heap and self._deadline_heap[0][1] not in self._deadlines:
+                heapq.heappop(self._deadline_heap)
+            return self._deadline_heap[0][0] if self._deadline_heap else None
+
+    def rebuild_daily_stats(self, after_user_id: int, limit: int) -> int:
+        """Пересчет ежедневной статистики и /insights следующих limit пользователей из сессий"""
+        with self._lock:
+            chunk = sorted(user_id for user_id in self._user_sessions if user_id > after_user_id)[:limit]
+            if not chunk:
+                return None
+            last_user_id = chunk[-1]
+            for user_id in [user_id for user_id in self._daily if after_user_id < user_id <= last_user_id]:
+                del self._daily[user_id]
+            for user_id in [user_id for user_id in self._insights if after_user_id < user_id <= last_user_id]:
+                del self._insights[user_id]
+            for user_id in [user_id for user_id in self._tag_daily if after_user_id < user_id <= last_user_id]:
+                del self._tag_daily[user_id]
+            for user_id in chunk:
+                self._rebuild(user_id)
+            return last_user_id
+
+    def _rebuild(self, user_id: int):
+        """Ежедневная статистика, статистика по тегам и /insights пользователя
+        заново из закрытых сессий"""
+        self._daily.pop(user_id, None)
+        self._tag_daily.pop(user_id, None)
+        self._insights.pop(user_id, None)
+        for session_id in self._user_sessions.get(user_id, ()):
+            _, start, end, _, tag = self._sessions[session_id]
+            if end is not None:
+                self._credit(user_id, start, end, tag)
+
+    def refresh_rollups(self, after_user_id: int, limit: int) -> int:
+        """Недельная статистика и серии считаются при чтении: только порядок порций"""
+        with self._lock:
+            chunk = sorted(user_id for user_id in self._daily if user_id > after_user_id)[:limit]
+            return chunk[-1] if chunk else None
+
+    def ensure_session_partitions(self, months_ahead: int) -> int:
+        """Секций нет: создавать нечего"""
+        return 0
+
+    def iter_export_rows(self, dataset: str, user_id: int = None, chunk_size: int = 5000):
+        """Строки набора EXPORT_DATASETS порциями по chunk_size"""
+        if dataset not in EXPORT_DATASETS:
+            raise KeyError(dataset)
+        with self._lock:
+            if dataset == 'sessions':
+                rows = sorted(
+                    ((session_id, *session[:5]) for session_id, session in self._sessions.items()
+                     if user_id is None or session[0] == user_id),
+                    key=lambda row: (row[1], row[2])
+                )
+            else:
+                rows = sorted(
+                    (owner, day, row[0], row[1]) for owner, days in self._daily.items()
+                    if user_id is None or owner == user_id for day, row in days.items()
+                )
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    def import_sessions(self, rows, batch_size: int = 50000) -> dict:
+        """Загрузка закрытых сессий: rows - итератор (user_id, start_time, end_time[, tag]),
+        время без часового пояса считается временем бота
+
+        Пересекающиеся интервалы объединяются, интервалы, пересекающиеся с
+        уже записанными сессиями, отбрасываются. batch_size не используется.
+        """
+        staged = sorted(
+            ((user_id, as_utc(start, self.timezone), as_utc(end, self.timezone), tag)
+             for user_id, start, end, tag in map(import_row, rows)),
+            key=lambda row: row[:3]
+        )
+        with self._lock:
+            now = utc_now()
+            imported = 0
+            users = 0
+            for user_id, group in groupby(staged, key=lambda row: row[0]):
+                existing = [self._sessions[session_id] for session_id in self._user_sessions.get(user_id, ())]
+                credited = False
+                for start, end, tag in merge_intervals(row[1:] for row in group):
+                    if any(s[1] < end and (s[2] or now) > start for s in existing):
+                        continue
+                    self._next_id += 1
+                    self._sessions[self._next_id] = [user_id, start, end, session_minutes(start, end), tag]
+                    self._user_sessions[user_id].append(self._next_id)
+                    self._credit(user_id, start, end, tag)
+                    imported += 1
+                    credited = True
+                users += credited
+            return {'loaded': len(staged), 'imported': imported, 'users': users}
+
+    def get_job_runs(self) -> dict:
+        with self._lock:
+            return dict(self._job_runs)
+
+    def set_job_run(self, name: str, run_at: datetime) -> bool:
+        with self._lock:
+            previous = self._job_runs.get(name)
+            self._job_runs[name] = run_at if previous is None else max(previous, run_at)
+            return True
+
+    def close(self):
+        pass
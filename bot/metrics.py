@@ -0,0 +1,179 @@
+import time
+from bisect import bisect_left
+
+# Границы корзин гистограмм задержки, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Метрика в формате Prometheus
+
+    Метрики обновляются только из цикла событий, поэтому обходятся без
+    блокировок: запись - это поиск по словарю и сложение.
+    """
+
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        """Строки значений: (суффикс, значения меток, доп. метка, значение)"""
+        return []
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        for suffix, labels, extra, value in self.samples():
+            lines.append(
+                f'{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}'
+            )
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        return [('_total', labels, '', value) for labels, value in self._values.items()]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счетчики по корзинам (последняя - +Inf), сумма]
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, *labels):
+        """Контекстный менеджер, измеряющий время выполнения блока"""
+        return _Timer(self, labels)
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        result = []
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                result.append(('_bucket', labels, f'le="{_format_value(bound)}"', cumulative))
+            result.append(('_sum', labels, '', total))
+            result.append(('_count', labels, '', cumulative))
+        return result
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class CallbackMetric(Metric):
+    """Метрика, значения которой читаются при выдаче: func() -> {labels: value}
+
+    Подходит для счетчиков, которые уже ведутся в других объектах (кеш,
+    рассылка), - на горячем пути ничего не добавляется.
+    """
+
+    def __init__(self, name: str, help: str, type: str, func, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self.func = func
+
+    def samples(self):
+        suffix = '_total' if self.type == 'counter' else ''
+        return [(suffix, labels, '', value) for labels, value in self.func().items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, type: str, func, labelnames: tuple = ()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, type, func, labelnames))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+# Метрики процесса бота
+REGISTRY = Registry()
+
+UPDATES = REGISTRY.counter('bot_updates', 'Обработанные обновления Telegram', ('type',))
+UPDATE_ERRORS = REGISTRY.counter('bot_update_errors', 'Обновления, завершившиеся ошибкой', ('type',))
+UPDATE_LATENCY = REGISTRY.histogram(
+    'bot_update_duration_seconds', 'Время обработки обновления', ('type',)
+)
+CALLBACK_LATENCY = REGISTRY.histogram(
+    'bot_callback_duration_seconds', 'Время обработки нажатия кнопки', ('action',)
+)
+DB_LATENCY = REGISTRY.histogram(
+    'bot_db_query_duration_seconds', 'Время выполнения метода Database', ('method',)
+)
+DB_WAIT = REGISTRY.histogram(
+    'bot_db_wait_seconds', 'Ожидание свободного потока пула подключений', ('method',)
+)
+JOB_DURATION = REGISTRY.histogram(
+    'bot_job_duration_seconds', 'Время выполнения задачи планировщика', ('job',),
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+)
+JOB_FAILURES = REGISTRY.counter('bot_job_failures', 'Задачи планировщика, завершившиеся ошибкой', ('job',))
+SKIPPED_UPDATES = REGISTRY.counter(
+    'bot_skipped_updates', 'Пропущенные повторные обновления, нажатия и правки сообщений', ('reason',)
+)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Версионные миграции схемы базы данных
+
+Миграции - файлы bot/migrations/NNNN_описание.sql, применяются по
+возрастанию номера, каждая в своей транзакции. Примененные версии хранятся
+в таблице schema_migrations. Одновременный запуск из нескольких процессов
+безопасен: миграции выполняются под advisory-блокировкой.
+
+Запуск: python -m bot.migrate [--list]
+"""
+
+import argparse
+import os
+import re
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> list:
+    """Миграции из каталога: список (версия, имя, путь) по возрастанию версии"""
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Две миграции с номером {version}: {migrations[version][1]}, {filename}")
+        migrations[version] = (version, filename, os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def applied_versions(conn) -> set:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return set()
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn, directory: str = MIGRATIONS_DIR) -> list:
+    """Применение недостающих миграций, возвращает имена примененных файлов"""
+    applied = []
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(hashtext('schema_migrations'))")
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            conn.commit()
+            done = applied_versions(conn)
+            for version, name, path in load_migrations(directory):
+                if version in done:
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    cursor.execute(f.read())
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name)
+                )
+                conn.commit()
+                applied.append(name)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(hashtext('schema_migrations'))")
+            conn.commit()
+    return applied
+
+
+def main():
+    from .database import Database
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--list', action='store_true', help='только показать состояние миграций')
+    args = parser.parse_args()
+
+    # Database применяет миграции при создании, если не указано иное
+    db = Database(maxconn=1, migrate=not args.list)
+    try:
+        with db.connection() as conn:
+            done = applied_versions(conn)
+        for version, name, _ in load_migrations():
+            print(f"{'✅' if version in done else '⏳'} {name}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+-- Базовая схема Time Tracker Bot
+-- Совместима с базами, созданными прежними create_tables() и init.sql:
+-- недостающие столбцы и триггеры добавляются, представления заменяются таблицами.
+
+CREATE TABLE IF NOT EXISTS user_birthday (
+    user_id BIGINT PRIMARY KEY,
+    birthday DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE user_birthday ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS deepwork_sessions (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP,
+    duration_minutes INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE deepwork_sessions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    date DATE NOT NULL,
+    total_minutes INTEGER DEFAULT 0,
+    session_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, date)
+);
+ALTER TABLE daily_stats ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Время последнего запуска задач планировщика
+CREATE TABLE IF NOT EXISTS scheduler_jobs (
+    name TEXT PRIMARY KEY,
+    last_run_at TIMESTAMPTZ NOT NULL
+);
+
+-- Недельная и месячная статистика, обновляемая при закрытии сессий
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_views WHERE schemaname = current_schema() AND viewname = 'weekly_stats') THEN
+        DROP VIEW weekly_stats;
+    END IF;
+    IF EXISTS (SELECT 1 FROM pg_views WHERE schemaname = current_schema() AND viewname = 'monthly_stats') THEN
+        DROP VIEW monthly_stats;
+    END IF;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS weekly_stats (
+    user_id BIGINT NOT NULL,
+    week_start DATE NOT NULL,
+    total_minutes INTEGER NOT NULL DEFAULT 0,
+    total_sessions INTEGER NOT NULL DEFAULT 0,
+    days_with_work INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, week_start)
+);
+
+CREATE TABLE IF NOT EXISTS monthly_stats (
+    user_id BIGINT NOT NULL,
+    month_start DATE NOT NULL,
+    total_minutes INTEGER NOT NULL DEFAULT 0,
+    total_sessions INTEGER NOT NULL DEFAULT 0,
+    days_with_work INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month_start)
+);
+
+-- Настройки пользователя и серия дней с достигнутой целью
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id BIGINT PRIMARY KEY,
+    daily_goal_minutes INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_streaks (
+    user_id BIGINT PRIMARY KEY,
+    current_streak INTEGER NOT NULL DEFAULT 0,
+    longest_streak INTEGER NOT NULL DEFAULT 0,
+    last_goal_day DATE,
+    goal_days INTEGER NOT NULL DEFAULT 0,
+    active_days INTEGER NOT NULL DEFAULT 0
+);
+
+-- Индекс для выборки всех пользователей за день (рассылка отчетов)
+CREATE INDEX IF NOT EXISTS idx_daily_stats_date_user ON daily_stats(date, user_id);
+-- Покрывается уникальным индексом (user_id, date) и индексом (date, user_id)
+DROP INDEX IF EXISTS idx_daily_stats_user_id;
+DROP INDEX IF EXISTS idx_daily_stats_date;
+
+-- Обновление updated_at при изменении строки
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_user_birthday_updated_at ON user_birthday;
+CREATE TRIGGER update_user_birthday_updated_at
+    BEFORE UPDATE ON user_birthday
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_deepwork_sessions_updated_at ON deepwork_sessions;
+CREATE TRIGGER update_deepwork_sessions_updated_at
+    BEFORE UPDATE ON deepwork_sessions
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+DROP TRIGGER IF EXISTS update_daily_stats_updated_at ON daily_stats;
+CREATE TRIGGER update_daily_stats_updated_at
+    BEFORE UPDATE ON daily_stats
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Разбиение сессии по календарным дням: минуты и признак дня начала сессии.
+-- Минуты считаются как разность целых минут от начала сессии до границ дня,
+-- поэтому сумма по дням всегда равна длительности сессии.
+CREATE OR REPLACE FUNCTION session_day_split(p_start TIMESTAMP, p_end TIMESTAMP)
+RETURNS TABLE (day DATE, minutes INTEGER, started INTEGER) AS $$
+    SELECT
+        d::date,
+        (FLOOR(EXTRACT(EPOCH FROM (LEAST(p_end, d + INTERVAL '1 day') - p_start)) / 60)
+         - FLOOR(EXTRACT(EPOCH FROM (GREATEST(p_start, d) - p_start)) / 60))::integer,
+        (d::date = p_start::date)::integer
+    FROM generate_series(p_start::date, p_end::date, INTERVAL '1 day') AS d
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Цель пользователя в минутах (по умолчанию DEFAULT_DAILY_GOAL_MINUTES)
+CREATE OR REPLACE FUNCTION daily_goal(p_user_id BIGINT)
+RETURNS INTEGER AS $$
+    SELECT COALESCE(
+        (SELECT daily_goal_minutes FROM user_settings WHERE user_id = p_user_id),
+        240
+    )
+$$ LANGUAGE sql STABLE;
+
+-- Серии дней с достигнутой целью полным просмотром daily_stats диапазона
+-- пользователей. Серия - подряд идущие календарные дни с целью; текущей
+-- считается серия, закончившаяся в last_goal_day.
+CREATE OR REPLACE FUNCTION streak_scan(p_first BIGINT, p_last BIGINT)
+RETURNS TABLE (
+    user_id BIGINT, current_streak INTEGER, longest_streak INTEGER,
+    last_goal_day DATE, goal_days INTEGER, active_days INTEGER
+) AS $$
+    WITH days AS (
+        SELECT user_id, date, total_minutes, total_minutes >= daily_goal(user_id) AS hit
+        FROM daily_stats
+        WHERE user_id BETWEEN p_first AND p_last
+    ), islands AS (
+        SELECT user_id, MAX(date) AS last_day, COUNT(*)::integer AS length
+        FROM (
+            SELECT user_id, date,
+                   date - (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY date))::integer AS grp
+            FROM days
+            WHERE hit
+        ) runs
+        GROUP BY user_id, grp
+    ), totals AS (
+        SELECT user_id,
+               COUNT(*) FILTER (WHERE hit)::integer AS goal_days,
+               COUNT(*) FILTER (WHERE total_minutes > 0)::integer AS active_days
+        FROM days
+        GROUP BY user_id
+    )
+    SELECT t.user_id, COALESCE(c.length, 0), COALESCE(l.longest, 0), c.last_day,
+           t.goal_days, t.active_days
+    FROM totals t
+    LEFT JOIN (
+        SELECT DISTINCT ON (user_id) user_id, length, last_day
+        FROM islands
+        ORDER BY user_id, last_day DESC
+    ) c ON c.user_id = t.user_id
+    LEFT JOIN (
+        SELECT user_id, MAX(length) AS longest FROM islands GROUP BY user_id
+    ) l ON l.user_id = t.user_id
+$$ LANGUAGE sql STABLE;
+
+-- Зачисление закрытой сессии в ежедневную, недельную и месячную статистику
+-- и в серию дней с целью. Сессия через полночь распределяется по дням, а сама
+-- сессия засчитывается дню начала. Серия обновляется без просмотра истории;
+-- только если цель достигнута в день раньше последнего дня с целью (поздно
+-- закрытая сессия), серия пересчитывается полностью. Пересчет статистики
+-- берет ту же блокировку монопольно, поэтому не пересекается с зачислением.
+-- Возвращает ежедневную статистику затронутых дней.
+CREATE OR REPLACE FUNCTION credit_session(p_user_id BIGINT, p_start TIMESTAMP, p_end TIMESTAMP)
+RETURNS TABLE (day DATE, total_minutes INTEGER, session_count INTEGER) AS $$
+#variable_conflict use_column
+DECLARE
+    r RECORD;
+    v_total INTEGER;
+    v_count INTEGER;
+    v_new_day INTEGER;
+    v_goal INTEGER;
+    v_goal_hit BOOLEAN;
+    v_rescan BOOLEAN := FALSE;
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(hashtext('daily_stats'));
+    v_goal := daily_goal(p_user_id);
+
+    FOR r IN SELECT * FROM session_day_split(p_start, p_end) LOOP
+        INSERT INTO daily_stats AS d (user_id, date, total_minutes, session_count)
+        VALUES (p_user_id, r.day, r.minutes, r.started)
+        ON CONFLICT (user_id, date)
+        DO UPDATE SET
+            total_minutes = d.total_minutes + EXCLUDED.total_minutes,
+            session_count = d.session_count + EXCLUDED.session_count
+        RETURNING d.total_minutes, d.session_count INTO v_total, v_count;
+
+        -- День впервые получил минуты дипворка
+        v_new_day := (v_total > 0 AND v_total = r.minutes)::integer;
+
+        INSERT INTO weekly_stats AS w (user_id, week_start, total_minutes, total_sessions, days_with_work)
+        VALUES (p_user_id, DATE_TRUNC('week', r.day)::date, r.minutes, r.started, v_new_day)
+        ON CONFLICT (user_id, week_start)
+        DO UPDATE SET
+            total_minutes = w.total_minutes + EXCLUDED.total_minutes,
+            total_sessions = w.total_sessions + EXCLUDED.total_sessions,
+            days_with_work = w.days_with_work + EXCLUDED.days_with_work;
+
+        INSERT INTO monthly_stats AS m (user_id, month_start, total_minutes, total_sessions, days_with_work)
+        VALUES (p_user_id, DATE_TRUNC('month', r.day)::date, r.minutes, r.started, v_new_day)
+        ON CONFLICT (user_id, month_start)
+        DO UPDATE SET
+            total_minutes = m.total_minutes + EXCLUDED.total_minutes,
+            total_sessions = m.total_sessions + EXCLUDED.total_sessions,
+            days_with_work = m.days_with_work + EXCLUDED.days_with_work;
+
+        -- Цель достигнута именно этой сессией
+        v_goal_hit := v_total >= v_goal AND v_total - r.minutes < v_goal;
+
+        IF v_goal_hit AND EXISTS (
+            SELECT 1 FROM user_streaks s WHERE s.user_id = p_user_id AND s.last_goal_day > r.day
+        ) THEN
+            v_rescan := TRUE;
+        ELSIF v_goal_hit OR v_new_day = 1 THEN
+            INSERT INTO user_streaks AS s
+                (user_id, current_streak, longest_streak, last_goal_day, goal_days, active_days)
+            VALUES (
+                p_user_id, v_goal_hit::integer, v_goal_hit::integer,
+                CASE WHEN v_goal_hit THEN r.day END, v_goal_hit::integer, v_new_day
+            )
+            ON CONFLICT (user_id)
+            DO UPDATE SET
+                current_streak = CASE
+                    WHEN NOT v_goal_hit THEN s.current_streak
+                    WHEN s.last_goal_day = r.day - 1 THEN s.current_streak + 1
+                    ELSE 1
+                END,
+                longest_streak = GREATEST(s.longest_streak, CASE
+                    WHEN NOT v_goal_hit THEN s.current_streak
+                    WHEN s.last_goal_day = r.day - 1 THEN s.current_streak + 1
+                    ELSE 1
+                END),
+                last_goal_day = CASE WHEN v_goal_hit THEN r.day ELSE s.last_goal_day END,
+                goal_days = s.goal_days + v_goal_hit::integer,
+                active_days = s.active_days + v_new_day;
+        END IF;
+
+        day := r.day;
+        total_minutes := v_total;
+        session_count := v_count;
+        RETURN NEXT;
+    END LOOP;
+
+    IF v_rescan THEN
+        DELETE FROM user_streaks s WHERE s.user_id = p_user_id;
+        INSERT INTO user_streaks SELECT * FROM streak_scan(p_user_id, p_user_id);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Закрытие сессии и обновление статистики за один запрос.
+-- Время берется на сервере базы данных, день - по часовому поясу подключения.
+-- Возвращает статистику за день окончания сессии; для уже закрытой сессии
+-- ничего не меняет и возвращает текущую статистику за сегодня.
+CREATE OR REPLACE FUNCTION close_session(p_session_id INTEGER)
+RETURNS TABLE (total_minutes INTEGER, session_count INTEGER) AS $$
+#variable_conflict use_column
+DECLARE
+    v_user_id BIGINT;
+    v_start TIMESTAMP;
+    v_end TIMESTAMP := LOCALTIMESTAMP;
+BEGIN
+    UPDATE deepwork_sessions
+    SET end_time = v_end,
+        duration_minutes = FLOOR(EXTRACT(EPOCH FROM (v_end - start_time)) / 60)
+    WHERE id = p_session_id AND end_time IS NULL
+    RETURNING user_id, start_time INTO v_user_id, v_start;
+
+    IF NOT FOUND THEN
+        RETURN QUERY
+        SELECT d.total_minutes, d.session_count
+        FROM daily_stats d
+        JOIN deepwork_sessions s ON s.user_id = d.user_id
+        WHERE s.id = p_session_id AND d.date = CURRENT_DATE;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT c.total_minutes, c.session_count
+    FROM credit_session(v_user_id, v_start, v_end) c
+    WHERE c.day = v_end::date;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,87 @@
+-- Секционирование deepwork_sessions по месяцам start_time и индексы под
+-- горячие запросы. Существующие сессии переносятся в секции, идентификаторы
+-- и последовательность сохраняются.
+
+ALTER TABLE deepwork_sessions RENAME TO deepwork_sessions_unpartitioned;
+ALTER INDEX deepwork_sessions_pkey RENAME TO deepwork_sessions_unpartitioned_pkey;
+DROP INDEX IF EXISTS idx_deepwork_sessions_user_id;
+DROP INDEX IF EXISTS idx_deepwork_sessions_start_time;
+DROP INDEX IF EXISTS idx_deepwork_sessions_end_time;
+ALTER SEQUENCE deepwork_sessions_id_seq OWNED BY NONE;
+
+-- Первичный ключ секционированной таблицы обязан включать ключ секционирования
+CREATE TABLE deepwork_sessions (
+    id INTEGER NOT NULL DEFAULT nextval('deepwork_sessions_id_seq'),
+    user_id BIGINT NOT NULL,
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP,
+    duration_minutes INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, start_time)
+) PARTITION BY RANGE (start_time);
+ALTER SEQUENCE deepwork_sessions_id_seq OWNED BY deepwork_sessions.id;
+
+-- Сессии вне созданных секций (если обслуживание секций отстало)
+CREATE TABLE deepwork_sessions_default PARTITION OF deepwork_sessions DEFAULT;
+
+-- История пользователя по времени (пересчет статистики, выгрузка)
+CREATE INDEX idx_deepwork_sessions_user_start ON deepwork_sessions (user_id, start_time);
+-- Открытые сессии: активная сессия пользователя, загрузка при запуске, сверка
+CREATE INDEX idx_deepwork_sessions_open ON deepwork_sessions (user_id, start_time DESC)
+    WHERE end_time IS NULL;
+-- Закрытие открытой сессии по идентификатору без знания секции
+CREATE INDEX idx_deepwork_sessions_open_id ON deepwork_sessions (id)
+    WHERE end_time IS NULL;
+
+CREATE TRIGGER update_deepwork_sessions_updated_at
+    BEFORE UPDATE ON deepwork_sessions
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Создание месячных секций, покрывающих дни с p_from по p_to. Сессии этих
+-- месяцев, попавшие в секцию по умолчанию, переносятся в новую секцию.
+-- Возвращает число созданных секций.
+CREATE OR REPLACE FUNCTION ensure_session_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE := DATE_TRUNC('month', p_from)::date;
+    v_next DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    WHILE v_month <= p_to LOOP
+        v_next := (v_month + INTERVAL '1 month')::date;
+        v_name := 'deepwork_sessions_' || TO_CHAR(v_month, 'YYYY_MM');
+        IF to_regclass(v_name) IS NULL THEN
+            CREATE TEMP TABLE moved_sessions (LIKE deepwork_sessions);
+            WITH moved AS (
+                DELETE FROM deepwork_sessions_default
+                WHERE start_time >= v_month AND start_time < v_next
+                RETURNING *
+            )
+            INSERT INTO moved_sessions SELECT * FROM moved;
+
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF deepwork_sessions FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_month, v_next
+            );
+            INSERT INTO deepwork_sessions SELECT * FROM moved_sessions;
+            DROP TABLE moved_sessions;
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_next;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_session_partitions(
+    COALESCE((SELECT MIN(start_time)::date FROM deepwork_sessions_unpartitioned), CURRENT_DATE),
+    (CURRENT_DATE + INTERVAL '3 months')::date
+);
+
+INSERT INTO deepwork_sessions (id, user_id, start_time, end_time, duration_minutes, created_at, updated_at)
+SELECT id, user_id, start_time, end_time, duration_minutes, created_at, updated_at
+FROM deepwork_sessions_unpartitioned;
+
+DROP TABLE deepwork_sessions_unpartitioned;
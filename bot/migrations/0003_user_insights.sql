@@ -0,0 +1,198 @@
+-- Гистограммы для /insights: минуты дипворка по часам недели и число сессий
+-- по длительности. Обновляются при зачислении каждой сессии, поэтому команда
+-- читает одну строку независимо от длины истории.
+
+-- hour_minutes[1..168]: час недели по времени бота, 1 - понедельник 00:00-01:00,
+-- 168 - воскресенье 23:00-24:00. length_counts[1..5]: сессии до 30 минут,
+-- 30-60, 60-120, 120-240 и от 240 минут (как в analytics_examples.sql).
+CREATE TABLE IF NOT EXISTS user_insights (
+    user_id BIGINT PRIMARY KEY,
+    hour_minutes INTEGER[] NOT NULL,
+    length_counts INTEGER[] NOT NULL
+);
+
+-- Поэлементная сумма массивов одной длины
+CREATE OR REPLACE FUNCTION array_add(a INTEGER[], b INTEGER[])
+RETURNS INTEGER[] AS $$
+    SELECT ARRAY(
+        SELECT x + y FROM unnest(a, b) WITH ORDINALITY AS t(x, y, i) ORDER BY i
+    )
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Минуты сессии по часам недели; округление как в session_day_split, поэтому
+-- сумма по часам равна длительности сессии. Сессия длиннее недели дает
+-- несколько строк с одним часом.
+CREATE OR REPLACE FUNCTION session_hour_split(p_start TIMESTAMP, p_end TIMESTAMP)
+RETURNS TABLE (hour INTEGER, minutes INTEGER) AS $$
+    SELECT
+        ((EXTRACT(ISODOW FROM h) - 1) * 24 + EXTRACT(HOUR FROM h) + 1)::integer,
+        (FLOOR(EXTRACT(EPOCH FROM (LEAST(p_end, h + INTERVAL '1 hour') - p_start)) / 60)
+         - FLOOR(EXTRACT(EPOCH FROM (GREATEST(p_start, h) - p_start)) / 60))::integer
+    FROM generate_series(DATE_TRUNC('hour', p_start), p_end - INTERVAL '1 microsecond', INTERVAL '1 hour') AS h
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Номер корзины длительности сессии (1..5)
+CREATE OR REPLACE FUNCTION session_length_bucket(p_start TIMESTAMP, p_end TIMESTAMP)
+RETURNS INTEGER AS $$
+    SELECT width_bucket(FLOOR(EXTRACT(EPOCH FROM (p_end - p_start)) / 60), ARRAY[30, 60, 120, 240]::numeric[]) + 1
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Вклад одной сессии в hour_minutes и length_counts
+CREATE OR REPLACE FUNCTION session_hour_minutes(p_start TIMESTAMP, p_end TIMESTAMP)
+RETURNS INTEGER[] AS $$
+    SELECT array_agg(COALESCE(sp.minutes, 0) ORDER BY g)
+    FROM generate_series(1, 168) AS g
+    LEFT JOIN (
+        SELECT hour, SUM(minutes)::integer AS minutes
+        FROM session_hour_split(p_start, p_end)
+        GROUP BY hour
+    ) sp ON sp.hour = g
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION session_length_counts(p_start TIMESTAMP, p_end TIMESTAMP)
+RETURNS INTEGER[] AS $$
+    SELECT array_agg((g = session_length_bucket(p_start, p_end))::integer ORDER BY g)
+    FROM generate_series(1, 5) AS g
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Гистограммы полным просмотром закрытых сессий диапазона пользователей
+CREATE OR REPLACE FUNCTION session_insights(p_first BIGINT, p_last BIGINT)
+RETURNS TABLE (user_id BIGINT, hour_minutes INTEGER[], length_counts INTEGER[]) AS $$
+    WITH sessions AS (
+        SELECT s.user_id, s.start_time, s.end_time
+        FROM deepwork_sessions s
+        WHERE s.user_id BETWEEN p_first AND p_last AND s.end_time IS NOT NULL
+    ), hours AS (
+        SELECT s.user_id, sp.hour, SUM(sp.minutes)::integer AS minutes
+        FROM sessions s
+        CROSS JOIN LATERAL session_hour_split(s.start_time, s.end_time) sp
+        GROUP BY s.user_id, sp.hour
+    ), lengths AS (
+        SELECT s.user_id, session_length_bucket(s.start_time, s.end_time) AS bucket,
+               COUNT(*)::integer AS sessions
+        FROM sessions s
+        GROUP BY 1, 2
+    ), users AS (
+        SELECT DISTINCT s.user_id FROM sessions s
+    )
+    SELECT h.user_id, h.hour_minutes, l.length_counts
+    FROM (
+        SELECT u.user_id, array_agg(COALESCE(h.minutes, 0) ORDER BY g) AS hour_minutes
+        FROM users u
+        CROSS JOIN generate_series(1, 168) AS g
+        LEFT JOIN hours h ON h.user_id = u.user_id AND h.hour = g
+        GROUP BY u.user_id
+    ) h
+    JOIN (
+        SELECT u.user_id, array_agg(COALESCE(l.sessions, 0) ORDER BY g) AS length_counts
+        FROM users u
+        CROSS JOIN generate_series(1, 5) AS g
+        LEFT JOIN lengths l ON l.user_id = u.user_id AND l.bucket = g
+        GROUP BY u.user_id
+    ) l ON l.user_id = h.user_id
+$$ LANGUAGE sql STABLE;
+
+-- Зачисление закрытой сессии в ежедневную, недельную и месячную статистику,
+-- в серию дней с целью и в гистограммы user_insights. Сессия через полночь распределяется по дням, а сама
+-- сессия засчитывается дню начала. Серия обновляется без просмотра истории;
+-- только если цель достигнута в день раньше последнего дня с целью (поздно
+-- закрытая сессия), серия пересчитывается полностью. Пересчет статистики
+-- берет ту же блокировку монопольно, поэтому не пересекается с зачислением.
+-- Возвращает ежедневную статистику затронутых дней.
+CREATE OR REPLACE FUNCTION credit_session(p_user_id BIGINT, p_start TIMESTAMP, p_end TIMESTAMP)
+RETURNS TABLE (day DATE, total_minutes INTEGER, session_count INTEGER) AS $$
+#variable_conflict use_column
+DECLARE
+    r RECORD;
+    v_total INTEGER;
+    v_count INTEGER;
+    v_new_day INTEGER;
+    v_goal INTEGER;
+    v_goal_hit BOOLEAN;
+    v_rescan BOOLEAN := FALSE;
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(hashtext('daily_stats'));
+    v_goal := daily_goal(p_user_id);
+
+    INSERT INTO user_insights AS i (user_id, hour_minutes, length_counts)
+    VALUES (p_user_id, session_hour_minutes(p_start, p_end), session_length_counts(p_start, p_end))
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+        hour_minutes = array_add(i.hour_minutes, EXCLUDED.hour_minutes),
+        length_counts = array_add(i.length_counts, EXCLUDED.length_counts);
+
+    FOR r IN SELECT * FROM session_day_split(p_start, p_end) LOOP
+        INSERT INTO daily_stats AS d (user_id, date, total_minutes, session_count)
+        VALUES (p_user_id, r.day, r.minutes, r.started)
+        ON CONFLICT (user_id, date)
+        DO UPDATE SET
+            total_minutes = d.total_minutes + EXCLUDED.total_minutes,
+            session_count = d.session_count + EXCLUDED.session_count
+        RETURNING d.total_minutes, d.session_count INTO v_total, v_count;
+
+        -- День впервые получил минуты дипворка
+        v_new_day := (v_total > 0 AND v_total = r.minutes)::integer;
+
+        INSERT INTO weekly_stats AS w (user_id, week_start, total_minutes, total_sessions, days_with_work)
+        VALUES (p_user_id, DATE_TRUNC('week', r.day)::date, r.minutes, r.started, v_new_day)
+        ON CONFLICT (user_id, week_start)
+        DO UPDATE SET
+            total_minutes = w.total_minutes + EXCLUDED.total_minutes,
+            total_sessions = w.total_sessions + EXCLUDED.total_sessions,
+            days_with_work = w.days_with_work + EXCLUDED.days_with_work;
+
+        INSERT INTO monthly_stats AS m (user_id, month_start, total_minutes, total_sessions, days_with_work)
+        VALUES (p_user_id, DATE_TRUNC('month', r.day)::date, r.minutes, r.started, v_new_day)
+        ON CONFLICT (user_id, month_start)
+        DO UPDATE SET
+            total_minutes = m.total_minutes + EXCLUDED.total_minutes,
+            total_sessions = m.total_sessions + EXCLUDED.total_sessions,
+            days_with_work = m.days_with_work + EXCLUDED.days_with_work;
+
+        -- Цель достигнута именно этой сессией
+        v_goal_hit := v_total >= v_goal AND v_total - r.minutes < v_goal;
+
+        IF v_goal_hit AND EXISTS (
+            SELECT 1 FROM user_streaks s WHERE s.user_id = p_user_id AND s.last_goal_day > r.day
+        ) THEN
+            v_rescan := TRUE;
+        ELSIF v_goal_hit OR v_new_day = 1 THEN
+            INSERT INTO user_streaks AS s
+                (user_id, current_streak, longest_streak, last_goal_day, goal_days, active_days)
+            VALUES (
+                p_user_id, v_goal_hit::integer, v_goal_hit::integer,
+                CASE WHEN v_goal_hit THEN r.day END, v_goal_hit::integer, v_new_day
+            )
+            ON CONFLICT (user_id)
+            DO UPDATE SET
+                current_streak = CASE
+                    WHEN NOT v_goal_hit THEN s.current_streak
+                    WHEN s.last_goal_day = r.day - 1 THEN s.current_streak + 1
+                    ELSE 1
+                END,
+                longest_streak = GREATEST(s.longest_streak, CASE
+                    WHEN NOT v_goal_hit THEN s.current_streak
+                    WHEN s.last_goal_day = r.day - 1 THEN s.current_streak + 1
+                    ELSE 1
+                END),
+                last_goal_day = CASE WHEN v_goal_hit THEN r.day ELSE s.last_goal_day END,
+                goal_days = s.goal_days + v_goal_hit::integer,
+                active_days = s.active_days + v_new_day;
+        END IF;
+
+        day := r.day;
+        total_minutes := v_total;
+        session_count := v_count;
+        RETURN NEXT;
+    END LOOP;
+
+    IF v_rescan THEN
+        DELETE FROM user_streaks s WHERE s.user_id = p_user_id;
+        INSERT INTO user_streaks SELECT * FROM streak_scan(p_user_id, p_user_id);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Гистограммы уже накопленной истории
+INSERT INTO user_insights (user_id, hour_minutes, length_counts)
+SELECT * FROM session_insights(-9223372036854775808, 9223372036854775807);
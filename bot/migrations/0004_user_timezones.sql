@@ -0,0 +1,381 @@
+-- Часовой пояс пользователя и время с часовым поясом во всех таблицах.
+-- Прежнее время без пояса записано в часовом поясе бота (TIMEZONE) и
+-- переводится в TIMESTAMPTZ по часовому поясу подключения. Статистика
+-- пользователей без своего пояса не меняется: их день считается, как раньше,
+-- по TIMEZONE.
+
+-- NULL - часовой пояс бота
+ALTER TABLE user_settings ADD COLUMN IF NOT EXISTS timezone TEXT;
+-- Строка настроек может хранить только часовой пояс, цель - по умолчанию
+ALTER TABLE user_settings ALTER COLUMN daily_goal_minutes DROP NOT NULL;
+
+ALTER TABLE user_settings ALTER COLUMN updated_at TYPE TIMESTAMPTZ;
+ALTER TABLE user_birthday
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ,
+    ALTER COLUMN updated_at TYPE TIMESTAMPTZ;
+ALTER TABLE daily_stats
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ,
+    ALTER COLUMN updated_at TYPE TIMESTAMPTZ;
+
+-- Тип ключа секционирования не меняется: deepwork_sessions пересоздается,
+-- как в 0002, идентификаторы и последовательность сохраняются. Секции
+-- прежней таблицы переименовываются, чтобы имена освободились для новых.
+ALTER TABLE deepwork_sessions RENAME TO deepwork_sessions_local;
+ALTER TABLE deepwork_sessions_local DROP CONSTRAINT deepwork_sessions_pkey;
+DROP INDEX idx_deepwork_sessions_user_start;
+DROP INDEX idx_deepwork_sessions_open;
+DROP INDEX idx_deepwork_sessions_open_id;
+ALTER SEQUENCE deepwork_sessions_id_seq OWNED BY NONE;
+
+DO $$
+DECLARE
+    v_partition TEXT;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'deepwork_sessions_local'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', v_partition, v_partition || '_local');
+    END LOOP;
+END;
+$$;
+
+-- Секции по месяцам UTC
+CREATE TABLE deepwork_sessions (
+    id INTEGER NOT NULL DEFAULT nextval('deepwork_sessions_id_seq'),
+    user_id BIGINT NOT NULL,
+    start_time TIMESTAMPTZ NOT NULL,
+    end_time TIMESTAMPTZ,
+    duration_minutes INTEGER,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, start_time)
+) PARTITION BY RANGE (start_time);
+ALTER SEQUENCE deepwork_sessions_id_seq OWNED BY deepwork_sessions.id;
+
+CREATE TABLE deepwork_sessions_default PARTITION OF deepwork_sessions DEFAULT;
+
+CREATE INDEX idx_deepwork_sessions_user_start ON deepwork_sessions (user_id, start_time);
+CREATE INDEX idx_deepwork_sessions_open ON deepwork_sessions (user_id, start_time DESC)
+    WHERE end_time IS NULL;
+CREATE INDEX idx_deepwork_sessions_open_id ON deepwork_sessions (id)
+    WHERE end_time IS NULL;
+
+CREATE TRIGGER update_deepwork_sessions_updated_at
+    BEFORE UPDATE ON deepwork_sessions
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Создание месячных секций, покрывающих дни с p_from по p_to (даты UTC).
+-- Сессии этих месяцев, попавшие в секцию по умолчанию, переносятся в новую
+-- секцию. Возвращает число созданных секций.
+CREATE OR REPLACE FUNCTION ensure_session_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE := DATE_TRUNC('month', p_from)::date;
+    v_next DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    WHILE v_month <= p_to LOOP
+        v_next := (v_month + INTERVAL '1 month')::date;
+        v_name := 'deepwork_sessions_' || TO_CHAR(v_month, 'YYYY_MM');
+        IF to_regclass(v_name) IS NULL THEN
+            CREATE TEMP TABLE moved_sessions (LIKE deepwork_sessions);
+            WITH moved AS (
+                DELETE FROM deepwork_sessions_default
+                WHERE start_time >= v_month::timestamp AT TIME ZONE 'UTC'
+                  AND start_time < v_next::timestamp AT TIME ZONE 'UTC'
+                RETURNING *
+            )
+            INSERT INTO moved_sessions SELECT * FROM moved;
+
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF deepwork_sessions FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_month::timestamp AT TIME ZONE 'UTC', v_next::timestamp AT TIME ZONE 'UTC'
+            );
+            INSERT INTO deepwork_sessions SELECT * FROM moved_sessions;
+            DROP TABLE moved_sessions;
+            v_created := v_created + 1;
+        END IF;
+        v_month := v_next;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_session_partitions(
+    COALESCE(
+        (SELECT (MIN(start_time) AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC')::date
+         FROM deepwork_sessions_local),
+        (now() AT TIME ZONE 'UTC')::date
+    ),
+    ((now() AT TIME ZONE 'UTC') + INTERVAL '3 months')::date
+);
+
+INSERT INTO deepwork_sessions (id, user_id, start_time, end_time, duration_minutes, created_at, updated_at)
+SELECT id, user_id,
+       start_time AT TIME ZONE current_setting('TimeZone'),
+       end_time AT TIME ZONE current_setting('TimeZone'),
+       duration_minutes,
+       created_at AT TIME ZONE current_setting('TimeZone'),
+       updated_at AT TIME ZONE current_setting('TimeZone')
+FROM deepwork_sessions_local;
+
+DROP TABLE deepwork_sessions_local;
+
+-- Часовой пояс пользователя: свой или часовой пояс подключения (бота)
+CREATE OR REPLACE FUNCTION user_timezone(p_user_id BIGINT)
+RETURNS TEXT AS $$
+    SELECT COALESCE(
+        (SELECT timezone FROM user_settings WHERE user_id = p_user_id),
+        current_setting('TimeZone')
+    )
+$$ LANGUAGE sql STABLE;
+
+-- Функции расчета статистики считают дни и часы недели в часовом поясе
+-- пользователя; прежние версии для времени без пояса удаляются.
+DROP FUNCTION IF EXISTS session_day_split(TIMESTAMP, TIMESTAMP);
+DROP FUNCTION IF EXISTS session_hour_split(TIMESTAMP, TIMESTAMP);
+DROP FUNCTION IF EXISTS session_length_bucket(TIMESTAMP, TIMESTAMP);
+DROP FUNCTION IF EXISTS session_hour_minutes(TIMESTAMP, TIMESTAMP);
+DROP FUNCTION IF EXISTS session_length_counts(TIMESTAMP, TIMESTAMP);
+DROP FUNCTION IF EXISTS credit_session(BIGINT, TIMESTAMP, TIMESTAMP);
+
+-- Разбиение сессии по местным календарным дням: минуты и признак дня начала
+-- сессии. Минуты считаются как разность целых минут от начала сессии до
+-- местной полуночи, поэтому сумма по дням всегда равна длительности сессии.
+-- Полночь считается от 23:00 предыдущего дня: если часы переводят назад в
+-- полночь, день начинается с первой из двух полуночей (как в bot/stats.py).
+CREATE OR REPLACE FUNCTION session_day_split(p_start TIMESTAMPTZ, p_end TIMESTAMPTZ, p_timezone TEXT)
+RETURNS TABLE (day DATE, minutes INTEGER, started INTEGER) AS $$
+    SELECT
+        d::date,
+        (FLOOR(EXTRACT(EPOCH FROM (LEAST(
+            p_end, (d + INTERVAL '23 hours') AT TIME ZONE p_timezone + INTERVAL '1 hour'
+         ) - p_start)) / 60)
+         - FLOOR(EXTRACT(EPOCH FROM (GREATEST(
+            p_start, (d - INTERVAL '1 hour') AT TIME ZONE p_timezone + INTERVAL '1 hour'
+         ) - p_start)) / 60))::integer,
+        (d::date = (p_start AT TIME ZONE p_timezone)::date)::integer
+    FROM generate_series(
+        (p_start AT TIME ZONE p_timezone)::date::timestamp,
+        (p_end AT TIME ZONE p_timezone)::date::timestamp,
+        INTERVAL '1 day'
+    ) AS d
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Минуты сессии по местным часам недели (1 - понедельник 00:00-01:00);
+-- округление как в session_day_split
+CREATE OR REPLACE FUNCTION session_hour_split(p_start TIMESTAMPTZ, p_end TIMESTAMPTZ, p_timezone TEXT)
+RETURNS TABLE (hour INTEGER, minutes INTEGER) AS $$
+    SELECT
+        ((EXTRACT(ISODOW FROM h AT TIME ZONE p_timezone) - 1) * 24
+         + EXTRACT(HOUR FROM h AT TIME ZONE p_timezone) + 1)::integer,
+        (FLOOR(EXTRACT(EPOCH FROM (LEAST(p_end, h + INTERVAL '1 hour') - p_start)) / 60)
+         - FLOOR(EXTRACT(EPOCH FROM (GREATEST(p_start, h) - p_start)) / 60))::integer
+    FROM generate_series(
+        DATE_TRUNC('hour', p_start, p_timezone), p_end - INTERVAL '1 microsecond', INTERVAL '1 hour'
+    ) AS h
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION session_length_bucket(p_start TIMESTAMPTZ, p_end TIMESTAMPTZ)
+RETURNS INTEGER AS $$
+    SELECT width_bucket(FLOOR(EXTRACT(EPOCH FROM (p_end - p_start)) / 60), ARRAY[30, 60, 120, 240]::numeric[]) + 1
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION session_hour_minutes(p_start TIMESTAMPTZ, p_end TIMESTAMPTZ, p_timezone TEXT)
+RETURNS INTEGER[] AS $$
+    SELECT array_agg(COALESCE(sp.minutes, 0) ORDER BY g)
+    FROM generate_series(1, 168) AS g
+    LEFT JOIN (
+        SELECT hour, SUM(minutes)::integer AS minutes
+        FROM session_hour_split(p_start, p_end, p_timezone)
+        GROUP BY hour
+    ) sp ON sp.hour = g
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION session_length_counts(p_start TIMESTAMPTZ, p_end TIMESTAMPTZ)
+RETURNS INTEGER[] AS $$
+    SELECT array_agg((g = session_length_bucket(p_start, p_end))::integer ORDER BY g)
+    FROM generate_series(1, 5) AS g
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Гистограммы полным просмотром закрытых сессий диапазона пользователей
+CREATE OR REPLACE FUNCTION session_insights(p_first BIGINT, p_last BIGINT)
+RETURNS TABLE (user_id BIGINT, hour_minutes INTEGER[], length_counts INTEGER[]) AS $$
+    WITH sessions AS (
+        SELECT s.user_id, s.start_time, s.end_time,
+               COALESCE(u.timezone, current_setting('TimeZone')) AS timezone
+        FROM deepwork_sessions s
+        LEFT JOIN user_settings u ON u.user_id = s.user_id
+        WHERE s.user_id BETWEEN p_first AND p_last AND s.end_time IS NOT NULL
+    ), hours AS (
+        SELECT s.user_id, sp.hour, SUM(sp.minutes)::integer AS minutes
+        FROM sessions s
+        CROSS JOIN LATERAL session_hour_split(s.start_time, s.end_time, s.timezone) sp
+        GROUP BY s.user_id, sp.hour
+    ), lengths AS (
+        SELECT s.user_id, session_length_bucket(s.start_time, s.end_time) AS bucket,
+               COUNT(*)::integer AS sessions
+        FROM sessions s
+        GROUP BY 1, 2
+    ), users AS (
+        SELECT DISTINCT s.user_id FROM sessions s
+    )
+    SELECT h.user_id, h.hour_minutes, l.length_counts
+    FROM (
+        SELECT u.user_id, array_agg(COALESCE(h.minutes, 0) ORDER BY g) AS hour_minutes
+        FROM users u
+        CROSS JOIN generate_series(1, 168) AS g
+        LEFT JOIN hours h ON h.user_id = u.user_id AND h.hour = g
+        GROUP BY u.user_id
+    ) h
+    JOIN (
+        SELECT u.user_id, array_agg(COALESCE(l.sessions, 0) ORDER BY g) AS length_counts
+        FROM users u
+        CROSS JOIN generate_series(1, 5) AS g
+        LEFT JOIN lengths l ON l.user_id = u.user_id AND l.bucket = g
+        GROUP BY u.user_id
+    ) l ON l.user_id = h.user_id
+$$ LANGUAGE sql STABLE;
+
+-- Зачисление закрытой сессии в ежедневную, недельную и месячную статистику,
+-- в серию дней с целью и в гистограммы user_insights. Дни и часы недели
+-- считаются в часовом поясе пользователя; сессия через местную полночь
+-- распределяется по дням, а сама сессия засчитывается дню начала. Серия
+-- обновляется без просмотра истории; только если цель достигнута в день
+-- раньше последнего дня с целью (поздно закрытая сессия), серия
+-- пересчитывается полностью. Пересчет статистики берет ту же блокировку
+-- монопольно, поэтому не пересекается с зачислением. Возвращает ежедневную
+-- статистику затронутых дней.
+CREATE OR REPLACE FUNCTION credit_session(p_user_id BIGINT, p_start TIMESTAMPTZ, p_end TIMESTAMPTZ)
+RETURNS TABLE (day DATE, total_minutes INTEGER, session_count INTEGER) AS $$
+#variable_conflict use_column
+DECLARE
+    r RECORD;
+    v_total INTEGER;
+    v_count INTEGER;
+    v_new_day INTEGER;
+    v_goal INTEGER;
+    v_goal_hit BOOLEAN;
+    v_rescan BOOLEAN := FALSE;
+    v_timezone TEXT;
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(hashtext('daily_stats'));
+    v_goal := daily_goal(p_user_id);
+    v_timezone := user_timezone(p_user_id);
+
+    INSERT INTO user_insights AS i (user_id, hour_minutes, length_counts)
+    VALUES (
+        p_user_id, session_hour_minutes(p_start, p_end, v_timezone), session_length_counts(p_start, p_end)
+    )
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+        hour_minutes = array_add(i.hour_minutes, EXCLUDED.hour_minutes),
+        length_counts = array_add(i.length_counts, EXCLUDED.length_counts);
+
+    FOR r IN SELECT * FROM session_day_split(p_start, p_end, v_timezone) LOOP
+        INSERT INTO daily_stats AS d (user_id, date, total_minutes, session_count)
+        VALUES (p_user_id, r.day, r.minutes, r.started)
+        ON CONFLICT (user_id, date)
+        DO UPDATE SET
+            total_minutes = d.total_minutes + EXCLUDED.total_minutes,
+            session_count = d.session_count + EXCLUDED.session_count
+        RETURNING d.total_minutes, d.session_count INTO v_total, v_count;
+
+        -- День впервые получил минуты дипворка
+        v_new_day := (v_total > 0 AND v_total = r.minutes)::integer;
+
+        INSERT INTO weekly_stats AS w (user_id, week_start, total_minutes, total_sessions, days_with_work)
+        VALUES (p_user_id, DATE_TRUNC('week', r.day)::date, r.minutes, r.started, v_new_day)
+        ON CONFLICT (user_id, week_start)
+        DO UPDATE SET
+            total_minutes = w.total_minutes + EXCLUDED.total_minutes,
+            total_sessions = w.total_sessions + EXCLUDED.total_sessions,
+            days_with_work = w.days_with_work + EXCLUDED.days_with_work;
+
+        INSERT INTO monthly_stats AS m (user_id, month_start, total_minutes, total_sessions, days_with_work)
+        VALUES (p_user_id, DATE_TRUNC('month', r.day)::date, r.minutes, r.started, v_new_day)
+        ON CONFLICT (user_id, month_start)
+        DO UPDATE SET
+            total_minutes = m.total_minutes + EXCLUDED.total_minutes,
+            total_sessions = m.total_sessions + EXCLUDED.total_sessions,
+            days_with_work = m.days_with_work + EXCLUDED.days_with_work;
+
+        -- Цель достигнута именно этой сессией
+        v_goal_hit := v_total >= v_goal AND v_total - r.minutes < v_goal;
+
+        IF v_goal_hit AND EXISTS (
+            SELECT 1 FROM user_streaks s WHERE s.user_id = p_user_id AND s.last_goal_day > r.day
+        ) THEN
+            v_rescan := TRUE;
+        ELSIF v_goal_hit OR v_new_day = 1 THEN
+            INSERT INTO user_streaks AS s
+                (user_id, current_streak, longest_streak, last_goal_day, goal_days, active_days)
+            VALUES (
+                p_user_id, v_goal_hit::integer, v_goal_hit::integer,
+                CASE WHEN v_goal_hit THEN r.day END, v_goal_hit::integer, v_new_day
+            )
+            ON CONFLICT (user_id)
+            DO UPDATE SET
+                current_streak = CASE
+                    WHEN NOT v_goal_hit THEN s.current_streak
+                    WHEN s.last_goal_day = r.day - 1 THEN s.current_streak + 1
+                    ELSE 1
+                END,
+                longest_streak = GREATEST(s.longest_streak, CASE
+                    WHEN NOT v_goal_hit THEN s.current_streak
+                    WHEN s.last_goal_day = r.day - 1 THEN s.current_streak + 1
+                    ELSE 1
+                END),
+                last_goal_day = CASE WHEN v_goal_hit THEN r.day ELSE s.last_goal_day END,
+                goal_days = s.goal_days + v_goal_hit::integer,
+                active_days = s.active_days + v_new_day;
+        END IF;
+
+        day := r.day;
+        total_minutes := v_total;
+        session_count := v_count;
+        RETURN NEXT;
+    END LOOP;
+
+    IF v_rescan THEN
+        DELETE FROM user_streaks s WHERE s.user_id = p_user_id;
+        INSERT INTO user_streaks SELECT * FROM streak_scan(p_user_id, p_user_id);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Закрытие сессии и обновление статистики за один запрос.
+-- Время берется на сервере базы данных, день - по часовому поясу пользователя.
+-- Возвращает статистику за местный день окончания сессии; для уже закрытой
+-- сессии ничего не меняет и возвращает текущую статистику за сегодня.
+CREATE OR REPLACE FUNCTION close_session(p_session_id INTEGER)
+RETURNS TABLE (total_minutes INTEGER, session_count INTEGER) AS $$
+#variable_conflict use_column
+DECLARE
+    v_user_id BIGINT;
+    v_start TIMESTAMPTZ;
+    v_end TIMESTAMPTZ := now();
+BEGIN
+    UPDATE deepwork_sessions
+    SET end_time = v_end,
+        duration_minutes = FLOOR(EXTRACT(EPOCH FROM (v_end - start_time)) / 60)
+    WHERE id = p_session_id AND end_time IS NULL
+    RETURNING user_id, start_time INTO v_user_id, v_start;
+
+    IF NOT FOUND THEN
+        RETURN QUERY
+        SELECT d.total_minutes, d.session_count
+        FROM daily_stats d
+        JOIN deepwork_sessions s ON s.user_id = d.user_id
+        WHERE s.id = p_session_id AND d.date = (v_end AT TIME ZONE user_timezone(s.user_id))::date;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT c.total_minutes, c.session_count
+    FROM credit_session(v_user_id, v_start, v_end) c
+    WHERE c.day = (v_end AT TIME ZONE user_timezone(v_user_id))::date;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,47 @@
+-- Не больше одной открытой сессии на пользователя. Уникальный индекс
+-- секционированной таблицы обязан включать ключ секционирования start_time,
+-- поэтому открытые сессии дублируются в таблице open_sessions с первичным
+-- ключом user_id, которую ведет триггер deepwork_sessions: вторая открытая
+-- сессия пользователя (двойное нажатие, повторная доставка обновления)
+-- нарушает первичный ключ и не записывается.
+
+-- Лишние открытые сессии прежних двойных нажатий удаляются: бот знает только
+-- последнюю, а остальные закрыла бы сверка с зачислением SESSION_MAX_HOURS
+DELETE FROM deepwork_sessions s
+WHERE s.end_time IS NULL
+  AND EXISTS (
+      SELECT 1 FROM deepwork_sessions n
+      WHERE n.user_id = s.user_id AND n.end_time IS NULL
+        AND (n.start_time, n.id) > (s.start_time, s.id)
+  );
+
+CREATE TABLE IF NOT EXISTS open_sessions (
+    user_id BIGINT PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    start_time TIMESTAMPTZ NOT NULL
+);
+
+INSERT INTO open_sessions (user_id, session_id, start_time)
+SELECT user_id, id, start_time FROM deepwork_sessions WHERE end_time IS NULL
+ON CONFLICT (user_id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION track_open_session()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.end_time IS NULL THEN
+        DELETE FROM open_sessions WHERE user_id = OLD.user_id AND session_id = OLD.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.end_time IS NULL THEN
+        INSERT INTO open_sessions (user_id, session_id, start_time)
+        VALUES (NEW.user_id, NEW.id, NEW.start_time);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггер секционированной таблицы копируется во все секции, в том числе
+-- создаваемые ensure_session_partitions
+DROP TRIGGER IF EXISTS track_open_sessions ON deepwork_sessions;
+CREATE TRIGGER track_open_sessions
+    AFTER INSERT OR UPDATE OF end_time OR DELETE ON deepwork_sessions
+    FOR EACH ROW EXECUTE FUNCTION track_open_session();
@@ -0,0 +1,53 @@
+-- Сроки сессий: окончание по плану, конец перерыва, напоминание и
+-- автоостановка забытой сессии. Все сроки лежат в одной таблице с индексом
+-- по времени, и один цикл бота забирает наступившие порциями, вместо
+-- отдельного ожидания на каждого пользователя.
+CREATE TABLE IF NOT EXISTS session_deadlines (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    -- Открытая сессия пользователя на момент постановки (NULL для перерыва)
+    session_id INTEGER,
+    kind TEXT NOT NULL,
+    due_at TIMESTAMPTZ NOT NULL,
+    -- Длина перерыва после окончания по плану или незасчитываемые минуты автоостановки
+    minutes INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_session_deadlines_due ON session_deadlines (due_at);
+CREATE INDEX IF NOT EXISTS idx_session_deadlines_user ON session_deadlines (user_id);
+
+-- Закрытие сессии в момент p_end (по умолчанию сейчас, не раньше начала):
+-- окончание по плану и автоостановка зачисляют время до срока, а не до
+-- момента обработки. Сроки пользователя снимаются вместе с сессией.
+DROP FUNCTION IF EXISTS close_session(INTEGER);
+CREATE OR REPLACE FUNCTION close_session(p_session_id INTEGER, p_end TIMESTAMPTZ DEFAULT NULL)
+RETURNS TABLE (total_minutes INTEGER, session_count INTEGER) AS $$
+#variable_conflict use_column
+DECLARE
+    v_user_id BIGINT;
+    v_start TIMESTAMPTZ;
+    v_end TIMESTAMPTZ := COALESCE(p_end, now());
+    v_closed TIMESTAMPTZ;
+BEGIN
+    UPDATE deepwork_sessions
+    SET end_time = GREATEST(v_end, start_time),
+        duration_minutes = FLOOR(EXTRACT(EPOCH FROM (GREATEST(v_end, start_time) - start_time)) / 60)
+    WHERE id = p_session_id AND end_time IS NULL
+    RETURNING user_id, start_time, end_time INTO v_user_id, v_start, v_closed;
+
+    IF NOT FOUND THEN
+        RETURN QUERY
+        SELECT d.total_minutes, d.session_count
+        FROM daily_stats d
+        JOIN deepwork_sessions s ON s.user_id = d.user_id
+        WHERE s.id = p_session_id AND d.date = (v_end AT TIME ZONE user_timezone(s.user_id))::date;
+        RETURN;
+    END IF;
+
+    DELETE FROM session_deadlines WHERE user_id = v_user_id;
+
+    RETURN QUERY
+    SELECT c.total_minutes, c.session_count
+    FROM credit_session(v_user_id, v_start, v_closed) c
+    WHERE c.day = (v_closed AT TIME ZONE user_timezone(v_user_id))::date;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,39 @@
+-- Теги сессий (проект, на который ушло время) и статистика по тегам за
+-- местные дни пользователя рядом с daily_stats. Отчеты по тегам за любой
+-- период, в том числе за годы, читают диапазон первичного ключа
+-- (user_id, date, tag), а не сессии.
+ALTER TABLE deepwork_sessions ADD COLUMN IF NOT EXISTS tag TEXT;
+
+CREATE TABLE IF NOT EXISTS daily_tag_stats (
+    user_id BIGINT NOT NULL,
+    date DATE NOT NULL,
+    tag TEXT NOT NULL,
+    total_minutes INTEGER NOT NULL DEFAULT 0,
+    session_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date, tag)
+);
+
+-- Зачисление закрытой сессии с тегом. Сессии закрывают close_session,
+-- сверка устаревших и пересчеты, поэтому статистику по тегам ведет триггер,
+-- как open_sessions. Без тега сессия учитывается только в daily_stats.
+CREATE OR REPLACE FUNCTION credit_session_tag()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF OLD.end_time IS NULL AND NEW.end_time IS NOT NULL AND NEW.tag IS NOT NULL THEN
+        PERFORM pg_advisory_xact_lock_shared(hashtext('daily_stats'));
+        INSERT INTO daily_tag_stats AS t (user_id, date, tag, total_minutes, session_count)
+        SELECT NEW.user_id, sp.day, NEW.tag, sp.minutes, sp.started
+        FROM session_day_split(NEW.start_time, NEW.end_time, user_timezone(NEW.user_id)) sp
+        ON CONFLICT (user_id, date, tag)
+        DO UPDATE SET
+            total_minutes = t.total_minutes + EXCLUDED.total_minutes,
+            session_count = t.session_count + EXCLUDED.session_count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS credit_session_tags ON deepwork_sessions;
+CREATE TRIGGER credit_session_tags
+    AFTER UPDATE OF end_time ON deepwork_sessions
+    FOR EACH ROW EXECUTE FUNCTION credit_session_tag();
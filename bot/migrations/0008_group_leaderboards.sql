@@ -0,0 +1,23 @@
+-- Участники групповых чатов и таблицы лидеров. group_leaderboards - снимок
+-- первых мест каждого чата за день и неделю: его пересчитывает по порциям
+-- чатов задача планировщика, а /leaderboard читает не больше
+-- LEADERBOARD_SIZE строк первичного ключа, сколько бы участников ни было в
+-- группе.
+CREATE TABLE IF NOT EXISTS group_members (
+    chat_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    name TEXT NOT NULL,
+    joined_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (chat_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS group_leaderboards (
+    chat_id BIGINT NOT NULL,
+    period TEXT NOT NULL CHECK (period IN ('day', 'week')),
+    position INTEGER NOT NULL,
+    period_start DATE NOT NULL,
+    user_id BIGINT NOT NULL,
+    name TEXT NOT NULL,
+    total_minutes INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, period, position)
+);
@@ -0,0 +1,5 @@
+-- Язык кнопок и сообщений пользователя (NULL - язык бота по умолчанию).
+-- Бот запоминает язык клиента Telegram, чтобы сообщения без обновления
+-- пользователя (сроки сессий, ежедневные рассылки) шли на том же языке и
+-- после перезапуска.
+ALTER TABLE user_settings ADD COLUMN IF NOT EXISTS language TEXT;
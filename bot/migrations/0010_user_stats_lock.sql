@@ -0,0 +1,123 @@
+-- Блокировка статистики одного пользователя. Зачисление сессий берет
+-- совместно и общую блокировку daily_stats, и блокировку пользователя
+-- (daily_stats, hashtext(user_id)). Смена цели или часового пояса
+-- пересчитывает статистику одного пользователя под монопольной блокировкой
+-- пользователя и ждет только его зачислений; монопольную общую блокировку
+-- берут лишь полные пересчеты и импорт.
+
+CREATE OR REPLACE FUNCTION credit_session(p_user_id BIGINT, p_start TIMESTAMPTZ, p_end TIMESTAMPTZ)
+RETURNS TABLE (day DATE, total_minutes INTEGER, session_count INTEGER) AS $$
+#variable_conflict use_column
+DECLARE
+    r RECORD;
+    v_total INTEGER;
+    v_count INTEGER;
+    v_new_day INTEGER;
+    v_goal INTEGER;
+    v_goal_hit BOOLEAN;
+    v_rescan BOOLEAN := FALSE;
+    v_timezone TEXT;
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared(hashtext('daily_stats'));
+    PERFORM pg_advisory_xact_lock_shared(hashtext('daily_stats'), hashtext(p_user_id::text));
+    v_goal := daily_goal(p_user_id);
+    v_timezone := user_timezone(p_user_id);
+
+    INSERT INTO user_insights AS i (user_id, hour_minutes, length_counts)
+    VALUES (
+        p_user_id, session_hour_minutes(p_start, p_end, v_timezone), session_length_counts(p_start, p_end)
+    )
+    ON CONFLICT (user_id)
+    DO UPDATE SET
+        hour_minutes = array_add(i.hour_minutes, EXCLUDED.hour_minutes),
+        length_counts = array_add(i.length_counts, EXCLUDED.length_counts);
+
+    FOR r IN SELECT * FROM session_day_split(p_start, p_end, v_timezone) LOOP
+        INSERT INTO daily_stats AS d (user_id, date, total_minutes, session_count)
+        VALUES (p_user_id, r.day, r.minutes, r.started)
+        ON CONFLICT (user_id, date)
+        DO UPDATE SET
+            total_minutes = d.total_minutes + EXCLUDED.total_minutes,
+            session_count = d.session_count + EXCLUDED.session_count
+        RETURNING d.total_minutes, d.session_count INTO v_total, v_count;
+
+        -- День впервые получил минуты дипворка
+        v_new_day := (v_total > 0 AND v_total = r.minutes)::integer;
+
+        INSERT INTO weekly_stats AS w (user_id, week_start, total_minutes, total_sessions, days_with_work)
+        VALUES (p_user_id, DATE_TRUNC('week', r.day)::date, r.minutes, r.started, v_new_day)
+        ON CONFLICT (user_id, week_start)
+        DO UPDATE SET
+            total_minutes = w.total_minutes + EXCLUDED.total_minutes,
+            total_sessions = w.total_sessions + EXCLUDED.total_sessions,
+            days_with_work = w.days_with_work + EXCLUDED.days_with_work;
+
+        INSERT INTO monthly_stats AS m (user_id, month_start, total_minutes, total_sessions, days_with_work)
+        VALUES (p_user_id, DATE_TRUNC('month', r.day)::date, r.minutes, r.started, v_new_day)
+        ON CONFLICT (user_id, month_start)
+        DO UPDATE SET
+            total_minutes = m.total_minutes + EXCLUDED.total_minutes,
+            total_sessions = m.total_sessions + EXCLUDED.total_sessions,
+            days_with_work = m.days_with_work + EXCLUDED.days_with_work;
+
+        -- Цель достигнута именно этой сессией
+        v_goal_hit := v_total >= v_goal AND v_total - r.minutes < v_goal;
+
+        IF v_goal_hit AND EXISTS (
+            SELECT 1 FROM user_streaks s WHERE s.user_id = p_user_id AND s.last_goal_day > r.day
+        ) THEN
+            v_rescan := TRUE;
+        ELSIF v_goal_hit OR v_new_day = 1 THEN
+            INSERT INTO user_streaks AS s
+                (user_id, current_streak, longest_streak, last_goal_day, goal_days, active_days)
+            VALUES (
+                p_user_id, v_goal_hit::integer, v_goal_hit::integer,
+                CASE WHEN v_goal_hit THEN r.day END, v_goal_hit::integer, v_new_day
+            )
+            ON CONFLICT (user_id)
+            DO UPDATE SET
+                current_streak = CASE
+                    WHEN NOT v_goal_hit THEN s.current_streak
+                    WHEN s.last_goal_day = r.day - 1 THEN s.current_streak + 1
+                    ELSE 1
+                END,
+                longest_streak = GREATEST(s.longest_streak, CASE
+                    WHEN NOT v_goal_hit THEN s.current_streak
+                    WHEN s.last_goal_day = r.day - 1 THEN s.current_streak + 1
+                    ELSE 1
+                END),
+                last_goal_day = CASE WHEN v_goal_hit THEN r.day ELSE s.last_goal_day END,
+                goal_days = s.goal_days + v_goal_hit::integer,
+                active_days = s.active_days + v_new_day;
+        END IF;
+
+        day := r.day;
+        total_minutes := v_total;
+        session_count := v_count;
+        RETURN NEXT;
+    END LOOP;
+
+    IF v_rescan THEN
+        DELETE FROM user_streaks s WHERE s.user_id = p_user_id;
+        INSERT INTO user_streaks SELECT * FROM streak_scan(p_user_id, p_user_id);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION credit_session_tag()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF OLD.end_time IS NULL AND NEW.end_time IS NOT NULL AND NEW.tag IS NOT NULL THEN
+        PERFORM pg_advisory_xact_lock_shared(hashtext('daily_stats'));
+        PERFORM pg_advisory_xact_lock_shared(hashtext('daily_stats'), hashtext(NEW.user_id::text));
+        INSERT INTO daily_tag_stats AS t (user_id, date, tag, total_minutes, session_count)
+        SELECT NEW.user_id, sp.day, NEW.tag, sp.minutes, sp.started
+        FROM session_day_split(NEW.start_time, NEW.end_time, user_timezone(NEW.user_id)) sp
+        ON CONFLICT (user_id, date, tag)
+        DO UPDATE SET
+            total_minutes = t.total_minutes + EXCLUDED.total_minutes,
+            session_count = t.session_count + EXCLUDED.session_count;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,236 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from .metrics import JOB_DURATION, JOB_FAILURES
+
+logger = logging.getLogger(__name__)
+
+# Максимальный интервал сна: защищает от переводов системных часов и сна хоста
+MAX_SLEEP_SECONDS = 3600
+
+
+class CronSpec:
+    """Расписание в формате cron: 'минута час день_месяца месяц день_недели'
+
+    Поддерживаются '*', числа, списки 'a,b', диапазоны 'a-b' и шаги '*/n', 'a-b/n'.
+    День недели: 0-6, где 0 (и 7) - воскресенье.
+    """
+
+    FIELDS = (
+        ('minute', 0, 59),
+        ('hour', 0, 23),
+        ('day', 1, 31),
+        ('month', 1, 12),
+        ('weekday', 0, 7),
+    )
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Ожидается 5 полей cron, получено: {expression!r}")
+        self.expression = expression
+        values = {}
+        for part, (name, low, high) in zip(parts, self.FIELDS):
+            values[name] = self._parse_field(part, low, high)
+        self.minutes = sorted(values['minute'])
+        self.hours = sorted(values['hour'])
+        self.days = values['day']
+        self.months = values['month']
+        self.weekdays = {day % 7 for day in values['weekday']}
+        # Как в cron: если ограничены и день месяца, и день недели, достаточно совпадения одного
+        self.day_restricted = parts[2] != '*'
+        self.weekday_restricted = parts[4] != '*'
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> set:
+        """Разбор одного поля cron в множество значений"""
+        values = set()
+        for item in field.split(','):
+            step = 1
+            if '/' in item:
+                item, step_str = item.split('/', 1)
+                step = int(step_str)
+                if step <= 0:
+                    raise ValueError(f"Некорректный шаг в поле cron: {field!r}")
+            if item == '*':
+                start, end = low, high
+            elif '-' in item:
+                start_str, end_str = item.split('-', 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = end = int(item)
+                if step != 1:
+                    end = high
+            if start < low or end > high or start > end:
+                raise ValueError(f"Значение вне диапазона {low}-{high}: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day) -> bool:
+        in_month = day.day in self.days
+        # isoweekday: 1 - понедельник ... 7 - воскресенье, в cron воскресенье - 0
+        in_week = day.isoweekday() % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return in_month or in_week
+        if self.day_restricted:
+            return in_month
+        if self.weekday_restricted:
+            return in_week
+        return True
+
+    def next_after(self, moment: datetime, tz: ZoneInfo) -> datetime:
+        """Ближайший момент срабатывания строго после moment в часовом поясе tz"""
+        local = moment.astimezone(tz)
+        day = local.date()
+        # Поиск ограничен несколькими годами, чтобы невыполнимое расписание (31 февраля) не зациклилось
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+                        if candidate > local:
+                            return candidate.astimezone(timezone.utc)
+            day += timedelta(days=1)
+        raise ValueError(f"Расписание никогда не срабатывает: {self.expression!r}")
+
+
+class Job:
+    """Задача планировщика"""
+
+    def __init__(self, name: str, spec: CronSpec, func, tz: ZoneInfo, catch_up: bool = True):
+        self.name = name
+        self.spec = spec
+        self.func = func
+        self.tz = tz
+        self.catch_up = catch_up
+        self.next_run = None
+
+
+class Scheduler:
+    """Планировщик задач внутри цикла событий бота
+
+    Задачи хранятся в куче по времени следующего запуска, планировщик спит
+    ровно до ближайшей задачи. Время последнего запуска сохраняется в базе
+    данных, и все пропущенные за время простоя запуски (например, ежедневные
+    отчеты за каждый день простоя) выполняются после старта по порядку; на
+    первой ошибке догоняющие запуски задачи прекращаются, и оставшиеся будут
+    догнаны после следующего перезапуска. Функция задачи получает плановое
+    время запуска (UTC).
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self._jobs = {}
+        self._heap = []
+        self._counter = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()
+
+    def add_job(self, name: str, expression: str, func, tz: ZoneInfo, catch_up: bool = True) -> Job:
+        """Регистрация задачи с cron-расписанием в часовом поясе tz"""
+        job = Job(name, CronSpec(expression), func, tz, catch_up)
+        self._jobs[name] = job
+        if self._task is not None:
+            self._push(job, job.spec.next_after(datetime.now(timezone.utc), tz))
+        return job
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._jobs
+
+    def remove_job(self, name: str):
+        """Удаление задачи (запись в куче пропускается при извлечении)"""
+        self._jobs.pop(name, None)
+
+    def _push(self, job: Job, run_at: datetime):
+        job.next_run = run_at
+        self._counter += 1
+        heapq.heappush(self._heap, (run_at, self._counter, job))
+        self._wakeup.set()
+
+    async def start(self):
+        """Планирование задач с учетом пропущенных запусков и запуск цикла"""
+        now = datetime.now(timezone.utc)
+        last_runs = await self.db.get_job_runs() if self.db else {}
+        for job in self._jobs.values():
+            last_run = last_runs.get(job.name)
+            if job.catch_up and last_run is not None:
+                missed = []
+                run_at = job.spec.next_after(last_run, job.tz)
+                while run_at <= now:
+                    missed.append(run_at)
+                    run_at = job.spec.next_after(run_at, job.tz)
+                if missed:
+                    logger.info(
+                        f"Задача {job.name} пропущена {len(missed)} раз с {missed[0]}, выполняем сейчас"
+                    )
+                    self._spawn(self._catch_up(job, missed))
+            self._push(job, job.spec.next_after(now, job.tz))
+        self._task = asyncio.create_task(self._run())
+
+    def _spawn(self, coroutine):
+        # Долгая задача не должна задерживать остальные
+        task = asyncio.create_task(coroutine)
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _catch_up(self, job: Job, missed: list):
+        """Пропущенные запуски задачи по порядку до первой ошибки"""
+        for run_at in missed:
+            if self._jobs.get(job.name) is not job or not await self._execute(job, run_at):
+                return
+
+    async def stop(self):
+        """Остановка цикла планировщика"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            run_at, _, job = self._heap[0]
+            delay = (run_at - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, MAX_SLEEP_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            if self._jobs.get(job.name) is not job or job.next_run != run_at:
+                # Задача удалена или перепланирована
+                continue
+
+            self._spawn(self._execute(job, run_at))
+            self._push(job, job.spec.next_after(max(run_at, datetime.now(timezone.utc)), job.tz))
+
+    async def _execute(self, job: Job, run_at: datetime) -> bool:
+        """Выполнение задачи и сохранение времени успешного запуска; False при ошибке"""
+        started = time.perf_counter()
+        try:
+            await job.func(run_at)
+            logger.info(f"Задача {job.name} выполнена")
+        except Exception as e:
+            JOB_FAILURES.inc(job.name)
+            logger.error(f"Ошибка выполнения задачи {job.name}: {e}")
+            # Неудачный запуск не сохраняется: после перезапуска он будет догнан
+            return False
+        finally:
+            JOB_DURATION.observe(time.perf_counter() - started, job.name)
+        if self.db:
+            await self.db.set_job_run(job.name, run_at)
+        return True
@@ -0,0 +1,76 @@
+import logging
+from datetime import datetime
+from .storage import AsyncDatabase
+from .cache import TodayStatsCache
+
+logger = logging.getLogger(__name__)
+
+
+class SessionRegistry:
+    """Реестр активных сессий дипворка
+
+    Открытые сессии хранятся в памяти и читаются без обращения к базе данных,
+    а каждое изменение сразу записывается в базу. При запуске все открытые
+    сессии загружаются одним запросом, поэтому перезапуск бота не теряет их.
+    shard=(index, count) ограничивает загрузку и сверку пользователями
+    процесса-обработчика webhook: user_id % count = index. Статистика за день, полученная при закрытии сессии, сразу попадает в
+    кеш today_stats, а сверка устаревших сессий сбрасывает его записи.
+    """
+
+    def __init__(self, db: AsyncDatabase, max_age_minutes: int, today_stats: TodayStatsCache = None,
+                 shard: tuple = None):
+        self.db = db
+        self.max_age_minutes = max_age_minutes
+        self.today_stats = today_stats
+        self.shard = shard
+        # user_id -> session_id
+        self._sessions = {}
+
+    async def load(self):
+        """Загрузка открытых сессий из базы данных после сверки устаревших;
+        ошибка базы данных прерывает запуск бота"""
+        await self.reconcile()
+        self._sessions = dict(await self.db.get_open_sessions(self.shard))
+        logger.info(f"Загружено активных сессий: {len(self._sessions)}")
+
+    async def reconcile(self) -> list:
+        """Массовое закрытие сессий, открытых дольше max_age_minutes"""
+        user_ids = await self.db.close_stale_sessions(self.max_age_minutes, self.shard)
+        for user_id in user_ids:
+            self._sessions.pop(user_id, None)
+            if self.today_stats is not None:
+                self.today_stats.invalidate(user_id)
+        if user_ids:
+            logger.info(f"Закрыто устаревших сессий: {len(user_ids)}")
+        return user_ids
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, user_id: int) -> int:
+        """Идентификатор активной сессии пользователя или None"""
+        return self._sessions.get(user_id)
+
+    async def start(self, user_id: int, deadlines: list = (), tag: str = None) -> int:
+        """Создание сессии с тегом tag в базе данных и регистрация ее в памяти;
+        сроки deadlines отсчитываются от начала сессии"""
+        session_id = await self.db.start_session(user_id, deadlines, tag)
+        if session_id:
+            self._sessions[user_id] = session_id
+        return session_id
+
+    async def end(self, user_id: int, end_time: datetime = None) -> dict:
+        """Завершение активной сессии (в момент end_time, по умолчанию сейчас):
+        статистика за день или None"""
+        session_id = self._sessions.get(user_id)
+        if session_id is None:
+            return None
+        stats = await self.db.end_session(session_id, end_time)
+        if stats is not None:
+            self._sessions.pop(user_id, None)
+            if self.today_stats is not None:
+                self.today_stats.put(user_id, stats['day'], stats)
+        return stats
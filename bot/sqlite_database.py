@@ -0,0 +1,1184 @@
+"""
+Хранилище в файле SQLite (DB_ENGINE=sqlite)
+
+Для развертывания на одной машине: база - один файл SQLITE_PATH рядом с
+ботом, без контейнера PostgreSQL. Журнал WAL позволяет читать статистику
+параллельно с записью, запись сериализуется транзакциями BEGIN IMMEDIATE
+(как advisory-блокировкой в PostgreSQL). Каждый поток пула AsyncDatabase
+работает со своим подключением. Таблицы те же, что в PostgreSQL, но
+статистика зачисляется кодом на Python (bot/stats.py), а не функциями
+базы данных. Время сессий хранится в UTC.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta, timezone
+from itertools import groupby, islice
+from zoneinfo import ZoneInfo
+from .database import (
+    EXPORT_DATASETS, DEFAULT_DAILY_GOAL_MINUTES, RECENT_TAGS_DAYS, make_stats, make_day_stats, import_row
+)
+from .stats import (
+    local_timezone, utc_now, as_utc, session_minutes, session_day_split, empty_insights, add_session_insights,
+    merge_intervals, streak_scan, current_streak, week_start, month_start
+)
+
+# Версия схемы в PRAGMA user_version
+SCHEMA_VERSION = 7
+
+# Сессий за один шаг перевода времени в UTC при обновлении схемы
+UPGRADE_BATCH_SIZE = 10000
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_birthday (
+        user_id INTEGER PRIMARY KEY,
+        birthday TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS deepwork_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT,
+        duration_minutes INTEGER,
+        tag TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_deepwork_sessions_user_start ON deepwork_sessions (user_id, start_time);
+    -- Не больше одной открытой сессии на пользователя
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_deepwork_sessions_open ON deepwork_sessions (user_id)
+        WHERE end_time IS NULL;
+
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        total_minutes INTEGER NOT NULL DEFAULT 0,
+        session_count INTEGER NOT NULL DEFAULT 0,
+        -- Момент последнего изменения в наносекундах: версия для кэша графиков
+        updated_at INTEGER NOT NULL,
+        PRIMARY KEY (user_id, date)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_daily_stats_date_user ON daily_stats (date, user_id);
+
+    -- Статистика по тегам, как в миграции 0007_session_tags.sql
+    CREATE TABLE IF NOT EXISTS daily_tag_stats (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        tag TEXT NOT NULL,
+        total_minutes INTEGER NOT NULL DEFAULT 0,
+        session_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, date, tag)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS weekly_stats (
+        user_id INTEGER NOT NULL,
+        week_start TEXT NOT NULL,
+        total_minutes INTEGER NOT NULL DEFAULT 0,
+        total_sessions INTEGER NOT NULL DEFAULT 0,
+        days_with_work INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, week_start)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS monthly_stats (
+        user_id INTEGER NOT NULL,
+        month_start TEXT NOT NULL,
+        total_minutes INTEGER NOT NULL DEFAULT 0,
+        total_sessions INTEGER NOT NULL DEFAULT 0,
+        days_with_work INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, month_start)
+    ) WITHOUT ROWID;
+
+    -- NULL в колонке - значение по умолчанию (цель, часовой пояс и язык бота)
+    CREATE TABLE IF NOT EXISTS user_settings (
+        user_id INTEGER PRIMARY KEY,
+        daily_goal_minutes INTEGER,
+        timezone TEXT,
+        language TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS user_streaks (
+        user_id INTEGER PRIMARY KEY,
+        current_streak INTEGER NOT NULL DEFAULT 0,
+        longest_streak INTEGER NOT NULL DEFAULT 0,
+        last_goal_day TEXT,
+        goal_days INTEGER NOT NULL DEFAULT 0,
+        active_days INTEGER NOT NULL DEFAULT 0
+    );
+
+    -- Гистограммы /insights: массивы JSON, как INTEGER[] в PostgreSQL
+    CREATE TABLE IF NOT EXISTS user_insights (
+        user_id INTEGER PRIMARY KEY,
+        hour_minutes TEXT NOT NULL,
+        length_counts TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS scheduler_jobs (
+        name TEXT PRIMARY KEY,
+        last_run_at TEXT NOT NULL
+    );
+
+    -- Сроки сессий, как в миграции 0006_session_deadlines.sql
+    CREATE TABLE IF NOT EXISTS session_deadlines (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        session_id INTEGER,
+        kind TEXT NOT NULL,
+        due_at TEXT NOT NULL,
+        minutes INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_session_deadlines_due ON session_deadlines (due_at);
+    CREATE INDEX IF NOT EXISTS idx_session_deadlines_user ON session_deadlines (user_id);
+
+    -- Участники групповых чатов и снимок таблиц лидеров, как в миграции
+    -- 0008_group_leaderboards.sql
+    CREATE TABLE IF NOT EXISTS group_members (
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        joined_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (chat_id, user_id)
+    );
+
+    CREATE TABLE IF NOT EXISTS group_leaderboards (
+        chat_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        period_start TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        total_minutes INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, period, position)
+    );
+"""
+
+# Пересчет недельной и месячной статистики диапазона пользователей. Неделя
+# начинается с понедельника: шесть дней назад и вперед до понедельника.
+REBUILD_ROLLUPS_SQL = (
+    "DELETE FROM weekly_stats WHERE user_id BETWEEN :first AND :last",
+    """
+        INSERT INTO weekly_stats (user_id, week_start, total_minutes, total_sessions, days_with_work)
+        SELECT user_id, date(date, '-6 days', 'weekday 1'), SUM(total_minutes), SUM(session_count),
+               SUM(total_minutes > 0)
+        FROM daily_stats
+        WHERE user_id BETWEEN :first AND :last
+        GROUP BY 1, 2
+    """,
+    "DELETE FROM monthly_stats WHERE user_id BETWEEN :first AND :last",
+    """
+        INSERT INTO monthly_stats (user_id, month_start, total_minutes, total_sessions, days_with_work)
+        SELECT user_id, date(date, 'start of month'), SUM(total_minutes), SUM(session_count),
+               SUM(total_minutes > 0)
+        FROM daily_stats
+        WHERE user_id BETWEEN :first AND :last
+        GROUP BY 1, 2
+    """,
+)
+
+# Снимок таблиц лидеров диапазона чатов, как REFRESH_LEADERBOARDS_SQL в
+# bot/database.py; неделя начинается с понедельника
+REFRESH_LEADERBOARDS_SQL = (
+    "DELETE FROM group_leaderboards WHERE chat_id BETWEEN :first AND :last",
+    """
+        INSERT INTO group_leaderboards (chat_id, period, position, period_start, user_id, name, total_minutes)
+        SELECT chat_id, period, position, period_start, user_id, name, total_minutes
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                       PARTITION BY chat_id, period ORDER BY total_minutes DESC, user_id
+                   ) AS position
+            FROM (
+                SELECT m.chat_id, p.period, p.period_start, m.user_id, m.name, (
+                           SELECT SUM(d.total_minutes) FROM daily_stats d
+                           WHERE d.user_id = m.user_id AND d.date BETWEEN p.period_start AND :day
+                       ) AS total_minutes
+                FROM group_members m
+                CROSS JOIN (
+                    SELECT 'day' AS period, :day AS period_start
+                    UNION ALL SELECT 'week', date(:day, '-6 days', 'weekday 1')
+                ) p
+                WHERE m.chat_id BETWEEN :first AND :last
+            )
+            WHERE total_minutes > 0
+        )
+        WHERE position <= :size
+    """,
+)
+
+# Запросы выгрузки: колонки и порядок как в EXPORT_DATASETS
+EXPORT_QUERIES = {
+    'sessions': """
+        SELECT id, user_id, start_time, end_time, duration_minutes, tag
+        FROM deepwork_sessions {where}
+        ORDER BY user_id, start_time
+    """,
+    'daily_stats': """
+        SELECT user_id, date, total_minutes, session_count
+        FROM daily_stats {where}
+        ORDER BY user_id, date
+    """,
+}
+
+
+def _timestamp(moment: datetime) -> str:
+    """Время в UTC как текст одинаковой длины: строки сравниваются как время"""
+    return moment.astimezone(timezone.utc).isoformat(' ', 'microseconds')
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _parse_date(value: str) -> date:
+    return date.fromisoformat(value) if value is not None else None
+
+
+class SQLiteDatabase:
+    def __init__(self, path: str = None, maxconn: int = None, migrate: bool = True):
+        self.path = path or os.getenv('SQLITE_PATH', 'time_tracker.db')
+        # Потоков с подключениями: читатели работают параллельно, писатель один
+        self.maxconn = maxconn or int(os.getenv('DB_POOL_MAX', '4'))
+        self.timezone = local_timezone()
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        if migrate:
+            self.migrate()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Транзакции открываются явно в connection()
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL синхронизация при каждом COMMIT не нужна для целостности
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def migrate(self):
+        """Создание таблиц, если их еще нет, и обновление схемы старой версии"""
+        try:
+            with self.connection(write=True) as conn:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if 0 < version < 2:
+                    self._upgrade_timezones(conn)
+                if 0 < version < 3:
+                    self._upgrade_open_sessions(conn)
+                if 0 < version < 5:
+                    # Версия 4 -> 5: тег сессии; таблицу daily_tag_stats создает SCHEMA
+                    conn.execute("ALTER TABLE deepwork_sessions ADD COLUMN tag TEXT")
+                if 0 < version < 7:
+                    # Версия 6 -> 7: язык пользователя
+                    conn.execute("ALTER TABLE user_settings ADD COLUMN language TEXT")
+                if version < SCHEMA_VERSION:
+                    for statement in SCHEMA.split(';'):
+                        if statement.strip():
+                            conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        except Exception as e:
+            print(f"Ошибка создания схемы SQLite: {e}")
+            raise
+
+    def _upgrade_timezones(self, conn):
+        """Версия 1 -> 2: колонка часового пояса в user_settings и время сессий
+        из времени бота в UTC. Дни статистики не меняются: они уже посчитаны
+        в часовом поясе бота, который остается поясом по умолчанию."""
+        conn.execute("ALTER TABLE user_settings RENAME TO user_settings_v1")
+        conn.execute("""
+            CREATE TABLE user_settings (user_id INTEGER PRIMARY KEY, daily_goal_minutes INTEGER, timezone TEXT)
+        """)
+        conn.execute("""
+            INSERT INTO user_settings (user_id, daily_goal_minutes)
+            SELECT user_id, daily_goal_minutes FROM user_settings_v1
+        """)
+        conn.execute("DROP TABLE user_settings_v1")
+        after = 0
+        while True:
+            rows = conn.execute("""
+                SELECT id, start_time, end_time FROM deepwork_sessions WHERE id > ? ORDER BY id LIMIT ?
+            """, (after, UPGRADE_BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            conn.executemany("UPDATE deepwork_sessions SET start_time = ?, end_time = ? WHERE id = ?", [
+                (_timestamp(as_utc(_parse_timestamp(start), self.timezone)),
+                 _timestamp(as_utc(_parse_timestamp(end), self.timezone)) if end is not None else None,
+                 session_id)
+                for session_id, start, end in rows
+            ])
+            after = rows[-1][0]
+
+    @staticmethod
+    def _upgrade_open_sessions(conn):
+        """Версия 2 -> 3: индекс открытых сессий становится уникальным. Лишние
+        открытые сессии прежних двойных нажатий удаляются, как в миграции
+        0005_open_sessions.sql."""
+        conn.execute("""
+            DELETE FROM deepwork_sessions
+            WHERE end_time IS NULL AND EXISTS (
+                SELECT 1 FROM deepwork_sessions n
+                WHERE n.user_id = deepwork_sessions.user_id AND n.end_time IS NULL
+                  AND (n.start_time, n.id) > (deepwork_sessions.start_time, deepwork_sessions.id)
+            )
+        """)
+        conn.execute("DROP INDEX IF EXISTS idx_deepwork_sessions_open")
+
+    @contextmanager
+    def connection(self, write: bool = False):
+        """Подключение потока в транзакции: commit при успехе, rollback при ошибке
+
+        write=True сразу берет блокировку записи, чтобы две пишущие
+        транзакции не обнаруживали конфликт посреди работы.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # В том числе GeneratorExit недочитанной выгрузки
+            conn.execute("ROLLBACK")
+            raise
+
+    def _goal(self, conn, user_id: int) -> int:
+        row = conn.execute("SELECT daily_goal_minutes FROM user_settings WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row and row[0] is not None else DEFAULT_DAILY_GOAL_MINUTES
+
+    def _zone(self, conn, user_id: int) -> ZoneInfo:
+        row = conn.execute("SELECT timezone FROM user_settings WHERE user_id = ?", (user_id,)).fetchone()
+        return ZoneInfo(row[0]) if row and row[0] else self.timezone
+
+    def _today(self, conn, user_id: int) -> date:
+        return utc_now().astimezone(self._zone(conn, user_id)).date()
+
+    def _day_stats(self, conn, user_id: int, day: date) -> dict:
+        row = conn.execute("""
+            SELECT total_minutes, session_count FROM daily_stats WHERE user_id = ? AND date = ?
+        """, (user_id, day.isoformat())).fetchone()
+        return make_day_stats(day, self._goal(conn, user_id), *(row or ()))
+
+    def _credit(self, conn, user_id: int, start: datetime, end: datetime, tag: str = None):
+        """Зачисление закрытой сессии: день, тег, неделя, месяц, серия и /insights
+
+        Серия обновляется без просмотра истории, как в credit_session
+        PostgreSQL; только если цель достигнута в день раньше последнего дня с
+        целью (поздно закрытая сессия), серия пересчитывается полностью.
+        """
+        goal = self._goal(conn, user_id)
+        tz = self._zone(conn, user_id)
+        rescan = False
+        for day, minutes, started in session_day_split(start, end, tz):
+            conn.execute("""
+                INSERT INTO daily_stats (user_id, date, total_minutes, session_count, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, date)
+                DO UPDATE SET
+                    total_minutes = total_minutes + excluded.total_minutes,
+                    session_count = session_count + excluded.session_count,
+                    updated_at = excluded.updated_at
+            """, (user_id, day.isoformat(), minutes, started, time.time_ns()))
+            if tag is not None:
+                self._add_tag_day(conn, user_id, day, tag, minutes, started)
+            total = conn.execute("""
+                SELECT total_minutes FROM daily_stats WHERE user_id = ? AND date = ?
+            """, (user_id, day.isoformat())).fetchone()[0]
+            new_day = int(total > 0 and total == minutes)
+            for table, column, start_day in (('weekly_stats', 'week_start', week_start(day)),
+                                             ('monthly_stats', 'month_start', month_start(day))):
+                conn.execute(f"""
+                    INSERT INTO {table} (user_id, {column}, total_minutes, total_sessions, days_with_work)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (user_id, {column})
+                    DO UPDATE SET
+                        total_minutes = total_minutes + excluded.total_minutes,
+                        total_sessions = total_sessions + excluded.total_sessions,
+                        days_with_work = days_with_work + excluded.days_with_work
+                """, (user_id, start_day.isoformat(), minutes, started, new_day))
+            # Цель достигнута именно этой сессией
+            goal_hit = int(total >= goal and total - minutes < goal)
+            if goal_hit and conn.execute("""
+                SELECT 1 FROM user_streaks WHERE user_id = ? AND last_goal_day > ?
+            """, (user_id, day.isoformat())).fetchone():
+                rescan = True
+            elif goal_hit or new_day:
+                self._advance_streak(conn, user_id, day, goal_hit, new_day)
+        if rescan:
+            self._rescan_streaks(conn, user_id, user_id)
+        hour_minutes, length_counts = self._load_insights(conn, user_id)
+        add_session_insights(hour_minutes, length_counts, start, end, tz)
+        self._save_insights(conn, user_id, hour_minutes, length_counts)
+
+    @staticmethod
+    def _advance_streak(conn, user_id: int, day: date, goal_hit: int, new_day: int):
+        """Серия после нового дня с дипворком или дня, впервые достигшего цели"""
+        conn.execute("""
+            INSERT INTO user_streaks AS s
+                (user_id, current_streak, longest_streak, last_goal_day, goal_days, active_days)
+            VALUES (:user, :hit, :hit, CASE WHEN :hit THEN :day END, :hit, :new)
+            ON CONFLICT (user_id)
+            DO UPDATE SET
+                current_streak = CASE
+                    WHEN NOT :hit THEN s.current_streak
+                    WHEN s.last_goal_day = :previous THEN s.current_streak + 1
+                    ELSE 1
+                END,
+                longest_streak = MAX(s.longest_streak, CASE
+                    WHEN NOT :hit THEN s.current_streak
+                    WHEN s.last_goal_day = :previous THEN s.current_streak + 1
+                    ELSE 1
+                END),
+                last_goal_day = CASE WHEN :hit THEN :day ELSE s.last_goal_day END,
+                goal_days = s.goal_days + :hit,
+                active_days = s.active_days + :new
+        """, {
+            'user': user_id, 'hit': goal_hit, 'new': new_day,
+            'day': day.isoformat(), 'previous': (day - timedelta(days=1)).isoformat(),
+        })
+
+    @staticmethod
+    def _add_tag_day(conn, user_id: int, day: date, tag: str, minutes: int, started: int):
+        conn.execute("""
+            INSERT INTO daily_tag_stats (user_id, date, tag, total_minutes, session_count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, date, tag)
+            DO UPDATE SET
+                total_minutes = total_minutes + excluded.total_minutes,
+                session_count = session_count + excluded.session_count
+        """, (user_id, day.isoformat(), tag, minutes, started))
+
+    def _rescan_streaks(self, conn, first: int, last: int):
+        """Пересчет серий пользователей first..last из ежедневной статистики"""
+        goals = dict(conn.execute("""
+            SELECT user_id, daily_goal_minutes FROM user_settings
+            WHERE user_id BETWEEN ? AND ? AND daily_goal_minutes IS NOT NULL
+        """, (first, last)))
+        conn.execute("DELETE FROM user_streaks WHERE user_id BETWEEN ? AND ?", (first, last))
+        rows = conn.execute("""
+            SELECT user_id, date, total_minutes FROM daily_stats
+            WHERE user_id BETWEEN ? AND ?
+            ORDER BY user_id, date
+        """, (first, last))
+        for user_id, days in groupby(rows, key=lambda row: row[0]):
+            streak = streak_scan(
+                ((_parse_date(day), minutes) for _, day, minutes in days),
+                goals.get(user_id, DEFAULT_DAILY_GOAL_MINUTES)
+            )
+            conn.execute("""
+                INSERT INTO user_streaks
+                    (user_id, current_streak, longest_streak, last_goal_day, goal_days, active_days)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (user_id, streak['current_streak'], streak['longest_streak'],
+                  streak['last_goal_day'].isoformat() if streak['last_goal_day'] else None,
+                  streak['goal_days'], streak['active_days']))
+
+    def _load_insights(self, conn, user_id: int) -> tuple:
+        row = conn.execute("""
+            SELECT hour_minutes, length_counts FROM user_insights WHERE user_id = ?
+        """, (user_id,)).fetchone()
+        return (json.loads(row[0]), json.loads(row[1])) if row else empty_insights()
+
+    def _save_insights(self, conn, user_id: int, hour_minutes: list, length_counts: list):
+        conn.execute("""
+            INSERT OR REPLACE INTO user_insights (user_id, hour_minutes, length_counts) VALUES (?, ?, ?)
+        """, (user_id, json.dumps(hour_minutes), json.dumps(length_counts)))
+
+    def ping(self) -> bool:
+        """Проверка доступности файла базы данных"""
+        try:
+            with self.connection() as conn:
+                conn.execute("SELECT 1")
+                return True
+        except Exception as e:
+            print(f"База данных недоступна: {e}")
+            return False
+
+    def set_user_birthday(self, user_id: int, birthday: date) -> bool:
+        """Установка даты рождения пользователя"""
+        try:
+            with self.connection(write=True) as conn:
+                conn.execute("""
+                    INSERT INTO user_birthday (user_id, birthday) VALUES (?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET birthday = excluded.birthday
+                """, (user_id, birthday.isoformat()))
+                return True
+        except Exception as e:
+            print(f"Ошибка установки даты рождения: {e}")
+            return False
+
+    def get_user_birthday(self, user_id: int) -> date:
+        """Получение даты рождения пользователя"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute("SELECT birthday FROM user_birthday WHERE user_id = ?", (user_id,)).fetchone()
+                return _parse_date(row[0]) if row else None
+        except Exception as e:
+            print(f"Ошибка получения даты рождения: {e}")
+            return None
+
+    def start_session(self, user_id: int, deadlines: list = (), tag: str = None) -> int:
+        """Начало новой сессии дипворка с тегом tag; если открытая сессия уже есть, новая
+        не создается и возвращается ее id. Сроки новой сессии (отсчитываются
+        от ее начала) заменяют прежние сроки пользователя."""
+        try:
+            with self.connection(write=True) as conn:
+                row = conn.execute("""
+                    SELECT id FROM deepwork_sessions WHERE user_id = ? AND end_time IS NULL
+                """, (user_id,)).fetchone()
+                if row is not None:
+                    return row[0]
+                start = utc_now()
+                cursor = conn.execute("""
+                    INSERT INTO deepwork_sessions (user_id, start_time, tag) VALUES (?, ?, ?)
+                """, (user_id, _timestamp(start), tag))
+                self._replace_deadlines(conn, user_id, cursor.lastrowid, [
+                    (kind, start + delay, minutes) for kind, delay, minutes in deadlines
+                ])
+                return cursor.lastrowid
+        except Exception as e:
+            print(f"Ошибка начала сессии: {e}")
+            return None
+
+    def end_session(self, session_id: int, end_time: datetime = None) -> dict:
+        """Завершение сессии дипворка в момент end_time (по умолчанию сейчас)
+        со снятием ее сроков: обновленная статистика за день окончания или
+        None при ошибке. Уже закрытая сессия повторно не учитывается."""
+        try:
+            with self.connection(write=True) as conn:
+                now = end_time or utc_now()
+                row = conn.execute("""
+                    SELECT user_id, start_time, end_time, tag FROM deepwork_sessions WHERE id = ?
+                """, (session_id,)).fetchone()
+                if row is None:
+                    return make_day_stats(now.astimezone(self.timezone).date(), DEFAULT_DAILY_GOAL_MINUTES)
+                user_id, start, end, tag = row
+                if end is None:
+                    start = _parse_timestamp(start)
+                    now = max(now, start)
+                    conn.execute("""
+                        UPDATE deepwork_sessions SET end_time = ?, duration_minutes = ? WHERE id = ?
+                    """, (_timestamp(now), session_minutes(start, now), session_id))
+                    self._credit(conn, user_id, start, now, tag)
+                    conn.execute("DELETE FROM session_deadlines WHERE user_id = ?", (user_id,))
+                return self._day_stats(conn, user_id, now.astimezone(self._zone(conn, user_id)).date())
+        except Exception as e:
+            print(f"Ошибка завершения сессии: {e}")
+            return None
+
+    def get_today_stats(self, user_id: int, day: date = None) -> dict:
+        """Получение статистики за сегодня (или за указанный день) с целью
+        пользователя, None при ошибке"""
+        try:
+            with self.connection() as conn:
+                return self._day_stats(conn, user_id, day or self._today(conn, user_id))
+        except Exception as e:
+            print(f"Ошибка получения статистики: {e}")
+            return None
+
+    def get_week_stats(self, user_id: int, day: date = None) -> dict:
+        """Статистика за неделю, содержащую day (по умолчанию текущую)"""
+        return self._get_period_stats('weekly_stats', 'week_start', week_start, day, user_id)
+
+    def get_month_stats(self, user_id: int, day: date = None) -> dict:
+        """Статистика за месяц, содержащий day (по умолчанию текущий)"""
+        return self._get_period_stats('monthly_stats', 'month_start', month_start, day, user_id)
+
+    def _get_period_stats(self, table: str, column: str, period_start, day: date, user_id: int) -> dict:
+        try:
+            with self.connection() as conn:
+                start = period_start(day or self._today(conn, user_id))
+                row = conn.execute(f"""
+                    SELECT total_minutes, total_sessions, days_with_work FROM {table}
+                    WHERE user_id = ? AND {column} = ?
+                """, (user_id, start.isoformat())).fetchone()
+                total_minutes, total_sessions, days_with_work = row or (0, 0, 0)
+                stats = make_stats(total_minutes, total_sessions)
+                stats['start'] = start
+                stats['days_with_work'] = days_with_work
+                return stats
+        except Exception as e:
+            print(f"Ошибка получения статистики за период: {e}")
+            return None
+
+    def get_daily_goal(self, user_id: int) -> int:
+        """Цель дипворка пользователя в минутах"""
+        try:
+            with self.connection() as conn:
+                return self._goal(conn, user_id)
+        except Exception as e:
+            print(f"Ошибка получения цели: {e}")
+            return DEFAULT_DAILY_GOAL_MINUTES
+
+    def set_daily_goal(self, user_id: int, minutes: int) -> bool:
+        """Установка цели дипворка и пересчет серии дней с целью под новую цель"""
+        try:
+            with self.connection(write=True) as conn:
+                conn.execute("""
+                    INSERT INTO user_settings (user_id, daily_goal_minutes) VALUES (?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET daily_goal_minutes = excluded.daily_goal_minutes
+                """, (user_id, minutes))
+                self._rescan_streaks(conn, user_id, user_id)
+                return True
+        except Exception as e:
+            print(f"Ошибка установки цели: {e}")
+            return False
+
+    def get_user_timezone(self, user_id: int) -> str:
+        """Часовой пояс пользователя (по умолчанию пояс бота), None при ошибке"""
+        try:
+            with self.connection() as conn:
+                return self._zone(conn, user_id).key
+        except Exception as e:
+            print(f"Ошибка получения часового пояса: {e}")
+            return None
+
+    def set_user_timezone(self, user_id: int, timezone: str) -> bool:
+        """Установка часового пояса и пересчет всей статистики пользователя в нем"""
+        try:
+            ZoneInfo(timezone)
+            with self.connection(write=True) as conn:
+                conn.execute("""
+                    INSERT INTO user_settings (user_id, timezone) VALUES (?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET timezone = excluded.timezone
+                """, (user_id, timezone))
+                self._rebuild_users(conn, user_id, user_id)
+                return True
+        except Exception as e:
+            print(f"Ошибка установки часового пояса: {e}")
+            return False
+
+    def get_user_language(self, user_id: int) -> str:
+        """Запомненный язык пользователя, None - не запомнен или ошибка"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute("SELECT language FROM user_settings WHERE user_id = ?", (user_id,)).fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            print(f"Ошибка получения языка: {e}")
+            return None
+
+    def set_user_language(self, user_id: int, language: str) -> bool:
+        """Запоминание языка пользователя"""
+        try:
+            with self.connection(write=True) as conn:
+                conn.execute("""
+                    INSERT INTO user_settings (user_id, language) VALUES (?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET language = excluded.language
+                """, (user_id, language))
+                return True
+        except Exception as e:
+            print(f"Ошибка сохранения языка: {e}")
+            return False
+
+    def get_timezones(self) -> list:
+        """Часовые пояса, выбранные пользователями"""
+        try:
+            with self.connection() as conn:
+                return [row[0] for row in conn.execute("""
+                    SELECT DISTINCT timezone FROM user_settings WHERE timezone IS NOT NULL ORDER BY 1
+                """)]
+        except Exception as e:
+            print(f"Ошибка получения часовых поясов: {e}")
+            return []
+
+    def get_streak(self, user_id: int, today: date = None) -> dict:
+        """Серия дней с целью: текущая (прерывается, если вчера цель не достигнута),
+        лучшая, число дней с целью и с дипворком, цель в минутах"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute("""
+                    SELECT current_streak, longest_streak, last_goal_day, goal_days, active_days
+                    FROM user_streaks WHERE user_id = ?
+                """, (user_id,)).fetchone()
+                streak = {'current_streak': 0, 'longest_streak': 0, 'last_goal_day': None,
+                          'goal_days': 0, 'active_days': 0}
+                if row:
+                    streak = dict(zip(streak, row), last_goal_day=_parse_date(row[2]))
+                return {
+                    'current_streak': current_streak(streak, today or self._today(conn, user_id)),
+                    'longest_streak': streak['longest_streak'],
+                    'goal_days': streak['goal_days'],
+                    'active_days': streak['active_days'],
+                    'goal_minutes': self._goal(conn, user_id),
+                }
+        except Exception as e:
+            print(f"Ошибка получения серии: {e}")
+            return None
+
+    def get_chart_data(self, user_id: int, start: date, end: date) -> dict:
+        """Данные графика: минуты дипворка по датам периода, цель и версия"""
+        try:
+            with self.connection() as conn:
+                rows = conn.execute("""
+                    SELECT date, total_minutes, updated_at FROM daily_stats
+                    WHERE user_id = ? AND date BETWEEN ? AND ?
+                """, (user_id, start.isoformat(), end.isoformat())).fetchall()
+                goal = self._goal(conn, user_id)
+                return {
+                    'days': {_parse_date(day): minutes for day, minutes, _ in rows},
+                    'goal': goal,
+                    'version': (start, end, goal, len(rows), max((row[2] for row in rows), default=None)),
+                }
+        except Exception as e:
+            print(f"Ошибка получения данных графика: {e}")
+            return None
+
+    def get_insights(self, user_id: int) -> dict:
+        """Гистограммы закрытых сессий, как у Database.get_insights"""
+        try:
+            with self.connection() as conn:
+                hour_minutes, length_counts = self._load_insights(conn, user_id)
+                return {'hour_minutes': hour_minutes, 'length_counts': length_counts}
+        except Exception as e:
+            print(f"Ошибка получения закономерностей: {e}")
+            return None
+
+    def get_tag_stats(self, user_id: int, start: date, end: date) -> dict:
+        """Статистика по тегам за дни start..end, как у Database.get_tag_stats"""
+        try:
+            with self.connection() as conn:
+                stats = make_stats(*conn.execute("""
+                    SELECT COALESCE(SUM(total_minutes), 0), COALESCE(SUM(session_count), 0)
+                    FROM daily_stats
+                    WHERE user_id = ? AND date BETWEEN ? AND ?
+                """, (user_id, start.isoformat(), end.isoformat())).fetchone())
+                stats['tags'] = conn.execute("""
+                    SELECT tag, SUM(total_minutes), SUM(session_count)
+                    FROM daily_tag_stats
+                    WHERE user_id = ? AND date BETWEEN ? AND ?
+                    GROUP BY tag
+                    ORDER BY 2 DESC, 1
+                """, (user_id, start.isoformat(), end.isoformat())).fetchall()
+                return stats
+        except Exception as e:
+            print(f"Ошибка получения статистики по тегам: {e}")
+            return None
+
+    def get_recent_tags(self, user_id: int, limit: int) -> list:
+        """Теги закрытых сессий за RECENT_TAGS_DAYS дней: последние использованные первыми"""
+        try:
+            with self.connection() as conn:
+                since = self._today(conn, user_id) - timedelta(days=RECENT_TAGS_DAYS)
+                return [row[0] for row in conn.execute("""
+                    SELECT tag FROM daily_tag_stats
+                    WHERE user_id = ? AND date >= ?
+                    GROUP BY tag
+                    ORDER BY MAX(date) DESC, SUM(total_minutes) DESC, tag
+                    LIMIT ?
+                """, (user_id, since.isoformat(), limit))]
+        except Exception as e:
+            print(f"Ошибка получения недавних тегов: {e}")
+            return []
+
+    def add_group_member(self, chat_id: int, user_id: int, name: str) -> bool:
+        """Участник таблицы лидеров группового чата; для участника - обновление имени"""
+        try:
+            with self.connection(write=True) as conn:
+                conn.execute("""
+                    INSERT INTO group_members (chat_id, user_id, name) VALUES (?, ?, ?)
+                    ON CONFLICT (chat_id, user_id) DO UPDATE SET name = excluded.name
+                """, (chat_id, user_id, name))
+                return True
+        except Exception as e:
+            print(f"Ошибка добавления участника группы: {e}")
+            return False
+
+    def remove_group_member(self, chat_id: int, user_id: int) -> bool:
+        """Выход из таблицы лидеров чата: участник сразу пропадает и из снимка"""
+        try:
+            with self.connection(write=True) as conn:
+                conn.execute("DELETE FROM group_members WHERE chat_id = ? AND user_id = ?", (chat_id, user_id))
+                conn.execute("DELETE FROM group_leaderboards WHERE chat_id = ? AND user_id = ?", (chat_id, user_id))
+                return True
+        except Exception as e:
+            print(f"Ошибка удаления участника группы: {e}")
+            return False
+
+    def get_leaderboard(self, chat_id: int, period: str, period_start: date) -> list:
+        """Таблица лидеров чата из последнего снимка, как у Database.get_leaderboard"""
+        try:
+            with self.connection() as conn:
+                return conn.execute("""
+                    SELECT user_id, name, total_minutes FROM group_leaderboards
+                    WHERE chat_id = ? AND period = ? AND period_start = ?
+                    ORDER BY position
+                """, (chat_id, period, period_start.isoformat())).fetchall()
+        except Exception as e:
+            print(f"Ошибка получения таблицы лидеров: {e}")
+            return []
+
+    def refresh_leaderboards(self, day: date, after_chat_id: int, limit: int, size: int) -> int:
+        """Снимок таблиц лидеров следующих limit чатов, как у Database.refresh_leaderboards"""
+        with self.connection(write=True) as conn:
+            last_chat_id = conn.execute("""
+                SELECT MAX(chat_id) FROM (
+                    SELECT DISTINCT chat_id FROM group_members
+                    WHERE chat_id > ?
+                    ORDER BY chat_id
+                    LIMIT ?
+                )
+            """, (after_chat_id, limit)).fetchone()[0]
+            if last_chat_id is None:
+                return None
+            for statement in REFRESH_LEADERBOARDS_SQL:
+                conn.execute(statement, {
+                    'first': after_chat_id + 1, 'last': last_chat_id, 'day': day.isoformat(), 'size': size
+                })
+            return last_chat_id
+
+    def get_daily_report_page(self, day: date, after_user_id: int, limit: int, timezone: str = None) -> list:
+        """Страница статистики пользователей (только часового пояса timezone,
+        если он задан) за день: (user_id, total_minutes, session_count, daily_goal_minutes, language)"""
+        try:
+            with self.connection() as conn:
+                return conn.execute("""
+                    SELECT d.user_id, d.total_minutes, d.session_count,
+                           COALESCE(s.daily_goal_minutes, ?), s.language
+                    FROM daily_stats d
+                    LEFT JOIN user_settings s ON s.user_id = d.user_id
+                    WHERE d.date = ? AND d.user_id > ? AND d.total_minutes > 0
+                      AND (? IS NULL OR COALESCE(s.timezone, ?) = ?)
+                    ORDER BY d.user_id
+                    LIMIT ?
+                """, (DEFAULT_DAILY_GOAL_MINUTES, day.isoformat(), after_user_id,
+                      timezone, self.timezone.key, timezone, limit)).fetchall()
+        except Exception as e:
+            print(f"Ошибка получения статистики для рассылки: {e}")
+            # Пустая страница означала бы конец рассылки: неудачный запуск не должен считаться выполненным
+            raise
+
+    def get_birthday_page(self, after_user_id: int, limit: int, timezone: str = None) -> list:
+        """Страница дат рождения пользователей (только часового пояса timezone,
+        если он задан): (user_id, birthday, language)"""
+        try:
+            with self.connection() as conn:
+                rows = conn.execute("""
+                    SELECT b.user_id, b.birthday, s.language FROM user_birthday b
+                    LEFT JOIN user_settings s ON s.user_id = b.user_id
+                    WHERE b.user_id > ? AND (? IS NULL OR COALESCE(s.timezone, ?) = ?)
+                    ORDER BY b.user_id
+                    LIMIT ?
+                """, (after_user_id, timezone, self.timezone.key, timezone, limit)).fetchall()
+                return [(user_id, _parse_date(birthday), language) for user_id, birthday, language in rows]
+        except Exception as e:
+            print(f"Ошибка получения дат рождения для рассылки: {e}")
+            # Пустая страница означала бы конец рассылки: неудачный запуск не должен считаться выполненным
+            raise
+
+    def get_active_session(self, user_id: int) -> int:
+        """Получение активной сессии пользователя"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute("""
+                    SELECT id FROM deepwork_sessions WHERE user_id = ? AND end_time IS NULL
+                """, (user_id,)).fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            print(f"Ошибка получения активной сессии: {e}")
+            return None
+
+    def get_open_sessions(self, shard: tuple = None) -> list:
+        """Все открытые сессии одним запросом: список пар (user_id, session_id);
+        shard - только пользователи процесса-обработчика"""
+        index, count = shard or (None, None)
+        try:
+            with self.connection() as conn:
+                return conn.execute("""
+                    SELECT user_id, id FROM deepwork_sessions
+                    WHERE end_time IS NULL AND (:count IS NULL OR user_id % :count = :index)
+                    ORDER BY user_id
+                """, {'index': index, 'count': count}).fetchall()
+        except Exception as e:
+            print(f"Ошибка получения открытых сессий: {e}")
+            # Без них реестр был бы пуст, а новые сессии упирались бы в уже открытые
+            raise
+
+    def close_stale_sessions(self, max_age_minutes: int, shard: tuple = None) -> list:
+        """Массовое закрытие сессий старше max_age_minutes (shard - только
+        пользователей процесса-обработчика) с зачислением max_age_minutes
+        минут. Возвращает список user_id."""
+        index, count = shard or (None, None)
+        try:
+            with self.connection(write=True) as conn:
+                max_age = timedelta(minutes=max_age_minutes)
+                stale = conn.execute("""
+                    SELECT id, user_id, start_time, tag FROM deepwork_sessions
+                    WHERE end_time IS NULL AND start_time < :cutoff
+                      AND (:count IS NULL OR user_id % :count = :index)
+                """, {'cutoff': _timestamp(utc_now() - max_age), 'index': index, 'count': count}).fetchall()
+                for session_id, user_id, start, tag in stale:
+                    start = _parse_timestamp(start)
+                    conn.execute("""
+                        UPDATE deepwork_sessions SET end_time = ?, duration_minutes = ? WHERE id = ?
+                    """, (_timestamp(start + max_age), max_age_minutes, session_id))
+                    self._credit(conn, user_id, start, start + max_age, tag)
+                    conn.execute("DELETE FROM session_deadlines WHERE user_id = ?", (user_id,))
+                return sorted({row[1] for row in stale})
+        except Exception as e:
+            print(f"Ошибка закрытия устаревших сессий: {e}")
+            return []
+
+    @staticmethod
+    def _replace_deadlines(conn, user_id: int, session_id: int, deadlines):
+        conn.execute("DELETE FROM session_deadlines WHERE user_id = ?", (user_id,))
+        conn.executemany("""
+            INSERT INTO session_deadlines (user_id, session_id, kind, due_at, minutes) VALUES (?, ?, ?, ?, ?)
+        """, [(user_id, session_id, kind, _timestamp(due_at), minutes) for kind, due_at, minutes in deadlines])
+
+    def set_deadlines(self, user_id: int, deadlines: list) -> bool:
+        """Замена сроков пользователя; сроки привязываются к открытой сессии"""
+        try:
+            with self.connection(write=True) as conn:
+                row = conn.execute("""
+                    SELECT id FROM deepwork_sessions WHERE user_id = ? AND end_time IS NULL
+                """, (user_id,)).fetchone()
+                self._replace_deadlines(conn, user_id, row[0] if row else None, deadlines)
+                return True
+        except Exception as e:
+            print(f"Ошибка сохранения сроков сессии: {e}")
+            return False
+
+    def claim_deadlines(self, now: datetime, limit: int, shard: tuple = None) -> list:
+        """Наступившие сроки: удаляются и возвращаются, как в Database.claim_deadlines.
+        Запись в SQLite одна, поэтому SKIP LOCKED не нужен."""
+        index, count = shard or (None, None)
+        try:
+            with self.connection(write=True) as conn:
+                rows = conn.execute("""
+                    DELETE FROM session_deadlines
+                    WHERE id IN (
+                        SELECT id FROM session_deadlines
+                        WHERE due_at <= :now AND (:count IS NULL OR user_id % :count = :index)
+                        ORDER BY due_at
+                        LIMIT :limit
+                    )
+                    RETURNING user_id, session_id, kind, due_at, minutes
+                """, {'now': _timestamp(now), 'limit': limit, 'index': index, 'count': count}).fetchall()
+                return sorted(
+                    ((user_id, session_id, kind, _parse_timestamp(due_at), minutes)
+                     for user_id, session_id, kind, due_at, minutes in rows),
+                    key=lambda row: row[3]
+                )
+        except Exception as e:
+            print(f"Ошибка получения наступивших сроков: {e}")
+            return []
+
+    def next_deadline(self, shard: tuple = None) -> datetime:
+        """Время ближайшего срока (None, если сроков нет)"""
+        index, count = shard or (None, None)
+        try:
+            with self.connection() as conn:
+                row = conn.execute("""
+                    SELECT due_at FROM session_deadlines
+                    WHERE :count IS NULL OR user_id % :count = :index
+                    ORDER BY due_at
+                    LIMIT 1
+                """, {'index': index, 'count': count}).fetchone()
+                return _parse_timestamp(row[0]) if row else None
+        except Exception as e:
+            print(f"Ошибка получения ближайшего срока: {e}")
+            return None
+
+    def rebuild_daily_stats(self, after_user_id: int, limit: int) -> int:
+        """Пересчет всей статистики следующих limit пользователей из сессий
+
+        Порядок и результат как у Database.rebuild_daily_stats.
+        """
+        with self.connection(write=True) as conn:
+            last_user_id = self._chunk_end(conn, 'deepwork_sessions', after_user_id, limit)
+            if last_user_id is None:
+                return None
+            self._rebuild_users(conn, after_user_id + 1, last_user_id)
+            return last_user_id
+
+    def _rebuild_users(self, conn, first: int, last: int):
+        conn.execute("DELETE FROM daily_stats WHERE user_id BETWEEN ? AND ?", (first, last))
+        conn.execute("DELETE FROM daily_tag_stats WHERE user_id BETWEEN ? AND ?", (first, last))
+        conn.execute("DELETE FROM user_insights WHERE user_id BETWEEN ? AND ?", (first, last))
+        sessions = conn.execute("""
+            SELECT user_id, start_time, end_time, tag FROM deepwork_sessions
+            WHERE user_id BETWEEN ? AND ? AND end_time IS NOT NULL
+            ORDER BY user_id
+        """, (first, last)).fetchall()
+        for user_id, group in groupby(sessions, key=lambda row: row[0]):
+            self._add_days(conn, user_id, [(_parse_timestamp(start), _parse_timestamp(end), tag)
+                                           for _, start, end, tag in group])
+        self._refresh_rollups(conn, first, last)
+
+    def refresh_rollups(self, after_user_id: int, limit: int) -> int:
+        """Пересчет недельной и месячной статистики и серий следующих limit пользователей"""
+        with self.connection(write=True) as conn:
+            last_user_id = self._chunk_end(conn, 'daily_stats', after_user_id, limit)
+            if last_user_id is not None:
+                self._refresh_rollups(conn, after_user_id + 1, last_user_id)
+            return last_user_id
+
+    @staticmethod
+    def _chunk_end(conn, source: str, after_user_id: int, limit: int) -> int:
+        return conn.execute(f"""
+            SELECT MAX(user_id) FROM (
+                SELECT DISTINCT user_id FROM {source}
+                WHERE user_id > ?
+                ORDER BY user_id
+                LIMIT ?
+            )
+        """, (after_user_id, limit)).fetchone()[0]
+
+    def _refresh_rollups(self, conn, first: int, last: int):
+        for statement in REBUILD_ROLLUPS_SQL:
+            conn.execute(statement, {'first': first, 'last': last})
+        self._rescan_streaks(conn, first, last)
+
+    def _add_days(self, conn, user_id: int, sessions: list):
+        """Зачисление закрытых сессий пользователя - [(start, end, tag), ...] -
+        в daily_stats, daily_tag_stats и /insights без недельной статистики и
+        серий - их пересчитывает вызывающий"""
+        days = {}
+        tag_days = {}
+        tz = self._zone(conn, user_id)
+        hour_minutes, length_counts = self._load_insights(conn, user_id)
+        for start, end, tag in sessions:
+            for day, minutes, started in session_day_split(start, end, tz):
+                total = days.setdefault(day, [0, 0])
+                total[0] += minutes
+                total[1] += started
+                if tag is not None:
+                    total = tag_days.setdefault((day, tag), [0, 0])
+                    total[0] += minutes
+                    total[1] += started
+            add_session_insights(hour_minutes, length_counts, start, end, tz)
+        for (day, tag), (minutes, started) in sorted(tag_days.items()):
+            self._add_tag_day(conn, user_id, day, tag, minutes, started)
+        updated_at = time.time_ns()
+        conn.executemany("""
+            INSERT INTO daily_stats (user_id, date, total_minutes, session_count, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, date)
+            DO UPDATE SET
+                total_minutes = total_minutes + excluded.total_minutes,
+                session_count = session_count + excluded.session_count,
+                updated_at = excluded.updated_at
+        """, [(user_id, day.isoformat(), minutes, started, updated_at)
+              for day, (minutes, started) in sorted(days.items())])
+        self._save_insights(conn, user_id, hour_minutes, length_counts)
+
+    def ensure_session_partitions(self, months_ahead: int) -> int:
+        """Секций в SQLite нет: создавать нечего"""
+        return 0
+
+    def iter_export_rows(self, dataset: str, user_id: int = None, chunk_size: int = 5000):
+        """Строки набора EXPORT_DATASETS порциями по chunk_size
+
+        Все порции читаются в одной транзакции (снимок WAL). Ошибки не
+        перехватываются, чтобы не получить молча обрезанную выгрузку.
+        """
+        if dataset not in EXPORT_DATASETS:
+            raise KeyError(dataset)
+        where = "WHERE user_id = ?" if user_id is not None else ""
+        params = (user_id,) if user_id is not None else ()
+        with self.connection() as conn:
+            cursor = conn.execute(EXPORT_QUERIES[dataset].format(where=where), params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if dataset == 'sessions':
+                    yield [(session_id, owner, _parse_timestamp(start), _parse_timestamp(end), duration, tag)
+                           for session_id, owner, start, end, duration, tag in rows]
+                else:
+                    yield [(owner, _parse_date(day), total, count) for owner, day, total, count in rows]
+
+    def import_sessions(self, rows, batch_size: int = 50000) -> dict:
+        """Загрузка закрытых сессий: rows - итератор (user_id, start_time, end_time[, tag]),
+        время без часового пояса считается временем бота
+
+        Строки порциями по batch_size записываются во временную таблицу,
+        затем в одной транзакции по каждому пользователю интервалы
+        объединяются, пересекающиеся с записанными сессиями отбрасываются,
+        а статистика пользователя пересчитывается один раз. Ошибки не
+        перехватываются: загрузка либо проходит целиком, либо нет.
+        """
+        rows = iter(rows)
+        loaded = 0
+        imported = 0
+        users = 0
+        with self.connection(write=True) as conn:
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS import_staging (
+                    user_id INTEGER NOT NULL,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    tag TEXT
+                )
+            """)
+            conn.execute("DELETE FROM import_staging")
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                conn.executemany("INSERT INTO import_staging VALUES (?, ?, ?, ?)", [
+                    (user_id, _timestamp(as_utc(start, self.timezone)), _timestamp(as_utc(end, self.timezone)), tag)
+                    for user_id, start, end, tag in map(import_row, batch)
+                ])
+                loaded += len(batch)
+
+            now = _timestamp(utc_now())
+            staged = conn.execute("""
+                SELECT user_id, start_time, end_time, tag FROM import_staging ORDER BY user_id, start_time, end_time
+            """)
+            for user_id, group in groupby(staged, key=lambda row: row[0]):
+                sessions = []
+                for start, end, tag in merge_intervals(row[1:] for row in group):
+                    overlap = conn.execute("""
+                        SELECT 1 FROM deepwork_sessions
+                        WHERE user_id = ? AND start_time < ? AND COALESCE(end_time, ?) > ?
+                        LIMIT 1
+                    """, (user_id, end, now, start)).fetchone()
+                    if overlap is None:
+                        sessions.append((_parse_timestamp(start), _parse_timestamp(end), tag))
+                if not sessions:
+                    continue
+                conn.executemany("""
+                    INSERT INTO deepwork_sessions (user_id, start_time, end_time, duration_minutes, tag)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(user_id, _timestamp(start), _timestamp(end), session_minutes(start, end), tag)
+                      for start, end, tag in sessions])
+                self._add_days(conn, user_id, sessions)
+                self._refresh_rollups(conn, user_id, user_id)
+                imported += len(sessions)
+                users += 1
+            conn.execute("DELETE FROM import_staging")
+            return {'loaded': loaded, 'imported': imported, 'users': users}
+
+    def get_job_runs(self) -> dict:
+        """Время последнего запуска задач планировщика: name -> datetime"""
+        try:
+            with self.connection() as conn:
+                return {name: _parse_timestamp(last_run_at)
+                        for name, last_run_at in conn.execute("SELECT name, last_run_at FROM scheduler_jobs")}
+        except Exception as e:
+            print(f"Ошибка получения запусков задач: {e}")
+            return {}
+
+    def set_job_run(self, name: str, run_at: datetime) -> bool:
+        """Сохранение времени последнего запуска задачи"""
+        try:
+            with self.connection(write=True) as conn:
+                row = conn.execute("SELECT last_run_at FROM scheduler_jobs WHERE name = ?", (name,)).fetchone()
+                if row is None or _parse_timestamp(row[0]) < run_at:
+                    conn.execute("""
+                        INSERT OR REPLACE INTO scheduler_jobs (name, last_run_at) VALUES (?, ?)
+                    """, (name, run_at.isoformat()))
+                return True
+        except Exception as e:
+            print(f"Ошибка сохранения запуска задачи: {e}")
+            return False
+
+    def close(self):
+        """Закрытие подключений всех потоков"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -0,0 +1,161 @@
+"""
+Расчет статистики сессий на Python для встроенных хранилищ
+
+Те же правила, что у функций session_day_split, session_hour_split,
+session_length_bucket и streak_scan из bot/migrations: SQLiteDatabase и
+MemoryDatabase считают минуты, серии и гистограммы /insights так же, как
+PostgreSQL.
+
+Время сессий - datetime с часовым поясом UTC: разность двух моментов в
+одном поясе с переходом на летнее время считалась бы по часам на стене.
+Дни и часы недели считаются в часовом поясе пользователя.
+"""
+
+import os
+from bisect import bisect_right
+from datetime import datetime, date, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from .database import SESSION_LENGTH_BUCKETS
+
+MINUTE = timedelta(minutes=1)
+HOUR = timedelta(hours=1)
+
+# Часов в неделе в гистограмме user_insights
+WEEK_HOURS = 168
+
+
+def local_timezone() -> ZoneInfo:
+    """Часовой пояс бота: пояс пользователей, не выбравших свой"""
+    return ZoneInfo(os.getenv('TIMEZONE', 'Europe/Moscow'))
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def as_utc(moment: datetime, tz: ZoneInfo) -> datetime:
+    """Момент в UTC; время без часового пояса считается временем tz"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=tz)
+    return moment.astimezone(timezone.utc)
+
+
+def local_midnight(day: date, tz: ZoneInfo) -> datetime:
+    """Начало местного дня day в UTC"""
+    return datetime.combine(day, time(), tzinfo=tz).astimezone(timezone.utc)
+
+
+def session_minutes(start: datetime, end: datetime) -> int:
+    """Полные минуты сессии (duration_minutes)"""
+    return (end - start) // MINUTE
+
+
+def session_day_split(start: datetime, end: datetime, tz: ZoneInfo) -> list:
+    """Минуты сессии по местным дням: список (день, минуты, начата ли в этот день)
+
+    Минуты считаются от начала сессии с округлением вниз, поэтому их сумма
+    по дням равна длительности сессии.
+    """
+    days = []
+    first = start.astimezone(tz).date()
+    day = first
+    while day <= end.astimezone(tz).date():
+        minutes = (
+            session_minutes(start, min(end, local_midnight(day + timedelta(days=1), tz)))
+            - session_minutes(start, max(start, local_midnight(day, tz)))
+        )
+        days.append((day, minutes, int(day == first)))
+        day += timedelta(days=1)
+    return days
+
+
+def session_hour_split(start: datetime, end: datetime, tz: ZoneInfo) -> list:
+    """Минуты сессии по местным часам недели: список (час с понедельника 00:00 от 0, минуты)"""
+    hours = []
+    hour = start.astimezone(tz).replace(minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+    while hour < end:
+        minutes = (
+            session_minutes(start, min(end, hour + HOUR))
+            - session_minutes(start, max(start, hour))
+        )
+        local = hour.astimezone(tz)
+        hours.append((local.weekday() * 24 + local.hour, minutes))
+        hour += HOUR
+    return hours
+
+
+def session_length_bucket(start: datetime, end: datetime) -> int:
+    """Номер корзины SESSION_LENGTH_BUCKETS (от 0) по длительности сессии"""
+    return bisect_right(SESSION_LENGTH_BUCKETS, session_minutes(start, end))
+
+
+def empty_insights() -> tuple:
+    """Пустые гистограммы: минуты по часам недели и число сессий по корзинам"""
+    return [0] * WEEK_HOURS, [0] * (len(SESSION_LENGTH_BUCKETS) + 1)
+
+
+def add_session_insights(hour_minutes: list, length_counts: list, start: datetime, end: datetime, tz: ZoneInfo):
+    """Добавление закрытой сессии в гистограммы /insights"""
+    for hour, minutes in session_hour_split(start, end, tz):
+        hour_minutes[hour] += minutes
+    length_counts[session_length_bucket(start, end)] += 1
+
+
+def merge_intervals(intervals) -> list:
+    """Объединение пересекающихся интервалов одного пользователя
+
+    intervals - кортежи (начало, конец, ...), отсортированные по началу и
+    концу; остальные поля (тег) объединенный интервал берет у первого.
+    Интервал, начинающийся ровно в конце предыдущего, остается отдельным.
+    """
+    merged = []
+    for start, end, *rest in intervals:
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end, *rest])
+    return [tuple(interval) for interval in merged]
+
+
+def streak_scan(days, goal: int) -> dict:
+    """Серии дней с целью по ежедневной статистике пользователя
+
+    days - пары (дата, минуты) по возрастанию даты. Возвращает поля
+    user_streaks: current_streak - серия с последним днем цели,
+    longest_streak, last_goal_day, goal_days и active_days.
+    """
+    streak = {'current_streak': 0, 'longest_streak': 0, 'last_goal_day': None, 'goal_days': 0, 'active_days': 0}
+    for day, total_minutes in days:
+        if total_minutes > 0:
+            streak['active_days'] += 1
+        if total_minutes < goal:
+            continue
+        streak['goal_days'] += 1
+        if streak['last_goal_day'] == day - timedelta(days=1):
+            streak['current_streak'] += 1
+        else:
+            streak['current_streak'] = 1
+        streak['last_goal_day'] = day
+        streak['longest_streak'] = max(streak['longest_streak'], streak['current_streak'])
+    return streak
+
+
+def current_streak(streak: dict, today: date) -> int:
+    """Текущая серия прерывается, если вчера цель не достигнута"""
+    last_goal_day = streak['last_goal_day']
+    if last_goal_day is None or last_goal_day < today - timedelta(days=1):
+        return 0
+    return streak['current_streak']
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    """Первый день следующего месяца"""
+    return (day.replace(day=1) + timedelta(days=31)).replace(day=1)
@@ -0,0 +1,169 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from .engines import Storage, create_database
+from .metrics import DB_LATENCY, DB_WAIT
+
+
+def _timed(func, *args):
+    """Вызов func в потоке пула: (момент начала, длительность, результат)"""
+    started = time.perf_counter()
+    result = func(*args)
+    return started, time.perf_counter() - started, result
+
+
+class AsyncDatabase:
+    """Асинхронный доступ к базе данных через ограниченный пул подключений
+
+    Каждый вызов выполняется в отдельном потоке, число потоков равно размеру
+    пула подключений, поэтому медленный запрос одного пользователя не блокирует
+    цикл событий и не задерживает обработку остальных обновлений.
+    """
+
+    def __init__(self, db: Storage = None, max_workers: int = None):
+        self.db = db if db is not None else create_database()
+        self.max_workers = max_workers or self.db.maxconn
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='db')
+
+    async def _run(self, func, *args):
+        """Выполнение синхронного метода хранилища в пуле потоков
+
+        Ожидание свободного потока и время выполнения метода попадают в
+        метрики; гистограммы обновляются уже в цикле событий.
+        """
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        started, elapsed, result = await loop.run_in_executor(
+            self.executor, functools.partial(_timed, func, *args)
+        )
+        DB_WAIT.observe(started - submitted, func.__name__)
+        DB_LATENCY.observe(elapsed, func.__name__)
+        return result
+
+    async def ping(self) -> bool:
+        return await self._run(self.db.ping)
+
+    async def set_user_birthday(self, user_id: int, birthday: date) -> bool:
+        return await self._run(self.db.set_user_birthday, user_id, birthday)
+
+    async def get_user_birthday(self, user_id: int) -> date:
+        return await self._run(self.db.get_user_birthday, user_id)
+
+    async def start_session(self, user_id: int, deadlines: list = (), tag: str = None) -> int:
+        return await self._run(self.db.start_session, user_id, deadlines, tag)
+
+    async def end_session(self, session_id: int, end_time: datetime = None) -> dict:
+        return await self._run(self.db.end_session, session_id, end_time)
+
+    async def get_today_stats(self, user_id: int, day: date = None) -> dict:
+        return await self._run(self.db.get_today_stats, user_id, day)
+
+    async def get_week_stats(self, user_id: int, day: date = None) -> dict:
+        return await self._run(self.db.get_week_stats, user_id, day)
+
+    async def get_month_stats(self, user_id: int, day: date = None) -> dict:
+        return await self._run(self.db.get_month_stats, user_id, day)
+
+    async def get_daily_goal(self, user_id: int) -> int:
+        return await self._run(self.db.get_daily_goal, user_id)
+
+    async def set_daily_goal(self, user_id: int, minutes: int) -> bool:
+        return await self._run(self.db.set_daily_goal, user_id, minutes)
+
+    async def get_user_timezone(self, user_id: int) -> str:
+        return await self._run(self.db.get_user_timezone, user_id)
+
+    async def set_user_timezone(self, user_id: int, timezone: str) -> bool:
+        return await self._run(self.db.set_user_timezone, user_id, timezone)
+
+    async def get_user_language(self, user_id: int) -> str:
+        return await self._run(self.db.get_user_language, user_id)
+
+    async def set_user_language(self, user_id: int, language: str) -> bool:
+        return await self._run(self.db.set_user_language, user_id, language)
+
+    async def get_timezones(self) -> list:
+        return await self._run(self.db.get_timezones)
+
+    async def get_streak(self, user_id: int, today: date = None) -> dict:
+        return await self._run(self.db.get_streak, user_id, today)
+
+    async def get_chart_data(self, user_id: int, start: date, end: date) -> dict:
+        return await self._run(self.db.get_chart_data, user_id, start, end)
+
+    async def get_insights(self, user_id: int) -> dict:
+        return await self._run(self.db.get_insights, user_id)
+
+    async def get_tag_stats(self, user_id: int, start: date, end: date) -> dict:
+        return await self._run(self.db.get_tag_stats, user_id, start, end)
+
+    async def get_recent_tags(self, user_id: int, limit: int) -> list:
+        return await self._run(self.db.get_recent_tags, user_id, limit)
+
+    async def add_group_member(self, chat_id: int, user_id: int, name: str) -> bool:
+        return await self._run(self.db.add_group_member, chat_id, user_id, name)
+
+    async def remove_group_member(self, chat_id: int, user_id: int) -> bool:
+        return await self._run(self.db.remove_group_member, chat_id, user_id)
+
+    async def get_leaderboard(self, chat_id: int, period: str, period_start: date) -> list:
+        return await self._run(self.db.get_leaderboard, chat_id, period, period_start)
+
+    async def refresh_leaderboards(self, day: date, after_chat_id: int, limit: int, size: int) -> int:
+        return await self._run(self.db.refresh_leaderboards, day, after_chat_id, limit, size)
+
+    async def get_daily_report_page(self, day: date, after_user_id: int, limit: int, timezone: str = None) -> list:
+        return await self._run(self.db.get_daily_report_page, day, after_user_id, limit, timezone)
+
+    async def get_birthday_page(self, after_user_id: int, limit: int, timezone: str = None) -> list:
+        return await self._run(self.db.get_birthday_page, after_user_id, limit, timezone)
+
+    async def get_active_session(self, user_id: int) -> int:
+        return await self._run(self.db.get_active_session, user_id)
+
+    async def get_open_sessions(self, shard: tuple = None) -> list:
+        return await self._run(self.db.get_open_sessions, shard)
+
+    async def close_stale_sessions(self, max_age_minutes: int, shard: tuple = None) -> list:
+        return await self._run(self.db.close_stale_sessions, max_age_minutes, shard)
+
+    async def set_deadlines(self, user_id: int, deadlines: list) -> bool:
+        return await self._run(self.db.set_deadlines, user_id, deadlines)
+
+    async def claim_deadlines(self, now: datetime, limit: int, shard: tuple = None) -> list:
+        return await self._run(self.db.claim_deadlines, now, limit, shard)
+
+    async def next_deadline(self, shard: tuple = None) -> datetime:
+        return await self._run(self.db.next_deadline, shard)
+
+    async def rebuild_daily_stats(self, after_user_id: int, limit: int) -> int:
+        return await self._run(self.db.rebuild_daily_stats, after_user_id, limit)
+
+    async def refresh_rollups(self, after_user_id: int, limit: int) -> int:
+        return await self._run(self.db.refresh_rollups, after_user_id, limit)
+
+    async def ensure_session_partitions(self, months_ahead: int) -> int:
+        return await self._run(self.db.ensure_session_partitions, months_ahead)
+
+    async def export_history(self, directory: str, fmt: str, user_id: int = None) -> list:
+        # Импорт здесь: bot.export запускается как модуль (python -m bot.export)
+        from .export import export_history
+        return await self._run(export_history, self.db, directory, fmt, user_id)
+
+    async def import_history(self, path: str, fmt: str = None, user_id: int = None) -> dict:
+        # Импорт здесь: bot.importer запускается как модуль (python -m bot.importer)
+        from .importer import import_history
+        return await self._run(import_history, self.db, path, fmt, user_id)
+
+    async def get_job_runs(self) -> dict:
+        return await self._run(self.db.get_job_runs)
+
+    async def set_job_run(self, name: str, run_at: datetime) -> bool:
+        return await self._run(self.db.set_job_run, name, run_at)
+
+    async def close(self):
+        """Остановка пула потоков и закрытие подключений"""
+        self.executor.shutdown(wait=True)
+        self.db.close()
@@ -0,0 +1,57 @@
+"""
+Теги сессий и периоды отчета /stats
+
+Тег - короткое имя проекта или вида работы: без # в начале, в нижнем
+регистре, пробелы заменяются на _. Тег целиком помещается в callback_data
+кнопки "start_deepwork:<тег>" (не больше 64 байт).
+"""
+
+import re
+from datetime import date, timedelta
+
+# Символов в теге
+MAX_TAG_LENGTH = 24
+
+# Префикс кнопки начала сессии с тегом
+TAG_CALLBACK_PREFIX = "start_deepwork:"
+
+# Ограничение Telegram на callback_data, байты
+CALLBACK_DATA_LIMIT = 64
+
+# Периоды /stats по названию
+STATS_PERIODS = ('week', 'month', 'year', 'all')
+
+DATE_RANGE_PATTERN = re.compile(r'^(\d{1,2}\.\d{1,2}\.\d{4})\s*(?:-|–|\s)\s*(\d{1,2}\.\d{1,2}\.\d{4})$')
+
+
+def normalize_tag(text: str) -> str:
+    """Тег из ввода пользователя: None для пустого ввода, ValueError для
+    слишком длинного"""
+    tag = '_'.join(text.strip().lstrip('#').lower().split())
+    if not tag:
+        return None
+    if len(tag) > MAX_TAG_LENGTH or len((TAG_CALLBACK_PREFIX + tag).encode()) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"Тег длиннее {MAX_TAG_LENGTH} символов: {tag}")
+    return tag
+
+
+def stats_period(text: str, today: date) -> tuple:
+    """Первый и последний день отчета: week, month и year - текущие неделя,
+    месяц и год до сегодня, all - вся история, или две даты ДД.ММ.ГГГГ
+    через дефис. ValueError, если период не распознан."""
+    text = (text or 'month').strip().lower()
+    if text == 'week':
+        return today - timedelta(days=today.weekday()), today
+    if text == 'month':
+        return today.replace(day=1), today
+    if text == 'year':
+        return today.replace(month=1, day=1), today
+    if text == 'all':
+        return date.min, today
+    match = DATE_RANGE_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Неизвестный период: {text}")
+    start, end = (date(*map(int, reversed(value.split('.')))) for value in match.groups())
+    if start > end:
+        raise ValueError(f"Начало периода позже конца: {text}")
+    return start, end
@@ -0,0 +1,693 @@
+"""
+Кнопки и тексты сообщений бота
+
+Клавиатуры собираются один раз при запуске для каждого языка и
+переиспользуются во всех ответах: обработчики нажатий не создают
+InlineKeyboardBuilder и модели кнопок. Тексты без переменных частей -
+готовые строки, шаблоны с ними - заранее связанные методы str.format.
+Новый язык - словари BUTTONS[язык], TEXTS[язык] и NAMES[язык];
+недостающие строки берутся из языка по умолчанию.
+"""
+
+from collections import OrderedDict
+from datetime import date
+from functools import lru_cache
+from types import SimpleNamespace
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from .tags import TAG_CALLBACK_PREFIX
+
+DEFAULT_LANGUAGE = 'ru'
+
+# Главных меню с разными недавними тегами в кеше одного языка
+MENU_CACHE_SIZE = 1024
+
+# Подписи кнопок; ключ - callback_data, кроме кнопок из BUTTON_ACTIONS
+BUTTONS = {
+    'ru': {
+        'start_deepwork': "🎯 Начать дипворк",
+        'start_pomodoro': "🍅 Помидор",
+        'next_pomodoro': "🍅 Следующий помидор",
+        'stop_deepwork': "⏹ Остановить дипворк",
+        'continue_deepwork': "✅ Продолжаю",
+        'today_stats': "📊 Статистика за сегодня",
+        'chart_week': "📈 График за неделю",
+        'set_birthday': "🎂 Установить дату рождения",
+        'back_to_main': "🔙 Назад",
+        'main_menu': "🔙 Главное меню",
+    },
+    'en': {
+        'start_deepwork': "🎯 Start deep work",
+        'start_pomodoro': "🍅 Pomodoro",
+        'next_pomodoro': "🍅 Next pomodoro",
+        'stop_deepwork': "⏹ Stop deep work",
+        'continue_deepwork': "✅ Still working",
+        'today_stats': "📊 Today's stats",
+        'chart_week': "📈 Weekly chart",
+        'set_birthday': "🎂 Set birthday",
+        'back_to_main': "🔙 Back",
+        'main_menu': "🔙 Main menu",
+    },
+}
+
+# callback_data кнопок, подпись которых отличается от действия
+BUTTON_ACTIONS = {'next_pomodoro': 'start_pomodoro', 'main_menu': 'back_to_main'}
+
+# Кнопка начала сессии с недавним тегом
+TAG_BUTTON = "🎯 #{tag}"
+
+# Клавиатуры: строки кнопок
+KEYBOARDS = {
+    'back': (('back_to_main',),),
+    'session': (('stop_deepwork', 'back_to_main'),),
+    'session_stopped': (('start_deepwork', 'today_stats', 'back_to_main'),),
+    'today_stats': (('start_deepwork', 'stop_deepwork', 'chart_week', 'back_to_main'),),
+    'pomodoro_finished': (('next_pomodoro',), ('today_stats',)),
+    'session_autostopped': (('start_deepwork',), ('today_stats',)),
+    'reminder': (('continue_deepwork', 'stop_deepwork'),),
+    'break_over': (('next_pomodoro',), ('main_menu',)),
+    'birthday_saved': (('start_deepwork', 'today_stats', 'back_to_main'),),
+}
+
+TEXTS = {
+    'ru': {
+        'welcome': (
+            "🚀 Добро пожаловать в Time Tracker Bot!\n\n"
+            "Этот бот поможет вам отслеживать время, проведенное в дипворке.\n"
+            "🕰 Часовой пояс: {timezone} (изменить: /timezone)\n\n"
+            "Выберите действие:"
+        ),
+        'main_menu': "🚀 Главное меню Time Tracker Bot\n\nВыберите действие:",
+        'session_exists': "⚠️ У вас уже есть активная сессия дипворка!\nСначала остановите текущую сессию.",
+        'session_start_failed': "❌ Ошибка при создании сессии. Попробуйте еще раз.",
+        'session_title': "🎯 Сессия дипворка",
+        'session_title_tag': "🎯 Сессия дипворка #{tag}",
+        'session_waiting': "Время идет... ⏰",
+        'session_elapsed': "⏱ Прошло: {hours}ч {minutes:02d}м",
+        'session_finish': "\n🍅 Окончание по плану: {finish_time}",
+        'session': "{title} началась в {start_time}\n\n{progress}\nНажмите 'Остановить дипворк' когда закончите.",
+        'no_session': "⚠️ У вас нет активной сессии дипворка.",
+        'no_session_stop': "⚠️ У вас нет активной сессии дипворка.\nСначала начните новую сессию.",
+        'continue_failed': "❌ Ошибка при продлении сессии. Попробуйте еще раз.",
+        'session_continued': "👍 Продолжаем! Следующее напоминание через {minutes} мин.",
+        'today_summary': "📊 Сегодня: {hours}ч {minutes}м, сессий: {session_count}",
+        'pomodoro_finished': "🍅 Помидор завершен!\n\n{summary}",
+        'pomodoro_break': "\n\n☕ Перерыв {minutes} мин, я напомню, когда он закончится.",
+        'session_autostopped': (
+            "⏹ Сессия дипворка остановлена: не было ответа на напоминание. "
+            "Время после напоминания не засчитано.\n\n{summary}"
+        ),
+        'session_reminder': (
+            "⏰ Сессия дипворка все еще идет. Вы еще работаете?\n\n"
+            "Если не ответить, через {minutes} мин сессия остановится, "
+            "а время после этого напоминания не засчитается."
+        ),
+        'break_over': "☕ Перерыв окончен! Начнем следующий помидор?",
+        'session_stopped': (
+            "✅ Сессия дипворка завершена!\n\n"
+            "📊 Статистика за сегодня:\n"
+            "⏱ Общее время: {hours}ч {minutes}м\n"
+            "🔄 Количество сессий: {session_count}\n\n"
+            "Отличная работа! 🎉"
+        ),
+        'stop_failed': "❌ Ошибка при завершении сессии. Попробуйте еще раз.",
+        'stats_failed': "❌ Ошибка при получении статистики. Попробуйте еще раз.",
+        'today_stats': (
+            "📊 Статистика за сегодня ({day:%d.%m.%Y}):\n\n"
+            "⏱ Общее время дипворка: {hours}ч {minutes}м\n"
+            "🔄 Количество сессий: {session_count}\n\n"
+            "Цель: {goal_hours}ч {goal_rest}м дипворка в день 🎯"
+        ),
+        'ask_birthday': (
+            "🎂 Пожалуйста, отправьте вашу дату рождения в формате ДД.ММ.ГГГГ\n\n"
+            "Например: 15.03.1990\n\n"
+            "Это нужно для подсчета количества прожитых дней."
+        ),
+        'birthday_saved': (
+            "✅ Дата рождения успешно установлена!\n\n"
+            "🎂 Ваш день рождения: {birthday:%d.%m.%Y}\n"
+            "🌍 Вы прожили на этой планете: {days} дней\n\n"
+            "Теперь каждое утро в 6:00 вы будете получать обновление о количестве прожитых дней!"
+        ),
+        'birthday_failed': "❌ Ошибка при сохранении даты рождения. Попробуйте еще раз.",
+        'birthday_invalid': "❌ Неверный формат даты. Используйте формат ДД.ММ.ГГГГ\nНапример: 15.03.1990",
+        'streak_failed': "❌ Ошибка при получении серии. Попробуйте еще раз.",
+        'insights_failed': "❌ Ошибка при получении закономерностей. Попробуйте еще раз.",
+        'duration': "{hours}ч {minutes}м",
+        'period_range': "{start:%d.%m.%Y}–{end:%d.%m.%Y}",
+        'period_stats': (
+            "📊 Статистика за {period} ({period_start:%d.%m}–{period_end:%d.%m.%Y}):\n\n"
+            "⏱ Общее время дипворка: {hours}ч {minutes}м\n"
+            "🔄 Количество сессий: {session_count}\n"
+            "📆 Дней с дипворком: {days_with_work}"
+        ),
+        'period_average': "\n📈 В среднем за день с дипворком: {hours}ч {minutes}м",
+        'streak': (
+            "🔥 Текущая серия: {current_streak} дн.\n"
+            "🏆 Лучшая серия: {longest_streak} дн.\n"
+            "🎯 Цель: {goal_hours}ч {goal_rest}м в день"
+        ),
+        'streak_goal_days': "\n📈 Цель достигнута в {goal_days} из {active_days} дней с дипворком ({percent}%)",
+        'chart_usage': "❌ Формат: /chart week, /chart month или /chart year",
+        'chart_caption': "📈 Дипворк за {period}: {hours}ч {minutes}м",
+        'charts_unavailable': "❌ Графики недоступны: не установлен matplotlib",
+        'chart_failed': "❌ Ошибка при построении графика. Попробуйте еще раз.",
+        'chart_goal': "Цель",
+        'chart_hours': "Часы",
+        'chart_title': "Дипворк {start:%d.%m}–{end:%d.%m.%Y}",
+        'chart_title_year': "Дипворк {start:%d.%m.%Y}–{end:%d.%m.%Y}",
+        'insights_empty': "🔍 Закономерности появятся после первой завершенной сессии дипворка",
+        'insights_title': "🔍 Закономерности дипворка",
+        'insights_hours': "🕐 Самые продуктивные часы:",
+        'insights_hour': "  {hour:02d}:00–{next_hour:02d}:00 — {duration}",
+        'insights_days': "📅 По дням недели:",
+        'insights_day': "  {weekday} {bar} {duration}",
+        'insights_best': "🏆 Лучшее время: {weekday}, {hour:02d}:00–{next_hour:02d}:00",
+        'insights_lengths': "⏱ Длительность сессий ({sessions}):",
+        'insights_length': "  {label} — {count} ({percent}%)",
+        'length_first': "до {high} мин",
+        'length_range': "{low}–{high} мин",
+        'length_last': "{low}+ мин",
+        'focus_usage': "❌ Используйте: /focus [минуты работы] [минуты перерыва], например /focus 50 10",
+        'focus_limits': "❌ Работа - от 1 до 240 минут, перерыв - от 0 до 60 минут",
+        'tag_too_long': "❌ Тег - не длиннее {max_length} символов, например /start_deepwork thesis",
+        'stats_usage': (
+            "❌ Формат: /stats week, /stats month, /stats year, /stats all "
+            "или /stats 01.01.2025-31.12.2025"
+        ),
+        'tag_stats_empty': "🏷 За {title} дипворка не было",
+        'tag_stats_line': "  {name} — {hours}ч {minutes}м ({percent}%), сессий: {sessions}",
+        'untagged': "без тега",
+        'tag_stats': (
+            "🏷 Дипворк по тегам за {title}:\n\n{lines}\n\n"
+            "⏱ Всего: {hours}ч {minutes}м, сессий: {session_count}\n"
+            "Начать сессию с тегом: /start_deepwork <тег>"
+        ),
+        'group_only': "👥 Таблицы лидеров работают в группах: добавьте бота в группу и отправьте там /join",
+        'leave_group_only': "👥 Команда работает в группах, где вы отправили /join",
+        'joined': (
+            "✅ {name} участвует в таблице лидеров группы. "
+            "Она обновляется раз в {minutes} мин: /leaderboard"
+        ),
+        'join_failed': "❌ Ошибка при добавлении в таблицу лидеров. Попробуйте еще раз.",
+        'left': "👋 {name} больше не в таблице лидеров группы",
+        'leave_failed': "❌ Ошибка при выходе из таблицы лидеров. Попробуйте еще раз.",
+        'leaderboard_usage': "❌ Формат: /leaderboard day или /leaderboard week",
+        'leaderboard_empty': "🏆 За {title} в таблице лидеров пока пусто\n\nУчаствовать: /join",
+        'leaderboard_line': "{place} {name} — {hours}ч {minutes}м",
+        'leaderboard': (
+            "🏆 Лидеры дипворка за {title}:\n\n{lines}\n\n"
+            "Обновляется раз в {minutes} мин. Участвовать: /join, выйти: /leave"
+        ),
+        'goal': "🎯 Ваша цель: {hours}ч {minutes}м дипворка в день\n\nИзменить: /goal <минуты>, например /goal 240",
+        'goal_invalid': "❌ Укажите цель в минутах от 1 до 1440, например /goal 240",
+        'goal_saved': "✅ Новая цель: {hours}ч {minutes}м дипворка в день 🎯",
+        'goal_failed': "❌ Ошибка при сохранении цели. Попробуйте еще раз.",
+        'timezone': (
+            "🕰 Ваш часовой пояс: {timezone}, сейчас {now}\n\n"
+            "Изменить: /timezone <пояс>, например /timezone Asia/Yekaterinburg или /timezone +5"
+        ),
+        'timezone_invalid': (
+            "❌ Неизвестный часовой пояс. Укажите название, например Europe/Moscow, "
+            "или смещение от UTC в часах, например +3"
+        ),
+        'timezone_saved': "✅ Часовой пояс: {timezone}, сейчас {now}\nСтатистика по дням пересчитана по местному времени",
+        'timezone_failed': "❌ Ошибка при сохранении часового пояса. Попробуйте еще раз.",
+        'export_admin_only': "❌ Выгрузка всех пользователей доступна только администратору",
+        'export_busy': "⏳ Сейчас выполняется другая выгрузка, попробуйте через несколько минут",
+        'export_usage': "❌ Формат: /export [csv|jsonl|parquet] [all]",
+        'parquet_unavailable': "❌ Выгрузка в Parquet недоступна: не установлен pyarrow",
+        'export_failed': "❌ Ошибка при выгрузке истории. Попробуйте еще раз.",
+        'export_too_large': "❌ {name} больше 50 МБ, используйте python -m bot.export",
+        'export_caption': "📦 {name}: {count} строк",
+        'import_help': (
+            "📥 Отправьте файл CSV или JSON с подписью /import.\n\n"
+            "Нужны поля start_time и end_time в формате ISO, например:\n"
+            "start_time,end_time\n2025-03-01 09:00,2025-03-01 10:30\n\n"
+            "Время без часового пояса считается временем вашего часового пояса (/timezone). "
+            "Подходит и файл сессий из /export."
+        ),
+        'import_too_large': "❌ Файл больше 20 МБ, используйте python -m bot.importer",
+        'import_busy': "⏳ Сейчас выполняется другой импорт, попробуйте через несколько минут",
+        'import_unsupported': "❌ Поддерживаются файлы .csv, .json и .jsonl",
+        'import_failed': "❌ Ошибка при импорте истории. Попробуйте еще раз.",
+        'import_done': "✅ Импорт завершен\n\n📄 Строк в файле: {rows}\n💾 Записано сессий: {imported}",
+        'import_skipped': "\n🔁 Пропущено пересекающихся и уже записанных: {count}",
+        'import_invalid': "\n⚠️ Строк с ошибками: {count}\n",
+        'daily_report': (
+            "📊 Ежедневный отчет о дипворке\n"
+            "📅 {day:%d.%m.%Y}\n\n"
+            "⏱ Общее время: {hours}ч {minutes}м\n"
+            "🔄 Количество сессий: {session_count}\n\n"
+            "{verdict}"
+        ),
+        'report_goal_met': "🎉 Отличный день! Вы достигли цели!",
+        'report_good': "👍 Хороший результат! Продолжайте в том же духе!",
+        'report_fair': "👌 Неплохо! Завтра постарайтесь больше.",
+        'report_low': "💪 Завтра новый день! Поставьте цель и достигните её!",
+        'birthday_morning': (
+            "🌅 Доброе утро!\n\n"
+            "🎂 Сегодня вы прожили на этой планете: {days} дней\n\n"
+            "💫 Каждый новый день - это возможность стать лучше!\n"
+            "🎯 Начните день с дипворка и достигните своих целей!"
+        ),
+    },
+    'en': {
+        'welcome': (
+            "🚀 Welcome to Time Tracker Bot!\n\n"
+            "This bot helps you track the time you spend in deep work.\n"
+            "🕰 Time zone: {timezone} (change: /timezone)\n\n"
+            "Choose an action:"
+        ),
+        'main_menu': "🚀 Time Tracker Bot main menu\n\nChoose an action:",
+        'session_exists': "⚠️ You already have an active deep work session!\nStop the current session first.",
+        'session_start_failed': "❌ Failed to start the session. Please try again.",
+        'session_title': "🎯 Deep work session",
+        'session_title_tag': "🎯 Deep work session #{tag}",
+        'session_waiting': "The clock is running... ⏰",
+        'session_elapsed': "⏱ Elapsed: {hours}h {minutes:02d}m",
+        'session_finish': "\n🍅 Planned end: {finish_time}",
+        'session': "{title} started at {start_time}\n\n{progress}\nPress 'Stop deep work' when you are done.",
+        'no_session': "⚠️ You have no active deep work session.",
+        'no_session_stop': "⚠️ You have no active deep work session.\nStart a new session first.",
+        'continue_failed': "❌ Failed to extend the session. Please try again.",
+        'session_continued': "👍 Keep going! Next reminder in {minutes} min.",
+        'today_summary': "📊 Today: {hours}h {minutes}m, sessions: {session_count}",
+        'pomodoro_finished': "🍅 Pomodoro complete!\n\n{summary}",
+        'pomodoro_break': "\n\n☕ Break for {minutes} min, I will remind you when it is over.",
+        'session_autostopped': (
+            "⏹ Deep work session stopped: there was no answer to the reminder. "
+            "Time after the reminder was not counted.\n\n{summary}"
+        ),
+        'session_reminder': (
+            "⏰ Your deep work session is still running. Are you still working?\n\n"
+            "Without an answer the session stops in {minutes} min "
+            "and the time after this reminder is not counted."
+        ),
+        'break_over': "☕ Break is over! Ready for the next pomodoro?",
+        'session_stopped': (
+            "✅ Deep work session complete!\n\n"
+            "📊 Today's stats:\n"
+            "⏱ Total time: {hours}h {minutes}m\n"
+            "🔄 Sessions: {session_count}\n\n"
+            "Great work! 🎉"
+        ),
+        'stop_failed': "❌ Failed to stop the session. Please try again.",
+        'stats_failed': "❌ Failed to load the stats. Please try again.",
+        'today_stats': (
+            "📊 Today's stats ({day:%d.%m.%Y}):\n\n"
+            "⏱ Total deep work: {hours}h {minutes}m\n"
+            "🔄 Sessions: {session_count}\n\n"
+            "Goal: {goal_hours}h {goal_rest}m of deep work a day 🎯"
+        ),
+        'ask_birthday': (
+            "🎂 Please send your date of birth as DD.MM.YYYY\n\n"
+            "For example: 15.03.1990\n\n"
+            "It is used to count the days you have lived."
+        ),
+        'birthday_saved': (
+            "✅ Date of birth saved!\n\n"
+            "🎂 Your birthday: {birthday:%d.%m.%Y}\n"
+            "🌍 Days you have lived on this planet: {days}\n\n"
+            "Every morning at 6:00 you will get an update on the number of days lived!"
+        ),
+        'birthday_failed': "❌ Failed to save the date of birth. Please try again.",
+        'birthday_invalid': "❌ Invalid date format. Use DD.MM.YYYY\nFor example: 15.03.1990",
+        'streak_failed': "❌ Failed to load the streak. Please try again.",
+        'insights_failed': "❌ Failed to load the patterns. Please try again.",
+        'duration': "{hours}h {minutes}m",
+        'period_range': "{start:%d.%m.%Y}–{end:%d.%m.%Y}",
+        'period_stats': (
+            "📊 Stats for {period} ({period_start:%d.%m}–{period_end:%d.%m.%Y}):\n\n"
+            "⏱ Total deep work: {hours}h {minutes}m\n"
+            "🔄 Sessions: {session_count}\n"
+            "📆 Days with deep work: {days_with_work}"
+        ),
+        'period_average': "\n📈 Average per day with deep work: {hours}h {minutes}m",
+        'streak': (
+            "🔥 Current streak: {current_streak} d.\n"
+            "🏆 Best streak: {longest_streak} d.\n"
+            "🎯 Goal: {goal_hours}h {goal_rest}m a day"
+        ),
+        'streak_goal_days': "\n📈 Goal reached on {goal_days} of {active_days} days with deep work ({percent}%)",
+        'chart_usage': "❌ Usage: /chart week, /chart month or /chart year",
+        'chart_caption': "📈 Deep work for {period}: {hours}h {minutes}m",
+        'charts_unavailable': "❌ Charts are unavailable: matplotlib is not installed",
+        'chart_failed': "❌ Failed to draw the chart. Please try again.",
+        'chart_goal': "Goal",
+        'chart_hours': "Hours",
+        'chart_title': "Deep work {start:%d.%m}–{end:%d.%m.%Y}",
+        'chart_title_year': "Deep work {start:%d.%m.%Y}–{end:%d.%m.%Y}",
+        'insights_empty': "🔍 Patterns will appear after your first completed deep work session",
+        'insights_title': "🔍 Deep work patterns",
+        'insights_hours': "🕐 Most productive hours:",
+        'insights_hour': "  {hour:02d}:00–{next_hour:02d}:00 — {duration}",
+        'insights_days': "📅 By day of the week:",
+        'insights_day': "  {weekday} {bar} {duration}",
+        'insights_best': "🏆 Best time: {weekday}, {hour:02d}:00–{next_hour:02d}:00",
+        'insights_lengths': "⏱ Session length ({sessions}):",
+        'insights_length': "  {label} — {count} ({percent}%)",
+        'length_first': "under {high} min",
+        'length_range': "{low}–{high} min",
+        'length_last': "{low}+ min",
+        'focus_usage': "❌ Usage: /focus [work minutes] [break minutes], for example /focus 50 10",
+        'focus_limits': "❌ Work is 1 to 240 minutes, a break is 0 to 60 minutes",
+        'tag_too_long': "❌ A tag is at most {max_length} characters, for example /start_deepwork thesis",
+        'stats_usage': (
+            "❌ Usage: /stats week, /stats month, /stats year, /stats all "
+            "or /stats 01.01.2025-31.12.2025"
+        ),
+        'tag_stats_empty': "🏷 No deep work for {title}",
+        'tag_stats_line': "  {name} — {hours}h {minutes}m ({percent}%), sessions: {sessions}",
+        'untagged': "no tag",
+        'tag_stats': (
+            "🏷 Deep work by tag for {title}:\n\n{lines}\n\n"
+            "⏱ Total: {hours}h {minutes}m, sessions: {session_count}\n"
+            "Start a tagged session: /start_deepwork <tag>"
+        ),
+        'group_only': "👥 Leaderboards work in groups: add the bot to a group and send /join there",
+        'leave_group_only': "👥 This command works in groups where you sent /join",
+        'joined': "✅ {name} is on the group leaderboard. It is updated every {minutes} min: /leaderboard",
+        'join_failed': "❌ Failed to join the leaderboard. Please try again.",
+        'left': "👋 {name} is no longer on the group leaderboard",
+        'leave_failed': "❌ Failed to leave the leaderboard. Please try again.",
+        'leaderboard_usage': "❌ Usage: /leaderboard day or /leaderboard week",
+        'leaderboard_empty': "🏆 The leaderboard for {title} is empty so far\n\nJoin: /join",
+        'leaderboard_line': "{place} {name} — {hours}h {minutes}m",
+        'leaderboard': (
+            "🏆 Deep work leaders for {title}:\n\n{lines}\n\n"
+            "Updated every {minutes} min. Join: /join, leave: /leave"
+        ),
+        'goal': "🎯 Your goal: {hours}h {minutes}m of deep work a day\n\nChange: /goal <minutes>, for example /goal 240",
+        'goal_invalid': "❌ Give the goal in minutes from 1 to 1440, for example /goal 240",
+        'goal_saved': "✅ New goal: {hours}h {minutes}m of deep work a day 🎯",
+        'goal_failed': "❌ Failed to save the goal. Please try again.",
+        'timezone': (
+            "🕰 Your time zone: {timezone}, now {now}\n\n"
+            "Change: /timezone <zone>, for example /timezone Asia/Yekaterinburg or /timezone +5"
+        ),
+        'timezone_invalid': (
+            "❌ Unknown time zone. Give a name, for example Europe/Moscow, "
+            "or an offset from UTC in hours, for example +3"
+        ),
+        'timezone_saved': "✅ Time zone: {timezone}, now {now}\nDaily stats were recalculated in local time",
+        'timezone_failed': "❌ Failed to save the time zone. Please try again.",
+        'export_admin_only': "❌ Only the administrator can export all users",
+        'export_busy': "⏳ Another export is running, please try again in a few minutes",
+        'export_usage': "❌ Usage: /export [csv|jsonl|parquet] [all]",
+        'parquet_unavailable': "❌ Parquet export is unavailable: pyarrow is not installed",
+        'export_failed': "❌ Failed to export the history. Please try again.",
+        'export_too_large': "❌ {name} is larger than 50 MB, use python -m bot.export",
+        'export_caption': "📦 {name}: {count} rows",
+        'import_help': (
+            "📥 Send a CSV or JSON file with the caption /import.\n\n"
+            "It needs start_time and end_time fields in ISO format, for example:\n"
+            "start_time,end_time\n2025-03-01 09:00,2025-03-01 10:30\n\n"
+            "Times without a time zone are read in your time zone (/timezone). "
+            "A sessions file from /export works too."
+        ),
+        'import_too_large': "❌ The file is larger than 20 MB, use python -m bot.importer",
+        'import_busy': "⏳ Another import is running, please try again in a few minutes",
+        'import_unsupported': "❌ Supported files: .csv, .json and .jsonl",
+        'import_failed': "❌ Failed to import the history. Please try again.",
+        'import_done': "✅ Import complete\n\n📄 Rows in the file: {rows}\n💾 Sessions saved: {imported}",
+        'import_skipped': "\n🔁 Skipped as overlapping or already saved: {count}",
+        'import_invalid': "\n⚠️ Rows with errors: {count}\n",
+        'daily_report': (
+            "📊 Daily deep work report\n"
+            "📅 {day:%d.%m.%Y}\n\n"
+            "⏱ Total time: {hours}h {minutes}m\n"
+            "🔄 Sessions: {session_count}\n\n"
+            "{verdict}"
+        ),
+        'report_goal_met': "🎉 Great day! You reached your goal!",
+        'report_good': "👍 Good result! Keep it up!",
+        'report_fair': "👌 Not bad! Try for a bit more tomorrow.",
+        'report_low': "💪 Tomorrow is a new day! Set a goal and reach it!",
+        'birthday_morning': (
+            "🌅 Good morning!\n\n"
+            "🎂 Today you have lived on this planet for {days} days\n\n"
+            "💫 Every new day is a chance to get better!\n"
+            "🎯 Start your day with deep work and reach your goals!"
+        ),
+    },
+}
+
+
+# Названия дней, месяцев и периодов отчетов
+NAMES = {
+    'ru': {
+        'weekdays': ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"),
+        'weekday_names': ("понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье"),
+        'months': ("янв", "фев", "мар", "апр", "май", "июн", "июл", "авг", "сен", "окт", "ноя", "дек"),
+        # "за ..." в /stats, /chart, /leaderboard, /week и /month
+        'periods': {'day': "сегодня", 'week': "неделю", 'month': "месяц", 'year': "год", 'all': "все время"},
+    },
+    'en': {
+        'weekdays': ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"),
+        'weekday_names': ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"),
+        'months': ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"),
+        'periods': {'day': "today", 'week': "this week", 'month': "this month", 'year': "this year", 'all': "all time"},
+    },
+}
+
+# Места таблицы лидеров с медалью
+LEADERBOARD_MEDALS = ("🥇", "🥈", "🥉")
+
+
+def _compile(template: str):
+    """Строка без полей как есть, шаблон с полями - связанный метод format"""
+    return template.format if '{' in template else template
+
+
+class Templates:
+    """Кнопки и тексты одного языка, собранные один раз
+
+    text - тексты TEXTS по ключам: строки или функции format(**поля);
+    names - названия NAMES (дни недели, месяцы, периоды отчетов);
+    keyboard - готовые клавиатуры KEYBOARDS. Клавиатуры общие для всех
+    сообщений и не изменяются после сборки.
+    """
+
+    def __init__(self, language: str = DEFAULT_LANGUAGE, menu_cache_size: int = MENU_CACHE_SIZE):
+        self.language = language
+        texts = {**TEXTS[DEFAULT_LANGUAGE], **TEXTS.get(language, {})}
+        self.text = SimpleNamespace(**{key: _compile(template) for key, template in texts.items()})
+        self.names = SimpleNamespace(**{**NAMES[DEFAULT_LANGUAGE], **NAMES.get(language, {})})
+        labels = {**BUTTONS[DEFAULT_LANGUAGE], **BUTTONS.get(language, {})}
+        self._buttons = {
+            key: InlineKeyboardButton(text=label, callback_data=BUTTON_ACTIONS.get(key, key))
+            for key, label in labels.items()
+        }
+        self.keyboard = SimpleNamespace(**{name: self._markup(rows) for name, rows in KEYBOARDS.items()})
+        # Меню зависит только от недавних тегов: у многих пользователей они совпадают
+        self.main_menu = lru_cache(maxsize=menu_cache_size)(self._main_menu)
+
+    def _markup(self, rows) -> InlineKeyboardMarkup:
+        return InlineKeyboardMarkup(inline_keyboard=[[self._buttons[key] for key in row] for row in rows])
+
+    def _main_menu(self, tags: tuple = (), birthday: bool = False) -> InlineKeyboardMarkup:
+        """Главное меню по кнопке в строке: начало сессии, недавние теги, помидор,
+        остановка и статистика; birthday - с кнопкой даты рождения"""
+        buttons = self._buttons
+        rows = [[buttons['start_deepwork']]]
+        rows += [
+            [InlineKeyboardButton(text=TAG_BUTTON.format(tag=tag), callback_data=TAG_CALLBACK_PREFIX + tag)]
+            for tag in tags
+        ]
+        rows += [[buttons['start_pomodoro']], [buttons['stop_deepwork']], [buttons['today_stats']]]
+        if birthday:
+            rows.append([buttons['set_birthday']])
+        return InlineKeyboardMarkup(inline_keyboard=rows)
+
+    def session_text(self, start_time: str, elapsed_minutes: int = None, finish_time: str = None,
+                     tag: str = None) -> str:
+        """Текст сообщения идущей сессии; с прошедшим временем, если оно известно"""
+        text = self.text
+        if elapsed_minutes is None:
+            progress = text.session_waiting
+        else:
+            progress = text.session_elapsed(hours=elapsed_minutes // 60, minutes=elapsed_minutes % 60)
+        if finish_time is not None:
+            progress += text.session_finish(finish_time=finish_time)
+        title = text.session_title if tag is None else text.session_title_tag(tag=tag)
+        return text.session(title=title, start_time=start_time, progress=progress)
+
+
+    def duration(self, minutes: int) -> str:
+        return self.text.duration(hours=minutes // 60, minutes=minutes % 60)
+
+    def period_title(self, period: str, start: date, end: date) -> str:
+        """Название периода отчета ("за ...") или его даты"""
+        title = self.names.periods.get(period)
+        return title if title is not None else self.text.period_range(start=start, end=end)
+
+    def period_stats(self, period: str, start: date, end: date, stats: dict) -> str:
+        """Текст статистики за неделю или месяц"""
+        text = self.text.period_stats(period=self.names.periods[period], period_start=start, period_end=end, **stats)
+        if stats['days_with_work']:
+            average = stats['total_minutes'] // stats['days_with_work']
+            text += self.text.period_average(hours=average // 60, minutes=average % 60)
+        return text
+
+    def streak(self, streak: dict) -> str:
+        """Текст /streak: серии дней с достигнутой целью"""
+        goal = streak['goal_minutes']
+        text = self.text.streak(**streak, goal_hours=goal // 60, goal_rest=goal % 60)
+        if streak['active_days']:
+            percent = round(streak['goal_days'] / streak['active_days'] * 100)
+            text += self.text.streak_goal_days(**streak, percent=percent)
+        return text
+
+    def insights(self, hour_minutes: list, length_counts: list, buckets: tuple) -> str:
+        """Текст /insights из гистограмм user_insights; buckets - границы длительности сессий в минутах"""
+        text, names = self.text, self.names
+        sessions = sum(length_counts)
+        if not sessions:
+            return text.insights_empty
+
+        by_hour = [sum(hour_minutes[day * 24 + hour] for day in range(7)) for hour in range(24)]
+        by_day = [sum(hour_minutes[day * 24:day * 24 + 24]) for day in range(7)]
+        top_hours = sorted((hour for hour in range(24) if by_hour[hour]), key=lambda hour: -by_hour[hour])[:3]
+        best = max(range(168), key=lambda index: hour_minutes[index])
+
+        lines = [text.insights_title, ""]
+        # Сессии короче минуты не добавляют минут по часам
+        if any(hour_minutes):
+            lines.append(text.insights_hours)
+            lines += [
+                text.insights_hour(hour=hour, next_hour=(hour + 1) % 24, duration=self.duration(by_hour[hour]))
+                for hour in top_hours
+            ]
+            lines += ["", text.insights_days]
+            peak = max(by_day)
+            for day, minutes in enumerate(by_day):
+                filled = round(minutes / peak * 10)
+                lines.append(text.insights_day(
+                    weekday=names.weekdays[day], bar='█' * filled + '░' * (10 - filled),
+                    duration=self.duration(minutes)
+                ))
+            lines += ["", text.insights_best(
+                weekday=names.weekday_names[best // 24], hour=best % 24, next_hour=(best % 24 + 1) % 24
+            ), ""]
+
+        bounds = (0,) + tuple(buckets)
+        labels = [text.length_range(low=low, high=high) for low, high in zip(bounds, bounds[1:])]
+        labels[0] = text.length_first(high=bounds[1])
+        labels.append(text.length_last(low=bounds[-1]))
+        lines.append(text.insights_lengths(sessions=sessions))
+        lines += [
+            text.insights_length(label=label, count=count, percent=round(count / sessions * 100))
+            for label, count in zip(labels, length_counts)
+        ]
+        return "\n".join(lines)
+
+    def tag_stats(self, title: str, stats: dict) -> str:
+        """Текст /stats: время по тегам и без тега с долей от общего"""
+        text = self.text
+        total = stats['total_minutes']
+        if not total:
+            return text.tag_stats_empty(title=title)
+
+        def line(name: str, minutes: int, sessions: int) -> str:
+            return text.tag_stats_line(
+                name=name, hours=minutes // 60, minutes=minutes % 60,
+                percent=round(minutes / total * 100), sessions=sessions
+            )
+
+        lines = [line(f"#{tag}", minutes, sessions) for tag, minutes, sessions in stats['tags']]
+        untagged = total - sum(minutes for _, minutes, _ in stats['tags'])
+        if untagged > 0:
+            sessions = stats['session_count'] - sum(count for _, _, count in stats['tags'])
+            lines.append(line(text.untagged, untagged, sessions))
+        return text.tag_stats(title=title, lines="\n".join(lines), **stats)
+
+    def leaderboard(self, title: str, rows: list, refresh_minutes: int) -> str:
+        """Текст /leaderboard: места участников группы по минутам дипворка"""
+        text = self.text
+        if not rows:
+            return text.leaderboard_empty(title=title)
+        lines = []
+        for position, (_, name, minutes) in enumerate(rows, 1):
+            place = LEADERBOARD_MEDALS[position - 1] if position <= len(LEADERBOARD_MEDALS) else f"{position}."
+            lines.append(text.leaderboard_line(place=place, name=name, hours=minutes // 60, minutes=minutes % 60))
+        return text.leaderboard(title=title, lines="\n".join(lines), minutes=refresh_minutes)
+
+    def daily_report(self, day: date, stats: dict, goal: int) -> str:
+        """Текст ежедневного отчета о дипворке с оценкой относительно цели в минутах"""
+        text = self.text
+        total = stats['total_minutes']
+        if total >= goal:
+            verdict = text.report_goal_met
+        elif total >= goal * 3 // 4:
+            verdict = text.report_good
+        elif total >= goal // 2:
+            verdict = text.report_fair
+        else:
+            verdict = text.report_low
+        return text.daily_report(day=day, verdict=verdict, **stats)
+
+    def import_result(self, result: dict) -> str:
+        """Текст итога /import; ошибки строк - как их описал импорт"""
+        text = self.text.import_done(**result)
+        if result['loaded'] > result['imported']:
+            text += self.text.import_skipped(count=result['loaded'] - result['imported'])
+        if result['invalid']:
+            text += self.text.import_invalid(count=result['invalid']) + "\n".join(result['errors'])
+        return text
+
+
+class TemplateRegistry:
+    """Templates языков бота; первый язык - язык по умолчанию
+
+    Язык пользователя - language_code его клиента Telegram, если этот язык
+    включен, иначе язык по умолчанию. Для сообщений без обновления
+    пользователя (сроки сессий) язык запоминается (LRU maxsize), а бот
+    сохраняет его в базе данных: рассылки и сообщения после перезапуска
+    берут язык оттуда. С одним языком ничего не запоминается.
+    """
+
+    def __init__(self, languages=(DEFAULT_LANGUAGE,), maxsize: int = 10_000):
+        unknown = [language for language in languages if language not in TEXTS]
+        if unknown or not languages:
+            raise ValueError(f"Неизвестные языки: {', '.join(unknown)}, доступны: {', '.join(TEXTS)}")
+        self._templates = {language: Templates(language) for language in languages}
+        self.default = self._templates[languages[0]]
+        self.multilingual = len(self._templates) > 1
+        self.maxsize = maxsize
+        # user_id -> Templates языка последнего обновления
+        self._users = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def get(self, language: str = None) -> Templates:
+        """Templates языка; выключенный или неизвестный язык - язык по умолчанию"""
+        return self._templates.get(language, self.default)
+
+    def language_of(self, user) -> str:
+        """Язык пользователя Telegram (types.User) из включенных"""
+        language = (user.language_code or '').split('-')[0].lower()
+        return language if language in self._templates else self.default.language
+
+    def for_user(self, user) -> Templates:
+        """Templates пользователя Telegram (types.User)"""
+        if not self.multilingual:
+            return self.default
+        return self._templates[self.language_of(user)]
+
+    def remember(self, user_id: int, language: str) -> bool:
+        """Запоминает язык пользователя; True, если он новый или изменился"""
+        templates = self.get(language)
+        changed = self._users.get(user_id) is not templates
+        self._users[user_id] = templates
+        self._users.move_to_end(user_id)
+        if len(self._users) > self.maxsize:
+            self._users.popitem(last=False)
+        return changed
+
+    def for_user_id(self, user_id: int) -> Templates:
+        """Templates по запомненному языку пользователя"""
+        return self._users.get(user_id, self.default)
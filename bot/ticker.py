@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import math
+import time
+from .broadcast import TokenBucket
+from .locks import UserLocks
+
+logger = logging.getLogger(__name__)
+
+# Интервал обновления по времени с начала сессии: (до, интервал), секунды
+DEFAULT_INTERVALS = ((3600, 60), (3 * 3600, 300), (None, 900))
+
+
+class TimerWheel:
+    """Колесо таймеров: слоты по tick секунд, по ключу не больше одного таймера
+
+    Постановка, перенос и отмена таймера - O(1), за шаг просматривается один
+    слот, поэтому стоимость не зависит от числа таймеров. Повторная
+    постановка ключа заменяет прежний таймер (обновления объединяются).
+    Таймеры дальше slots * tick секунд ждут нужного оборота колеса.
+    """
+
+    def __init__(self, now: float, tick: float = 1.0, slots: int = 3600):
+        self.tick = tick
+        self._slots = [{} for _ in range(slots)]
+        # key -> номер шага срабатывания
+        self._deadlines = {}
+        self._current = math.floor(now / tick)
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key, at: float):
+        """Таймер key на момент at (не раньше следующего шага)"""
+        self.cancel(key)
+        deadline = max(math.ceil(at / self.tick), self._current + 1)
+        self._deadlines[key] = deadline
+        self._slots[deadline % len(self._slots)][key] = deadline
+
+    def cancel(self, key):
+        deadline = self._deadlines.pop(key, None)
+        if deadline is not None:
+            del self._slots[deadline % len(self._slots)][key]
+
+    def advance(self, now: float) -> list:
+        """Ключи таймеров, сработавших к моменту now"""
+        due = []
+        target = math.floor(now / self.tick)
+        # После долгой паузы цикла событий достаточно одного оборота колеса
+        start = max(self._current + 1, target - len(self._slots) + 1)
+        for step in range(start, target + 1):
+            slot = self._slots[step % len(self._slots)]
+            if not slot:
+                continue
+            fired = [key for key, deadline in slot.items() if deadline <= target]
+            for key in fired:
+                del slot[key]
+                del self._deadlines[key]
+            due.extend(fired)
+        self._current = max(self._current, target)
+        return due
+
+
+class _LiveMessage:
+    __slots__ = ('chat_id', 'message_id', 'started', 'text', 'reply_markup', 'render')
+
+    def __init__(self, chat_id, message_id, started, text, reply_markup, render):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.started = started
+        self.text = text
+        self.reply_markup = reply_markup
+        self.render = render
+
+
+class SessionTicker:
+    """Обновление сообщений идущих сессий с прошедшим временем
+
+    Все сообщения обслуживает одно колесо таймеров и несколько обработчиков,
+    а не задача на каждого пользователя. Интервал растет с длительностью
+    сессии (intervals) и с числом сессий: правок не больше rate в секунду,
+    поэтому при десятках тысяч сессий сообщения обновляются реже, но лимиты
+    Telegram соблюдаются. Правка не отправляется, если текст не изменился.
+
+    edit(chat_id, message_id, text, reply_markup) возвращает None при ошибке,
+    и сообщение больше не обновляется. render(elapsed) строит текст по
+    прошедшим секундам или возвращает None, если сессия уже закончилась.
+    """
+
+    def __init__(self, edit, rate: float = 10, max_in_flight: int = 5, intervals: tuple = DEFAULT_INTERVALS,
+                 locks: UserLocks = None, clock=time.monotonic):
+        self.edit = edit
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.intervals = intervals
+        self.locks = locks
+        self.clock = clock
+        self.bucket = TokenBucket(rate, burst=1, clock=clock)
+        self.wheel = TimerWheel(clock())
+        # user_id -> _LiveMessage
+        self._messages = {}
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self.edited = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._messages
+
+    def track(self, user_id: int, chat_id: int, message_id: int, text: str, render, reply_markup=None):
+        """Обновлять сообщение сессии, начавшейся сейчас; text - его текущий текст"""
+        message = _LiveMessage(chat_id, message_id, self.clock(), text, reply_markup, render)
+        self._messages[user_id] = message
+        self._schedule(user_id, message)
+
+    def untrack(self, user_id: int):
+        """Сообщение заменено или сессия закончилась"""
+        self._messages.pop(user_id, None)
+        self.wheel.cancel(user_id)
+
+    def interval(self, elapsed: float) -> float:
+        for until, step in self.intervals:
+            if until is None or elapsed < until:
+                break
+        # Правки всех сообщений за интервал укладываются в rate
+        return max(step, len(self._messages) / self.rate)
+
+    def _schedule(self, user_id: int, message: _LiveMessage):
+        elapsed = self.clock() - message.started
+        step = self.interval(elapsed)
+        # Следующая граница интервала от начала сессии: текст меняется ровно на ней
+        self.wheel.schedule(user_id, message.started + (elapsed // step + 1) * step)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.max_in_flight)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            for user_id in self.wheel.advance(self.clock()):
+                self._queue.put_nowait(user_id)
+
+    async def _worker(self):
+        while True:
+            user_id = await self._queue.get()
+            try:
+                await self.refresh(user_id)
+            except Exception as e:
+                self.failed += 1
+                self.untrack(user_id)
+                logger.error(f"Ошибка обновления сообщения сессии пользователя {user_id}: {e}")
+
+    async def refresh(self, user_id: int):
+        """Правка сообщения пользователя, если его текст изменился"""
+        message = self._messages.get(user_id)
+        if message is None:
+            return
+        text = message.render(self.clock() - message.started)
+        if text is None:
+            self.untrack(user_id)
+            return
+        if text == message.text:
+            self.unchanged += 1
+        else:
+            await self.bucket.acquire()
+            if self.locks is None:
+                result = await self._edit(user_id, message, text)
+            else:
+                # Нажатие кнопки не должно разойтись с правкой по таймеру
+                async with self.locks.hold(user_id):
+                    result = await self._edit(user_id, message, text)
+            if result is None:
+                return
+        if self._messages.get(user_id) is message:
+            self._schedule(user_id, message)
+
+    async def _edit(self, user_id: int, message: _LiveMessage, text: str):
+        # Пока ждали очереди, сообщение могли заменить
+        if self._messages.get(user_id) is not message:
+            return None
+        result = await self.edit(message.chat_id, message.message_id, text, message.reply_markup)
+        if result is None:
+            self.failed += 1
+            self.untrack(user_id)
+            return None
+        self.edited += 1
+        message.text = text
+        return result
@@ -0,0 +1,109 @@
+import re
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+from typing import NamedTuple
+from zoneinfo import ZoneInfo, available_timezones
+from .storage import AsyncDatabase
+from .stats import utc_now, local_midnight
+
+# Смещение от UTC в целых часах: +3, -5, UTC+3, GMT-05:00
+OFFSET_PATTERN = re.compile(r'^(?:UTC|GMT)?\s*([+-])\s*(\d{1,2})(?::00)?$', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1)
+def _zone_names() -> dict:
+    """Имена часовых поясов базы IANA без учета регистра"""
+    return {name.lower(): name for name in available_timezones()}
+
+
+def parse_timezone(text: str) -> str:
+    """Имя часового пояса из ввода пользователя
+
+    Принимаются имена IANA (Europe/Moscow, asia/tokyo), UTC и смещения в
+    целых часах (+3, UTC-5), которые переводятся в пояса Etc/GMT без
+    перехода на летнее время. ValueError, если пояс не распознан.
+    """
+    text = text.strip()
+    match = OFFSET_PATTERN.match(text)
+    if match:
+        hours = int(match.group(2)) * (1 if match.group(1) == '+' else -1)
+        if not -12 <= hours <= 14:
+            raise ValueError(f"Смещение вне диапазона -12..+14: {text}")
+        # В именах Etc/GMT знак обратный: Etc/GMT-3 - это UTC+3
+        return 'UTC' if hours == 0 else f"Etc/GMT{-hours:+d}"
+    name = _zone_names().get(text.lower().replace(' ', '_'))
+    if name is None:
+        raise ValueError(f"Неизвестный часовой пояс: {text}")
+    return name
+
+
+class LocalDay(NamedTuple):
+    """Местный день пользователя: пояс, дата и ее границы в UTC"""
+    timezone: ZoneInfo
+    day: date
+    start: datetime
+    end: datetime
+
+
+def local_day(tz: ZoneInfo, now: datetime) -> LocalDay:
+    day = now.astimezone(tz).date()
+    return LocalDay(tz, day, local_midnight(day, tz), local_midnight(day + timedelta(days=1), tz))
+
+
+class UserClock:
+    """Часовые пояса и текущие местные дни пользователей
+
+    Пояс читается из базы один раз на пользователя, а границы его текущего
+    дня хранятся вместе с ним: пока местная полночь не наступила, "сегодня"
+    считается без обращения к базе и без пересчета часового пояса. Размер
+    ограничен (LRU). Обработчики одного пользователя выполняются в одном
+    процессе, поэтому кеш процесса не расходится с базой.
+    """
+
+    def __init__(self, db: AsyncDatabase, default: ZoneInfo, maxsize: int = 10_000, clock=utc_now):
+        self.db = db
+        self.default = default
+        self.maxsize = maxsize
+        self.clock = clock
+        # user_id -> LocalDay
+        self._days = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    async def day(self, user_id: int) -> LocalDay:
+        """Текущий местный день пользователя"""
+        now = self.clock()
+        entry = self._days.get(user_id)
+        if entry is None:
+            name = await self.db.get_user_timezone(user_id)
+            entry = local_day(ZoneInfo(name) if name else self.default, now)
+            # Ошибку чтения не запоминаем: в следующий раз пояс прочитается снова
+            if name is not None:
+                self._store(user_id, entry)
+        elif now >= entry.end:
+            entry = local_day(entry.timezone, now)
+            self._store(user_id, entry)
+        else:
+            self._days.move_to_end(user_id)
+        return entry
+
+    async def today(self, user_id: int) -> date:
+        return (await self.day(user_id)).day
+
+    async def timezone(self, user_id: int) -> ZoneInfo:
+        return (await self.day(user_id)).timezone
+
+    async def set(self, user_id: int, name: str) -> bool:
+        """Сохранение пояса пользователя в базе с пересчетом его статистики"""
+        if not await self.db.set_user_timezone(user_id, name):
+            return False
+        self._store(user_id, local_day(ZoneInfo(name), self.clock()))
+        return True
+
+    def _store(self, user_id: int, entry: LocalDay):
+        self._days[user_id] = entry
+        self._days.move_to_end(user_id)
+        if len(self._days) > self.maxsize:
+            self._days.popitem(last=False)
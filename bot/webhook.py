@@ -0,0 +1,178 @@
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+from aiohttp import web
+from aiogram import types
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def extract_user_id(payload: dict) -> int:
+    """Идентификатор пользователя из обновления Telegram (0, если его нет)"""
+    for key, value in payload.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        sender = value.get('from') or value.get('user') or value.get('chat')
+        if isinstance(sender, dict) and isinstance(sender.get('id'), int):
+            return sender['id']
+    return 0
+
+
+def webhook_workers() -> int:
+    """Число процессов-обработчиков webhook (WEBHOOK_WORKERS)"""
+    return int(os.getenv('WEBHOOK_WORKERS', '2'))
+
+
+class WorkerPool:
+    """Пул процессов-обработчиков обновлений
+
+    Обновления одного пользователя всегда попадают в один и тот же процесс
+    (user_id по модулю числа процессов), поэтому состояние пользователя в
+    памяти процесса остается согласованным.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._context = multiprocessing.get_context('spawn')
+        self.queues = [self._context.Queue() for _ in range(size)]
+        self.processes = []
+
+    def start(self):
+        for index, queue in enumerate(self.queues):
+            process = self._context.Process(
+                target=_worker_main, args=(index, self.size, queue), name=f'bot-worker-{index}', daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+        logger.info(f"Запущено процессов-обработчиков: {self.size}")
+
+    def route(self, user_id: int, body: bytes):
+        """Передача сырого обновления процессу, отвечающему за пользователя"""
+        self.queues[user_id % self.size].put(body)
+
+    def stop(self, timeout: float = 10):
+        """Остановка процессов после обработки уже принятых обновлений"""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+def create_webhook_app(route, secret: str, path: str) -> web.Application:
+    """HTTP-приложение, принимающее обновления Telegram
+
+    route(user_id, body) вызывается для каждого обновления с верным секретом.
+    """
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), secret):
+            return web.Response(status=401)
+        body = await request.read()
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(payload, dict):
+            return web.Response(status=400)
+        route(extract_user_id(payload), body)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    return app
+
+
+async def run_webhook(tracker):
+    """Режим webhook: HTTP-сервер принимает обновления и раздает их пулу процессов"""
+    url = os.getenv('WEBHOOK_URL')
+    secret = os.getenv('WEBHOOK_SECRET')
+    if not url or not secret:
+        logger.error("Для режима webhook нужны WEBHOOK_URL и WEBHOOK_SECRET!")
+        return
+    path = os.getenv('WEBHOOK_PATH', '/webhook')
+    host = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+    port = int(os.getenv('WEBHOOK_PORT', '8080'))
+
+    pool = WorkerPool(webhook_workers())
+    pool.start()
+    runner = web.AppRunner(create_webhook_app(pool.route, secret, path), access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        await tracker.bot.set_webhook(
+            url=url.rstrip('/') + path,
+            secret_token=secret,
+            allowed_updates=tracker.dp.resolve_used_update_types()
+        )
+        logger.info(f"Webhook слушает {host}:{port}{path}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        pool.stop()
+
+
+def _worker_main(index: int, size: int, queue):
+    """Точка входа процесса-обработчика"""
+    asyncio.run(_serve_worker(index, size, queue))
+
+
+async def _serve_worker(index: int, size: int, queue):
+    from .bot import TimeTrackerBot, create_health_server
+    from .scheduler import Scheduler
+
+    tracker = TimeTrackerBot()
+    # Лимиты отправки делятся между всеми процессами бота
+    tracker.setup(os.getenv('TELEGRAM_TOKEN'), workers=size)
+    # Сессии и сроки пользователя загружает, сверяет и обрабатывает процесс,
+    # которому маршрутизируются его обновления
+    tracker.sessions.shard = tracker.deadlines.shard = (index, size)
+    await tracker.sessions.load()
+    tracker.deadlines.start()
+    # Сверка зависших сессий своих пользователей: закрытые сессии сразу уходят
+    # из реестра и кеша статистики процесса
+    scheduler = Scheduler()
+    scheduler.add_job(
+        "reconcile_sessions", "0 * * * *", tracker._reconcile_sessions, tracker.timezone, catch_up=False
+    )
+    await scheduler.start()
+    if tracker.ticker is not None:
+        tracker.ticker.start()
+    # Метрики обработчиков процесса - на следующих за основным портах
+    health = create_health_server(tracker, offset=index + 1)
+    if health:
+        await health.start()
+    logger.info(f"Процесс-обработчик {index} готов")
+
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    try:
+        while True:
+            body = await loop.run_in_executor(None, queue.get)
+            if body is None:
+                break
+            try:
+                update = types.Update.model_validate_json(body, context={'bot': tracker.bot})
+            except ValueError as e:
+                logger.error(f"Некорректное обновление: {e}")
+                continue
+            # Как и при polling, каждое обновление обрабатывается отдельной задачей
+            task = asyncio.create_task(tracker.dp.feed_update(tracker.bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await scheduler.stop()
+        await tracker.deadlines.stop()
+        if tracker.ticker is not None:
+            await tracker.ticker.stop()
+        if health:
+            await health.stop()
+        await tracker.bot.session.close()
+        await tracker.db.close()
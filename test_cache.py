@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Тесты кеша статистики за сегодня
+"""
+
+import sys
+import os
+from datetime import date, timedelta
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.cache import TodayStatsCache, ChartCache, RecentKeys, RecentTags
+from bot.database import make_stats
+
+TODAY = date(2026, 10, 18)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_misses_and_lru_eviction():
+    cache = TodayStatsCache(maxsize=2, ttl=60, clock=FakeClock())
+    assert cache.get(1, TODAY) is None
+    cache.put(1, TODAY, make_stats(30, 1))
+    cache.put(2, TODAY, make_stats(60, 2))
+    assert cache.get(1, TODAY)['total_minutes'] == 30
+    # Пользователь 2 использовался давно и вытесняется
+    cache.put(3, TODAY, make_stats(90, 3))
+    assert cache.get(2, TODAY) is None
+    assert cache.get(1, TODAY) is not None
+    assert cache.counters() == {'hits': 2, 'misses': 2, 'size': 2}
+
+
+def test_ttl_and_invalidate():
+    clock = FakeClock()
+    cache = TodayStatsCache(ttl=60, clock=clock)
+    cache.put(1, TODAY, make_stats(30, 1))
+    cache.put(2, TODAY, make_stats(30, 1))
+    cache.invalidate(2)
+    assert cache.get(2, TODAY) is None
+    clock.now = 61
+    assert cache.get(1, TODAY) is None
+    assert len(cache) == 0
+
+
+def test_rolls_over_at_new_day():
+    cache = TodayStatsCache(clock=FakeClock())
+    cache.put(1, TODAY, make_stats(30, 1))
+    tomorrow = TODAY + timedelta(days=1)
+    assert cache.get(1, tomorrow) is None
+    assert len(cache) == 0
+    cache.put(1, tomorrow, make_stats(10, 1))
+    # Запоздавшая запись за прошлый день не заменяет запись за новый
+    cache.put(1, TODAY, make_stats(30, 1))
+    assert cache.get(1, tomorrow)['total_minutes'] == 10
+    assert cache.get(1, TODAY) is None
+    # У другого пользователя в другом часовом поясе еще прошлый день
+    cache.put(2, TODAY, make_stats(30, 1))
+    assert cache.get(2, TODAY)['total_minutes'] == 30
+
+
+def test_chart_file_id_is_reused_until_version_changes():
+    cache = ChartCache(maxsize=2)
+    cache.put(1, 'week', ('v1',), 'file-1')
+    assert cache.get(1, 'week', ('v1',)) == 'file-1'
+    assert cache.get(1, 'month', ('v1',)) is None
+    # Статистика изменилась - график нужно нарисовать заново
+    assert cache.get(1, 'week', ('v2',)) is None
+    cache.put(1, 'week', ('v2',), 'file-2')
+    cache.put(2, 'week', ('v1',), 'file-3')
+    cache.put(3, 'week', ('v1',), 'file-4')
+    assert len(cache) == 2
+    assert cache.get(1, 'week', ('v2',)) is None
+    assert cache.counters() == {'hits': 1, 'misses': 3, 'size': 2}
+
+
+def test_recent_keys_expire_and_are_bounded():
+    clock = FakeClock()
+    keys = RecentKeys(maxsize=2, ttl=60, clock=clock)
+    assert not keys.seen(1)
+    assert keys.seen(1)
+    clock.now = 61
+    # Повтор после ttl обрабатывается как новое обновление
+    assert not keys.seen(1)
+    assert not keys.seen(2)
+    assert not keys.seen(3)
+    assert len(keys) == 2
+    assert not keys.seen(1)
+    keys.forget(1)
+    assert not keys.seen(1)
+
+
+def test_recent_tags_move_to_front_and_are_bounded():
+    tags = RecentTags(limit=2, maxsize=2)
+    assert tags.get(1) is None
+    # Без записи новый тег не заменяет теги из базы данных
+    tags.add(1, 'thesis')
+    assert tags.get(1) is None
+    tags.put(1, ['review', 'thesis', 'email'])
+    assert tags.get(1) == ['review', 'thesis']
+    tags.add(1, 'thesis')
+    assert tags.get(1) == ['thesis', 'review']
+    tags.add(1, 'email')
+    assert tags.get(1) == ['email', 'thesis']
+    tags.put(2, [])
+    tags.put(3, ['x'])
+    assert len(tags) == 2
+    assert tags.get(1) is None
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Тесты графиков дипворка
+"""
+
+import sys
+import os
+import asyncio
+from datetime import date
+
+import pytest
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.charts import ChartRenderer, chart_period
+
+TODAY = date(2026, 10, 18)
+
+
+def test_chart_periods():
+    assert chart_period('week', TODAY) == (date(2026, 10, 12), date(2026, 10, 18))
+    assert chart_period('month', date(2026, 2, 10)) == (date(2026, 2, 1), date(2026, 2, 28))
+    start, end = chart_period('year', TODAY)
+    # Тепловая карта начинается с понедельника и занимает 53 недели
+    assert (start.weekday(), (end - start).days // 7 + 1, end) == (0, 53, TODAY)
+    with pytest.raises(ValueError):
+        chart_period('day', TODAY)
+
+
+def test_charts_are_rendered_in_worker_process():
+    pytest.importorskip('matplotlib')
+    renderer = ChartRenderer()
+
+    async def render_all():
+        images = []
+        for kind in ('week', 'year'):
+            start, end = chart_period(kind, TODAY)
+            images.append(await renderer.render(kind, start, end, {TODAY: 300, start: 30}, 240))
+        return images
+
+    try:
+        images = asyncio.run(render_all())
+    finally:
+        renderer.close()
+    assert all(image.startswith(b'\x89PNG') for image in images)
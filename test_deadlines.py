@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Тесты сроков сессий: цикл обработки и помидор через обработчики бота
+"""
+
+import sys
+import os
+import asyncio
+from datetime import timedelta
+
+# Добавляем корневую директорию и бенчмарки в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from bot.bot import TimeTrackerBot
+from bot.deadlines import DeadlineQueue
+from bot.memory_database import MemoryDatabase
+from bot.stats import utc_now
+from bot.storage import AsyncDatabase
+from replay import FakeTelegramSession, make_update
+
+USER = 5
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = utc_now()
+
+    def __call__(self):
+        return self.now
+
+
+def test_due_deadlines_are_handled_in_batches():
+    clock = FakeClock()
+    db = AsyncDatabase(MemoryDatabase())
+    handled = []
+
+    async def handler(deadline):
+        if deadline.user_id == 3:
+            raise RuntimeError("ошибка одного срока не останавливает порцию")
+        handled.append((deadline.user_id, deadline.kind))
+
+    async def scenario():
+        queue = DeadlineQueue(db, handler, batch_size=2, clock=clock)
+        for user_id in range(1, 6):
+            await db.set_deadlines(user_id, [('break', clock.now + timedelta(minutes=user_id), None)])
+        clock.now += timedelta(minutes=3)
+        assert await queue.run_once() == 2
+        assert await queue.run_once() == 1
+        assert await queue.run_once() == 0
+        assert handled == [(1, 'break'), (2, 'break')]
+        assert (queue.handled, queue.failed) == (2, 1)
+        assert await db.next_deadline() == clock.now + timedelta(minutes=1)
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_notify_wakes_sleeping_loop():
+    db = AsyncDatabase(MemoryDatabase())
+    handled = asyncio.Event
+
+    async def scenario():
+        done = handled()
+
+        async def handler(deadline):
+            done.set()
+
+        queue = DeadlineQueue(db, handler, max_sleep=3600)
+        queue.start()
+        await asyncio.sleep(0.01)
+        # Цикл спит до max_sleep: новый срок будит его сразу
+        await db.set_deadlines(USER, [('break', utc_now(), None)])
+        queue.notify(utc_now())
+        await asyncio.wait_for(done.wait(), timeout=2)
+        await queue.stop()
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_pomodoro_finishes_on_deadline_and_schedules_break(monkeypatch):
+    monkeypatch.setenv('SESSION_TICKER', '0')
+    clock = FakeClock()
+    db = AsyncDatabase(MemoryDatabase())
+
+    async def scenario():
+        tracker = TimeTrackerBot(db)
+        tracker.setup('1:TEST')
+        tracker.bot.session = FakeTelegramSession()
+        tracker.deadlines.clock = clock
+
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(1, USER, 'callback', 'start_pomodoro'))
+        assert USER in tracker.sessions
+        assert await db.next_deadline() == await db.next_deadline((USER % 2, 2))
+
+        # Срок еще не наступил
+        assert await tracker.deadlines.run_once() == 0
+        clock.now += timedelta(minutes=tracker.pomodoro_minutes, seconds=1)
+        assert await tracker.deadlines.run_once() == 1
+        assert USER not in tracker.sessions
+        stats = await db.get_today_stats(USER)
+        assert (stats['total_minutes'], stats['session_count']) == (tracker.pomodoro_minutes, 1)
+        assert tracker.bot.session.calls['SendMessage'] == 1
+
+        # Конец перерыва
+        clock.now += timedelta(minutes=tracker.pomodoro_break_minutes)
+        assert await tracker.deadlines.run_once() == 1
+        assert tracker.bot.session.calls['SendMessage'] == 2
+        assert await db.next_deadline() is None
+
+        # Остановка кнопкой снимает сроки открытой сессии
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(2, USER, 'callback', 'start_deepwork'))
+        assert await db.next_deadline() is not None
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(3, USER, 'callback', 'stop_deepwork'))
+        assert await db.next_deadline() is None
+        await db.close()
+
+    asyncio.run(scenario())
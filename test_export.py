@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Тесты выгрузки истории
+"""
+
+import sys
+import os
+import csv
+import json
+from datetime import date, datetime
+
+import pytest
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.export import export_history
+
+SESSIONS = [
+    (1, 7, datetime(2026, 10, 17, 23, 0), datetime(2026, 10, 18, 1, 0), 120, 'thesis'),
+    (2, 7, datetime(2026, 10, 18, 9, 0), None, None, None),
+]
+DAILY = [(7, date(2026, 10, 17), 60, 1), (7, date(2026, 10, 18), 60, 0)]
+
+
+class FakeDatabase:
+    """Отдает строки порциями, как серверный курсор"""
+
+    def __init__(self):
+        self.calls = []
+
+    def iter_export_rows(self, dataset, user_id=None, chunk_size=5000):
+        self.calls.append((dataset, user_id, chunk_size))
+        rows = SESSIONS if dataset == 'sessions' else DAILY
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+
+def test_csv_and_jsonl_are_written_in_chunks(tmp_path):
+    db = FakeDatabase()
+    files = export_history(db, str(tmp_path), 'csv', user_id=7, chunk_size=1)
+    assert [(os.path.basename(path), count) for path, count in files] == [
+        ('sessions_user_7.csv', 2), ('daily_stats_user_7.csv', 2)
+    ]
+    assert db.calls == [('sessions', 7, 1), ('daily_stats', 7, 1)]
+    with open(files[0][0], newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['id', 'user_id', 'start_time', 'end_time', 'duration_minutes', 'tag']
+    assert rows[1][-1] == 'thesis'
+    assert rows[2] == ['2', '7', '2026-10-18 09:00:00', '', '', '']
+
+    files = export_history(db, str(tmp_path), 'jsonl')
+    with open(files[1][0], encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert os.path.basename(files[1][0]) == 'daily_stats_all.jsonl'
+    assert lines[0] == {'user_id': 7, 'date': '2026-10-17', 'total_minutes': 60, 'session_count': 1}
+
+
+def test_unknown_format_is_rejected_before_reading():
+    db = FakeDatabase()
+    with pytest.raises(ValueError):
+        export_history(db, '.', 'xlsx')
+    assert db.calls == []
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Тесты чтения и проверки импортируемых сессий
+"""
+
+import sys
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.importer import SessionReader
+
+MSK = ZoneInfo('Europe/Moscow')
+NOW = datetime(2026, 10, 18, 12, 0, tzinfo=MSK)
+
+
+def test_csv_rows_are_validated_and_bad_rows_reported(tmp_path):
+    path = tmp_path / 'history.csv'
+    path.write_text(
+        "start_time,end_time,tag\n"
+        "2026-10-17 09:00,2026-10-17 10:30,#Thesis Draft\n"
+        "2026-10-17T06:00:00Z,2026-10-17T07:00:00Z,\n"
+        "2026-10-17 11:00,2026-10-17 10:00,\n"
+        "2026-10-16 08:00,2026-10-17 09:00,\n"
+        "2026-10-18 11:00,2026-10-18 13:00,\n"
+        "вчера,2026-10-17 10:00,\n"
+        "2026-10-17 12:00,2026-10-17 13:00," + "x" * 30 + "\n",
+        encoding='utf-8'
+    )
+    reader = SessionReader(str(path), user_id=7, timezone=MSK, now=NOW)
+    assert list(reader) == [
+        (7, datetime(2026, 10, 17, 9, 0, tzinfo=MSK), datetime(2026, 10, 17, 10, 30, tzinfo=MSK), 'thesis_draft'),
+        # Время без часового пояса считается временем пояса timezone
+        (7, datetime(2026, 10, 17, 9, 0, tzinfo=MSK), datetime(2026, 10, 17, 10, 0, tzinfo=MSK), None),
+    ]
+    assert (reader.rows, reader.invalid) == (7, 5)
+    assert [error.split(':')[0] for error in reader.errors] == [
+        'строка 4', 'строка 5', 'строка 6', 'строка 7', 'строка 8'
+    ]
+
+
+def test_json_lines_and_array_with_user_ids(tmp_path):
+    lines = tmp_path / 'sessions_all.jsonl'
+    lines.write_text(
+        '{"id": 1, "user_id": 5, "start_time": "2026-10-17T09:00:00", "end_time": "2026-10-17T09:45:00"}\n'
+        '\n'
+        '{"start_time": "2026-10-17T09:00:00", "end_time": "2026-10-17T09:45:00"}\n'
+        'не json\n',
+        encoding='utf-8'
+    )
+    reader = SessionReader(str(lines), timezone=MSK, now=NOW)
+    assert list(reader) == [
+        (5, datetime(2026, 10, 17, 9, 0, tzinfo=MSK), datetime(2026, 10, 17, 9, 45, tzinfo=MSK), None)
+    ]
+    assert reader.invalid == 2
+
+    array = tmp_path / 'history.json'
+    array.write_text('[{"user_id": "6", "start_time": "2026-10-17 09:00", "end_time": "2026-10-17 09:30"}]')
+    assert list(SessionReader(str(array), timezone=MSK, now=NOW)) == [
+        (6, datetime(2026, 10, 17, 9, 0, tzinfo=MSK), datetime(2026, 10, 17, 9, 30, tzinfo=MSK), None)
+    ]
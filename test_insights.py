@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Тесты текста /insights
+"""
+
+import sys
+import os
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.database import SESSION_LENGTH_BUCKETS
+from bot.templates import Templates
+
+
+def test_insights_text_from_histograms():
+    hour_minutes = [0] * 168
+    hour_minutes[10] = 90          # понедельник 10:00
+    hour_minutes[24 + 10] = 120    # вторник 10:00
+    hour_minutes[24 + 9] = 30      # вторник 09:00
+    hour_minutes[167] = 45         # воскресенье 23:00
+    text = Templates().insights(hour_minutes, [1, 2, 1, 0, 0], SESSION_LENGTH_BUCKETS)
+
+    assert "  10:00–11:00 — 3ч 30м\n  23:00–00:00 — 0ч 45м\n  09:00–10:00 — 0ч 30м\n" in text
+    assert "  Пн ██████░░░░ 1ч 30м\n  Вт ██████████ 2ч 30м\n  Ср ░░░░░░░░░░ 0ч 0м" in text
+    assert "🏆 Лучшее время: вторник, 10:00–11:00" in text
+    assert text.endswith(
+        "⏱ Длительность сессий (4):\n"
+        "  до 30 мин — 1 (25%)\n  30–60 мин — 2 (50%)\n  60–120 мин — 1 (25%)\n"
+        "  120–240 мин — 0 (0%)\n  240+ мин — 0 (0%)"
+    )
+
+
+def test_insights_without_sessions():
+    text = Templates().insights([0] * 168, [0] * 5, SESSION_LENGTH_BUCKETS)
+    assert "после первой завершенной сессии" in text
+
+
+def test_insights_with_only_sessions_shorter_than_a_minute():
+    text = Templates().insights([0] * 168, [2, 0, 0, 0, 0], SESSION_LENGTH_BUCKETS)
+    assert "Самые продуктивные часы" not in text
+    assert "  до 30 мин — 2 (100%)" in text
+
+
+def test_insights_in_english():
+    hour_minutes = [0] * 168
+    hour_minutes[24 + 10] = 120    # вторник 10:00
+    text = Templates('en').insights(hour_minutes, [0, 1, 0, 0, 0], SESSION_LENGTH_BUCKETS)
+    assert "🏆 Best time: Tuesday, 10:00–11:00" in text
+    assert "  Tue ██████████ 2h 0m" in text
+    assert text.endswith("  240+ min — 0 (0%)")
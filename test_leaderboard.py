@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Тесты таблиц лидеров групп: участие через /join и /leave, снимок задачи
+планировщика и /leaderboard через обработчики бота
+"""
+
+import sys
+import os
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+# Добавляем корневую директорию и бенчмарки в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from bot.bot import TimeTrackerBot
+from bot.memory_database import MemoryDatabase
+from bot.stats import utc_now
+from bot.storage import AsyncDatabase
+from replay import FakeTelegramSession, make_update
+
+CHAT = -1001
+ANNA, BORIS = 5, 6
+
+
+class RecordingSession(FakeTelegramSession):
+    """Заглушка Bot API, запоминающая тексты отправленных сообщений"""
+
+    def __init__(self):
+        super().__init__()
+        self.texts = []
+
+    async def make_request(self, bot, method, timeout=None):
+        if getattr(method, 'text', None) is not None:
+            self.texts.append(method.text)
+        return await super().make_request(bot, method, timeout)
+
+
+def group_update(update_id: int, user_id: int, name: str, text: str, **fields) -> dict:
+    """Сообщение участника группового чата CHAT"""
+    update = make_update(update_id, user_id, 'command' if text.startswith('/') else 'text', text)
+    update['message']['chat'] = {'id': CHAT, 'type': 'supergroup', 'title': 'Команда'}
+    update['message']['from']['first_name'] = name
+    update['message'].update(fields)
+    return update
+
+
+def test_group_leaderboard(monkeypatch):
+    monkeypatch.setenv('SESSION_TICKER', '0')
+    db = AsyncDatabase(MemoryDatabase())
+
+    async def scenario():
+        tracker = TimeTrackerBot(db)
+        tracker.setup('1:TEST')
+        session = tracker.bot.session = RecordingSession()
+        now = utc_now()
+        for user_id, minutes in ((ANNA, 30), (BORIS, 90)):
+            await tracker.sessions.start(user_id)
+            await tracker.sessions.end(user_id, now + timedelta(minutes=minutes, seconds=30))
+
+        await tracker.dp.feed_raw_update(tracker.bot, group_update(1, ANNA, "Анна", '/join'))
+        assert session.texts[-1].startswith("✅ Анна участвует в таблице лидеров группы")
+        await tracker.dp.feed_raw_update(tracker.bot, group_update(2, BORIS, "Борис", '/join'))
+        # До пересчета снимка таблица пуста
+        await tracker.dp.feed_raw_update(tracker.bot, group_update(3, ANNA, "Анна", '/leaderboard'))
+        assert session.texts[-1].startswith("🏆 За сегодня в таблице лидеров пока пусто")
+
+        await tracker._refresh_leaderboards(now)
+        await tracker.dp.feed_raw_update(tracker.bot, group_update(4, ANNA, "Анна", '/leaderboard week'))
+        lines = session.texts[-1].split("\n")
+        assert lines[0] == "🏆 Лидеры дипворка за неделю:"
+        assert lines[2:4] == ["🥇 Борис — 1ч 30м", "🥈 Анна — 0ч 30м"]
+
+        # Обычный текст в группе - не ввод даты рождения
+        sent = len(session.texts)
+        await tracker.dp.feed_raw_update(tracker.bot, group_update(5, ANNA, "Анна", 'всем привет'))
+        assert len(session.texts) == sent
+
+        # Вышедший из группы сразу пропадает из таблицы
+        await tracker.dp.feed_raw_update(tracker.bot, group_update(
+            6, BORIS, "Борис", '', left_chat_member={'id': BORIS, 'is_bot': False, 'first_name': "Борис"}
+        ))
+        await tracker.dp.feed_raw_update(tracker.bot, group_update(7, ANNA, "Анна", '/leaderboard'))
+        assert session.texts[-1].split("\n")[2:3] == ["🥇 Анна — 0ч 30м"]
+
+        await tracker.dp.feed_raw_update(tracker.bot, group_update(8, ANNA, "Анна", '/leaderboard month'))
+        assert session.texts[-1].startswith("❌ Формат: /leaderboard")
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(9, ANNA, 'command', '/leaderboard'))
+        assert session.texts[-1].startswith("👥 Таблицы лидеров работают в группах")
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('minutes', ['0', '7', '60', '90'])
+def test_refresh_interval_must_divide_hour(monkeypatch, minutes):
+    monkeypatch.setenv('LEADERBOARD_REFRESH_MINUTES', minutes)
+    with pytest.raises(ValueError):
+        TimeTrackerBot(AsyncDatabase(MemoryDatabase()))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Тесты блокировок пользователей: очередь нажатий и отбрасывание повторов
+"""
+
+import sys
+import os
+import asyncio
+
+# Добавляем корневую директорию и бенчмарки в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from bot.bot import TimeTrackerBot
+from bot.locks import UserLocks
+from bot.memory_database import MemoryDatabase
+from bot.storage import AsyncDatabase
+from replay import FakeTelegramSession, make_update
+
+
+def test_actions_of_one_user_run_in_order():
+    locks = UserLocks()
+    events = []
+
+    async def press(user_id: int, action: str):
+        async with locks.hold(user_id, action):
+            events.append(('begin', user_id, action))
+            await asyncio.sleep(0.01)
+            events.append(('end', user_id, action))
+
+    async def scenario():
+        first = asyncio.create_task(press(1, 'start'))
+        await asyncio.sleep(0)
+        assert locks.pending(1, 'start')
+        assert not locks.pending(1, 'stop')
+        assert not locks.pending(2, 'start')
+        await asyncio.gather(first, press(1, 'stop'), press(2, 'start'))
+        # Записи удаляются, когда блокировку никто не держит и не ждет
+        assert len(locks) == 0
+        assert not locks.pending(1, 'start')
+
+    asyncio.run(scenario())
+    user_events = [event[0] + ':' + event[2] for event in events if event[1] == 1]
+    assert user_events == ['begin:start', 'end:start', 'begin:stop', 'end:stop']
+    # Другой пользователь не ждет первого
+    assert events.index(('begin', 2, 'start')) < events.index(('end', 1, 'start'))
+
+
+def test_lock_is_released_on_error():
+    locks = UserLocks()
+
+    async def scenario():
+        try:
+            async with locks.hold(1, 'start'):
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert len(locks) == 0
+        async with locks.hold(1, 'start'):
+            assert len(locks) == 1
+
+    asyncio.run(scenario())
+
+
+def test_redelivery_after_error_is_processed(monkeypatch):
+    monkeypatch.setenv('SESSION_TICKER', '0')
+    db = AsyncDatabase(MemoryDatabase())
+
+    async def scenario():
+        tracker = TimeTrackerBot(db)
+        tracker.setup('1:TEST')
+        tracker.bot.session = FakeTelegramSession()
+        start = tracker.sessions.start
+
+        async def failing_start(*args, **kwargs):
+            tracker.sessions.start = start
+            raise RuntimeError("база недоступна")
+
+        tracker.sessions.start = failing_start
+        update = make_update(1, 5, 'callback', 'start_deepwork')
+        try:
+            await tracker.dp.feed_raw_update(tracker.bot, update)
+        except RuntimeError:
+            pass
+        assert 5 not in tracker.sessions
+        # Повторная доставка того же update_id не отбрасывается как дубликат
+        await tracker.dp.feed_raw_update(tracker.bot, update)
+        assert 5 in tracker.sessions
+        await tracker.dp.feed_raw_update(tracker.bot, update)
+        assert len(tracker.seen_updates) == 1
+        await db.close()
+
+    asyncio.run(scenario())
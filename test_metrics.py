@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Тесты метрик в формате Prometheus
+"""
+
+import sys
+import os
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.metrics import Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram('db_seconds', 'Время запроса', ('method',), buckets=(0.01, 0.1))
+    for value in (0.005, 0.01, 0.05, 3.0):
+        histogram.observe(value, 'end_session')
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP db_seconds Время запроса', '# TYPE db_seconds histogram']
+    assert 'db_seconds_bucket{method="end_session",le="0.01"} 2' in lines
+    assert 'db_seconds_bucket{method="end_session",le="0.1"} 3' in lines
+    assert 'db_seconds_bucket{method="end_session",le="+Inf"} 4' in lines
+    assert 'db_seconds_count{method="end_session"} 4' in lines
+
+
+def test_counter_and_callback():
+    registry = Registry()
+    counter = registry.counter('updates', 'Обновления', ('type',))
+    counter.inc('message')
+    counter.inc('message')
+    registry.callback('lag_seconds', 'Задержка', 'gauge', lambda: {(): 0.5})
+    text = registry.render()
+    assert 'updates_total{type="message"} 2' in text
+    assert 'lag_seconds 0.5' in text
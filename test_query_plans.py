@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Регрессионные тесты планов горячих запросов
+
+Схема создается миграциями в отдельной схеме PostgreSQL, заполняется
+данными, после чего планы запросов методов Database проверяются через
+EXPLAIN: ни один горячий запрос не должен читать заполненные секции
+deepwork_sessions или daily_stats последовательным сканированием.
+Без доступной базы данных тесты пропускаются.
+"""
+
+import sys
+import os
+import json
+from datetime import date, timedelta
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.database import Database, MIN_CHAT_ID
+
+SCHEMA = 'test_query_plans'
+USERS = 2000
+SESSIONS_PER_USER = 60
+
+HOT_TABLES = ('deepwork_sessions', 'daily_stats', 'daily_tag_stats', 'session_deadlines', 'group_members',
+              'group_leaderboards')
+
+# Групповых чатов: все пользователи распределены по ним
+CHATS = 200
+
+# День снимков таблиц лидеров: у каждого пользователя есть сессия двое суток назад
+LEADERBOARD_DAY = date.today() - timedelta(days=2)
+
+
+def _connect():
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+        database=os.getenv('DB_NAME', 'time_tracker'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        connect_timeout=3
+    )
+
+
+class RecordingCursor(psycopg2.extensions.cursor):
+    """Курсор, запоминающий выполненные запросы с подставленными параметрами"""
+
+    queries = []
+
+    def execute(self, query, vars=None):
+        RecordingCursor.queries.append(self.mogrify(query, vars).decode())
+        return super().execute(query, vars)
+
+
+@pytest.fixture(scope='module')
+def db():
+    try:
+        admin = _connect()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL недоступен: {e}")
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+
+    previous = os.environ.get('DB_SCHEMA')
+    os.environ['DB_SCHEMA'] = SCHEMA
+    database = Database(minconn=1, maxconn=1)
+    try:
+        with database.connection() as conn, conn.cursor() as cursor:
+            # Сессии за четыре месяца, у каждого сотого пользователя открытая
+            cursor.execute("""
+                INSERT INTO deepwork_sessions (user_id, start_time, end_time, duration_minutes)
+                SELECT u, t, t + INTERVAL '50 minutes', 50
+                FROM generate_series(1, %(users)s) u,
+                     LATERAL (
+                         SELECT now() - make_interval(hours => 48 * n + (u %% 24)) AS t
+                         FROM generate_series(1, %(sessions)s) n
+                     ) s
+            """, {'users': USERS, 'sessions': SESSIONS_PER_USER})
+            cursor.execute("""
+                INSERT INTO deepwork_sessions (user_id, start_time)
+                SELECT u, now() - INTERVAL '20 minutes'
+                FROM generate_series(1, %(users)s, 100) u
+            """, {'users': USERS})
+            cursor.execute("""
+                INSERT INTO daily_stats (user_id, date, total_minutes, session_count)
+                SELECT user_id, start_time::date, SUM(duration_minutes), COUNT(*)
+                FROM deepwork_sessions
+                WHERE end_time IS NOT NULL
+                GROUP BY 1, 2
+            """)
+            # Время по тегам: два проекта в каждый день с дипворком
+            cursor.execute("""
+                INSERT INTO daily_tag_stats (user_id, date, tag, total_minutes, session_count)
+                SELECT user_id, date, tag, total_minutes / 2, session_count
+                FROM daily_stats, unnest(ARRAY['thesis', 'review']) tag
+            """)
+            # Сроки на сутки вперед: напоминания и окончания помидоров
+            cursor.execute("""
+                INSERT INTO session_deadlines (user_id, kind, due_at)
+                SELECT u, 'remind', now() + make_interval(secs => (u * 50 + n) %% 86400)
+                FROM generate_series(1, %(users)s) u, generate_series(1, 50) n
+            """, {'users': USERS})
+            cursor.execute("""
+                INSERT INTO group_members (chat_id, user_id, name)
+                SELECT -1 - u %% %(chats)s, u, 'user ' || u
+                FROM generate_series(1, %(users)s) u
+            """, {'users': USERS, 'chats': CHATS})
+        # Снимки таблиц лидеров всех чатов
+        database.refresh_leaderboards(LEADERBOARD_DAY, MIN_CHAT_ID, CHATS, 10)
+        with database.connection() as conn:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("ANALYZE")
+            conn.autocommit = False
+            conn.cursor_factory = RecordingCursor
+        yield database
+    finally:
+        database.close()
+        if previous is None:
+            os.environ.pop('DB_SCHEMA', None)
+        else:
+            os.environ['DB_SCHEMA'] = previous
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        admin.close()
+
+
+def _seq_scans(plan: dict) -> list:
+    """Имена отношений, читаемых последовательным сканированием"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def _assert_no_seq_scans(db: Database, queries: list):
+    with db.connection() as conn, conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+        # Пустые секции планировщик честно читает последовательно - это не регрессия
+        cursor.execute("""
+            SELECT relname FROM pg_class
+            WHERE relnamespace = %s::regnamespace AND relkind = 'r' AND reltuples > 0
+        """, (SCHEMA,))
+        populated = {row[0] for row in cursor.fetchall()}
+        for query in queries:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {query}")
+            plan = cursor.fetchone()[0][0]['Plan']
+            scans = [
+                name for name in _seq_scans(plan)
+                if name in populated and name.startswith(HOT_TABLES)
+            ]
+            assert not scans, f"Seq Scan по {scans}:\n{query}\n{json.dumps(plan, indent=1)}"
+
+
+def _record(call) -> list:
+    RecordingCursor.queries = []
+    call()
+    return [
+        query for query in RecordingCursor.queries
+        if query.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE'))
+        and 'pg_advisory' not in query
+    ]
+
+
+def test_session_and_stats_queries_use_indexes(db):
+    user_id = 42
+    queries = []
+    queries += _record(lambda: db.get_active_session(user_id))
+    session_id = db.start_session(user_id)
+    queries += _record(lambda: db.end_session(session_id))
+    queries += _record(lambda: db.get_today_stats(user_id))
+    queries += _record(lambda: db.get_week_stats(user_id))
+    queries += _record(lambda: db.get_month_stats(user_id))
+    queries += _record(lambda: db.get_streak(user_id))
+    queries += _record(lambda: db.get_chart_data(user_id, date.today() - timedelta(days=364), date.today()))
+    queries += _record(lambda: db.get_daily_report_page(date.today(), 0, 500))
+    queries += _record(lambda: db.get_daily_report_page(date.today(), 0, 500, 'Asia/Tokyo'))
+    queries += _record(lambda: db.get_user_timezone(user_id))
+    queries += _record(lambda: db.get_tag_stats(user_id, date.today() - timedelta(days=2 * 365), date.today()))
+    queries += _record(lambda: db.get_recent_tags(user_id, 3))
+    assert queries
+    _assert_no_seq_scans(db, queries)
+
+
+def test_open_session_queries_use_partial_indexes(db):
+    queries = _record(db.get_open_sessions)
+    queries += _record(lambda: db.close_stale_sessions(24 * 60))
+    # Запросы внутри close_session: EXPLAIN функции их не показывает
+    queries += [
+        """
+        UPDATE deepwork_sessions SET end_time = now()
+        WHERE id = 101 AND end_time IS NULL
+        """,
+        """
+        SELECT d.total_minutes, d.session_count
+        FROM daily_stats d
+        JOIN deepwork_sessions s ON s.user_id = d.user_id
+        WHERE s.id = 101 AND d.date = (now() AT TIME ZONE user_timezone(s.user_id))::date
+        """,
+    ]
+    _assert_no_seq_scans(db, queries)
+
+
+def test_deadline_queue_uses_due_index(db):
+    from bot.stats import utc_now
+    queries = _record(lambda: db.claim_deadlines(utc_now(), 500))
+    queries += _record(lambda: db.claim_deadlines(utc_now(), 500, shard=(1, 4)))
+    queries += _record(db.next_deadline)
+    queries += _record(lambda: db.set_deadlines(42, []))
+    _assert_no_seq_scans(db, queries)
+
+
+def test_leaderboard_queries_use_primary_keys(db):
+    # Пересчет одной порции чатов: участники и их дни - диапазоны первичных ключей
+    queries = [
+        statement
+        for query in _record(lambda: db.refresh_leaderboards(LEADERBOARD_DAY, -CHATS // 2, 10, 10))
+        for statement in query.split(';') if statement.strip()
+    ]
+    rows = []
+    queries += _record(lambda: rows.extend(db.get_leaderboard(-1, 'day', LEADERBOARD_DAY)))
+    assert rows
+    _assert_no_seq_scans(db, queries)
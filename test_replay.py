@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Проверка воспроизведения обновлений через обработчики бота (без сети и базы)
+"""
+
+import sys
+import os
+import asyncio
+from argparse import Namespace
+
+# Добавляем корневую директорию и бенчмарки в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from replay import run, compare
+
+
+def test_replay_in_memory_and_compare_with_baseline():
+    args = Namespace(
+        updates=300, users=20, concurrency=5, postgres=False, pool=4, db_latency=0, api_latency=0,
+        memory_sample=0, seed=1
+    )
+    result = asyncio.run(run(args))
+    assert (result['updates'], result['errors']) == (300, 0)
+    assert result['types']['callback:start_deepwork']['db_calls'] == 1
+    # Статистика за сегодня после остановки сессии берется из кеша
+    assert result['types']['callback:today_stats']['db_calls'] < 1
+    assert result['api_methods']['AnswerCallbackQuery'] > 0
+
+    assert compare(result, result, 0.1) == 0
+    worse = dict(result, db_calls_per_update=result['db_calls_per_update'] * 2)
+    assert compare(result, worse, 0.1) == 1
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Тесты планировщика задач
+"""
+
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.scheduler import CronSpec, Scheduler
+
+MSK = ZoneInfo('Europe/Moscow')
+
+
+def test_daily_spec_uses_job_timezone():
+    spec = CronSpec('59 23 * * *')
+    moment = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    assert spec.next_after(moment, MSK) == datetime(2026, 1, 1, 20, 59, tzinfo=timezone.utc)
+    assert spec.next_after(moment, ZoneInfo('UTC')) == datetime(2026, 1, 1, 23, 59, tzinfo=timezone.utc)
+
+
+def test_ranges_steps_and_weekdays():
+    spec = CronSpec('*/15 9-17 * * 1-5')
+    # Суббота 12:00 UTC -> понедельник 09:00 по Москве
+    moment = datetime(2026, 10, 17, 12, 0, tzinfo=timezone.utc)
+    assert spec.next_after(moment, MSK) == datetime(2026, 10, 19, 6, 0, tzinfo=timezone.utc)
+    assert spec.minutes == [0, 15, 30, 45]
+
+
+def test_invalid_spec():
+    with pytest.raises(ValueError):
+        CronSpec('61 * * * *')
+    with pytest.raises(ValueError):
+        CronSpec('* * *')
+
+
+class FakeJobStore:
+    def __init__(self, runs):
+        self.runs = dict(runs)
+
+    async def get_job_runs(self):
+        return dict(self.runs)
+
+    async def set_job_run(self, name, run_at):
+        self.runs[name] = run_at
+        return True
+
+
+def missed_midnights(last_run):
+    spec, now = CronSpec('0 0 * * *'), datetime.now(timezone.utc)
+    runs = [spec.next_after(last_run, ZoneInfo('UTC'))]
+    while spec.next_after(runs[-1], ZoneInfo('UTC')) <= now:
+        runs.append(spec.next_after(runs[-1], ZoneInfo('UTC')))
+    return runs
+
+
+def test_missed_runs_are_caught_up():
+    async def scenario():
+        last_run = datetime.now(timezone.utc) - timedelta(days=3, hours=12)
+        store = FakeJobStore({'report': last_run})
+        scheduler = Scheduler(store)
+        fired = []
+
+        async def job(run_at):
+            fired.append(run_at)
+
+        scheduler.add_job('report', '0 0 * * *', job, ZoneInfo('UTC'))
+        await scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return last_run, fired, store
+
+    last_run, fired, store = asyncio.run(scenario())
+    # Каждый пропущенный день выполняется по порядку
+    assert len(fired) >= 3
+    assert fired == missed_midnights(last_run)
+    assert store.runs['report'] == fired[-1]
+
+
+def test_catch_up_stops_on_failure():
+    async def scenario():
+        last_run = datetime.now(timezone.utc) - timedelta(days=3, hours=12)
+        store = FakeJobStore({'report': last_run})
+        scheduler = Scheduler(store)
+        fired = []
+
+        async def job(run_at):
+            fired.append(run_at)
+            if len(fired) == 2:
+                raise RuntimeError("база недоступна")
+
+        scheduler.add_job('report', '0 0 * * *', job, ZoneInfo('UTC'))
+        await scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return last_run, fired, store
+
+    last_run, fired, store = asyncio.run(scenario())
+    # Следующие за ошибкой запуски будут догнаны после перезапуска
+    assert fired == missed_midnights(last_run)[:2]
+    assert store.runs['report'] == fired[0]
+
+
+def test_failed_run_is_not_saved():
+    async def scenario():
+        two_days_ago = datetime.now(timezone.utc) - timedelta(days=2)
+        store = FakeJobStore({'report': two_days_ago})
+        scheduler = Scheduler(store)
+
+        async def job(run_at):
+            raise RuntimeError("база недоступна")
+
+        scheduler.add_job('report', '0 0 * * *', job, ZoneInfo('UTC'))
+        await scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return two_days_ago, store
+
+    two_days_ago, store = asyncio.run(scenario())
+    # Запуск будет догнан после перезапуска
+    assert store.runs['report'] == two_days_ago
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Общие тесты движков хранилища
+
+Каждый тест выполняется для MemoryDatabase, SQLiteDatabase (временный
+файл) и Database в отдельной схеме PostgreSQL. Без доступной базы данных
+PostgreSQL ее вариант пропускается.
+"""
+
+import sys
+import os
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+
+import psycopg2
+import pytest
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.database import Database, MIN_CHAT_ID
+from bot.engines import create_database
+from bot.stats import utc_now, local_timezone
+
+SCHEMA = 'test_storage_conformance'
+
+TABLES = ('deepwork_sessions', 'open_sessions', 'session_deadlines', 'daily_stats', 'daily_tag_stats', 'weekly_stats',
+          'monthly_stats', 'user_settings', 'user_streaks', 'user_insights', 'user_birthday', 'scheduler_jobs',
+          'group_members', 'group_leaderboards')
+
+USER = 7
+
+
+@pytest.fixture(scope='module')
+def postgres():
+    try:
+        admin = psycopg2.connect(
+            host=os.getenv('DB_HOST', 'localhost'),
+            port=os.getenv('DB_PORT', '5432'),
+            database=os.getenv('DB_NAME', 'time_tracker'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            connect_timeout=3
+        )
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL недоступен: {e}")
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+
+    previous = os.environ.get('DB_SCHEMA')
+    os.environ['DB_SCHEMA'] = SCHEMA
+    database = Database(minconn=1, maxconn=2)
+    try:
+        yield database
+    finally:
+        database.close()
+        if previous is None:
+            os.environ.pop('DB_SCHEMA', None)
+        else:
+            os.environ['DB_SCHEMA'] = previous
+        with admin.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        admin.close()
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'postgres'])
+def db(request, tmp_path, monkeypatch):
+    if request.param == 'postgres':
+        database = request.getfixturevalue('postgres')
+        with database.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {', '.join(TABLES)}")
+        yield database
+        return
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'time_tracker.db'))
+    database = create_database(request.param)
+    yield database
+    database.close()
+
+
+def _today() -> date:
+    return utc_now().astimezone(local_timezone()).date()
+
+
+def _at(day: date, hour: int, minute: int = 0) -> datetime:
+    """Время в часовом поясе бота"""
+    return datetime.combine(day, time(), tzinfo=local_timezone()) + timedelta(hours=hour, minutes=minute)
+
+
+def test_session_lifecycle(db):
+    session_id = db.start_session(USER)
+    assert db.get_active_session(USER) == session_id
+    assert db.get_open_sessions() == [(USER, session_id)]
+    # Повторное начало (двойное нажатие) возвращает уже открытую сессию
+    assert db.start_session(USER) == session_id
+    assert db.get_open_sessions() == [(USER, session_id)]
+
+    stats = db.end_session(session_id)
+    assert (stats['day'], stats['session_count'], stats['goal_minutes']) == (_today(), 1, 240)
+    assert db.get_active_session(USER) is None
+    assert db.get_open_sessions() == []
+    # Повторное завершение не зачисляет сессию второй раз
+    assert db.end_session(session_id)['session_count'] == 1
+    assert db.get_today_stats(USER)['session_count'] == 1
+
+
+def test_deadlines_are_claimed_once_in_order(db):
+    now = utc_now()
+    # Сроки новой сессии отсчитываются от ее начала
+    session_id = db.start_session(USER, [('finish', timedelta(minutes=25), 5)])
+    # Повторное начало не меняет сроки открытой сессии
+    assert db.start_session(USER, [('remind', timedelta(0), None)]) == session_id
+    assert timedelta(minutes=25) <= db.next_deadline() - now < timedelta(minutes=26)
+    assert db.claim_deadlines(now, 10) == []
+
+    assert db.set_deadlines(USER, [
+        ('autostop', now - timedelta(minutes=1), 30), ('remind', now - timedelta(minutes=2), None)
+    ])
+    assert db.set_deadlines(USER + 1, [('break', now + timedelta(hours=1), None)])
+    # Сроки другого процесса-обработчика не забираются
+    assert db.claim_deadlines(now, 10, shard=((USER + 1) % 2, 2)) == []
+    claimed = db.claim_deadlines(now, 10, shard=(USER % 2, 2))
+    assert claimed == [
+        (USER, session_id, 'remind', now - timedelta(minutes=2), None),
+        (USER, session_id, 'autostop', now - timedelta(minutes=1), 30),
+    ]
+    assert db.claim_deadlines(now, 10) == []
+    assert db.next_deadline() == now + timedelta(hours=1)
+    assert db.next_deadline(shard=(USER % 2, 2)) is None
+
+    # Окончание по сроку зачисляет время до срока и снимает сроки пользователя
+    db.set_deadlines(USER, [('remind', now + timedelta(hours=2), None)])
+    stats = db.end_session(session_id, end_time=now + timedelta(minutes=25))
+    assert stats['session_count'] == 1
+    assert db.next_deadline(shard=(USER % 2, 2)) is None
+    assert db.claim_deadlines(now + timedelta(days=1), 1) == [(USER + 1, None, 'break', now + timedelta(hours=1), None)]
+
+
+def test_stale_sessions_are_closed_and_credited(db):
+    db.start_session(USER)
+    assert db.close_stale_sessions(0) == [USER]
+    assert db.get_active_session(USER) is None
+    assert db.get_today_stats(USER)['session_count'] == 1
+    assert db.close_stale_sessions(0) == []
+
+
+def test_open_sessions_by_shard(db):
+    own = db.start_session(USER)
+    other = db.start_session(USER + 1)
+    assert db.get_open_sessions() == [(USER, own), (USER + 1, other)]
+    assert db.get_open_sessions((USER % 2, 2)) == [(USER, own)]
+    # Сверка процесса-обработчика не закрывает сессии чужих пользователей
+    assert db.close_stale_sessions(0, ((USER + 1) % 2, 2)) == [USER + 1]
+    assert db.get_open_sessions() == [(USER, own)]
+    assert db.close_stale_sessions(0, ((USER + 1) % 2, 2)) == []
+
+
+def test_tag_stats_follow_tagged_sessions(db):
+    now = utc_now()
+    thesis = db.start_session(USER, tag='thesis')
+    db.end_session(thesis, end_time=now + timedelta(minutes=50))
+    # Сверка устаревших тоже зачисляет тег
+    db.start_session(USER, tag='review')
+    db.close_stale_sessions(0)
+    untagged = db.start_session(USER)
+    db.end_session(untagged, end_time=now + timedelta(minutes=80))
+
+    durations = {row[0]: row[4] for chunk in db.iter_export_rows('sessions', USER) for row in chunk}
+    start, end = _today() - timedelta(days=2), _today() + timedelta(days=2)
+    stats = db.get_tag_stats(USER, start, end)
+    assert stats['tags'] == [('thesis', durations[thesis], 1), ('review', 0, 1)]
+    assert (stats['total_minutes'], stats['session_count']) == (sum(durations.values()), 3)
+    assert db.get_recent_tags(USER, 3) == ['thesis', 'review']
+    assert db.get_recent_tags(USER, 1) == ['thesis']
+    empty = db.get_tag_stats(USER, date(2000, 1, 1), date(2000, 12, 31))
+    assert (empty['tags'], empty['total_minutes']) == ([], 0)
+
+    # Пересчеты строят статистику по тегам заново из сессий
+    assert db.rebuild_daily_stats(0, 100) == USER
+    assert db.get_tag_stats(USER, start, end) == stats
+    assert db.set_user_timezone(USER, 'Asia/Tokyo')
+    assert db.get_tag_stats(USER, start, end)['tags'] == stats['tags']
+
+
+def test_group_leaderboards_from_snapshots(db):
+    chat, other, outsider = -100, USER + 1, USER + 2
+    wednesday = date(2026, 3, 4)
+    db.import_sessions(iter([
+        (USER, _at(date(2026, 3, 2), 10), _at(date(2026, 3, 2), 11)),
+        (USER, _at(wednesday, 10), _at(wednesday, 10, 30)),
+        (other, _at(wednesday, 9), _at(wednesday, 10)),
+        (outsider, _at(wednesday, 12), _at(wednesday, 14)),
+    ]))
+    assert db.add_group_member(chat, USER, "Аня")
+    assert db.add_group_member(chat, other, "Борис")
+    # Повторный /join обновляет имя
+    assert db.add_group_member(chat, USER, "Анна")
+    assert db.get_leaderboard(chat, 'day', wednesday) == []
+
+    assert db.refresh_leaderboards(wednesday, MIN_CHAT_ID, 100, 10) == chat
+    assert db.refresh_leaderboards(wednesday, chat, 100, 10) is None
+    assert [tuple(row) for row in db.get_leaderboard(chat, 'day', wednesday)] == [
+        (other, "Борис", 60), (USER, "Анна", 30)
+    ]
+    assert [tuple(row) for row in db.get_leaderboard(chat, 'week', date(2026, 3, 2))] == [
+        (USER, "Анна", 90), (other, "Борис", 60)
+    ]
+    # Снимок другого дня не выдается за сегодняшний
+    assert db.get_leaderboard(chat, 'day', date(2026, 3, 5)) == []
+
+    db.refresh_leaderboards(wednesday, MIN_CHAT_ID, 100, 1)
+    assert [tuple(row) for row in db.get_leaderboard(chat, 'day', wednesday)] == [(other, "Борис", 60)]
+    assert db.remove_group_member(chat, other)
+    assert db.get_leaderboard(chat, 'day', wednesday) == []
+    db.refresh_leaderboards(wednesday, MIN_CHAT_ID, 100, 10)
+    assert [tuple(row) for row in db.get_leaderboard(chat, 'week', date(2026, 3, 2))] == [(USER, "Анна", 90)]
+
+
+def test_import_splits_sessions_by_day_week_and_month(db):
+    rows = [
+        (USER, datetime(2026, 3, 1, 23, 30), datetime(2026, 3, 2, 0, 45)),   # воскресенье -> понедельник
+        (USER, _at(date(2026, 3, 2), 10), _at(date(2026, 3, 2), 11)),
+        (USER, datetime(2026, 3, 2, 10, 30), datetime(2026, 3, 2, 12, 0)),   # объединяется с предыдущей
+    ]
+    assert db.import_sessions(iter(rows), batch_size=2) == {'loaded': 3, 'imported': 2, 'users': 1}
+    # Повторный импорт того же файла ничего не меняет
+    assert db.import_sessions(iter(rows))['imported'] == 0
+
+    assert db.get_today_stats(USER, date(2026, 3, 1))['total_minutes'] == 30
+    monday = db.get_today_stats(USER, date(2026, 3, 2))
+    assert (monday['total_minutes'], monday['session_count'], monday['hours']) == (165, 1, 2)
+
+    week = db.get_week_stats(USER, date(2026, 3, 4))
+    assert (week['start'], week['total_minutes'], week['session_count'], week['days_with_work']) == (
+        date(2026, 3, 2), 165, 1, 1
+    )
+    month = db.get_month_stats(USER, date(2026, 3, 31))
+    assert (month['start'], month['total_minutes'], month['session_count'], month['days_with_work']) == (
+        date(2026, 3, 1), 195, 2, 2
+    )
+
+    insights = db.get_insights(USER)
+    assert insights['hour_minutes'][6 * 24 + 23] == 30
+    assert insights['hour_minutes'][:2] == [45, 0]
+    assert insights['hour_minutes'][10:12] == [60, 60]
+    assert sum(insights['hour_minutes']) == 195
+    assert insights['length_counts'] == [0, 0, 1, 1, 0]
+
+    chart = db.get_chart_data(USER, date(2026, 3, 2), date(2026, 3, 8))
+    assert (chart['days'], chart['goal']) == ({date(2026, 3, 2): 165}, 240)
+
+    sessions = [row for chunk in db.iter_export_rows('sessions', USER, chunk_size=1) for row in chunk]
+    # Время выгружается с часовым поясом
+    assert [row[1:] for row in sessions] == [
+        (USER, _at(date(2026, 3, 1), 23, 30), _at(date(2026, 3, 2), 0, 45), 75, None),
+        (USER, _at(date(2026, 3, 2), 10), _at(date(2026, 3, 2), 12), 120, None),
+    ]
+    assert all(row[2].utcoffset() is not None for row in sessions)
+    daily = [row for chunk in db.iter_export_rows('daily_stats') for row in chunk]
+    assert daily == [(USER, date(2026, 3, 1), 30, 1), (USER, date(2026, 3, 2), 165, 1)]
+
+
+def test_export_and_import_keep_session_tags(db):
+    monday = date(2026, 3, 2)
+    db.import_sessions([
+        (USER, _at(monday, 9), _at(monday, 10), 'thesis'),
+        (USER, _at(monday, 9, 30), _at(monday, 11), 'review'),   # объединяется с предыдущей
+        (USER, _at(monday, 12), _at(monday, 12, 30), 'review'),
+        (USER, _at(monday, 14), _at(monday, 15)),
+    ])
+    exported = [row for chunk in db.iter_export_rows('sessions', USER) for row in chunk]
+    assert [row[-1] for row in exported] == ['thesis', 'review', None]
+    stats = db.get_tag_stats(USER, monday, monday)
+    assert stats['tags'] == [('thesis', 120, 1), ('review', 30, 1)]
+
+    # Файл выгрузки загружается другому пользователю вместе с тегами
+    assert db.import_sessions((USER + 1, start, end, tag) for _, _, start, end, _, tag in exported)['imported'] == 3
+    assert db.get_tag_stats(USER + 1, monday, monday) == stats
+
+
+def test_chart_version_changes_with_data_and_goal(db):
+    db.import_sessions([(USER, datetime(2026, 3, 2, 10, 0), datetime(2026, 3, 2, 11, 0))])
+    version = db.get_chart_data(USER, date(2026, 3, 2), date(2026, 3, 8))['version']
+    db.import_sessions([(USER, datetime(2026, 3, 2, 12, 0), datetime(2026, 3, 2, 13, 0))])
+    changed = db.get_chart_data(USER, date(2026, 3, 2), date(2026, 3, 8))['version']
+    assert changed != version
+    db.set_daily_goal(USER, 60)
+    assert db.get_chart_data(USER, date(2026, 3, 2), date(2026, 3, 8))['version'] != changed
+
+
+def test_streak_follows_goal(db):
+    today = _today()
+    db.import_sessions([
+        (USER, _at(today - timedelta(days=days), 10), _at(today - timedelta(days=days), 11))
+        for days in (1, 2, 4)
+    ])
+    assert db.get_streak(USER) == {
+        'current_streak': 0, 'longest_streak': 0, 'goal_days': 0, 'active_days': 3, 'goal_minutes': 240
+    }
+    assert db.set_daily_goal(USER, 60)
+    assert db.get_daily_goal(USER) == 60
+    assert db.get_streak(USER) == {
+        'current_streak': 2, 'longest_streak': 2, 'goal_days': 3, 'active_days': 3, 'goal_minutes': 60
+    }
+    assert db.set_daily_goal(USER, 90)
+    assert db.get_streak(USER)['goal_days'] == 0
+
+
+def test_sqlite_streak_is_advanced_without_rescan(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'time_tracker.db'))
+    db = create_database('sqlite')
+    today = _today()
+    db.set_daily_goal(USER, 60)
+    rescans = []
+    monkeypatch.setattr(db, '_rescan_streaks', lambda conn, first, last: rescans.append(first))
+
+    def credit(days: int, minutes: int):
+        start = _at(today - timedelta(days=days), 10)
+        with db.connection(write=True) as conn:
+            db._credit(conn, USER, start, start + timedelta(minutes=minutes))
+
+    def streak_row():
+        with db.connection() as conn:
+            return conn.execute("SELECT * FROM user_streaks WHERE user_id = ?", (USER,)).fetchone()
+
+    for days, minutes in ((6, 60), (5, 30), (5, 40), (4, 20), (2, 90), (1, 60)):
+        credit(days, minutes)
+    assert not rescans
+    incremental = streak_row()
+    assert incremental[1:] == (2, 2, (today - timedelta(days=1)).isoformat(), 4, 5)
+    with db.connection(write=True) as conn:
+        type(db)._rescan_streaks(db, conn, USER, USER)
+    assert streak_row() == incremental
+
+    # Поздно закрытая сессия довела до цели день раньше последнего дня с целью
+    credit(3, 60)
+    assert rescans == [USER]
+    db.close()
+
+
+def test_rebuild_reproduces_incremental_stats(db):
+    today = _today()
+    db.set_daily_goal(USER + 1, 30)
+    db.import_sessions([
+        (user_id, _at(today - timedelta(days=days), 22), _at(today - timedelta(days=days - 1), 1, 10))
+        for user_id in (USER, USER + 1) for days in (1, 3, 9)
+    ])
+
+    def snapshot():
+        return [
+            (db.get_week_stats(user_id, today - timedelta(days=days)),
+             db.get_month_stats(user_id, today - timedelta(days=days)),
+             db.get_streak(user_id), db.get_insights(user_id))
+            for user_id in (USER, USER + 1) for days in (0, 9)
+        ] + [row for chunk in db.iter_export_rows('daily_stats') for row in chunk]
+
+    before = snapshot()
+    assert db.rebuild_daily_stats(0, 1) == USER
+    assert db.rebuild_daily_stats(USER, 1) == USER + 1
+    assert db.rebuild_daily_stats(USER + 1, 1) is None
+    assert snapshot() == before
+    assert db.refresh_rollups(0, 10) == USER + 1
+    assert db.refresh_rollups(USER + 1, 10) is None
+    assert snapshot() == before
+
+
+def test_report_and_birthday_pages(db):
+    day = date(2026, 3, 2)
+    db.set_daily_goal(3, 30)
+    db.import_sessions([
+        (user_id, _at(day, 9), _at(day, 9, 10 * user_id)) for user_id in (1, 2, 3)
+    ])
+    assert db.get_daily_report_page(day, 0, 2) == [(1, 10, 1, 240, None), (2, 20, 1, 240, None)]
+    assert db.get_daily_report_page(day, 2, 2) == [(3, 30, 1, 30, None)]
+    assert db.get_daily_report_page(day + timedelta(days=1), 0, 2) == []
+
+    for user_id in (3, 1, 2):
+        assert db.set_user_birthday(user_id, date(1990, 3, user_id))
+    assert db.set_user_birthday(1, date(1991, 1, 1))
+    assert db.get_user_birthday(1) == date(1991, 1, 1)
+    assert db.get_user_birthday(4) is None
+    assert db.get_birthday_page(1, 5) == [(2, date(1990, 3, 2), None), (3, date(1990, 3, 3), None)]
+
+
+def test_user_language(db):
+    day = date(2026, 3, 2)
+    db.import_sessions([(USER, _at(day, 9), _at(day, 10))])
+    db.set_user_birthday(USER, date(1990, 3, 1))
+    assert db.get_user_language(USER) is None
+    assert db.set_user_language(USER, 'en')
+    assert db.get_user_language(USER) == 'en'
+    # Язык хранится в строке настроек рядом с целью и не сбрасывает ее
+    assert db.set_daily_goal(USER, 30)
+    assert db.set_user_language(USER, 'ru')
+    assert db.get_daily_goal(USER) == 30
+    assert db.get_daily_report_page(day, 0, 10) == [(USER, 60, 1, 30, 'ru')]
+    assert db.get_birthday_page(0, 10) == [(USER, date(1990, 3, 1), 'ru')]
+
+
+def _locked_in_thread(call, lock_user_id: int, database) -> bool:
+    """Ждет ли call зачисления сессии пользователя lock_user_id в другой транзакции"""
+    thread = threading.Thread(target=call)
+    with database.connection() as conn, conn.cursor() as cursor:
+        # Те же блокировки, что берет credit_session
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(hashtext('daily_stats'))")
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock_shared(hashtext('daily_stats'), hashtext(%s::text))", (lock_user_id,)
+        )
+        thread.start()
+        thread.join(1)
+        waiting = thread.is_alive()
+    thread.join()
+    return waiting
+
+
+def test_goal_and_timezone_changes_wait_only_for_own_credits(postgres):
+    with postgres.connection() as conn, conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(TABLES)}")
+    assert not _locked_in_thread(lambda: postgres.set_daily_goal(USER, 30), USER + 1, postgres)
+    assert _locked_in_thread(lambda: postgres.set_daily_goal(USER, 60), USER, postgres)
+    assert postgres.get_daily_goal(USER) == 60
+    assert not _locked_in_thread(lambda: postgres.set_user_timezone(USER, 'Asia/Tokyo'), USER + 1, postgres)
+    assert _locked_in_thread(lambda: postgres.set_user_timezone(USER, 'Europe/Paris'), USER, postgres)
+    assert postgres.get_user_timezone(USER) == 'Europe/Paris'
+
+
+def test_user_timezone_moves_day_boundaries(db):
+    bot_zone = local_timezone().key
+    # 02:00-03:00 UTC: утро понедельника в часовом поясе бота и вечер воскресенья в Нью-Йорке
+    start = datetime(2026, 3, 2, 2, 0, tzinfo=timezone.utc)
+    db.set_user_birthday(USER, date(1990, 3, 1))
+    db.set_user_birthday(USER + 1, date(1990, 3, 2))
+    db.import_sessions([(user_id, start, start + timedelta(hours=1)) for user_id in (USER, USER + 1)])
+    assert db.get_user_timezone(USER) == bot_zone
+    assert db.get_timezones() == []
+
+    assert db.set_user_timezone(USER, 'America/New_York')
+    assert not db.set_user_timezone(USER, 'Mars/Olympus')
+    assert db.get_user_timezone(USER) == 'America/New_York'
+    assert db.get_timezones() == ['America/New_York']
+    # Статистика пользователя пересчитана в новом поясе, у другого не изменилась
+    assert db.get_today_stats(USER, date(2026, 3, 1))['total_minutes'] == 60
+    assert db.get_today_stats(USER, date(2026, 3, 2))['total_minutes'] == 0
+    assert db.get_today_stats(USER + 1, date(2026, 3, 2))['total_minutes'] == 60
+    assert db.get_week_stats(USER, date(2026, 3, 1))['start'] == date(2026, 2, 23)
+    assert db.get_insights(USER)['hour_minutes'][6 * 24 + 21] == 60
+
+    assert db.get_daily_report_page(date(2026, 3, 1), 0, 10, 'America/New_York') == [(USER, 60, 1, 240, None)]
+    assert db.get_daily_report_page(date(2026, 3, 1), 0, 10, bot_zone) == []
+    assert db.get_daily_report_page(date(2026, 3, 2), 0, 10, bot_zone) == [(USER + 1, 60, 1, 240, None)]
+    assert db.get_birthday_page(0, 10, 'America/New_York') == [(USER, date(1990, 3, 1), None)]
+    assert db.get_birthday_page(0, 10, bot_zone) == [(USER + 1, date(1990, 3, 2), None)]
+    # Цель и пояс хранятся в одной строке настроек
+    assert db.set_daily_goal(USER, 30)
+    assert db.get_user_timezone(USER) == 'America/New_York'
+    assert db.get_streak(USER, date(2026, 3, 2))['current_streak'] == 1
+
+
+def test_job_runs_only_move_forward(db):
+    later = datetime(2026, 3, 2, 9, 0, tzinfo=timezone.utc)
+    assert db.set_job_run('daily_report', later)
+    assert db.set_job_run('daily_report', later - timedelta(days=1))
+    assert db.get_job_runs() == {'daily_report': later}
+
+
+def test_service_methods(db):
+    assert db.ping()
+    assert db.ensure_session_partitions(1) >= 0
+    assert db.get_insights(USER) == {'hour_minutes': [0] * 168, 'length_counts': [0] * 5}
+    week = db.get_week_stats(USER, date(2026, 3, 4))
+    assert (week['start'], week['total_minutes'], week['days_with_work']) == (date(2026, 3, 2), 0, 0)
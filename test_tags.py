@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Тесты тегов сессий: разбор ввода, периоды /stats и сессии с тегом через
+обработчики бота
+"""
+
+import sys
+import os
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+# Добавляем корневую директорию и бенчмарки в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from bot.bot import TimeTrackerBot
+from bot.memory_database import MemoryDatabase
+from bot.stats import utc_now
+from bot.storage import AsyncDatabase
+from bot.tags import normalize_tag, stats_period, TAG_CALLBACK_PREFIX
+from replay import FakeTelegramSession, make_update
+
+USER = 5
+
+
+class RecordingSession(FakeTelegramSession):
+    """Заглушка Bot API, запоминающая тексты и кнопки отправленных сообщений"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    async def make_request(self, bot, method, timeout=None):
+        if getattr(method, 'text', None) is not None:
+            self.messages.append((method.text, getattr(method, 'reply_markup', None)))
+        return await super().make_request(bot, method, timeout)
+
+
+def test_normalize_tag():
+    assert normalize_tag("  #Deep  Work ") == "deep_work"
+    assert normalize_tag("Диплом") == "диплом"
+    assert normalize_tag("") is None
+    assert normalize_tag("#") is None
+    with pytest.raises(ValueError):
+        normalize_tag("x" * 25)
+    # Тег целиком помещается в callback_data кнопки
+    assert len((TAG_CALLBACK_PREFIX + normalize_tag("я" * 24)).encode()) <= 64
+
+
+def test_stats_period():
+    today = date(2026, 10, 18)
+    assert stats_period("week", today) == (date(2026, 10, 12), today)
+    assert stats_period(None, today) == (date(2026, 10, 1), today)
+    assert stats_period("YEAR", today) == (date(2026, 1, 1), today)
+    assert stats_period("all", today) == (date.min, today)
+    assert stats_period("01.01.2024-31.12.2025", today) == (date(2024, 1, 1), date(2025, 12, 31))
+    assert stats_period("1.3.2025 15.3.2025", today) == (date(2025, 3, 1), date(2025, 3, 15))
+    for text in ("yesterday", "31.12.2025-01.01.2025", "31.02.2025-01.03.2025"):
+        with pytest.raises(ValueError):
+            stats_period(text, today)
+
+
+def test_tagged_sessions_in_menu_and_stats(monkeypatch):
+    monkeypatch.setenv('SESSION_TICKER', '0')
+    db = AsyncDatabase(MemoryDatabase())
+
+    async def scenario():
+        tracker = TimeTrackerBot(db)
+        tracker.setup('1:TEST')
+        session = tracker.bot.session = RecordingSession()
+
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(1, USER, 'command', '/start_deepwork #Thesis'))
+        assert USER in tracker.sessions
+        assert session.messages[-1][0].startswith("🎯 Сессия дипворка #thesis")
+        await tracker.sessions.end(USER, utc_now() + timedelta(minutes=60))
+
+        # Недавний тег - кнопка главного меню, нажатие начинает сессию с ним
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(2, USER, 'command', '/start'))
+        buttons = [button.callback_data for row in session.messages[-1][1].inline_keyboard for button in row]
+        assert TAG_CALLBACK_PREFIX + "thesis" in buttons
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(3, USER, 'callback', TAG_CALLBACK_PREFIX + "thesis"))
+        assert session.messages[-1][0].startswith("🎯 Сессия дипворка #thesis")
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(4, USER, 'callback', 'stop_deepwork'))
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(5, USER, 'callback', 'start_deepwork'))
+        await tracker.sessions.end(USER, utc_now() + timedelta(minutes=20))
+
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(6, USER, 'command', '/stats 01.01.2000-31.12.2099'))
+        assert session.messages[-1][0] == (
+            "🏷 Дипворк по тегам за 01.01.2000–31.12.2099:\n\n"
+            "  #thesis — 1ч 0м (75%), сессий: 2\n"
+            "  без тега — 0ч 20м (25%), сессий: 1\n\n"
+            "⏱ Всего: 1ч 20м, сессий: 3\n"
+            "Начать сессию с тегом: /start_deepwork <тег>"
+        )
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(7, USER, 'command', '/stats 31.12.2025'))
+        assert session.messages[-1][0].startswith("❌ Формат: /stats")
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(8, USER, 'command', '/start_deepwork ' + "x" * 30))
+        assert session.messages[-1][0].startswith("❌ Тег")
+        assert USER not in tracker.sessions
+        await db.close()
+
+    asyncio.run(scenario())
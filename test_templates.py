@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Тесты готовых кнопок и текстов: раскладка меню, шаблоны сообщений сессии и
+язык пользователя в обработчиках бота и рассылках
+"""
+
+import sys
+import os
+import asyncio
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+# Добавляем корневую директорию и бенчмарки в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from aiogram.types import User
+
+from bot.bot import TimeTrackerBot
+from bot.memory_database import MemoryDatabase
+from bot.stats import local_timezone
+from bot.storage import AsyncDatabase
+from bot.tags import TAG_CALLBACK_PREFIX
+from bot.templates import Templates, TemplateRegistry, TEXTS
+from replay import FakeTelegramSession, make_update
+
+USER = 5
+
+
+class RecordingSession(FakeTelegramSession):
+    """Заглушка Bot API, запоминающая тексты и кнопки отправленных сообщений"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    async def make_request(self, bot, method, timeout=None):
+        if getattr(method, 'text', None) is not None:
+            self.messages.append((method.text, getattr(method, 'reply_markup', None)))
+        return await super().make_request(bot, method, timeout)
+
+
+def callbacks(markup) -> list:
+    return [[button.callback_data for button in row] for row in markup.inline_keyboard]
+
+
+def test_keyboards_and_texts():
+    ui = Templates()
+    assert callbacks(ui.main_menu(('thesis',), True)) == [
+        ['start_deepwork'], [TAG_CALLBACK_PREFIX + 'thesis'], ['start_pomodoro'], ['stop_deepwork'],
+        ['today_stats'], ['set_birthday'],
+    ]
+    # Меню с теми же тегами - тот же объект
+    assert ui.main_menu(('thesis',), False) is ui.main_menu(('thesis',), False)
+    assert callbacks(ui.keyboard.today_stats) == [['start_deepwork', 'stop_deepwork', 'chart_week', 'back_to_main']]
+    assert callbacks(ui.keyboard.break_over) == [['start_pomodoro'], ['back_to_main']]
+
+    assert ui.session_text('09:30', elapsed_minutes=65, tag='thesis') == (
+        "🎯 Сессия дипворка #thesis началась в 09:30\n\n"
+        "⏱ Прошло: 1ч 05м\n"
+        "Нажмите 'Остановить дипворк' когда закончите."
+    )
+    assert ui.text.session_stopped(hours=1, minutes=5, session_count=2).startswith("✅ Сессия дипворка завершена!")
+    # У каждого языка полный набор текстов
+    assert all(TEXTS[language].keys() == TEXTS['ru'].keys() for language in TEXTS)
+
+
+def test_registry_languages():
+    with pytest.raises(ValueError):
+        TemplateRegistry(('ru', 'xx'))
+    english = User(id=USER, is_bot=False, first_name='Ann', language_code='en-US')
+    german = User(id=USER + 1, is_bot=False, first_name='Jan', language_code='de')
+
+    single = TemplateRegistry()
+    assert not single.multilingual
+    assert single.for_user(english) is single.default
+
+    registry = TemplateRegistry(('ru', 'en'), maxsize=1)
+    assert registry.for_user(english).language == registry.language_of(english) == 'en'
+    assert registry.language_of(german) == 'ru'
+    assert registry.get('de') is registry.default
+    # Язык запоминается явно; повторно тот же язык - без изменений
+    assert registry.remember(USER, 'en')
+    assert not registry.remember(USER, 'en')
+    assert registry.for_user_id(USER).language == 'en'
+    assert registry.remember(USER + 1, 'ru')
+    # Вытеснен пользователем german
+    assert USER not in registry
+    assert registry.for_user_id(USER) is registry.default
+    assert len(registry) == 1
+
+
+def test_user_language_in_handlers(monkeypatch):
+    monkeypatch.setenv('SESSION_TICKER', '0')
+    monkeypatch.setenv('BOT_LANGUAGES', 'ru,en')
+    db = AsyncDatabase(MemoryDatabase())
+
+    async def scenario():
+        tracker = TimeTrackerBot(db)
+        tracker.setup('1:TEST')
+        session = tracker.bot.session = RecordingSession()
+
+        update = make_update(1, USER, 'command', '/start')
+        update['message']['from']['language_code'] = 'en'
+        await tracker.dp.feed_raw_update(tracker.bot, update)
+        text, markup = session.messages[-1]
+        assert text.startswith("🚀 Welcome to Time Tracker Bot!")
+        assert markup.inline_keyboard[0][0].text == "🎯 Start deep work"
+
+        # Без language_code - язык по умолчанию
+        await tracker.dp.feed_raw_update(tracker.bot, make_update(2, USER + 1, 'callback', 'stop_deepwork'))
+        assert session.messages[-1][0].startswith("⚠️ У вас нет активной сессии дипворка.")
+        await db.close()
+
+    asyncio.run(scenario())
+
+
+def test_user_language_is_stored_for_broadcasts(monkeypatch):
+    monkeypatch.setenv('SESSION_TICKER', '0')
+    monkeypatch.setenv('BOT_LANGUAGES', 'ru,en')
+    memory = MemoryDatabase()
+    db = AsyncDatabase(memory)
+    day = date(2026, 3, 1)
+
+    async def scenario():
+        tracker = TimeTrackerBot(db)
+        tracker.setup('1:TEST')
+        session = tracker.bot.session = RecordingSession()
+
+        for update_id, command in enumerate(('/week', '/streak', '/goal 90', '/stats', '/import'), 1):
+            update = make_update(update_id, USER, 'command', command)
+            update['message']['from']['language_code'] = 'en'
+            await tracker.dp.feed_raw_update(tracker.bot, update)
+        texts = [text for text, _ in session.messages]
+        assert texts[0].startswith("📊 Stats for this week (")
+        assert texts[1].startswith("🔥 Current streak: 0 d.")
+        assert texts[2] == "✅ New goal: 1h 30m of deep work a day 🎯"
+        assert texts[3] == "🏷 No deep work for this month"
+        assert texts[4].startswith("📥 Send a CSV or JSON file with the caption /import.")
+        assert await db.get_user_language(USER) == 'en'
+
+        start = datetime.combine(day, time(9), tzinfo=local_timezone())
+        memory.import_sessions([(USER, start, start + timedelta(hours=2))])
+        await db.set_user_birthday(USER + 1, date(1990, 3, 1))
+        # После перезапуска язык берется из базы
+        restarted = TimeTrackerBot(db)
+        assert (await restarted._user_ui(USER)).language == 'en'
+        assert (await restarted._user_ui(USER + 1)).language == 'ru'
+        reports = [message async for message in restarted._daily_report_messages(day)]
+        assert reports == [(USER, Templates('en').daily_report(
+            day, {'total_minutes': 120, 'session_count': 1, 'hours': 2, 'minutes': 0}, 90
+        ))]
+        assert reports[0][1].endswith("🎉 Great day! You reached your goal!")
+        birthdays = [message async for message in restarted._birthday_messages(day)]
+        assert birthdays == [(USER + 1, Templates().text.birthday_morning(days=13149))]
+        await db.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Тесты колеса таймеров и обновления сообщений идущих сессий
+"""
+
+import sys
+import os
+import asyncio
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.ticker import TimerWheel, SessionTicker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_wheel_fires_once_per_key():
+    wheel = TimerWheel(now=0, tick=1.0, slots=8)
+    wheel.schedule('a', 3)
+    wheel.schedule('b', 5)
+    # Перенос заменяет прежний таймер
+    wheel.schedule('b', 4)
+    # Таймер через несколько оборотов колеса
+    wheel.schedule('c', 20)
+    wheel.schedule('d', 2)
+    wheel.cancel('d')
+    assert len(wheel) == 3
+    assert wheel.advance(2) == []
+    assert wheel.advance(3) == ['a']
+    assert wheel.advance(12) == ['b']
+    assert wheel.advance(19) == []
+    assert wheel.advance(20) == ['c']
+    assert len(wheel) == 0
+    # Момент в прошлом - на следующем шаге
+    wheel.schedule('e', 5)
+    assert wheel.advance(21) == ['e']
+
+
+def test_intervals_grow_with_elapsed_time_and_load():
+    ticker = SessionTicker(None, rate=10, clock=FakeClock())
+    assert ticker.interval(0) == 60
+    assert ticker.interval(3600) == 300
+    assert ticker.interval(4 * 3600) == 900
+    for user_id in range(20_000):
+        ticker._messages[user_id] = None
+    # 20000 сообщений при 10 правках в секунду - не чаще раза в 2000 секунд
+    assert ticker.interval(0) == 2000
+
+
+def test_refresh_edits_only_changed_text():
+    clock = FakeClock()
+    edits = []
+
+    async def edit(chat_id, message_id, text, reply_markup):
+        edits.append((chat_id, message_id, text))
+        return True
+
+    def render(elapsed):
+        return None if elapsed >= 600 else f"{int(elapsed // 300)}"
+
+    async def scenario():
+        ticker = SessionTicker(edit, rate=100, intervals=((None, 60),), clock=clock)
+        ticker.track(1, 10, 20, '0', render)
+        assert 1 in ticker.wheel
+
+        clock.now += 60
+        await ticker.refresh(1)
+        assert edits == []
+        assert ticker.unchanged == 1
+
+        clock.now += 240
+        await ticker.refresh(1)
+        assert edits == [(10, 20, '1')]
+        assert 1 in ticker.wheel
+
+        # Сессия закончилась - сообщение больше не обновляется
+        clock.now += 300
+        await ticker.refresh(1)
+        assert 1 not in ticker
+        assert 1 not in ticker.wheel
+        assert len(edits) == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_edit_stops_updates():
+    async def edit(chat_id, message_id, text, reply_markup):
+        return None
+
+    async def scenario():
+        clock = FakeClock()
+        ticker = SessionTicker(edit, rate=100, clock=clock)
+        ticker.track(1, 10, 20, 'old', lambda elapsed: 'new')
+        clock.now += 60
+        await ticker.refresh(1)
+        assert 1 not in ticker
+        assert ticker.failed == 1
+
+    asyncio.run(scenario())
+
+
+def test_send_rates_split_between_webhook_processes(monkeypatch):
+    monkeypatch.setenv('SESSION_TICKER', '1')
+    monkeypatch.setenv('BROADCAST_RATE', '30')
+    monkeypatch.setenv('SESSION_TICKER_RATE', '12')
+    from bot.bot import TimeTrackerBot
+    from bot.memory_database import MemoryDatabase
+    from bot.storage import AsyncDatabase
+
+    tracker = TimeTrackerBot(AsyncDatabase(MemoryDatabase()))
+    tracker.setup('1:TEST', workers=3)
+    # Три обработчика и основной процесс вместе не превышают общих лимитов
+    assert tracker.sender.global_bucket.interval == 4 / 30
+    assert tracker.ticker.rate == 4
+    asyncio.run(tracker.db.close())
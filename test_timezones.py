@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Тесты часовых поясов пользователей: разбор ввода и кеш местного дня
+"""
+
+import sys
+import os
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bot.timezones import UserClock, parse_timezone
+
+MSK = ZoneInfo('Europe/Moscow')
+
+
+class FakeDatabase:
+    def __init__(self, zones: dict):
+        self.zones = zones
+        self.calls = 0
+
+    async def get_user_timezone(self, user_id: int) -> str:
+        self.calls += 1
+        return self.zones.get(user_id, 'Europe/Moscow') if self.zones is not None else None
+
+    async def set_user_timezone(self, user_id: int, name: str) -> bool:
+        self.zones[user_id] = name
+        return True
+
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+def test_parse_timezone():
+    assert parse_timezone('Asia/Tokyo') == 'Asia/Tokyo'
+    assert parse_timezone(' america/new_york ') == 'America/New_York'
+    assert parse_timezone('utc') == 'UTC'
+    assert parse_timezone('+3') == 'Etc/GMT-3'
+    assert parse_timezone('UTC-05:00') == 'Etc/GMT+5'
+    assert parse_timezone('GMT+0') == 'UTC'
+    for text in ('Mars/Olympus', '+15', '+5:30', ''):
+        with pytest.raises(ValueError):
+            parse_timezone(text)
+
+
+def test_local_day_is_cached_until_local_midnight():
+    # 20:30 UTC: в Москве 23:30, в Токио уже следующий день
+    clock = FakeClock(datetime(2026, 10, 18, 20, 30, tzinfo=timezone.utc))
+    db = FakeDatabase({2: 'Asia/Tokyo'})
+    users = UserClock(db, MSK, clock=clock)
+
+    async def scenario():
+        assert await users.today(1) == date(2026, 10, 18)
+        assert await users.today(2) == date(2026, 10, 19)
+        day = await users.day(1)
+        assert (day.start, day.end) == (
+            datetime(2026, 10, 17, 21, tzinfo=timezone.utc), datetime(2026, 10, 18, 21, tzinfo=timezone.utc)
+        )
+        assert await users.timezone(2) == ZoneInfo('Asia/Tokyo')
+        assert db.calls == 2
+
+        # Полночь в Москве: день пересчитывается без обращения к базе
+        clock.now += timedelta(hours=1)
+        assert await users.today(1) == date(2026, 10, 19)
+        assert db.calls == 2
+
+        assert await users.set(1, 'America/New_York')
+        assert await users.today(1) == date(2026, 10, 18)
+        assert db.zones[1] == 'America/New_York'
+        assert db.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_failed_lookup_is_not_cached():
+    clock = FakeClock(datetime(2026, 10, 18, 12, tzinfo=timezone.utc))
+    db = FakeDatabase(None)
+    users = UserClock(db, MSK, maxsize=1, clock=clock)
+
+    async def scenario():
+        # Ошибка базы: пояс бота, но в следующий раз пояс читается снова
+        assert await users.timezone(1) == MSK
+        assert await users.timezone(1) == MSK
+        assert db.calls == 2
+        assert len(users) == 0
+
+    asyncio.run(scenario())